@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes an AIMD controller of the requests in flight per host
+and in total, so a crawl backs off a struggling host instead of hammering
+it, and opens up to a fast one.
+
+Each grab reports its host, its latency and its outcome:
+
+    ok: The limit of the host is raised, by one per grab until the first
+        congestion (slow start), then by one per limit grabs.
+    throttled: A 429 or 503 response, the limit of the host is halved.
+    timeout: The grab timed out, the limits of the host and in total are halved.
+    error: Any other failure, which tells nothing about congestion.
+
+An ok grab slower than latency_tolerance times the usual latency of its host
+is congested too. A limit is halved at most once per DECREASE_COOLDOWN
+seconds, as the grabs in flight together fail together, and is always kept
+between its floor and its ceiling.
+
+Author: weileizhe
+Date: 2015/04/27 00:00:06
+"""
+
+import logging
+import socket
+import threading
+import time
+import urllib2
+
+
+OK = 'ok'
+THROTTLED = 'throttled'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+THROTTLE_CODES = (429, 503)
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0
+# The weight of a latency in the usual latency of its host.
+LATENCY_SMOOTHING = 0.1
+# The latency never congested, so the jitter of a fast host is not taken for it.
+MIN_CONGESTED_LATENCY = 0.1
+# The most hosts listed when the limits are logged.
+LOG_HOSTS = 10
+
+
+def response_outcome(code):
+    """
+    Get the outcome of a grab answered with status code.
+
+    Args:
+        code: The HTTP status code.
+
+    Returns:
+        THROTTLED for 429 and 503, OK otherwise.
+    """
+    return THROTTLED if code in THROTTLE_CODES else OK
+
+
+def error_outcome(error):
+    """
+    Get the outcome of a grab failed with error.
+
+    Args:
+        error: The exception of the grab, an urllib2.HTTPError has a status code.
+
+    Returns:
+        The outcome by status code of an HTTPError, TIMEOUT if it timed out,
+        ERROR otherwise.
+    """
+    if isinstance(error, urllib2.HTTPError):
+        return response_outcome(error.code)
+    if isinstance(error, urllib2.URLError) and isinstance(error.reason, Exception):
+        error = error.reason
+    if isinstance(error, socket.timeout) or 'timed out' in str(error):
+        return TIMEOUT
+    return ERROR
+
+
+class AimdLimit(object):
+    """
+    A limit raised additively and lowered multiplicatively.
+
+    Attributes:
+        floor: The lowest limit.
+        ceiling: The highest limit.
+        limit: The current limit, a float raised by fractions.
+        slow_start: Raise the limit by one per success until the first decrease.
+        decreased_time: The time of the last decrease.
+    """
+
+    def __init__(self, floor, ceiling, limit=None, slow_start=True):
+        """ Init the limit.
+
+        Args:
+            floor: The lowest limit.
+            ceiling: The highest limit.
+            limit: The initial limit, None for the floor.
+            slow_start: Raise the limit by one per success until the first decrease.
+        """
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = float(floor if limit is None else limit)
+        self.slow_start = slow_start
+        self.decreased_time = 0
+
+    def increase(self):
+        """
+        Raise the limit after a success.
+        """
+        self.limit = min(self.ceiling, self.limit + (1 if self.slow_start else 1 / self.limit))
+
+    def decrease(self, now):
+        """
+        Lower the limit after a congestion unless it was lowered in the cooldown.
+
+        Returns:
+            True if the limit is lowered.
+        """
+        if now - self.decreased_time < DECREASE_COOLDOWN:
+            return False
+        self.slow_start = False
+        self.decreased_time = now
+        self.limit = max(self.floor, self.limit * DECREASE_FACTOR)
+        return True
+
+    def value(self):
+        """
+        Get the whole limit.
+        """
+        return int(self.limit)
+
+
+class ConcurrencyController(object):
+    """
+    The AIMD limits of the requests in flight per host and in total.
+
+    A host starts at host_floor and the total at global_ceiling, as the
+    total is only lowered by timeouts, which tell the crawler itself or its
+    network is overloaded rather than a host.
+
+    Attributes:
+        host_floor: The lowest limit of a host.
+        host_ceiling: The highest limit of a host.
+        global_floor: The lowest limit in total.
+        global_ceiling: The highest limit in total.
+        latency_tolerance: The times of the usual latency of a host a grab
+                           is congested beyond.
+        log_interval: The seconds between two logs of the limits.
+        metrics: The crawl_metrics.CrawlMetrics counting the changes, None not to.
+        increases: The limits raised so far.
+        decreases: The limits lowered so far.
+    """
+
+    def __init__(self, host_floor=1, host_ceiling=4, global_floor=1, global_ceiling=8,
+                 latency_tolerance=2.0, log_interval=10, metrics=None):
+        """ Init the controller.
+
+        Args:
+            host_floor: The lowest limit of a host.
+            host_ceiling: The highest limit of a host.
+            global_floor: The lowest limit in total.
+            global_ceiling: The highest limit in total.
+            latency_tolerance: The times of the usual latency of a host a grab
+                               is congested beyond.
+            log_interval: The seconds between two logs of the limits.
+            metrics: The crawl_metrics.CrawlMetrics counting the changes, None not to.
+        """
+        self.host_floor = host_floor
+        self.host_ceiling = host_ceiling
+        self.global_floor = global_floor
+        self.global_ceiling = global_ceiling
+        self.latency_tolerance = latency_tolerance
+        self.log_interval = log_interval
+        self.metrics = metrics
+        self.increases = 0
+        self.decreases = 0
+        self.host_limits = {}
+        self.host_latencies = {}
+        self.total_limit = AimdLimit(global_floor, global_ceiling, global_ceiling, False)
+        self.logged_time = time.time()
+        self.mutex = threading.Lock()
+
+    def host_limit(self, host):
+        """
+        Get the limit of the requests in flight to host.
+        """
+        with self.mutex:
+            limit = self.host_limits.get(host)
+            return self.host_floor if limit is None else limit.value()
+
+    def global_limit(self):
+        """
+        Get the limit of the requests in flight in total.
+        """
+        with self.mutex:
+            return self.total_limit.value()
+
+    def record(self, host, seconds, outcome):
+        """
+        Adjust the limits by a finished grab.
+
+        Args:
+            host: The host key of the grab, see frontier.url_host.
+            seconds: The latency of the grab.
+            outcome: OK, THROTTLED, TIMEOUT or ERROR.
+        """
+        now = time.time()
+        with self.mutex:
+            limit = self.host_limits.get(host)
+            if limit is None:
+                limit = self.host_limits[host] = AimdLimit(self.host_floor, self.host_ceiling)
+            if outcome == OK:
+                latency = self.host_latencies.get(host, seconds)
+                self.host_latencies[host] = latency + (seconds - latency) * LATENCY_SMOOTHING
+                if seconds > max(MIN_CONGESTED_LATENCY, latency * self.latency_tolerance):
+                    outcome = THROTTLED
+            changes = []
+            if outcome == OK:
+                changes.append(self._change(limit, limit.increase))
+                changes.append(self._change(self.total_limit, self.total_limit.increase))
+            elif outcome in (THROTTLED, TIMEOUT):
+                changes.append(self._change(limit, limit.decrease, now))
+                if outcome == TIMEOUT:
+                    changes.append(self._change(self.total_limit, self.total_limit.decrease, now))
+            log_due = now - self.logged_time >= self.log_interval
+            if log_due:
+                self.logged_time = now
+        if self.metrics is not None:
+            for change in changes:
+                if change:
+                    self.metrics.increment('concurrency_changes_total', 1, change)
+        if log_due:
+            self.log_limits()
+
+    def _change(self, limit, adjust, *args):
+        """
+        Adjust limit and count a change of its whole value, holding the mutex.
+
+        Returns:
+            'increase' or 'decrease' if the whole value changes, None otherwise.
+        """
+        value = limit.value()
+        adjust(*args)
+        if limit.value() > value:
+            self.increases += 1
+            return 'increase'
+        if limit.value() < value:
+            self.decreases += 1
+            return 'decrease'
+        return None
+
+    def log_limits(self):
+        """
+        Log the limit in total and the hosts of the lowest and highest limits.
+        """
+        with self.mutex:
+            hosts = sorted((limit.value(), host) for host, limit in self.host_limits.iteritems())
+            global_limit = self.total_limit.value()
+        if len(hosts) > LOG_HOSTS:
+            hosts = hosts[:LOG_HOSTS // 2] + hosts[-LOG_HOSTS // 2:]
+        logging.info('Concurrency limits: %d in total, %d hosts (%s), '
+                     '%d increases, %d decreases', global_limit, len(self.host_limits),
+                     ', '.join('%s=%d' % (host, value) for value, host in hosts),
+                     self.increases, self.decreases)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for adaptive concurrency.
+
+Author: weileizhe
+Date: 2015/04/27 00:00:06
+"""
+
+import socket
+import unittest
+import urllib2
+
+
+import httpretty
+
+import adaptive_concurrency
+import crawl_metrics
+import event_spider
+import mini_spider
+import seen_store
+
+
+class TestOutcome(unittest.TestCase):
+    """ Test response_outcome(code) and error_outcome(error) functions.
+    """
+
+    def test_response_outcome(self):
+        """ Test 429 and 503 are throttled.
+        """
+        self.assertEqual(adaptive_concurrency.response_outcome(200), adaptive_concurrency.OK)
+        self.assertEqual(adaptive_concurrency.response_outcome(404), adaptive_concurrency.OK)
+        for code in (429, 503):
+            self.assertEqual(adaptive_concurrency.response_outcome(code),
+                             adaptive_concurrency.THROTTLED)
+
+    def test_error_outcome(self):
+        """ Test the outcome of failed grabs.
+        """
+        self.assertEqual(adaptive_concurrency.error_outcome(
+            urllib2.HTTPError('http://a.com/', 503, 'busy', {}, None)),
+            adaptive_concurrency.THROTTLED)
+        for error in (socket.timeout('timed out'), urllib2.URLError(socket.timeout()),
+                      event_spider.FetchError('timed out')):
+            self.assertEqual(adaptive_concurrency.error_outcome(error),
+                             adaptive_concurrency.TIMEOUT)
+        self.assertEqual(adaptive_concurrency.error_outcome(socket.error('refused')),
+                         adaptive_concurrency.ERROR)
+
+
+class TestAimdLimit(unittest.TestCase):
+    """ Test for AimdLimit.
+    """
+
+    def test_increase_and_decrease(self):
+        """ Test slow start, the additive increase and the multiplicative decrease.
+        """
+        limit = adaptive_concurrency.AimdLimit(1, 16)
+        for i in xrange(7):
+            limit.increase()
+        self.assertEqual(limit.value(), 8)
+        self.assertTrue(limit.decrease(100))
+        self.assertEqual(limit.value(), 4)
+        self.assertFalse(limit.decrease(100.5))
+        for i in xrange(4):
+            limit.increase()
+        self.assertEqual(limit.value(), 4)
+        limit.increase()
+        self.assertEqual(limit.value(), 5)
+
+    def test_floor_and_ceiling(self):
+        """ Test the limit is kept between its floor and its ceiling.
+        """
+        limit = adaptive_concurrency.AimdLimit(2, 3)
+        for i in xrange(5):
+            limit.increase()
+        self.assertEqual(limit.value(), 3)
+        for i in xrange(5):
+            limit.decrease(i * 10)
+        self.assertEqual(limit.value(), 2)
+
+
+class TestConcurrencyController(unittest.TestCase):
+    """ Test for ConcurrencyController.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.metrics = crawl_metrics.CrawlMetrics()
+        self.controller = adaptive_concurrency.ConcurrencyController(
+            1, 8, 2, 16, 2.0, 60, self.metrics)
+
+    def record(self, outcome, seconds=0.01, times=1, host='a.com'):
+        """ Record times grabs of host.
+        """
+        for i in xrange(times):
+            self.controller.record(host, seconds, outcome)
+
+    def test_host_limit(self):
+        """ Test a host opens up while ok and backs off when throttled.
+        """
+        self.assertEqual(self.controller.host_limit('a.com'), 1)
+        self.record(adaptive_concurrency.OK, times=3)
+        self.assertEqual(self.controller.host_limit('a.com'), 4)
+        self.record(adaptive_concurrency.THROTTLED)
+        self.assertEqual(self.controller.host_limit('a.com'), 2)
+        self.assertEqual(self.controller.host_limit('b.com'), 1)
+        self.assertEqual(self.controller.global_limit(), 16)
+        self.record(adaptive_concurrency.ERROR, times=3)
+        self.assertEqual(self.controller.host_limit('a.com'), 2)
+        self.assertEqual(self.metrics.snapshot()['counters']['concurrency_changes_total'],
+                         {'increase': 3, 'decrease': 1})
+
+    def test_timeout(self):
+        """ Test a timeout backs off the host and the total.
+        """
+        self.record(adaptive_concurrency.OK, times=3)
+        self.record(adaptive_concurrency.TIMEOUT)
+        self.assertEqual(self.controller.host_limit('a.com'), 2)
+        self.assertEqual(self.controller.global_limit(), 8)
+
+    def test_slow_latency(self):
+        """ Test a grab much slower than usual backs off its host.
+        """
+        self.record(adaptive_concurrency.OK, 0.2, times=3)
+        self.record(adaptive_concurrency.OK, 0.3)
+        self.assertEqual(self.controller.host_limit('a.com'), 5)
+        self.record(adaptive_concurrency.OK, 1)
+        self.assertEqual(self.controller.host_limit('a.com'), 2)
+
+
+class TestGrabFeedback(unittest.TestCase):
+    """ Test the grabs of MiniSpider are told to the controller.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, 'http://busy.com/', body='busy', status=503)
+        httpretty.register_uri(httpretty.GET, 'http://idle.com/', body='idle')
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_grab_url(self):
+        """ Test the host and outcome of each grab are recorded.
+        """
+        controller = adaptive_concurrency.ConcurrencyController()
+        spider = mini_spider.MiniSpider(None, seen_store.SetSeenStore(), 1, 0, 5, '.*\.png$',
+                                        './output', concurrency=controller)
+        spider.grab_url('http://idle.com/')
+        spider.grab_url('http://busy.com/')
+        spider.release_url_response()
+        self.assertEqual(controller.host_limit('idle.com'), 2)
+        self.assertEqual(controller.host_limit('busy.com'), 1)
+        self.assertEqual(controller.decreases, 0)
+        self.assertEqual(controller.host_limits['busy.com'].slow_start, False)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module benchmarks the admission of the links found in webpages to the
+seen url store and the frontier, by thread count.
+
+Each thread admits generated webpages of links over many hosts, about a
+third of them seen before, in one of three modes:
+
+    single: One add_if_absent and one put per link, each taking the lock
+            of the store and of the frontier, as links were admitted before.
+    batched: One add_many and one put_many per webpage.
+    striped: As batched, with the urls split over the stripes of the store.
+
+The links admitted per second are printed for each thread count, so the
+modes can be compared as the threads grow.
+
+Usage: python admission_benchmark.py [-b fingerprint] [-p 2000] [-l 100] [-t 1 -t 4]
+
+Author: weileizhe
+Date: 2015/05/25 00:00:06
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+import frontier
+import seen_store
+
+
+ADMISSION_MODES = ('single', 'batched', 'striped')
+DEFAULT_THREAD_COUNTS = (1, 2, 4, 8, 16)
+
+
+class BenchmarkUrl(object):
+    """
+    A url object as the frontier keeps.
+    """
+    __slots__ = ('url', 'depth')
+
+    def __init__(self, url, depth=0):
+        """ Init the url object.
+        """
+        self.url = url
+        self.depth = depth
+
+
+def generate_webpages(page_count, link_count, host_count, seed):
+    """
+    Generate the links of webpages, about a third of them repeated.
+
+    Args:
+        page_count: The webpage count.
+        link_count: The links per webpage.
+        host_count: The hosts the links are spread over.
+        seed: The random seed.
+
+    Returns:
+        A list of lists of urls.
+    """
+    generator = random.Random(seed)
+    # Drawing n links of 1.2 * n urls repeats about a third of them.
+    url_count = max(1, int(page_count * link_count * 1.2))
+    webpages = []
+    for i in xrange(page_count):
+        links = []
+        for j in xrange(link_count):
+            url_index = generator.randrange(url_count)
+            links.append('http://host%d.com/page/%d.html' % (url_index % host_count, url_index))
+        webpages.append(links)
+    return webpages
+
+
+def admit_single(webpages, crawled_urls, url_queue):
+    """
+    Admit the links one by one.
+    """
+    for links in webpages:
+        for url in links:
+            if crawled_urls.add_if_absent(url):
+                url_queue.put(BenchmarkUrl(url, 1))
+
+
+def admit_batched(webpages, crawled_urls, url_queue):
+    """
+    Admit the links of each webpage in one batch.
+    """
+    for links in webpages:
+        url_queue.put_many([BenchmarkUrl(url, 1) for url in crawled_urls.add_many(links)])
+
+
+def run_admission(mode, backend, stripes, webpages, thread_count):
+    """
+    Admit the webpages split over thread_count threads.
+
+    Returns:
+        A (seconds, urls admitted) tuple.
+    """
+    crawled_urls = seen_store.create_seen_store(
+        backend, len(webpages) * len(webpages[0]), 0.001, './admission_benchmark.db',
+        stripes if mode == 'striped' else 1)
+    url_queue = frontier.HostFrontier(0)
+    admit = admit_single if mode == 'single' else admit_batched
+    threads = [threading.Thread(target=admit,
+                                args=(webpages[i::thread_count], crawled_urls, url_queue))
+               for i in xrange(thread_count)]
+    start_time = time.time()
+    for admission_thread in threads:
+        admission_thread.start()
+    for admission_thread in threads:
+        admission_thread.join()
+    seconds = time.time() - start_time
+    admitted = url_queue.qsize()
+    if hasattr(crawled_urls, 'close'):
+        crawled_urls.close()
+    return seconds, admitted
+
+
+def main():
+    """
+    Main function entrance.
+    """
+    argument_parser = argparse.ArgumentParser(description='Benchmark the link admission.')
+    argument_parser.add_argument('-b', '--backend', default='fingerprint',
+                                 choices=seen_store.SEEN_STORE_BACKENDS,
+                                 help='seen url store backend(default is fingerprint)')
+    argument_parser.add_argument('-s', '--stripes', type=int, default=16,
+                                 help='stripes of the striped mode(default is 16)')
+    argument_parser.add_argument('-p', '--pages', type=int, default=2000,
+                                 help='webpage count(default is 2000)')
+    argument_parser.add_argument('-l', '--links', type=int, default=100,
+                                 help='links per webpage(default is 100)')
+    argument_parser.add_argument('--hosts', type=int, default=500,
+                                 help='hosts the links are spread over(default is 500)')
+    argument_parser.add_argument('-t', '--threads', type=int, action='append',
+                                 help='thread count(default is 1, 2, 4, 8 and 16)')
+    arguments = argument_parser.parse_args()
+
+    webpages = generate_webpages(arguments.pages, arguments.links, arguments.hosts, 1)
+    link_count = arguments.pages * arguments.links
+    sys.stdout.write('%d webpages, %d links, %s store\n'
+                     % (arguments.pages, link_count, arguments.backend))
+    sys.stdout.write('%-10s %8s %10s %10s %12s\n'
+                     % ('mode', 'threads', 'admitted', 'seconds', 'links/s'))
+    for thread_count in arguments.threads or DEFAULT_THREAD_COUNTS:
+        for mode in ADMISSION_MODES:
+            seconds, admitted = run_admission(mode, arguments.backend, arguments.stripes,
+                                              webpages, thread_count)
+            sys.stdout.write('%-10s %8d %10d %10.2f %12.0f\n'
+                             % (mode, thread_count, admitted, seconds,
+                                link_count / max(seconds, 1e-6)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the archive storage of the saved webpages, appending
+them as WARC resource records to rolling segment files instead of writing a
+file per url:
+
+    <directory>/segment-00000.warc
+    <directory>/segment-00001.warc
+    <directory>/index.db
+
+A segment is rolled when it grows over segment_size bytes. The sqlite index
+maps every url to the segment, offset and length of its body, so a reader
+maps the segment with mmap and slices the body out without scanning. A url
+saved again gets a new record and the index points to the newest one.
+
+A record is indexed only after it is completely appended, so a crash never
+leaves a url pointing to a partial record. Read a webpage with:
+
+    python archive.py ./output http://example.com/a.png > a.png
+
+Author: weileizhe
+Date: 2015/03/09 00:00:06
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+
+DEFAULT_SEGMENT_SIZE = 1073741824
+DEFAULT_SPOOL_SIZE = 1048576
+COMMIT_INTERVAL = 100
+
+SEGMENT_NAME_FORMAT = 'segment-%05d.warc'
+SEGMENT_NAME_PATTERN = re.compile(r'^segment-(\d+)\.warc$')
+
+
+def segment_path(directory, segment):
+    """
+    Get the path of segment number segment in directory.
+    """
+    return os.path.join(directory, SEGMENT_NAME_FORMAT % segment)
+
+
+def connect_index(directory):
+    """
+    Open the index of the archive in directory, creating it if not exists.
+    """
+    connection = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+    connection.text_factory = str
+    connection.execute('PRAGMA synchronous = OFF')
+    connection.execute('CREATE TABLE IF NOT EXISTS records '
+                       '(url TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER)')
+    return connection
+
+
+def record_header(url, length):
+    """
+    Get the WARC header of a resource record of url with a body of length bytes.
+    """
+    return ('WARC/1.0\r\n'
+            'WARC-Type: resource\r\n'
+            'WARC-Target-URI: %s\r\n'
+            'WARC-Date: %s\r\n'
+            'WARC-Record-ID: <urn:uuid:%s>\r\n'
+            'Content-Length: %d\r\n'
+            '\r\n' % (url, time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                      uuid.uuid4(), length))
+
+
+class ArchiveWriter(object):
+    """
+    Webpage bodies appended to rolling WARC segments with an index of url to record.
+
+    Index changes are committed every COMMIT_INTERVAL webpages and on close().
+
+    Attributes:
+        directory: The archive directory.
+        segment_size: The bytes of a segment after which the next one is started.
+        spool_size: The max body bytes kept in memory before the record is appended.
+        segment: The number of the segment appended to.
+        record_count: The records appended by this writer.
+        record_bytes: The body bytes appended by this writer.
+    """
+
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE,
+                 spool_size=DEFAULT_SPOOL_SIZE):
+        """ Init the writer, starting a new segment after the existing ones.
+
+        Args:
+            directory: The archive directory.
+            segment_size: The bytes of a segment after which the next one is started.
+            spool_size: The max body bytes kept in memory before the record is appended.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.spool_size = spool_size
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = connect_index(directory)
+        self.uncommitted = 0
+        segments = [int(match.group(1)) for match in
+                    (SEGMENT_NAME_PATTERN.match(name) for name in os.listdir(directory)) if match]
+        self.segment = max(segments) + 1 if segments else 0
+        self.segment_file = None
+        self.record_count = 0
+        self.record_bytes = 0
+        self.mutex = threading.Lock()
+
+    def write(self, url, chunks):
+        """
+        Append the body of url as a record.
+
+        The body is spooled first, so a slow download does not hold the segment
+        and a failed one leaves nothing in it.
+
+        Args:
+            url: The url of the body.
+            chunks: The iterable of body chunks.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with tempfile.SpooledTemporaryFile(self.spool_size) as spool_file:
+            for chunk in chunks:
+                spool_file.write(chunk)
+            length = spool_file.tell()
+            spool_file.seek(0)
+            with self.mutex:
+                if self.segment_file is None:
+                    self.segment_file = open(segment_path(self.directory, self.segment), 'ab')
+                self.segment_file.write(record_header(url, length))
+                offset = self.segment_file.tell()
+                shutil.copyfileobj(spool_file, self.segment_file)
+                self.segment_file.write('\r\n\r\n')
+                self.segment_file.flush()
+                self.connection.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                                        (url, self.segment, offset, length))
+                self.record_count += 1
+                self.record_bytes += length
+                self.uncommitted += 1
+                if self.uncommitted >= COMMIT_INTERVAL:
+                    self.connection.commit()
+                    self.uncommitted = 0
+                if self.segment_file.tell() >= self.segment_size:
+                    self.segment_file.close()
+                    self.segment_file = None
+                    self.segment += 1
+
+    def lookup(self, url):
+        """
+        Get the (segment, offset, length) of the body of url, None if not archived.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with self.mutex:
+            return self.connection.execute('SELECT segment, offset, length FROM records '
+                                           'WHERE url = ?', (url,)).fetchone()
+
+    def close(self):
+        """
+        Close the segment and commit and close the index.
+        """
+        with self.mutex:
+            if self.segment_file is not None:
+                self.segment_file.close()
+                self.segment_file = None
+            self.connection.commit()
+            self.connection.close()
+
+
+class ArchiveReader(object):
+    """
+    Random access to the archived webpages, mapping every segment read with mmap.
+    """
+
+    def __init__(self, directory):
+        """ Init the reader.
+
+        Args:
+            directory: The archive directory.
+        """
+        self.directory = directory
+        self.connection = connect_index(directory)
+        self.segment_maps = {}
+        self.mutex = threading.Lock()
+
+    def lookup(self, url):
+        """
+        Get the (segment, offset, length) of the body of url, None if not archived.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with self.mutex:
+            return self.connection.execute('SELECT segment, offset, length FROM records '
+                                           'WHERE url = ?', (url,)).fetchone()
+
+    def read(self, url):
+        """
+        Read the archived body of url.
+
+        Raises:
+            KeyError: url is not archived.
+        """
+        record = self.lookup(url)
+        if record is None:
+            raise KeyError(url)
+        segment, offset, length = record
+        with self.mutex:
+            segment_map = self._segment_map(segment, offset + length)
+            return segment_map[offset:offset + length]
+
+    def _segment_map(self, segment, end):
+        """
+        Get the map of segment covering at least end bytes, holding the mutex.
+
+        A segment still being appended is mapped again when it has grown.
+        """
+        segment_map = self.segment_maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            if segment_map is not None:
+                segment_map.close()
+            with open(segment_path(self.directory, segment), 'rb') as segment_file:
+                segment_map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.segment_maps[segment] = segment_map
+        return segment_map
+
+    def __iter__(self):
+        """
+        Iterate the archived urls.
+        """
+        with self.mutex:
+            rows = self.connection.execute('SELECT url FROM records').fetchall()
+        for row in rows:
+            yield row[0]
+
+    def close(self):
+        """
+        Unmap the segments and close the index.
+        """
+        with self.mutex:
+            for segment_map in self.segment_maps.values():
+                segment_map.close()
+            self.segment_maps = {}
+            self.connection.close()
+
+
+def main():
+    """
+    Main function entrance.
+    """
+    argument_parser = argparse.ArgumentParser(
+        description='Write an archived webpage to stdout.')
+    argument_parser.add_argument('archive_directory',
+                                 help='the output_directory of a crawl with storage_layout archive')
+    argument_parser.add_argument('url', help='the url of the webpage')
+    arguments = argument_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if not os.path.exists(os.path.join(arguments.archive_directory, 'index.db')):
+        logging.error('No archive found in %s', arguments.archive_directory)
+        return -1
+    reader = ArchiveReader(arguments.archive_directory)
+    try:
+        sys.stdout.write(reader.read(arguments.url))
+    except KeyError:
+        logging.error('%s is not archived', arguments.url)
+        return -1
+    finally:
+        reader.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for archive.
+
+Author: weileizhe
+Date: 2015/03/09 00:00:06
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+import archive
+import blob_store_test
+import event_spider_test
+import frontier
+import mini_spider
+import pipeline
+import seen_store
+
+
+class TestArchive(unittest.TestCase):
+    """ Test for ArchiveWriter and ArchiveReader.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.archive_directory = os.path.join(self.temp_directory, 'archive')
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def segment_names(self):
+        """ Get the segment file names.
+        """
+        return sorted(name for name in os.listdir(self.archive_directory)
+                      if name.endswith('.warc'))
+
+    def test_write_and_read(self):
+        """ Test records roll over segments and are read by offset, the newest one winning.
+        """
+        writer = archive.ArchiveWriter(self.archive_directory, segment_size=300, spool_size=4)
+        writer.write('http://a.com/1.png', ['first ', 'body'])
+        writer.write(u'http://a.com/\xe9.png', ['second body'])
+        writer.write('http://a.com/3.png', [])
+        writer.write('http://a.com/1.png', ['new first body'])
+        self.assertEqual(writer.lookup('http://a.com/3.png')[2], 0)
+        self.assertEqual((writer.record_count, writer.record_bytes), (4, 35))
+        writer.close()
+        self.assertEqual(self.segment_names(), ['segment-00000.warc', 'segment-00001.warc'])
+
+        reader = archive.ArchiveReader(self.archive_directory)
+        self.assertEqual(reader.read('http://a.com/1.png'), 'new first body')
+        self.assertEqual(reader.read(u'http://a.com/\xe9.png'), 'second body')
+        self.assertEqual(reader.read('http://a.com/3.png'), '')
+        self.assertEqual(sorted(reader), ['http://a.com/1.png', 'http://a.com/3.png',
+                                          'http://a.com/\xc3\xa9.png'])
+        with self.assertRaises(KeyError):
+            reader.read('http://a.com/4.png')
+        reader.close()
+
+        with open(os.path.join(self.archive_directory, 'segment-00000.warc')) as segment_file:
+            segment = segment_file.read()
+        self.assertTrue(segment.startswith('WARC/1.0\r\nWARC-Type: resource\r\n'
+                                           'WARC-Target-URI: http://a.com/1.png\r\n'))
+        self.assertTrue('Content-Length: 10\r\n\r\nfirst body\r\n\r\nWARC/1.0\r\n' in segment)
+
+    def test_reopen(self):
+        """ Test a writer opened again starts a new segment and the reader sees new records.
+        """
+        writer = archive.ArchiveWriter(self.archive_directory)
+        writer.write('http://a.com/1.png', ['one'])
+        writer.close()
+        writer = archive.ArchiveWriter(self.archive_directory)
+        reader = archive.ArchiveReader(self.archive_directory)
+        self.assertEqual(reader.read('http://a.com/1.png'), 'one')
+        writer.write('http://a.com/2.png', ['two'])
+        writer.close()
+        self.assertEqual(reader.read('http://a.com/2.png'), 'two')
+        reader.close()
+        self.assertEqual(self.segment_names(), ['segment-00000.warc', 'segment-00001.warc'])
+
+    def test_write_failed(self):
+        """ Test a body failing to stream leaves no record.
+        """
+        def failing_chunks():
+            """ Yield a chunk and fail.
+            """
+            yield 'abc'
+            raise mini_spider.DownloadException('too large')
+
+        writer = archive.ArchiveWriter(self.archive_directory)
+        with self.assertRaises(mini_spider.DownloadException):
+            writer.write('http://a.com/1.png', failing_chunks())
+        self.assertEqual(writer.lookup('http://a.com/1.png'), None)
+        writer.close()
+        self.assertEqual(self.segment_names(), [])
+
+
+class TestArchiveStorage(unittest.TestCase):
+    """ Test crawling with target webpages appended to an archive.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = event_spider_test.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                            blob_store_test.MirrorHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.temp_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_directory)
+
+    def test_crawl(self):
+        """ Test every target webpage saved by the pipeline engine is read from the archive.
+        """
+        url_queue = frontier.HostFrontier(0)
+        crawled_urls = seen_store.SetSeenStore()
+        url_queue.put(mini_spider.Url(self.base_url + '/index.html', 0))
+        writer = archive.ArchiveWriter(self.temp_directory)
+        page_handler = mini_spider.MiniSpider(url_queue, crawled_urls, 1, 0, 5, '.*\.png',
+                                              self.temp_directory, webpage_store=writer)
+        pipeline.PipelineSpider(url_queue, crawled_urls, [page_handler], 1, 1, 4).run()
+        writer.close()
+
+        reader = archive.ArchiveReader(self.temp_directory)
+        for path, (content_type, body) in blob_store_test.WEBPAGES.items():
+            if content_type == 'image/png':
+                self.assertEqual(reader.read(self.base_url + path), body)
+        self.assertEqual(len(list(reader)), 4)
+        reader.close()
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes a content addressed store of the saved webpages.
+
+Every body is kept once as a blob named by its sha1, however many urls serve
+it, and a sqlite index maps every url to the sha1 of its body:
+
+    <directory>/blobs/<first 2 hex digits>/<other 38 hex digits>
+    <directory>/index.db
+
+The body is hashed while it streams. Bodies up to spool_size bytes are kept
+in memory, so a body already stored is never written to disk; larger ones are
+spooled to a temp file which is dropped if the blob exists.
+
+export() materializes the urllib2.quote(url) layout of the url storage, with
+hard links to the blobs where possible. Run it on a stored crawl with:
+
+    python blob_store.py ./output ./export
+
+Author: weileizhe
+Date: 2015/03/02 00:00:06
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import urllib2
+
+
+DEFAULT_SPOOL_SIZE = 1048576
+COMMIT_INTERVAL = 100
+
+
+class BlobStore(object):
+    """
+    Webpage bodies kept once per content with an index of url to sha1.
+
+    Index changes are committed every COMMIT_INTERVAL webpages and on close().
+
+    Attributes:
+        directory: The store directory.
+        spool_size: The max body bytes kept in memory while hashing.
+        blob_count: The blobs written by this store.
+        stored_bytes: The body bytes written as new blobs.
+        deduplicated_bytes: The body bytes of blobs already stored.
+    """
+
+    def __init__(self, directory, spool_size=DEFAULT_SPOOL_SIZE):
+        """ Init the store, creating the directory and index if not exist.
+
+        Args:
+            directory: The store directory.
+            spool_size: The max body bytes kept in memory while hashing.
+        """
+        self.directory = directory
+        self.spool_size = spool_size
+        self.blob_directory = os.path.join(directory, 'blobs')
+        if not os.path.exists(self.blob_directory):
+            os.makedirs(self.blob_directory)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'),
+                                          check_same_thread=False)
+        self.connection.text_factory = str
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS urls '
+                                '(url TEXT PRIMARY KEY, sha1 TEXT, size INTEGER)')
+        self.uncommitted = 0
+        self.blob_count = 0
+        self.stored_bytes = 0
+        self.deduplicated_bytes = 0
+        self.mutex = threading.Lock()
+
+    def blob_path(self, sha1):
+        """
+        Get the path of the blob of sha1.
+        """
+        return os.path.join(self.blob_directory, sha1[:2], sha1[2:])
+
+    def write(self, url, chunks):
+        """
+        Store the body of url unless a blob of the same content exists.
+
+        Args:
+            url: The url of the body.
+            chunks: The iterable of body chunks.
+
+        Returns:
+            The sha1 of the body.
+        """
+        body_hash = hashlib.sha1()
+        memory_chunks = []
+        size = 0
+        temp_file = None
+        try:
+            for chunk in chunks:
+                body_hash.update(chunk)
+                size += len(chunk)
+                if temp_file is not None:
+                    temp_file.write(chunk)
+                    continue
+                memory_chunks.append(chunk)
+                if size > self.spool_size:
+                    temp_file = tempfile.NamedTemporaryFile(dir=self.blob_directory, prefix='.',
+                                                            suffix='.part', delete=False)
+                    temp_file.writelines(memory_chunks)
+                    memory_chunks = []
+            sha1 = body_hash.hexdigest()
+            blob_path = self.blob_path(sha1)
+            if os.path.exists(blob_path):
+                self._count(False, size)
+            else:
+                self._write_blob(blob_path, temp_file, memory_chunks)
+                temp_file = None
+                self._count(True, size)
+        finally:
+            if temp_file is not None:
+                temp_file.close()
+                os.remove(temp_file.name)
+
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with self.mutex:
+            self.connection.execute('INSERT OR REPLACE INTO urls VALUES (?, ?, ?)',
+                                    (url, sha1, size))
+            self.uncommitted += 1
+            if self.uncommitted >= COMMIT_INTERVAL:
+                self.connection.commit()
+                self.uncommitted = 0
+        return sha1
+
+    def _write_blob(self, blob_path, temp_file, memory_chunks):
+        """
+        Move the spooled temp file, or write the memory chunks, to blob_path.
+        """
+        blob_directory = os.path.dirname(blob_path)
+        if not os.path.exists(blob_directory):
+            try:
+                os.makedirs(blob_directory)
+            except OSError:
+                if not os.path.isdir(blob_directory):
+                    raise
+        if temp_file is None:
+            temp_file = tempfile.NamedTemporaryFile(dir=self.blob_directory, prefix='.',
+                                                    suffix='.part', delete=False)
+            temp_file.writelines(memory_chunks)
+        try:
+            temp_file.close()
+            os.rename(temp_file.name, blob_path)
+        except:
+            os.remove(temp_file.name)
+            raise
+
+    def _count(self, new_blob, size):
+        """
+        Count a body stored as a new blob or deduplicated.
+        """
+        with self.mutex:
+            if new_blob:
+                self.blob_count += 1
+                self.stored_bytes += size
+            else:
+                self.deduplicated_bytes += size
+
+    def lookup(self, url):
+        """
+        Get the sha1 of the body of url, None if not stored.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with self.mutex:
+            row = self.connection.execute('SELECT sha1 FROM urls WHERE url = ?',
+                                          (url,)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return row[0]
+
+    def open(self, url):
+        """
+        Open the stored body of url.
+
+        Raises:
+            KeyError: url is not stored.
+        """
+        sha1 = self.lookup(url)
+        if sha1 is None:
+            raise KeyError(url)
+        return open(self.blob_path(sha1), 'rb')
+
+    def export(self, output_directory):
+        """
+        Materialize every stored url at output_directory/urllib2.quote(url, '').
+
+        Args:
+            output_directory: The directory of the url layout.
+
+        Returns:
+            The number of files exported.
+        """
+        with self.mutex:
+            rows = self.connection.execute('SELECT url, sha1 FROM urls').fetchall()
+        if not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+        exported_count = 0
+        for url, sha1 in rows:
+            blob_path = self.blob_path(sha1)
+            if not os.path.exists(blob_path):
+                logging.warn('Blob %s of %s is missing', sha1, url)
+                continue
+            target_path = os.path.join(output_directory, urllib2.quote(url, ''))
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            try:
+                os.link(blob_path, target_path)
+            except OSError:
+                shutil.copyfile(blob_path, target_path)
+            exported_count += 1
+        return exported_count
+
+    def close(self):
+        """
+        Commit and close the index.
+        """
+        with self.mutex:
+            self.connection.commit()
+            self.connection.close()
+
+
+def main():
+    """
+    Main function entrance.
+    """
+    argument_parser = argparse.ArgumentParser(
+        description='Export a content addressed store to the url layout.')
+    argument_parser.add_argument('store_directory',
+                                 help='the output_directory of a crawl with storage_layout content')
+    argument_parser.add_argument('output_directory',
+                                 help='directory to export the urllib2.quote(url) files to')
+    arguments = argument_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if not os.path.exists(os.path.join(arguments.store_directory, 'index.db')):
+        logging.error('No content addressed store found in %s', arguments.store_directory)
+        return -1
+    store = BlobStore(arguments.store_directory)
+    exported_count = store.export(arguments.output_directory)
+    store.close()
+    sys.stdout.write('%d files exported to %s\n' % (exported_count, arguments.output_directory))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
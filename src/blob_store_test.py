@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for blob store.
+
+Author: weileizhe
+Date: 2015/03/02 00:00:06
+"""
+
+import BaseHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib2
+
+
+import blob_store
+import event_spider_test
+import frontier
+import mini_spider
+import seen_store
+
+
+WEBPAGES = {
+    '/index.html': ('text/html', '<img src="/a.png" /><img src="/a.png?v=2" />'
+                                 '<img src="/mirror/a.png" /><img src="/b.png" />'),
+    '/a.png': ('image/png', 'image a'),
+    '/a.png?v=2': ('image/png', 'image a'),
+    '/mirror/a.png': ('image/png', 'image a'),
+    '/b.png': ('image/png', 'image b'),
+}
+
+
+class MirrorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serve WEBPAGES, one image under several urls.
+    """
+
+    def do_GET(self):
+        """ Handle GET request.
+        """
+        content_type, body = WEBPAGES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """ Keep test output quiet.
+        """
+        pass
+
+
+class TestBlobStore(unittest.TestCase):
+    """ Test for BlobStore.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.store_directory = os.path.join(self.temp_directory, 'store')
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def blob_files(self):
+        """ Get the blob file names, temp files included.
+        """
+        return sorted(name for directory, directories, files
+                      in os.walk(os.path.join(self.store_directory, 'blobs')) for name in files)
+
+    def test_write_deduplicated(self):
+        """ Test a body is stored once however many urls serve it, in memory or spooled.
+        """
+        store = blob_store.BlobStore(self.store_directory, spool_size=4)
+        sha1 = store.write('http://a.com/1.png', ['ab', 'cd'])
+        self.assertEqual(store.write(u'http://b.com/1.png', iter(['a', 'bcd'])), sha1)
+        large_sha1 = store.write('http://a.com/2.png', ['abc', 'def', 'gh'])
+        self.assertEqual(store.write('http://a.com/2.png?v=2', ['abcdefgh']), large_sha1)
+        self.assertEqual(self.blob_files(), sorted([sha1[2:], large_sha1[2:]]))
+        self.assertEqual((store.blob_count, store.stored_bytes, store.deduplicated_bytes),
+                         (2, 12, 12))
+        store.close()
+
+        store = blob_store.BlobStore(self.store_directory)
+        self.assertEqual(store.lookup('http://b.com/1.png'), sha1)
+        self.assertEqual(store.lookup('http://c.com/1.png'), None)
+        with store.open('http://a.com/2.png?v=2') as blob_file:
+            self.assertEqual(blob_file.read(), 'abcdefgh')
+        with self.assertRaises(KeyError):
+            store.open('http://c.com/1.png')
+        store.close()
+
+    def test_write_failed(self):
+        """ Test no blob or temp file is left if the body fails to stream.
+        """
+        def failing_chunks():
+            """ Yield some chunks and fail.
+            """
+            yield 'abc'
+            yield 'def'
+            raise mini_spider.DownloadException('too large')
+
+        store = blob_store.BlobStore(self.store_directory, spool_size=4)
+        with self.assertRaises(mini_spider.DownloadException):
+            store.write('http://a.com/1.png', failing_chunks())
+        self.assertEqual(self.blob_files(), [])
+        self.assertEqual(store.lookup('http://a.com/1.png'), None)
+        store.close()
+
+    def test_export(self):
+        """ Test the export materializes the url layout.
+        """
+        store = blob_store.BlobStore(self.store_directory)
+        store.write('http://a.com/1.png', ['same'])
+        store.write('http://a.com/1.png?v=2', ['same'])
+        store.write('http://a.com/2.png', ['other'])
+        export_directory = os.path.join(self.temp_directory, 'export')
+        self.assertEqual(store.export(export_directory), 3)
+        self.assertEqual(store.export(export_directory), 3)
+        store.close()
+        self.assertEqual(sorted(os.listdir(export_directory)),
+                         sorted(urllib2.quote(url, '') for url in (
+                             'http://a.com/1.png', 'http://a.com/1.png?v=2', 'http://a.com/2.png')))
+        with open(os.path.join(export_directory, urllib2.quote('http://a.com/1.png?v=2', ''))) \
+                as exported_file:
+            self.assertEqual(exported_file.read(), 'same')
+
+
+class TestContentStorage(unittest.TestCase):
+    """ Test crawling with target webpages kept in a blob store.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = event_spider_test.ThreadingHTTPServer(('127.0.0.1', 0), MirrorHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.temp_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_directory)
+
+    def test_crawl(self):
+        """ Test the mirrored image is stored once and exported under every url.
+        """
+        url_queue = frontier.HostFrontier(0)
+        crawled_urls = seen_store.SetSeenStore()
+        url_queue.put(mini_spider.Url(self.base_url + '/index.html', 0))
+        store = blob_store.BlobStore(self.temp_directory)
+        spider_thread = mini_spider.MiniSpiderThread(url_queue, crawled_urls, 1, 0, 5,
+                                                     '.*\.png', self.temp_directory,
+                                                     webpage_store=store)
+        spider_thread.setDaemon(True)
+        spider_thread.start()
+        url_queue.join()
+        url_queue.close()
+        spider_thread.join()
+        self.assertEqual((store.blob_count, store.deduplicated_bytes), (2, 14))
+
+        export_directory = os.path.join(self.temp_directory, 'export')
+        self.assertEqual(store.export(export_directory), 4)
+        store.close()
+        for path, (content_type, body) in WEBPAGES.items():
+            if content_type != 'image/png':
+                continue
+            with open(os.path.join(export_directory, urllib2.quote(self.base_url + path, ''))) \
+                    as exported_file:
+                self.assertEqual(exported_file.read(), body)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
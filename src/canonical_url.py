@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the canonicalization of the urls found in webpages, so
+trivially different spellings of a url are crawled once.
+
+A link is joined to the url of its webpage as RFC 3986 resolves it, dot
+segments removed, and then rewritten by the configured rules:
+
+    drop_fragment: Drop the #fragment, which never reaches the server.
+    lowercase_host: Lowercase the scheme and the host.
+    strip_default_port: Drop :80 of http and :443 of https.
+    sort_query: Sort the query parameters by name, keeping the order of
+                parameters of the same name.
+    strip_tracking_params: Drop the tracking query parameters, like utm_source.
+
+Only http and https urls are rewritten. The webpage url is parsed once for
+all its links, and the joins are memoized in a bounded LRU cache keyed by
+the part of the webpage url the link depends on, so the menu links shared by
+the webpages of a directory or a host are joined once.
+
+Author: weileizhe
+Date: 2015/03/16 00:00:06
+"""
+
+import collections
+import re
+import threading
+import urlparse
+
+
+CANONICAL_RULES = ('drop_fragment', 'lowercase_host', 'strip_default_port', 'sort_query',
+                   'strip_tracking_params')
+
+DEFAULT_TRACKING_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term',
+                           'utm_content', 'gclid', 'fbclid')
+
+DEFAULT_JOIN_CACHE_SIZE = 10000
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+SCHEME_PATTERN = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+
+
+def parse_names(names):
+    """
+    Parse a comma separated list of names, like the canonical rules.
+
+    Returns:
+        A tuple of the names, empty if names is empty.
+    """
+    return tuple(name.strip() for name in names.split(',') if name.strip())
+
+
+def parse_canonical_rules(canonical_rules):
+    """
+    Parse the canonical rules configuration.
+
+    Args:
+        canonical_rules: Comma separated rule names of CANONICAL_RULES.
+
+    Returns:
+        A tuple of the rule names.
+
+    Raises:
+        ValueError: Unknown rule.
+    """
+    rules = parse_names(canonical_rules)
+    for rule in rules:
+        if rule not in CANONICAL_RULES:
+            raise ValueError('unknown canonical rule %s' % rule)
+    return rules
+
+
+def remove_dot_segments(path):
+    """
+    Remove the . and .. segments of an absolute path as RFC 3986 does.
+    """
+    if '.' not in path:
+        return path
+    segments = path.split('/')
+    output = []
+    for segment in segments:
+        if segment == '.':
+            continue
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+            continue
+        output.append(segment)
+    if segments[-1] in ('.', '..'):
+        output.append('')
+    return '/'.join(output)
+
+
+class Canonicalizer(object):
+    """
+    Join the links of webpages and rewrite them to their canonical urls.
+
+    Attributes:
+        rules: The names of the rules applied.
+        tracking_params: The query parameter names dropped by strip_tracking_params.
+        cache_size: The max joins memoized, 0 not to memoize.
+        joins: The links joined.
+        join_hits: The joins found in the cache.
+        rewritten: The joined links rewritten by the rules.
+        avoided_duplicates: The rewritten links which were already crawled,
+                            each a fetch the rules avoided.
+    """
+
+    def __init__(self, rules=CANONICAL_RULES, tracking_params=DEFAULT_TRACKING_PARAMS,
+                 cache_size=DEFAULT_JOIN_CACHE_SIZE):
+        """ Init the canonicalizer.
+
+        Args:
+            rules: The names of the rules to apply.
+            tracking_params: The query parameter names dropped by strip_tracking_params.
+            cache_size: The max joins memoized, 0 not to memoize.
+        """
+        self.rules = tuple(rules)
+        self.tracking_params = frozenset(tracking_params)
+        self.cache_size = cache_size
+        self.drop_fragment = 'drop_fragment' in rules
+        self.lowercase_host = 'lowercase_host' in rules
+        self.strip_default_port = 'strip_default_port' in rules
+        self.sort_query = 'sort_query' in rules
+        self.strip_tracking_params = 'strip_tracking_params' in rules
+        self.cache = collections.OrderedDict()
+        self.joins = 0
+        self.join_hits = 0
+        self.rewritten = 0
+        self.avoided_duplicates = 0
+        self.mutex = threading.Lock()
+
+    def join(self, base, url):
+        """
+        Join a link to the url of its webpage and canonicalize it.
+        """
+        return self.join_all(base, [url])[0][0]
+
+    def join_all(self, base, urls):
+        """
+        Join the links of a webpage and canonicalize them, parsing base once.
+
+        Args:
+            base: The webpage url.
+            urls: The iterable of links in the webpage.
+
+        Returns:
+            A (canonical_urls, rewritten_urls) tuple, a list of the canonical
+            urls in the order of urls and the set of them which were rewritten
+            by the rules.
+        """
+        base_parts = urlparse.urlsplit(base)
+        canonical_urls = []
+        rewritten_urls = set()
+        joins = join_hits = 0
+        for url in urls:
+            joins += 1
+            key = (self._base_key(base_parts, url), url)
+            with self.mutex:
+                result = self.cache.pop(key, None)
+                if result is not None:
+                    self.cache[key] = result
+            if result is None:
+                joined_parts = self._resolve(base_parts, url)
+                canonical_url = self._canonicalize_parts(joined_parts)
+                result = (canonical_url, canonical_url != urlparse.urlunsplit(joined_parts))
+                if self.cache_size:
+                    with self.mutex:
+                        self.cache[key] = result
+                        if len(self.cache) > self.cache_size:
+                            self.cache.popitem(last=False)
+            else:
+                join_hits += 1
+            canonical_urls.append(result[0])
+            if result[1]:
+                rewritten_urls.add(result[0])
+        with self.mutex:
+            self.joins += joins
+            self.join_hits += join_hits
+            self.rewritten += len(rewritten_urls)
+        return canonical_urls, rewritten_urls
+
+    def canonicalize(self, url):
+        """
+        Canonicalize an absolute url.
+        """
+        parts = urlparse.urlsplit(url)
+        if parts.netloc:
+            parts = parts._replace(path=remove_dot_segments(parts.path))
+        return self._canonicalize_parts(parts)
+
+    def count_avoided_duplicates(self, count):
+        """
+        Count the rewritten links found already crawled.
+        """
+        with self.mutex:
+            self.avoided_duplicates += count
+
+    def _base_key(self, base_parts, url):
+        """
+        Get the part of the webpage url the join of url depends on.
+        """
+        if url.startswith('//'):
+            return base_parts.scheme
+        if url.startswith('/'):
+            return base_parts[:2]
+        if url.startswith('?'):
+            return base_parts[:3]
+        if not url or url.startswith('#'):
+            return base_parts[:4]
+        match = SCHEME_PATTERN.match(url)
+        if match is not None:
+            if match.group(1).lower() != base_parts.scheme or \
+                    url.startswith('//', match.end()):
+                return None
+            return base_parts[:4]
+        path = base_parts.path
+        return base_parts.scheme, base_parts.netloc, path[:path.rfind('/') + 1]
+
+    def _resolve(self, base_parts, url):
+        """
+        Resolve a link to the split webpage url as RFC 3986 does.
+
+        As urlparse.urljoin does, a link of the scheme of the webpage and no
+        host is relative, like http:a.html.
+        """
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if scheme and scheme != base_parts.scheme:
+            if netloc:
+                path = remove_dot_segments(path)
+            return urlparse.SplitResult(scheme, netloc, path, query, fragment)
+        if netloc:
+            return urlparse.SplitResult(base_parts.scheme, netloc, remove_dot_segments(path),
+                                        query, fragment)
+        if not path:
+            path = base_parts.path
+            if not query:
+                query = base_parts.query
+        elif not path.startswith('/'):
+            base_path = base_parts.path
+            if base_parts.netloc and not base_path:
+                base_path = '/'
+            path = base_path[:base_path.rfind('/') + 1] + path
+        return urlparse.SplitResult(base_parts.scheme, base_parts.netloc,
+                                    remove_dot_segments(path), query, fragment)
+
+    def _canonicalize_parts(self, parts):
+        """
+        Rewrite the split url by the rules and join it.
+        """
+        scheme, netloc, path, query, fragment = parts
+        if scheme.lower() not in DEFAULT_PORTS or not netloc:
+            return urlparse.urlunsplit(parts)
+
+        if self.lowercase_host:
+            scheme = scheme.lower()
+            userinfo, separator, host = netloc.rpartition('@')
+            netloc = userinfo + separator + host.lower()
+        if self.strip_default_port:
+            host, separator, port = netloc.rpartition(':')
+            if separator and ']' not in port and \
+                    (not port or port == DEFAULT_PORTS.get(scheme.lower())):
+                netloc = host
+        if not path:
+            path = '/'
+        if query and (self.strip_tracking_params or self.sort_query):
+            params = [param for param in query.split('&') if param]
+            if self.strip_tracking_params:
+                params = [param for param in params
+                          if param.split('=', 1)[0] not in self.tracking_params]
+            if self.sort_query:
+                params.sort(key=lambda param: param.split('=', 1)[0])
+            query = '&'.join(params)
+        if self.drop_fragment:
+            fragment = ''
+        return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for canonical url.
+
+Author: weileizhe
+Date: 2015/03/16 00:00:06
+"""
+
+import Queue
+import unittest
+
+
+import canonical_url
+import mini_spider
+import seen_store
+
+
+BASE_URL = 'http://Example.com:80/a/b/c.html?x=1#f'
+
+
+class TestParseCanonicalRules(unittest.TestCase):
+    """ Test parse_canonical_rules(canonical_rules) function.
+    """
+
+    def test_parse_canonical_rules(self):
+        """ Test parsing normal and unknown rules.
+        """
+        self.assertEqual(canonical_url.parse_canonical_rules(' drop_fragment,sort_query, '),
+                         ('drop_fragment', 'sort_query'))
+        self.assertEqual(canonical_url.parse_canonical_rules(''), ())
+        with self.assertRaises(ValueError):
+            canonical_url.parse_canonical_rules('drop_fragment, lowercase_path')
+
+
+class TestCanonicalizer(unittest.TestCase):
+    """ Test for Canonicalizer.
+    """
+
+    def test_join(self):
+        """ Test links are resolved as RFC 3986 does and rewritten by every rule.
+        """
+        canonicalizer = canonical_url.Canonicalizer()
+        for url, expected in (('d.html', 'http://example.com/a/b/d.html'),
+                              ('../d.html', 'http://example.com/a/d.html'),
+                              ('./', 'http://example.com/a/b/'),
+                              ('../../../../g', 'http://example.com/g'),
+                              ('/x/../y', 'http://example.com/y'),
+                              ('?q=2', 'http://example.com/a/b/c.html?q=2'),
+                              ('#g', 'http://example.com/a/b/c.html?x=1'),
+                              ('', 'http://example.com/a/b/c.html?x=1'),
+                              ('//Other.com:80', 'http://other.com/'),
+                              ('HTTPS://H.com:443/p?utm_source=a&b=2&a=1&b=1',
+                               'https://h.com/p?a=1&b=2&b=1'),
+                              ('https://h.com:8443/p', 'https://h.com:8443/p'),
+                              ('mailto:a@B.com', 'mailto:a@B.com')):
+            self.assertEqual(canonicalizer.join(BASE_URL, url), expected, url)
+
+    def test_join_without_rules(self):
+        """ Test links are only resolved without any rule.
+        """
+        canonicalizer = canonical_url.Canonicalizer(())
+        self.assertEqual(canonicalizer.join(BASE_URL, '../d.html?b=1&a=2#top'),
+                         'http://Example.com:80/a/d.html?b=1&a=2#top')
+        self.assertEqual(canonicalizer.join_all(BASE_URL, ['#top', '/']),
+                         (['http://Example.com:80/a/b/c.html?x=1#top', 'http://Example.com:80/'],
+                          set()))
+
+    def test_join_all_cached(self):
+        """ Test joins depending on the same part of the webpage url are cached.
+        """
+        canonicalizer = canonical_url.Canonicalizer(cache_size=3)
+        self.assertEqual(canonicalizer.join_all('http://a.com/x/1.html',
+                                                ['/menu', 'item', 'http://B.com/']),
+                         (['http://a.com/menu', 'http://a.com/x/item', 'http://b.com/'],
+                          set(['http://b.com/'])))
+        self.assertEqual(canonicalizer.join_all('http://a.com/x/2.html',
+                                                ['/menu', 'item', 'http://B.com/', '#top']),
+                         (['http://a.com/menu', 'http://a.com/x/item', 'http://b.com/',
+                           'http://a.com/x/2.html'], set(['http://b.com/', 'http://a.com/x/2.html'])))
+        self.assertEqual(canonicalizer.join_all('http://a.com/y/1.html', ['item']),
+                         (['http://a.com/y/item'], set()))
+        self.assertEqual((canonicalizer.joins, canonicalizer.join_hits, canonicalizer.rewritten),
+                         (8, 3, 3))
+        self.assertEqual(len(canonicalizer.cache), 3)
+
+    def test_canonicalize(self):
+        """ Test an absolute url is canonicalized.
+        """
+        canonicalizer = canonical_url.Canonicalizer()
+        self.assertEqual(canonicalizer.canonicalize('HTTP://A.com:80/x/./y/../z?gclid=1#f'),
+                         'http://a.com/x/z')
+
+
+class TestAvoidedDuplicates(unittest.TestCase):
+    """ Test counting the fetches avoided by canonicalization.
+    """
+
+    def test_put_next_urls(self):
+        """ Test only rewritten urls already crawled are counted.
+        """
+        url_queue = Queue.Queue()
+        crawled_urls = seen_store.SetSeenStore()
+        spider = mini_spider.MiniSpider(url_queue, crawled_urls, 2, 0, 5, '.*\.png$', './output')
+        next_urls, rewritten_urls = spider.canonicalizer.join_all(
+            'http://a.com/', ['b.html', 'B.html', 'b.html#top', 'HTTP://A.COM/b.html', 'c.html'])
+        spider.put_next_urls(mini_spider.Url('http://a.com/', 0), next_urls, url_queue,
+                             crawled_urls, rewritten_urls)
+        self.assertEqual(url_queue.qsize(), 3)
+        self.assertEqual(spider.canonicalizer.avoided_duplicates, 2)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes checkpoints of the crawl state, so a crawl restarted
+with --resume continues from the pending urls instead of the seed urls.
+
+The checkpoint is a sqlite file with three tables: pending holds the url and
+depth of every url put to the url queue and not done yet, seen holds every
+url put, and seed_offset holds the offset in the url list the seed urls are
+read up to. The url queue is wrapped to record its changes in memory, and a
+background thread applies them to the file every checkpoint_interval seconds
+in one transaction. The changes are applied in the order they happen, so a
+url is never marked done before the urls found in it are recorded. A url is
+recorded seen and pending, and a batch of seed urls with their offset, under
+one lock, so a flush never applies one without the other and a url is never
+seen on resume without being pending or done.
+
+Author: weileizhe
+Date: 2015/01/26 00:00:06
+"""
+
+import logging
+import sqlite3
+import threading
+
+import frontier
+
+
+PUT_OPERATION = 0
+SEEN_OPERATION = 1
+DONE_OPERATION = 2
+SEED_OFFSET_OPERATION = 3
+
+
+class CrawlCheckpoint(object):
+    """
+    A sqlite checkpoint of the pending urls and the seen urls.
+
+    Attributes:
+        path: The sqlite file path.
+        interval: The seconds between two flushes.
+    """
+
+    def __init__(self, path, interval):
+        """ Init the checkpoint, creating the sqlite file if not exists.
+
+        Args:
+            path: The sqlite file path.
+            interval: The seconds between two flushes.
+        """
+        self.path = path
+        self.interval = interval
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.text_factory = str
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pending '
+                                '(id INTEGER PRIMARY KEY, url TEXT, depth INTEGER)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS pending_url ON pending (url)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS seed_offset '
+                                '(id INTEGER PRIMARY KEY, offset INTEGER)')
+        self.connection.commit()
+        self.operations = []
+        self.mutex = threading.Lock()
+        self.flush_mutex = threading.Lock()
+        self.stopped = threading.Event()
+        self.flush_thread = None
+
+    def reset(self):
+        """
+        Clear the checkpoint for a new crawl, with the seed urls read from offset 0.
+        """
+        with self.flush_mutex:
+            self.connection.execute('DELETE FROM pending')
+            self.connection.execute('DELETE FROM seen')
+            self.connection.execute('INSERT OR REPLACE INTO seed_offset VALUES (0, 0)')
+            self.connection.commit()
+
+    def load(self):
+        """
+        Load the checkpoint, streaming the rows as they are iterated so the
+        urls of a large crawl are never all in memory. Iterate them before
+        start(), as a flush would reset the cursors.
+
+        Returns:
+            A (pending, seen) tuple, pending iterates (url, depth) in put
+            order and seen iterates urls.
+        """
+        with self.flush_mutex:
+            pending = self.connection.execute('SELECT url, depth FROM pending ORDER BY id')
+            seen = (url for url, in self.connection.execute('SELECT url FROM seen'))
+        return pending, seen
+
+    def load_seed_offset(self):
+        """
+        Load the offset in the url list the seed urls are read up to.
+
+        Returns:
+            The offset, None if the checkpoint predates the seed offset, when
+            every seed url was put before the crawl started.
+        """
+        with self.flush_mutex:
+            row = self.connection.execute('SELECT offset FROM seed_offset').fetchone()
+        return None if row is None else row[0]
+
+    def record_admitted(self, url_depths, seed_offset=None):
+        """
+        Record the (url, depth) pairs put to the url queue in one batch, each
+        seen and pending.
+
+        Args:
+            url_depths: The (url, depth) pairs put.
+            seed_offset: The offset in the url list the seed urls put are read
+                         up to, None if they are not seed urls.
+        """
+        with self.mutex:
+            for url, depth in url_depths:
+                self.operations.append((SEEN_OPERATION, url, None))
+                self.operations.append((PUT_OPERATION, url, depth))
+            if seed_offset is not None:
+                self.operations.append((SEED_OFFSET_OPERATION, None, seed_offset))
+
+    def record_done(self, url):
+        """
+        Record a url done by the crawl engine.
+        """
+        with self.mutex:
+            self.operations.append((DONE_OPERATION, url, None))
+
+    def flush(self):
+        """
+        Apply the recorded changes to the sqlite file in one transaction.
+
+        Returns:
+            The number of changes applied.
+        """
+        with self.flush_mutex:
+            with self.mutex:
+                operations, self.operations = self.operations, []
+            if not operations:
+                return 0
+            cursor = self.connection.cursor()
+            for operation, url, value in operations:
+                if operation == PUT_OPERATION:
+                    cursor.execute('INSERT INTO pending (url, depth) VALUES (?, ?)', (url, value))
+                elif operation == SEEN_OPERATION:
+                    cursor.execute('INSERT OR IGNORE INTO seen VALUES (?)', (url,))
+                elif operation == SEED_OFFSET_OPERATION:
+                    cursor.execute('INSERT OR REPLACE INTO seed_offset VALUES (0, ?)', (value,))
+                else:
+                    cursor.execute('DELETE FROM pending WHERE id = '
+                                   '(SELECT id FROM pending WHERE url = ? LIMIT 1)', (url,))
+            self.connection.commit()
+            return len(operations)
+
+    def start(self):
+        """
+        Start the background thread flushing every interval seconds.
+        """
+        self.flush_thread = threading.Thread(target=self._flush_periodically)
+        self.flush_thread.setDaemon(True)
+        self.flush_thread.start()
+
+    def _flush_periodically(self):
+        """
+        Flush every interval seconds until closed.
+        """
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            except sqlite3.Error as ex:
+                logging.warn('Checkpoint %s failed due to %s', self.path, str(ex))
+
+    def close(self):
+        """
+        Stop the background thread, flush and close the sqlite file.
+        """
+        self.stopped.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+        self.flush()
+        self.connection.close()
+
+
+class CheckpointedUrlQueue(object):
+    """
+    A url queue which records the urls put and done to a checkpoint. A url
+    put is recorded seen too, as the crawled urls are not recorded apart.
+
+    Everything else is delegated to the wrapped url queue.
+    """
+
+    def __init__(self, url_queue, crawl_checkpoint):
+        """ Init the url queue.
+
+        Args:
+            url_queue: The wrapped url queue.
+            crawl_checkpoint: The CrawlCheckpoint to record to.
+        """
+        self.url_queue = url_queue
+        self.crawl_checkpoint = crawl_checkpoint
+
+    def put(self, url_obj, *args, **kwargs):
+        """
+        Record and put the url object.
+        """
+        self.crawl_checkpoint.record_admitted([(url_obj.url, url_obj.depth)])
+        self.url_queue.put(url_obj, *args, **kwargs)
+
+    def put_many(self, url_objs, seed_offset=None):
+        """
+        Record and put the url objects in one batch.
+
+        Args:
+            url_objs: The list of url objects to crawl.
+            seed_offset: The offset in the url list the seed urls put are read
+                         up to, recorded with them, None if they are not seed urls.
+        """
+        self.crawl_checkpoint.record_admitted([(url_obj.url, url_obj.depth)
+                                               for url_obj in url_objs], seed_offset)
+        frontier.put_urls(self.url_queue, url_objs)
+
+    def task_done(self, url_obj):
+        """
+        Record the url object done and report it to the url queue.
+        """
+        self.crawl_checkpoint.record_done(url_obj.url)
+        self.url_queue.task_done(url_obj)
+
+    def __getattr__(self, name):
+        """
+        Delegate to the wrapped url queue.
+        """
+        return getattr(self.url_queue, name)
+
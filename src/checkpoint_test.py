@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for checkpoint.
+
+Author: weileizhe
+Date: 2015/01/26 00:00:06
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+import checkpoint
+import frontier
+import mini_spider
+import seen_store
+
+
+class TestCrawlCheckpoint(unittest.TestCase):
+    """ Test for CrawlCheckpoint and the checkpointed url queue.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_directory, 'checkpoint.db')
+        self.crawl_checkpoint = checkpoint.CrawlCheckpoint(self.path, 60)
+        self.url_queue = checkpoint.CheckpointedUrlQueue(frontier.HostFrontier(0),
+                                                         self.crawl_checkpoint)
+        self.crawled_urls = seen_store.SetSeenStore()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def crawl(self, url_obj, next_urls):
+        """ Crawl url_obj which links to next_urls.
+        """
+        for next_url in next_urls:
+            if self.crawled_urls.add_if_absent(next_url):
+                self.url_queue.put(mini_spider.Url(next_url, url_obj.depth + 1))
+        self.url_queue.task_done(url_obj)
+
+    def test_checkpoint_pending_and_seen(self):
+        """ Test the checkpoint keeps the pending urls and the seen urls.
+        """
+        self.url_queue.put(mini_spider.Url('http://a.com/', 0))
+        url_obj = self.url_queue.get_nowait()
+        self.crawl(url_obj, ['http://b.com/', 'http://c.com/', 'http://b.com/'])
+        self.assertEqual(self.crawl_checkpoint.flush(), 7)
+        self.assertEqual(self.crawl_checkpoint.flush(), 0)
+
+        pending, seen = map(list, self.crawl_checkpoint.load())
+        self.assertEqual(pending, [('http://b.com/', 1), ('http://c.com/', 1)])
+        self.assertEqual(sorted(seen), ['http://a.com/', 'http://b.com/', 'http://c.com/'])
+
+        self.crawl(self.url_queue.get_nowait(), [])
+        self.crawl_checkpoint.close()
+        pending, seen = map(list, checkpoint.CrawlCheckpoint(self.path, 60).load())
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(len(seen), 3)
+
+    def test_restore_checkpoint(self):
+        """ Test restoring a checkpoint to a new url queue and store.
+        """
+        self.url_queue.put(mini_spider.Url('http://a.com/', 0))
+        self.crawl(self.url_queue.get_nowait(), ['http://b.com/x'])
+        self.crawl_checkpoint.close()
+
+        url_queue = frontier.HostFrontier(0)
+        crawled_urls = seen_store.FingerprintSeenStore()
+        self.assertTrue(mini_spider.restore_checkpoint(
+            checkpoint.CrawlCheckpoint(self.path, 60), url_queue, crawled_urls))
+        url_obj = url_queue.get_nowait()
+        self.assertEqual((url_obj.url, url_obj.depth), ('http://b.com/x', 1))
+        self.assertTrue(url_queue.empty())
+        self.assertFalse(crawled_urls.add_if_absent('http://b.com/x'))
+
+    def test_reset(self):
+        """ Test reset clears the checkpoint.
+        """
+        self.url_queue.put(mini_spider.Url('http://a.com/', 0))
+        self.crawl_checkpoint.flush()
+        self.crawl_checkpoint.reset()
+        self.assertEqual(map(list, self.crawl_checkpoint.load()), [[], []])
+        self.assertFalse(mini_spider.restore_checkpoint(
+            self.crawl_checkpoint, frontier.HostFrontier(0), seen_store.SetSeenStore()))
+
+    def test_flush_between_admission_and_put(self):
+        """ Test a url flushed after it is added to the crawled urls and before
+        it is put is not seen on resume, and is pending once put.
+        """
+        self.url_queue.put(mini_spider.Url('http://a.com/', 0))
+        url_obj = self.url_queue.get_nowait()
+        self.crawl_checkpoint.flush()
+        added_urls = self.crawled_urls.add_many(['http://a.com/x'])
+        self.crawl_checkpoint.flush()
+        self.assertEqual(map(list, self.crawl_checkpoint.load()),
+                         [[('http://a.com/', 0)], ['http://a.com/']])
+        frontier.put_urls(self.url_queue, [mini_spider.Url(url, 1) for url in added_urls])
+        self.url_queue.task_done(url_obj)
+        self.crawl_checkpoint.flush()
+        self.assertEqual(map(list, self.crawl_checkpoint.load()),
+                         [[('http://a.com/x', 1)], ['http://a.com/', 'http://a.com/x']])
+
+    def test_seed_offset(self):
+        """ Test the seed offset is recorded with the seed urls put, and is 0 after reset.
+        """
+        self.assertEqual(self.crawl_checkpoint.load_seed_offset(), None)
+        self.crawl_checkpoint.reset()
+        self.assertEqual(self.crawl_checkpoint.load_seed_offset(), 0)
+        self.url_queue.put_many([mini_spider.Url('http://a.com/', 0),
+                                 mini_spider.Url('http://b.com/', 0)], 28)
+        self.assertEqual(self.crawl_checkpoint.operations[-1],
+                         (checkpoint.SEED_OFFSET_OPERATION, None, 28))
+        self.assertEqual(self.crawl_checkpoint.flush(), 5)
+        self.url_queue.put_many([], 42)
+        self.crawl_checkpoint.close()
+        crawl_checkpoint = checkpoint.CrawlCheckpoint(self.path, 60)
+        self.assertEqual(map(list, crawl_checkpoint.load()),
+                         [[('http://a.com/', 0), ('http://b.com/', 0)],
+                          ['http://a.com/', 'http://b.com/']])
+        self.assertEqual(crawl_checkpoint.load_seed_offset(), 42)
+        crawl_checkpoint.close()
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the cluster mode of mini spider, where several spider
+processes crawl one url space together.
+
+Every node is configured with the same cluster_nodes list and its own index
+in it. A url belongs to the node its host maps to on a consistent hash ring,
+so every host is crawled, deduped and scheduled by exactly one node. A node
+crawls the urls it owns and forwards the others to their owners in batches.
+The owner dedups a forwarded url against its crawled urls and puts it with
+the depth it was found at, so the dedup and depth semantics are the same as
+in one process.
+
+The transport is one json line per request over TCP:
+
+    {"command": "urls", "urls": [[url, depth], ...]} -> {"received": n}
+    {"command": "status"} -> {"idle": bool, "sent": n, "received": n}
+    {"command": "stop"} -> {}
+
+Node 0 detects the end of the crawl: when every node is idle and the urls
+sent equal the urls received, in two polls in a row with the same counts,
+no url is left anywhere and it stops every node.
+
+Author: weileizhe
+Date: 2015/02/16 00:00:06
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import socket
+import SocketServer
+import struct
+import threading
+import urllib
+
+import frontier
+
+
+DEFAULT_REPLICAS = 64
+
+URL_SAFE_CHARACTERS = "%/:=&?~#+!$,;'@()*[]"
+
+
+def parse_cluster_nodes(cluster_nodes):
+    """
+    Parse the cluster nodes configuration.
+
+    Args:
+        cluster_nodes: Comma separated host:port addresses, like
+                       "10.0.0.1:7070, 10.0.0.2:7070".
+
+    Returns:
+        A list of (host, port) tuples, empty if cluster_nodes is empty.
+
+    Raises:
+        ValueError: Invalid address.
+    """
+    nodes = []
+    for address in cluster_nodes.split(','):
+        address = address.strip()
+        if not address:
+            continue
+        host, separator, port = address.rpartition(':')
+        if not separator or not host or not port.isdigit() or not 0 < int(port) < 65536:
+            raise ValueError('invalid node address %s' % address)
+        nodes.append((host, int(port)))
+    return nodes
+
+
+def encode_url(url):
+    """
+    Get url as a str which is valid utf-8, so it can be sent as json.
+    """
+    if isinstance(url, unicode):
+        return url.encode('utf-8')
+    try:
+        url.decode('utf-8')
+    except UnicodeDecodeError:
+        return urllib.quote(url, URL_SAFE_CHARACTERS)
+    return url
+
+
+class HashRing(object):
+    """
+    A consistent hash ring mapping hosts to node indexes.
+
+    Each node has replicas points on the ring, and a host belongs to the node
+    of the first point after the hash of the host. Adding a node only moves
+    about 1 / node count of the hosts.
+    """
+
+    def __init__(self, node_names, replicas=DEFAULT_REPLICAS):
+        """ Init the ring.
+
+        Args:
+            node_names: The node names, a host maps to the index of its node.
+            replicas: The points per node.
+        """
+        points = []
+        for index, name in enumerate(node_names):
+            for replica in xrange(replicas):
+                points.append((self._hash('%s#%d' % (name, replica)), index))
+        points.sort()
+        self.point_hashes = [point_hash for point_hash, index in points]
+        self.point_indexes = [index for point_hash, index in points]
+
+    def _hash(self, key):
+        """
+        Get the 64-bit hash of key.
+        """
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return struct.unpack('<Q', hashlib.md5(key).digest()[:8])[0]
+
+    def node_index(self, host):
+        """
+        Get the index of the node owning host.
+        """
+        position = bisect.bisect(self.point_hashes, self._hash(host))
+        return self.point_indexes[position % len(self.point_indexes)]
+
+
+class ClusterRequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Handle one json line request of another node.
+    """
+
+    def handle(self):
+        """
+        Read the request and write the response.
+        """
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.cluster_node.handle_request(request)
+        except (ValueError, KeyError, TypeError) as error:
+            logging.warn('Bad cluster request from %s: %s', self.client_address[0], str(error))
+            return
+        self.wfile.write(json.dumps(response) + '\n')
+
+
+class ClusterServer(SocketServer.ThreadingTCPServer):
+    """
+    The TCP server of a cluster node.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ClusterNode(object):
+    """
+    A node of the cluster, owning the hosts mapped to it.
+
+    Attributes:
+        nodes: The (host, port) addresses of every node.
+        node_index: The index of this node in nodes.
+        sent: The urls forwarded to and received by other nodes.
+        received: The urls received from other nodes.
+        seed_feeder: The seed_feeder.SeedFeeder putting the seed urls of this
+                     node, None if no seed is left to read. The node is not
+                     idle until it finishes.
+    """
+
+    def __init__(self, nodes, node_index, url_queue, crawled_urls, url_factory,
+                 batch_size=100, flush_interval=0.5, timeout=5):
+        """ Init the node.
+
+        Args:
+            nodes: The (host, port) addresses of every node.
+            node_index: The index of this node in nodes.
+            url_queue: The local url queue to put the urls owned.
+            crawled_urls: The local seen_store to dedup the urls received.
+            url_factory: The function making a url object of (url, depth).
+            batch_size: The urls forwarded to a node in one request.
+            flush_interval: The max seconds a url waits to be forwarded, and
+                            the seconds between two polls of node 0.
+            timeout: The socket timeout talking to other nodes.
+        """
+        self.nodes = nodes
+        self.node_index = node_index
+        self.url_queue = url_queue
+        self.crawled_urls = crawled_urls
+        self.url_factory = url_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.ring = HashRing(['%s:%d' % node for node in nodes])
+        self.batches = [[] for node in nodes]
+        self.sending = 0
+        self.sent = 0
+        self.received = 0
+        self.seed_feeder = None
+        self.mutex = threading.Lock()
+        self.stopped = threading.Event()
+        self.server = None
+        self.threads = []
+
+    def owns(self, url):
+        """
+        Judge if the host of url belongs to this node.
+        """
+        return self.ring.node_index(frontier.url_host(url)) == self.node_index
+
+    def forward(self, url, depth):
+        """
+        Forward a url found at depth to its owner, batch_size urls at a time.
+
+        Args:
+            url: The url owned by another node.
+            depth: The crawl depth of url.
+        """
+        index = self.ring.node_index(frontier.url_host(url))
+        with self.mutex:
+            self.batches[index].append((encode_url(url), depth))
+            full = len(self.batches[index]) >= self.batch_size
+        if full:
+            self._flush(index)
+
+    def _flush(self, index):
+        """
+        Send the waiting urls of node index, keeping them to retry if it fails.
+        """
+        with self.mutex:
+            batch, self.batches[index] = self.batches[index], []
+            if not batch:
+                return
+            self.sending += 1
+        try:
+            self._request(index, {'command': 'urls', 'urls': batch})
+        except (socket.error, ValueError) as error:
+            logging.warn('Forward %d urls to node %d failed due to %s',
+                         len(batch), index, str(error) or error.__class__.__name__)
+            with self.mutex:
+                self.batches[index][:0] = batch
+                self.sending -= 1
+            return
+        with self.mutex:
+            self.sent += len(batch)
+            self.sending -= 1
+
+    def _request(self, index, request):
+        """
+        Send a request to node index and get its response.
+
+        Raises:
+            socket.error: Fail to talk to the node.
+            ValueError: Bad response.
+        """
+        connection = socket.create_connection(self.nodes[index], self.timeout)
+        try:
+            connection.sendall(json.dumps(request) + '\n')
+            response = connection.makefile('rb').readline()
+        finally:
+            connection.close()
+        return json.loads(response)
+
+    def handle_request(self, request):
+        """
+        Handle a request of another node.
+
+        Args:
+            request: The decoded json request.
+
+        Returns:
+            The response to encode as json.
+        """
+        command = request['command']
+        if command == 'urls':
+            urls = []
+            url_depths = {}
+            for url, depth in request['urls']:
+                url = url.encode('utf-8')
+                urls.append(url)
+                url_depths.setdefault(url, depth)
+            added_urls = self.crawled_urls.add_many(urls)
+            frontier.put_urls(self.url_queue, [self.url_factory(url, url_depths[url])
+                                               for url in added_urls])
+            with self.mutex:
+                self.received += len(request['urls'])
+            return {'received': len(request['urls'])}
+        if command == 'status':
+            return self.status()
+        if command == 'stop':
+            self.stopped.set()
+            return {}
+        raise ValueError('unknown command %s' % command)
+
+    def status(self):
+        """
+        Get the status of this node.
+
+        Returns:
+            A dict of idle, sent and received. The node is idle if every seed
+            of it is read, no url of it is waiting or in flight and no url is
+            waiting to be forwarded.
+        """
+        seeding = self.seed_feeder is not None and not self.seed_feeder.finished.is_set()
+        with self.mutex:
+            idle = not seeding and self.url_queue.unfinished_tasks == 0 and \
+                self.sending == 0 and not any(self.batches)
+            return {'idle': idle, 'sent': self.sent, 'received': self.received}
+
+    def start(self):
+        """
+        Start serving the other nodes, flushing the batches periodically and,
+        on node 0, detecting the end of the crawl.
+        """
+        self.server = ClusterServer(self.nodes[self.node_index], ClusterRequestHandler)
+        self.server.cluster_node = self
+        self._start_thread(self.server.serve_forever)
+        self._start_thread(self._flush_periodically)
+        if self.node_index == 0:
+            self._start_thread(self._detect_termination)
+
+    def _start_thread(self, target):
+        """
+        Start a daemon thread of the node.
+        """
+        node_thread = threading.Thread(target=target)
+        node_thread.setDaemon(True)
+        node_thread.start()
+        self.threads.append(node_thread)
+
+    def _flush_periodically(self):
+        """
+        Flush every batch every flush_interval seconds until stopped.
+        """
+        while not self.stopped.wait(self.flush_interval):
+            for index in xrange(len(self.nodes)):
+                if index != self.node_index:
+                    self._flush(index)
+
+    def _poll_statuses(self):
+        """
+        Get the status of every node, None if a node does not answer.
+        """
+        statuses = []
+        for index in xrange(len(self.nodes)):
+            if index == self.node_index:
+                statuses.append(self.status())
+                continue
+            try:
+                statuses.append(self._request(index, {'command': 'status'}))
+            except (socket.error, ValueError):
+                return None
+        return statuses
+
+    def _detect_termination(self):
+        """
+        Stop every node when no url is left in the cluster.
+        """
+        last_counts = None
+        while not self.stopped.wait(self.flush_interval):
+            statuses = self._poll_statuses()
+            if statuses is None or not all(status['idle'] for status in statuses):
+                last_counts = None
+                continue
+            counts = (sum(status['sent'] for status in statuses),
+                      sum(status['received'] for status in statuses))
+            if counts[0] == counts[1] and counts == last_counts:
+                break
+            last_counts = counts
+        else:
+            return
+
+        for index in xrange(len(self.nodes)):
+            if index != self.node_index:
+                try:
+                    self._request(index, {'command': 'stop'})
+                except (socket.error, ValueError) as error:
+                    logging.warn('Stop node %d failed due to %s', index, str(error))
+        self.stopped.set()
+
+    def wait_stopped(self):
+        """
+        Wait until node 0 stops the cluster.
+        """
+        while not self.stopped.wait(self.flush_interval):
+            pass
+
+    def close(self):
+        """
+        Stop serving and wait for the threads of the node.
+        """
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for node_thread in self.threads:
+            node_thread.join()
+
+
+class ShardedUrlQueue(object):
+    """
+    A url queue which puts the urls owned by the cluster node and forwards
+    the others. The crawl is not over until the cluster stops, so join()
+    waits for it and empty() is False until then.
+
+    Everything else is delegated to the wrapped url queue.
+    """
+
+    def __init__(self, url_queue, cluster_node):
+        """ Init the url queue.
+
+        Args:
+            url_queue: The wrapped local url queue.
+            cluster_node: The ClusterNode owning this shard.
+        """
+        self.url_queue = url_queue
+        self.cluster_node = cluster_node
+
+    def put(self, url_obj, *args, **kwargs):
+        """
+        Put the url object if owned, forward it otherwise.
+        """
+        if self.cluster_node.owns(url_obj.url):
+            self.url_queue.put(url_obj, *args, **kwargs)
+        else:
+            self.cluster_node.forward(url_obj.url, url_obj.depth)
+
+    def put_many(self, url_objs, seed_offset=None):
+        """
+        Put the url objects owned in one batch, forward the others.
+
+        Args:
+            url_objs: The list of url objects to crawl.
+            seed_offset: The offset in the url list the seed urls put are read
+                         up to, handed to the put_many of the wrapped url queue,
+                         None if they are not seed urls.
+        """
+        owned_url_objs = []
+        for url_obj in url_objs:
+            if self.cluster_node.owns(url_obj.url):
+                owned_url_objs.append(url_obj)
+            else:
+                self.cluster_node.forward(url_obj.url, url_obj.depth)
+        if seed_offset is not None:
+            self.url_queue.put_many(owned_url_objs, seed_offset)
+        else:
+            frontier.put_urls(self.url_queue, owned_url_objs)
+
+    def join(self):
+        """
+        Wait until the cluster stops.
+        """
+        self.cluster_node.wait_stopped()
+
+    def empty(self):
+        """
+        Judge if the cluster stopped and no url is waiting.
+        """
+        return self.cluster_node.stopped.is_set() and self.url_queue.empty()
+
+    def __getattr__(self, name):
+        """
+        Delegate to the wrapped url queue.
+        """
+        return getattr(self.url_queue, name)
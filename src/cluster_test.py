@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for cluster.
+
+Author: weileizhe
+Date: 2015/02/16 00:00:06
+"""
+
+import BaseHTTPServer
+import collections
+import os
+import re
+import shutil
+import socket
+import SocketServer
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+
+import cluster
+import frontier
+import mini_spider
+import seed_feeder
+import seen_store
+
+
+NODE_HOSTS = ('127.0.0.1', '127.0.0.2', '127.0.0.3')
+
+
+class GraphHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serve /page/<n>.html on every host, linking to /page/<n + 1>.html on every host.
+    """
+
+    def do_GET(self):
+        """ Handle GET request.
+        """
+        self.server.requests[self.headers.getheader('host') + self.path] += 1
+        match = re.match(r'^/page/(\d+)\.html$', self.path)
+        if match is None:
+            self.send_error(404)
+            return
+        next_page = int(match.group(1)) + 1
+        body = ''.join('<a href="http://%s:%d/page/%d.html">next</a>'
+                       % (host, self.server.server_address[1], next_page) for host in NODE_HOSTS)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """ Keep test output quiet.
+        """
+        pass
+
+
+class SlowSeedFeeder(seed_feeder.SeedFeeder):
+    """ A seed feeder sleeping before each batch, as reading a large url list does.
+    """
+    delay = 0.3
+
+    def feed(self, urls, offset):
+        """ Sleep longer than two polls of node 0, then feed the batch.
+        """
+        time.sleep(self.delay)
+        seed_feeder.SeedFeeder.feed(self, urls, offset)
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ Threading http server for test.
+    """
+    daemon_threads = True
+
+
+def unused_port():
+    """ Get a port nobody listens on.
+    """
+    unused_socket = socket.socket()
+    unused_socket.bind(('127.0.0.1', 0))
+    port = unused_socket.getsockname()[1]
+    unused_socket.close()
+    return port
+
+
+class TestParseClusterNodes(unittest.TestCase):
+    """ Test parse_cluster_nodes(cluster_nodes) function.
+    """
+
+    def test_parse_cluster_nodes(self):
+        """ Test parsing normal and invalid nodes.
+        """
+        self.assertEqual(cluster.parse_cluster_nodes('10.0.0.1:7070, node2:7071,'),
+                         [('10.0.0.1', 7070), ('node2', 7071)])
+        self.assertEqual(cluster.parse_cluster_nodes(''), [])
+        for cluster_nodes in ('10.0.0.1', ':7070', '10.0.0.1:port', '10.0.0.1:70700'):
+            with self.assertRaises(ValueError):
+                cluster.parse_cluster_nodes(cluster_nodes)
+
+
+class TestHashRing(unittest.TestCase):
+    """ Test for HashRing.
+    """
+
+    def test_node_index(self):
+        """ Test hosts spread over the nodes and few move when a node is added.
+        """
+        hosts = ['host%d.com' % i for i in xrange(3000)]
+        ring = cluster.HashRing(['node0', 'node1', 'node2'])
+        counts = collections.Counter(ring.node_index(host) for host in hosts)
+        self.assertEqual(sorted(counts), [0, 1, 2])
+        self.assertTrue(min(counts.values()) > 500)
+
+        larger_ring = cluster.HashRing(['node0', 'node1', 'node2', 'node3'])
+        moved = sum(1 for host in hosts if ring.node_index(host) != larger_ring.node_index(host))
+        self.assertTrue(moved < len(hosts) / 2)
+        self.assertTrue(all(larger_ring.node_index(host) == 3 for host in hosts
+                            if ring.node_index(host) != larger_ring.node_index(host)))
+
+
+class TestClusterNode(unittest.TestCase):
+    """ Test crawling with several cluster nodes.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = ThreadingHTTPServer(('0.0.0.0', 0), GraphHandler)
+        self.server.requests = collections.Counter()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.port = self.server.server_address[1]
+        self.cluster_nodes = []
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_node(self, nodes, node_index, seed_url, max_depth, crawled_urls, url_list_file=None):
+        """ Run one node with 2 spider threads until the cluster stops.
+
+        The seed urls of url_list_file are fed slowly, if given, instead of seed_url.
+        """
+        url_queue = frontier.HostFrontier(0)
+        cluster_node = cluster.ClusterNode(nodes, node_index, url_queue, crawled_urls,
+                                           mini_spider.Url, 2, 0.05)
+        self.cluster_nodes.append(cluster_node)
+        sharded_url_queue = cluster.ShardedUrlQueue(url_queue, cluster_node)
+        if url_list_file is not None:
+            feeder = SlowSeedFeeder(url_list_file, sharded_url_queue, crawled_urls,
+                                    mini_spider.Url, url_filter=cluster_node.owns, batch_size=2)
+            # The nodes read at different speeds, so some finish long before others.
+            feeder.delay = 0.1 + 0.2 * node_index
+            feeder.start()
+            sharded_url_queue = seed_feeder.SeededUrlQueue(sharded_url_queue, feeder)
+            cluster_node.seed_feeder = feeder
+        elif cluster_node.owns(seed_url):
+            sharded_url_queue.put(mini_spider.Url(seed_url, 0))
+        cluster_node.start()
+        spider_threads = []
+        for i in xrange(2):
+            spider_thread = mini_spider.MiniSpiderThread(sharded_url_queue, crawled_urls,
+                                                         max_depth, 0, 5, '.*\.png$',
+                                                         './output_test')
+            spider_thread.setDaemon(True)
+            spider_thread.start()
+            spider_threads.append(spider_thread)
+        sharded_url_queue.join()
+        sharded_url_queue.close()
+        for spider_thread in spider_threads:
+            spider_thread.join()
+        cluster_node.close()
+
+    def test_crawl(self):
+        """ Test every page within max_depth is grabed once by the node owning its host.
+        """
+        nodes = [('127.0.0.1', unused_port()) for host in NODE_HOSTS]
+        seed_url = 'http://127.0.0.1:%d/page/0.html' % self.port
+        node_crawled_urls = [seen_store.SetSeenStore() for node in nodes]
+        node_threads = []
+        for node_index in xrange(len(nodes)):
+            node_thread = threading.Thread(target=self.run_node,
+                                           args=(nodes, node_index, seed_url, 3,
+                                                 node_crawled_urls[node_index]))
+            node_thread.setDaemon(True)
+            node_thread.start()
+            node_threads.append(node_thread)
+        for node_thread in node_threads:
+            node_thread.join(30)
+            self.assertFalse(node_thread.is_alive())
+
+        expected = set(['%s:%d/page/%d.html' % (host, self.port, page)
+                        for host in NODE_HOSTS for page in xrange(1, 4)])
+        expected.add('127.0.0.1:%d/page/0.html' % self.port)
+        self.assertEqual(set(self.server.requests), expected)
+        self.assertEqual(set(self.server.requests.values()), set([1]))
+
+        ring = cluster.HashRing(['%s:%d' % node for node in nodes])
+        for node_index, crawled_urls in enumerate(node_crawled_urls):
+            for url in crawled_urls:
+                if ring.node_index(frontier.url_host(url)) != node_index:
+                    self.assertTrue(url in node_crawled_urls[ring.node_index(
+                        frontier.url_host(url))])
+
+    def test_crawl_slow_seeds(self):
+        """ Test the cluster does not stop before every node has read its seed urls,
+        so every link forwarded reaches a node still running.
+        """
+        nodes = [('127.0.0.1', unused_port()) for host in NODE_HOSTS]
+        seed_urls = ['http://%s:%d/page/%d.html' % (host, self.port, page)
+                     for page in xrange(0, 40, 10) for host in NODE_HOSTS]
+        url_list = tempfile.NamedTemporaryFile(delete=False)
+        with url_list:
+            url_list.write(''.join('%s\n' % url for url in seed_urls))
+        try:
+            node_threads = []
+            for node_index in xrange(len(nodes)):
+                node_thread = threading.Thread(target=self.run_node,
+                                               args=(nodes, node_index, None, 1,
+                                                     seen_store.SetSeenStore(), url_list.name))
+                node_thread.setDaemon(True)
+                node_thread.start()
+                node_threads.append(node_thread)
+            for node_thread in node_threads:
+                node_thread.join(30)
+                self.assertFalse(node_thread.is_alive())
+        finally:
+            os.remove(url_list.name)
+
+        expected = set(['%s:%d/page/%d.html' % (host, self.port, page + depth)
+                        for host in NODE_HOSTS for page in xrange(0, 40, 10)
+                        for depth in xrange(2)])
+        self.assertEqual(set(self.server.requests), expected)
+        for cluster_node in self.cluster_nodes:
+            self.assertFalse(any(cluster_node.batches))
+        self.assertEqual(sum(cluster_node.sent for cluster_node in self.cluster_nodes),
+                         sum(cluster_node.received for cluster_node in self.cluster_nodes))
+
+    def test_crawl_processes(self):
+        """ Test every page within max_depth is grabed once by nodes run as
+        mini_spider.py processes.
+        """
+        nodes = [('127.0.0.1', unused_port()) for host in NODE_HOSTS]
+        run_directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(run_directory, 'urls'), 'w') as url_lines:
+                url_lines.write('http://127.0.0.1:%d/page/0.html\n' % self.port)
+            configuration_file_name = os.path.join(run_directory, 'spider.conf')
+            with open(configuration_file_name, 'w') as configuration_file:
+                configuration_file.write('[spider]\n'
+                                         'url_list_file: ./urls\n'
+                                         'output_directory: ./output\n'
+                                         'max_depth: 3\n'
+                                         'crawl_interval: 0.01\n'
+                                         'crawl_timeout: 5\n'
+                                         'target_url: .*\\.png$\n'
+                                         'thread_count: 2\n'
+                                         'seen_store: set\n'
+                                         'prune_rules:\n'
+                                         'cluster_nodes: %s\n'
+                                         'cluster_batch_size: 2\n'
+                                         'cluster_flush_interval: 0.05\n'
+                                         % ', '.join('%s:%d' % node for node in nodes))
+            spider_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       'mini_spider.py')
+            processes = [subprocess.Popen([sys.executable, spider_path, '-c', 'spider.conf',
+                                           '--node-index', str(node_index)], cwd=run_directory)
+                         for node_index in xrange(len(nodes))]
+            end_time = time.time() + 30
+            while time.time() < end_time and any(process.poll() is None
+                                                 for process in processes):
+                time.sleep(0.1)
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            self.assertEqual([process.returncode for process in processes], [0] * len(nodes))
+        finally:
+            shutil.rmtree(run_directory)
+
+        expected = set(['%s:%d/page/%d.html' % (host, self.port, page)
+                        for host in NODE_HOSTS for page in xrange(1, 4)])
+        expected.add('127.0.0.1:%d/page/0.html' % self.port)
+        self.assertEqual(set(self.server.requests), expected)
+        self.assertEqual(set(self.server.requests.values()), set([1]))
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes a thread-safe pool of persistent HTTP/1.1 connections,
+so the webpages of the same host are grabed without a new TCP connection
+(and TLS handshake) per url.
+
+Author: weileizhe
+Date: 2015/01/12 00:00:06
+"""
+
+import collections
+import httplib
+import socket
+import threading
+import time
+import urlparse
+
+
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+DRAIN_LIMIT = 65536
+USER_AGENT = 'mini-spider/1.0'
+
+
+class PoolError(Exception):
+    """
+    Pool exception if fail to get a connection or grab the url.
+    """
+    pass
+
+
+class PooledResponse(object):
+    """
+    A response on a pooled connection which acts like the response of urllib2.urlopen.
+
+    The connection goes back to the pool when the body is read to the end or
+    the response is released.
+
+    Attributes:
+        url: The url of the response.
+        response: The httplib.HTTPResponse.
+    """
+
+    def __init__(self, pool, key, connection, response, url):
+        """ Init the response.
+
+        Args:
+            pool: The ConnectionPool owning the connection.
+            key: The (scheme, host, port) key of the connection.
+            connection: The httplib connection.
+            response: The httplib.HTTPResponse.
+            url: The url of the response.
+        """
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.url = url
+
+    def getcode(self):
+        """
+        Get the http status code.
+        """
+        return self.response.status
+
+    def geturl(self):
+        """
+        Get the url of the response.
+        """
+        return self.url
+
+    def info(self):
+        """
+        Get the http headers.
+        """
+        return self.response.msg
+
+    def read(self, size=None):
+        """
+        Read the response body, release the connection at the end of body.
+
+        Args:
+            size: The max bytes to read, None to read all.
+        """
+        if size is None or size < 0:
+            data = self.response.read()
+        else:
+            data = self.response.read(size)
+        if self.response.isclosed():
+            self.release()
+        return data
+
+    def release(self):
+        """
+        Give the connection back to the pool.
+
+        A small unread body is drained so the connection can be reused, a
+        large one is dropped with the connection.
+        """
+        if self.connection is None:
+            return
+        if not self.response.isclosed() and not self.response.will_close:
+            length = self.response.length
+            if length is not None and length <= DRAIN_LIMIT:
+                try:
+                    self.response.read()
+                except (httplib.HTTPException, socket.error):
+                    pass
+        connection, self.connection = self.connection, None
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool.release(self.key, connection)
+        else:
+            self.response.close()
+            self.pool.discard(self.key, connection)
+
+    def close(self):
+        """
+        Release the response, like closing a urllib2 response.
+        """
+        self.release()
+
+
+class ConnectionPool(object):
+    """
+    A bounded, thread-safe pool of persistent connections keyed by scheme, host and port.
+
+    At most max_per_host connections of a key are in use at the same time, at
+    most max_idle idle connections are kept in total, and idle connections are
+    closed after idle_timeout seconds.
+
+    Attributes:
+        max_per_host: The max connections of a key in use.
+        max_idle: The max idle connections kept in total.
+        idle_timeout: The seconds an idle connection is kept.
+    """
+
+    def __init__(self, max_per_host=2, max_idle=256, idle_timeout=30, metrics=None):
+        """ Init the pool.
+
+        Args:
+            max_per_host: The max connections of a key in use.
+            max_idle: The max idle connections kept in total.
+            idle_timeout: The seconds an idle connection is kept.
+            metrics: The crawl_metrics.CrawlMetrics timing new connections, None
+                     not to time them.
+        """
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics
+        self.idle_connections = collections.OrderedDict()
+        self.active_counts = collections.defaultdict(int)
+        self.idle_count = 0
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.connections_evicted = 0
+        self.mutex = threading.Lock()
+        self.connection_released = threading.Condition(self.mutex)
+
+    def acquire(self, key, timeout):
+        """
+        Get an idle connection of key or create a new one.
+
+        Args:
+            key: The (scheme, host, port) key.
+            timeout: The seconds to wait for a free slot of the key, also the
+                     socket timeout of a new connection.
+
+        Returns:
+            A (connection, reused) tuple.
+
+        Raises:
+            PoolError: No free slot of the key in timeout seconds.
+        """
+        end_time = time.time() + timeout
+        with self.mutex:
+            self._evict_idle(time.time())
+            while self.active_counts[key] >= self.max_per_host:
+                wait_time = end_time - time.time()
+                if wait_time <= 0:
+                    raise PoolError('No free connection to %s://%s:%d' % key)
+                self.connection_released.wait(wait_time)
+            self.active_counts[key] += 1
+            self.requests += 1
+            idle_connections = self.idle_connections.get(key)
+            if idle_connections:
+                connection, _ = idle_connections.pop()
+                if not idle_connections:
+                    del self.idle_connections[key]
+                self.idle_count -= 1
+                self.connections_reused += 1
+                return connection, True
+            self.connections_created += 1
+
+        scheme, host, port = key
+        if scheme == 'https':
+            connection = httplib.HTTPSConnection(host, port, timeout=timeout)
+        else:
+            connection = httplib.HTTPConnection(host, port, timeout=timeout)
+        return connection, False
+
+    def release(self, key, connection):
+        """
+        Put a connection whose response is read back to the idle connections.
+
+        Args:
+            key: The (scheme, host, port) key.
+            connection: The httplib connection.
+        """
+        with self.mutex:
+            self._release_slot(key)
+            now = time.time()
+            idle_connections = self.idle_connections.pop(key, [])
+            idle_connections.append((connection, now))
+            self.idle_connections[key] = idle_connections
+            self.idle_count += 1
+            self._evict_idle(now)
+            while self.idle_count > self.max_idle:
+                self._evict_oldest()
+
+    def discard(self, key, connection):
+        """
+        Close a connection which can not be reused.
+
+        Args:
+            key: The (scheme, host, port) key.
+            connection: The httplib connection.
+        """
+        connection.close()
+        with self.mutex:
+            self._release_slot(key)
+
+    def _release_slot(self, key):
+        """
+        Free a slot of key, holding the mutex.
+        """
+        self.active_counts[key] -= 1
+        if self.active_counts[key] <= 0:
+            del self.active_counts[key]
+        self.connection_released.notify()
+
+    def _evict_oldest(self):
+        """
+        Close the oldest idle connection of the least recently released key, holding the mutex.
+        """
+        key, idle_connections = next(self.idle_connections.iteritems())
+        connection, _ = idle_connections.pop(0)
+        if not idle_connections:
+            del self.idle_connections[key]
+        connection.close()
+        self.connections_evicted += 1
+        self.idle_count -= 1
+
+    def _evict_idle(self, now):
+        """
+        Close the keys idle for more than idle_timeout, holding the mutex.
+
+        The keys are ordered by their last release, so only a prefix of them
+        can be expired.
+        """
+        while self.idle_connections:
+            key, idle_connections = next(self.idle_connections.iteritems())
+            if idle_connections[-1][1] + self.idle_timeout > now:
+                return
+            del self.idle_connections[key]
+            for connection, _ in idle_connections:
+                connection.close()
+                self.connections_evicted += 1
+                self.idle_count -= 1
+
+    def urlopen(self, url, timeout, headers=None):
+        """
+        GET the url on a pooled connection, following redirects.
+
+        A reused connection which the server has closed is retried once on a
+        new connection.
+
+        Args:
+            url: The url to grab.
+            timeout: The grab timeout.
+            headers: The extra request headers, kept on redirects.
+
+        Returns:
+            A PooledResponse object.
+
+        Raises:
+            PoolError: Fail to get a connection or too many redirects.
+            httplib.HTTPException: Fail to parse the response.
+            socket.error: Fail to connect, send or receive.
+        """
+        for _ in xrange(MAX_REDIRECTS + 1):
+            response = self._request(url, timeout, headers)
+            location = response.info().getheader('location')
+            if response.getcode() not in REDIRECT_CODES or not location:
+                return response
+            response.release()
+            url = urlparse.urljoin(url, location)
+        raise PoolError('Too many redirects')
+
+    def _request(self, url, timeout, headers=None):
+        """
+        GET the url on a pooled connection once.
+        """
+        split_url = urlparse.urlsplit(url)
+        if split_url.scheme not in ('http', 'https') or not split_url.hostname:
+            raise PoolError('Unsupported url %s' % url)
+        port = split_url.port or (443 if split_url.scheme == 'https' else 80)
+        key = (split_url.scheme, split_url.hostname, port)
+        path = split_url.path or '/'
+        if split_url.query:
+            path += '?' + split_url.query
+        request_headers = {'Host': split_url.netloc, 'User-Agent': USER_AGENT, 'Accept': '*/*'}
+        request_headers.update(headers or {})
+
+        while True:
+            connection, reused = self.acquire(key, timeout)
+            try:
+                if not reused and self.metrics is not None:
+                    connect_time = time.time()
+                    connection.connect()
+                    self.metrics.observe('connect', time.time() - connect_time)
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+            except (httplib.HTTPException, socket.error):
+                self.discard(key, connection)
+                if reused:
+                    continue
+                raise
+            return PooledResponse(self, key, connection, response, url)
+
+    def stats(self):
+        """
+        Get the connection reuse stats.
+
+        Returns:
+            A dict of requests, connections_created, connections_reused,
+            connections_evicted and idle_connections.
+        """
+        with self.mutex:
+            return {
+                'requests': self.requests,
+                'connections_created': self.connections_created,
+                'connections_reused': self.connections_reused,
+                'connections_evicted': self.connections_evicted,
+                'idle_connections': self.idle_count,
+            }
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self.mutex:
+            for idle_connections in self.idle_connections.itervalues():
+                for connection, _ in idle_connections:
+                    connection.close()
+            self.idle_connections.clear()
+            self.idle_count = 0
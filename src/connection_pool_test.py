@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for connection pool.
+
+Author: weileizhe
+Date: 2015/01/12 00:00:06
+"""
+
+import BaseHTTPServer
+import SocketServer
+import threading
+import time
+import unittest
+
+
+import connection_pool
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serve HTTP/1.1 keep-alive responses.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """ Handle GET request.
+        """
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/page')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/close':
+            body = 'closed'
+            self.close_connection = 1
+        elif self.path == '/large':
+            body = 'x' * (connection_pool.DRAIN_LIMIT + 1)
+        else:
+            body = 'page %s' % self.path
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """ Keep test output quiet.
+        """
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ Threading http server for test.
+    """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        """ Ignore connections reset by the pool.
+        """
+        pass
+
+
+class TestConnectionPool(unittest.TestCase):
+    """ Test for ConnectionPool.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.pool = connection_pool.ConnectionPool(max_per_host=2, max_idle=4, idle_timeout=30)
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuse_connection(self):
+        """ Test the connection is reused after the body is read.
+        """
+        for i in xrange(3):
+            response = self.pool.urlopen(self.base_url + '/page%d' % i, 5)
+            self.assertEqual(response.getcode(), 200)
+            self.assertEqual(response.info().gettype(), 'text/plain')
+            self.assertEqual(response.read(), 'page /page%d' % i)
+        stats = self.pool.stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['connections_created'], 1)
+        self.assertEqual(stats['connections_reused'], 2)
+        self.assertEqual(stats['idle_connections'], 1)
+
+    def test_release_unread_response(self):
+        """ Test a small unread body is drained and a large one drops the connection.
+        """
+        self.pool.urlopen(self.base_url + '/page', 5).release()
+        self.assertEqual(self.pool.stats()['idle_connections'], 1)
+        self.pool.urlopen(self.base_url + '/large', 5).close()
+        self.assertEqual(self.pool.stats()['idle_connections'], 0)
+
+    def test_follow_redirect(self):
+        """ Test redirects are followed on the same connection.
+        """
+        response = self.pool.urlopen(self.base_url + '/redirect', 5)
+        self.assertEqual(response.geturl(), self.base_url + '/page')
+        self.assertEqual(response.read(), 'page /page')
+        self.assertEqual(self.pool.stats()['connections_created'], 1)
+
+    def test_retry_closed_connection(self):
+        """ Test a reused connection closed by the server is retried on a new one.
+        """
+        response = self.pool.urlopen(self.base_url + '/close', 5)
+        self.assertEqual(response.read(), 'closed')
+        self.assertEqual(self.pool.urlopen(self.base_url + '/page', 5).read(), 'page /page')
+        self.assertEqual(self.pool.stats()['connections_created'], 2)
+
+    def test_max_per_host(self):
+        """ Test no more than max_per_host connections of a key are in use.
+        """
+        key = ('http', '127.0.0.1', self.server.server_address[1])
+        first, _ = self.pool.acquire(key, 1)
+        self.pool.acquire(key, 1)
+        with self.assertRaises(connection_pool.PoolError):
+            self.pool.acquire(key, 0.01)
+        self.pool.release(key, first)
+        connection, reused = self.pool.acquire(key, 0.01)
+        self.assertTrue(reused)
+        self.assertTrue(connection is first)
+
+    def test_evict_idle_connections(self):
+        """ Test idle connections are evicted by max_idle and idle_timeout.
+        """
+        for i in xrange(6):
+            key = ('http', 'host%d' % i, 80)
+            connection, _ = self.pool.acquire(key, 1)
+            self.pool.release(key, connection)
+        self.assertEqual(self.pool.stats()['idle_connections'], 4)
+        self.assertEqual(self.pool.stats()['connections_evicted'], 2)
+
+        self.pool.idle_timeout = 0.01
+        time.sleep(0.02)
+        self.pool.acquire(('http', 'other', 80), 1)
+        self.assertEqual(self.pool.stats()['idle_connections'], 0)
+        self.assertEqual(self.pool.stats()['connections_evicted'], 6)
+
+    def test_unsupported_url(self):
+        """ Test grabing an unsupported url.
+        """
+        with self.assertRaises(connection_pool.PoolError):
+            self.pool.urlopen('ftp://example.com/', 5)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
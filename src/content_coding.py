@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the compression of webpages on the wire and at rest.
+
+The spider sends "Accept-Encoding: gzip, deflate", and decode_response wraps
+a gzip or deflate response in a DecodedResponse, which decodes the body as
+it is read, a buffer at a time, so the parser and the writer see the same
+bytes as before and max_body_size still bounds the decoded body.
+
+Text target webpages may be stored gzip compressed in the url layout, as
+output_directory/urllib2.quote(url) + '.gz'. read_webpage reads a stored
+webpage back whether it is compressed or not.
+
+Author: weileizhe
+Date: 2015/05/18 00:00:06
+"""
+
+import gzip
+import os
+import threading
+import urllib2
+import zlib
+
+
+ACCEPT_ENCODING = 'gzip, deflate'
+COMPRESSED_SUFFIX = '.gz'
+DEFAULT_COMPRESSION_LEVEL = 6
+DECODE_BUFFER_SIZE = 65536
+
+# The content types stored compressed besides text/*.
+TEXT_CONTENT_TYPES = frozenset([
+    'application/javascript', 'application/json', 'application/xml',
+    'application/xhtml+xml', 'application/rss+xml', 'application/atom+xml', 'image/svg+xml',
+])
+
+
+def is_text_content(content_type):
+    """
+    Judge if a webpage of content_type is text worth compressing.
+
+    Args:
+        content_type: The lower case content type without parameters.
+    """
+    return content_type.startswith('text/') or content_type in TEXT_CONTENT_TYPES
+
+
+def decode_response(response, stats=None, buffer_size=DECODE_BUFFER_SIZE):
+    """
+    Wrap response to decode its body if it is gzip or deflate encoded.
+
+    Args:
+        response: The response of urllib2.urlopen, or one acting like it.
+        stats: The CompressionStats counting the bytes saved, None not to count them.
+        buffer_size: The max encoded or decoded bytes handled at a time.
+
+    Returns:
+        A DecodedResponse, or response itself if it is not encoded.
+    """
+    encoding = response.info().getheader('content-encoding', '').strip().lower()
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        return DecodedResponse(response, encoding, stats, buffer_size)
+    return response
+
+
+class DecodedResponse(object):
+    """
+    A response decoding a gzip or deflate body as it is read, which acts like
+    the response of urllib2.urlopen.
+
+    A deflate body is zlib wrapped by the standard, but some servers send it
+    raw, so a body failing as zlib is decoded raw instead.
+
+    Attributes:
+        response: The encoded response.
+        encoding: The content encoding, gzip, x-gzip or deflate.
+        wire_bytes: The encoded bytes read so far.
+        decoded_bytes: The decoded bytes handed out so far.
+        stats: The CompressionStats told the bytes once the body is decoded
+               to the end, None not to tell it.
+    """
+
+    def __init__(self, response, encoding, stats=None, buffer_size=DECODE_BUFFER_SIZE):
+        """ Init the response.
+
+        Args:
+            response: The encoded response.
+            encoding: The content encoding, gzip, x-gzip or deflate.
+            stats: The CompressionStats counting the bytes saved, None not to count them.
+            buffer_size: The max encoded or decoded bytes handled at a time.
+        """
+        self.response = response
+        self.encoding = encoding
+        self.stats = stats
+        self.buffer_size = buffer_size
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.buffer = ''
+        self.decoded = False
+        self.eof = False
+        self.failed = False
+        self.reported = False
+        if encoding == 'deflate':
+            self.decoder = zlib.decompressobj()
+        else:
+            self.decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def getcode(self):
+        """
+        Get the http status code.
+        """
+        return self.response.getcode()
+
+    def geturl(self):
+        """
+        Get the url of the response.
+        """
+        return self.response.geturl()
+
+    def info(self):
+        """
+        Get the http headers, which still tell the content encoding.
+        """
+        return self.response.info()
+
+    def read(self, size=-1):
+        """
+        Read the decoded body.
+
+        Args:
+            size: The max bytes to read, a negative size or None to read all.
+
+        Raises:
+            zlib.error: The body is not validly encoded.
+        """
+        if size is None:
+            size = -1
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            self._decode_more()
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.decoded_bytes += len(data)
+        if self.eof and not self.buffer:
+            self._report()
+        return data
+
+    def _decode_more(self):
+        """
+        Decode at most buffer_size more bytes into the buffer.
+        """
+        chunk = self.decoder.unconsumed_tail
+        if not chunk:
+            chunk = self.response.read(self.buffer_size)
+            self.wire_bytes += len(chunk)
+            if not chunk:
+                self.buffer += self.decoder.flush()
+                self.eof = True
+                return
+        try:
+            try:
+                self.buffer += self.decoder.decompress(chunk, self.buffer_size)
+            except zlib.error:
+                if self.encoding != 'deflate' or self.decoded:
+                    raise
+                self.decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+                self.buffer += self.decoder.decompress(chunk, self.buffer_size)
+        except zlib.error:
+            self.failed = True
+            raise
+        self.decoded = True
+
+    def _report(self):
+        """
+        Tell stats the bytes transferred once the body is read or closed.
+
+        A body not read to the end or failing to decode is not told, as its
+        decoded bytes do not tell what the compression saved.
+        """
+        if self.stats is not None and not self.reported and self.eof and not self.failed:
+            self.stats.add_transfer(self.wire_bytes, self.decoded_bytes + len(self.buffer))
+        self.reported = True
+
+    def close(self):
+        """
+        Close the encoded response.
+        """
+        self._report()
+        if hasattr(self.response, 'close'):
+            self.response.close()
+
+
+class CompressionStats(object):
+    """
+    The bytes compression saved on the wire and on the disk, shared by the spiders.
+
+    Attributes:
+        wire_bytes: The encoded bytes grabed.
+        decoded_bytes: The bytes they decoded to.
+        stored_files: The webpages stored compressed.
+        raw_bytes: The bytes of the webpages stored compressed.
+        stored_bytes: The bytes they are stored in.
+        metrics: The crawl_metrics.CrawlMetrics counting the bytes saved, None not to.
+    """
+
+    def __init__(self, metrics=None):
+        """ Init the stats.
+
+        Args:
+            metrics: The crawl_metrics.CrawlMetrics counting the bytes saved, None not to.
+        """
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.stored_files = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.metrics = metrics
+        self.mutex = threading.Lock()
+
+    def add_transfer(self, wire_bytes, decoded_bytes):
+        """
+        Add an encoded body of wire_bytes grabed and decoded to decoded_bytes.
+        """
+        with self.mutex:
+            self.wire_bytes += wire_bytes
+            self.decoded_bytes += decoded_bytes
+        if self.metrics is not None and decoded_bytes > wire_bytes:
+            self.metrics.increment('compression_saved_bytes_total',
+                                   decoded_bytes - wire_bytes, 'wire')
+
+    def add_stored(self, raw_bytes, stored_bytes):
+        """
+        Add a webpage of raw_bytes stored compressed in stored_bytes.
+        """
+        with self.mutex:
+            self.stored_files += 1
+            self.raw_bytes += raw_bytes
+            self.stored_bytes += stored_bytes
+        if self.metrics is not None and raw_bytes > stored_bytes:
+            self.metrics.increment('compression_saved_bytes_total',
+                                   raw_bytes - stored_bytes, 'disk')
+
+    def wire_saved(self):
+        """
+        Get the bytes the content encoding saved on the wire.
+        """
+        return self.decoded_bytes - self.wire_bytes
+
+    def disk_saved(self):
+        """
+        Get the bytes the compression at rest saved on the disk.
+        """
+        return self.raw_bytes - self.stored_bytes
+
+
+def compress_chunks(chunks, stats=None, level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Compress the chunks of a webpage in the gzip format as they come.
+
+    Args:
+        chunks: The iterable of the webpage chunks.
+        stats: The CompressionStats counting the bytes saved, None not to count them.
+        level: The zlib compression level from 1 to 9.
+
+    Yields:
+        The gzip compressed chunks.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    raw_bytes = stored_bytes = 0
+    for chunk in chunks:
+        raw_bytes += len(chunk)
+        data = compressor.compress(chunk)
+        if data:
+            stored_bytes += len(data)
+            yield data
+    data = compressor.flush()
+    stored_bytes += len(data)
+    yield data
+    if stats is not None:
+        stats.add_stored(raw_bytes, stored_bytes)
+
+
+def webpage_paths(output_directory, url):
+    """
+    Get the paths a webpage of url is stored at in the url layout.
+
+    Returns:
+        A (path, compressed_path) tuple.
+    """
+    path = os.path.join(output_directory, urllib2.quote(url, ''))
+    return path, path + COMPRESSED_SUFFIX
+
+
+def read_webpage(output_directory, url):
+    """
+    Read a webpage stored in the url layout, compressed or not.
+
+    Args:
+        output_directory: The output directory of the target webpages.
+        url: The target url.
+
+    Returns:
+        The webpage body.
+
+    Raises:
+        IOError: The webpage is not stored.
+    """
+    path, compressed_path = webpage_paths(output_directory, url)
+    if os.path.exists(compressed_path):
+        with gzip.open(compressed_path, 'rb') as webpage_file:
+            return webpage_file.read()
+    with open(path, 'rb') as webpage_file:
+        return webpage_file.read()
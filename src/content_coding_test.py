@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for content coding.
+
+Author: weileizhe
+Date: 2015/05/18 00:00:06
+"""
+
+import gzip
+import httplib
+import os
+import Queue
+import shutil
+import StringIO
+import threading
+import unittest
+import zlib
+
+
+import httpretty
+
+import content_coding
+import event_spider
+import frontier
+import mini_spider
+import seen_store
+
+
+def gzip_body(body):
+    """
+    Compress body in the gzip format.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def raw_deflate_body(body):
+    """
+    Compress body in the raw deflate format without the zlib wrapper.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def encoded_response(body, encoding):
+    """
+    Create an EventResponse of body in the content encoding.
+    """
+    headers = httplib.HTTPMessage(StringIO.StringIO(
+        'Content-Type: text/html\r\nContent-Encoding: %s\r\n\r\n' % encoding))
+    return event_spider.EventResponse('http://a.com/', 200, headers, body)
+
+
+class TestDecodedResponse(unittest.TestCase):
+    """ Test for DecodedResponse.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.body = ''.join('<a href="/page%d">page %d</a>\n' % (i, i) for i in xrange(2000))
+
+    def test_decode(self):
+        """ Test gzip, zlib deflate and raw deflate bodies are decoded.
+        """
+        for body, encoding in ((gzip_body(self.body), 'gzip'),
+                               (zlib.compress(self.body), 'deflate'),
+                               (raw_deflate_body(self.body), 'deflate')):
+            response = content_coding.decode_response(encoded_response(body, encoding))
+            self.assertIsInstance(response, content_coding.DecodedResponse)
+            self.assertEqual(response.read(), self.body)
+            self.assertEqual(response.read(), '')
+            self.assertEqual(response.wire_bytes, len(body))
+
+    def test_read_incrementally(self):
+        """ Test the body is decoded a buffer at a time as it is read.
+        """
+        stats = content_coding.CompressionStats()
+        response = content_coding.decode_response(
+            encoded_response(gzip_body(self.body), 'gzip'), stats, 100)
+        chunks = []
+        chunk = response.read(1000)
+        self.assertLess(response.wire_bytes, len(gzip_body(self.body)))
+        while chunk:
+            self.assertLessEqual(len(chunk), 1000)
+            chunks.append(chunk)
+            chunk = response.read(1000)
+        self.assertEqual(''.join(chunks), self.body)
+        self.assertEqual(stats.decoded_bytes, len(self.body))
+        self.assertEqual(stats.wire_saved(), len(self.body) - len(gzip_body(self.body)))
+
+    def test_not_encoded(self):
+        """ Test a response not encoded is not wrapped.
+        """
+        response = encoded_response(self.body, 'identity')
+        self.assertIs(content_coding.decode_response(response), response)
+
+    def test_invalid_body(self):
+        """ Test an invalid body raises zlib.error.
+        """
+        response = content_coding.decode_response(encoded_response('not gzip', 'gzip'))
+        self.assertRaises(zlib.error, response.read)
+
+    def test_report_decoded_to_end(self):
+        """ Test only a body decoded to the end is told to the stats.
+        """
+        stats = content_coding.CompressionStats()
+        response = content_coding.decode_response(encoded_response('not gzip', 'gzip'), stats)
+        self.assertRaises(zlib.error, response.read)
+        response.close()
+        response = content_coding.decode_response(
+            encoded_response(gzip_body(self.body), 'gzip'), stats, 100)
+        response.read(1000)
+        response.close()
+        self.assertEqual((stats.wire_bytes, stats.decoded_bytes), (0, 0))
+        response = content_coding.decode_response(
+            encoded_response(gzip_body(self.body), 'gzip'), stats)
+        response.close()
+        self.assertEqual((stats.wire_bytes, stats.decoded_bytes), (0, 0))
+        response = content_coding.decode_response(
+            encoded_response(gzip_body(self.body), 'gzip'), stats)
+        self.assertEqual(response.read(), self.body)
+        response.close()
+        self.assertEqual(stats.decoded_bytes, len(self.body))
+
+
+class TestStoredCompression(unittest.TestCase):
+    """ Test the text webpages stored compressed.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        httpretty.enable()
+        self.body = 'body { color: red; }\n' * 1000
+        httpretty.register_uri(httpretty.GET, 'http://a.com/style.css', body=gzip_body(self.body),
+                               content_type='text/css', adding_headers={'Content-Encoding': 'gzip'})
+        httpretty.register_uri(httpretty.GET, 'http://a.com/logo.png', body='\x89PNG' * 100,
+                               content_type='image/png')
+        for url, content_type in (('http://a.com/corrupt.css', 'text/css'),
+                                  ('http://a.com/corrupt.html', 'text/html')):
+            httpretty.register_uri(httpretty.GET, url, body='not gzip', content_type=content_type,
+                                   adding_headers={'Content-Encoding': 'gzip'})
+        self.output_directory = './output_compression'
+        self.stats = content_coding.CompressionStats()
+        self.spider = mini_spider.MiniSpider(Queue.Queue(), seen_store.SetSeenStore(), 1, 0, 5,
+                                             '.*\.(css|png)$', self.output_directory,
+                                             compress_stored_text=True,
+                                             compression_stats=self.stats)
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        httpretty.disable()
+        httpretty.reset()
+        shutil.rmtree(self.output_directory, True)
+
+    def test_stored_compressed(self):
+        """ Test a gzip text webpage is decoded and stored compressed, and read back.
+        """
+        url = 'http://a.com/style.css'
+        self.spider.crawl_job(mini_spider.Url(url), Queue.Queue(), set())
+        self.assertEqual(httpretty.last_request().headers['Accept-Encoding'],
+                         content_coding.ACCEPT_ENCODING)
+        path, compressed_path = content_coding.webpage_paths(self.output_directory, url)
+        self.assertFalse(os.path.exists(path))
+        with gzip.open(compressed_path, 'rb') as webpage_file:
+            self.assertEqual(webpage_file.read(), self.body)
+        self.assertEqual(content_coding.read_webpage(self.output_directory, url), self.body)
+        self.assertGreater(self.stats.wire_saved(), 0)
+        self.assertEqual(self.stats.stored_files, 1)
+        self.assertEqual(self.stats.raw_bytes, len(self.body))
+        self.assertEqual(self.stats.disk_saved(),
+                         len(self.body) - os.path.getsize(compressed_path))
+        self.assertTrue(self.spider._webpage_saved(url))
+
+    def test_binary_stored_raw(self):
+        """ Test a binary webpage is stored as it is.
+        """
+        url = 'http://a.com/logo.png'
+        self.spider.crawl_job(mini_spider.Url(url), Queue.Queue(), set())
+        path, compressed_path = content_coding.webpage_paths(self.output_directory, url)
+        self.assertFalse(os.path.exists(compressed_path))
+        self.assertEqual(content_coding.read_webpage(self.output_directory, url), '\x89PNG' * 100)
+        self.assertEqual(self.stats.stored_files, 0)
+
+    def test_corrupt_body(self):
+        """ Test a corrupt gzip body raises DownloadException and stores nothing.
+        """
+        for url in ('http://a.com/corrupt.css', 'http://a.com/corrupt.html'):
+            self.assertRaises(mini_spider.DownloadException, self.spider.crawl_job,
+                              mini_spider.Url(url), Queue.Queue(), set())
+            self.assertRaises(IOError, content_coding.read_webpage, self.output_directory, url)
+        self.assertEqual(self.stats.wire_bytes, 0)
+
+    def test_corrupt_body_in_thread(self):
+        """ Test a corrupt gzip body does not stop the crawl thread or wedge join().
+        """
+        url_queue = frontier.HostFrontier(0)
+        spider_thread = mini_spider.MiniSpiderThread(url_queue, seen_store.SetSeenStore(), 1, 0,
+                                                     1, '.*\.css$', self.output_directory)
+        spider_thread.setDaemon(True)
+        spider_thread.start()
+        url_queue.put(mini_spider.Url('http://a.com/corrupt.css'))
+        url_queue.put(mini_spider.Url('http://a.com/style.css'))
+        join_thread = threading.Thread(target=url_queue.join)
+        join_thread.setDaemon(True)
+        join_thread.start()
+        join_thread.join(5)
+        self.assertFalse(join_thread.is_alive())
+        self.assertTrue(spider_thread.is_alive())
+        url_queue.close()
+        spider_thread.join(5)
+        self.assertEqual(content_coding.read_webpage(self.output_directory,
+                                                     'http://a.com/style.css'), self.body)
+
+    def test_read_missing_webpage(self):
+        """ Test reading a webpage not stored raises IOError.
+        """
+        self.assertRaises(IOError, content_coding.read_webpage, self.output_directory,
+                          'http://a.com/missing.css')
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module benchmarks the crawl engines of mini spider against a local
+synthetic web site, so throughput can be compared between versions.
+
+The site is a tree of depth levels spread over hosts local servers, told
+apart by their ports. Every webpage has fan_out link slots, each one an
+image with the probability image_ratio or a webpage of the next level
+otherwise, and links back to its parent and the root to exercise the dedup.
+Webpages are padded to page_size bytes, every response is delayed latency
+seconds and error_rate of the urls answer 503. The site is generated from
+seed, so the same arguments serve the same site.
+
+The site is served from a child process, and each engine crawls it with
+run_spider in its own child process with the options of the configuration,
+writing the crawl metrics to a temp stats file. The pages per second, the
+p50 and p99 fetch latency, the peak RSS and the CPU seconds of every crawl
+are printed and written as json to the output file.
+
+Usage: python crawl_benchmark.py [-c spider.conf] [-e thread -e event] [-o crawl_benchmark.json]
+                                 [--fan-out 8] [--depth 3] [--hosts 4] [--page-size 16384]
+                                 [--image-ratio 0.25] [--latency 0.005] [--error-rate 0.01]
+
+Author: weileizhe
+Date: 2015/04/06 00:00:06
+"""
+
+import argparse
+import BaseHTTPServer
+import ConfigParser
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import Queue
+import resource
+import shutil
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+
+import mini_spider
+
+
+WORDS = ('spider', 'crawl', 'page', 'link', 'news', 'market', 'weather', 'sport',
+         'science', 'travel', 'music', 'health', 'today', 'report', 'city', 'world')
+
+TARGET_URL = r'.*\.png$'
+
+
+def site_fraction(seed, *keys):
+    """
+    Get a fraction in [0, 1) fixed by seed and keys, the same in every process.
+    """
+    digest = hashlib.md5('/'.join(str(key) for key in (seed,) + keys)).hexdigest()
+    return int(digest[:13], 16) / float(1 << 52)
+
+
+class SyntheticSite(object):
+    """
+    A generated site graph.
+
+    Attributes:
+        fan_out: The link slots of a webpage.
+        depth: The levels below the root webpage.
+        hosts: The host count.
+        page_size: The bytes of a webpage.
+        image_ratio: The probability of a link slot to be an image.
+        latency: The seconds every response is delayed.
+        error_rate: The probability of a url to answer 503.
+        seed: The seed the site is generated from.
+        ports: The ports of the hosts, set when the site is served.
+    """
+
+    def __init__(self, fan_out, depth, hosts, page_size, image_ratio, latency, error_rate,
+                 seed=0):
+        """ Init the site.
+
+        Args:
+            fan_out: The link slots of a webpage.
+            depth: The levels below the root webpage.
+            hosts: The host count.
+            page_size: The bytes of a webpage.
+            image_ratio: The probability of a link slot to be an image.
+            latency: The seconds every response is delayed.
+            error_rate: The probability of a url to answer 503.
+            seed: The seed the site is generated from.
+        """
+        self.fan_out = fan_out
+        self.depth = depth
+        self.hosts = hosts
+        self.page_size = page_size
+        self.image_ratio = image_ratio
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.ports = []
+
+    def parameters(self):
+        """
+        Get the arguments the site is generated from.
+        """
+        return dict((name, getattr(self, name)) for name in (
+            'fan_out', 'depth', 'hosts', 'page_size', 'image_ratio', 'latency', 'error_rate',
+            'seed'))
+
+    def page_url(self, page_id):
+        """
+        Get the url of a webpage, on host page_id % hosts.
+        """
+        return 'http://127.0.0.1:%d/page/%d.html' % (self.ports[page_id % self.hosts], page_id)
+
+    def image_path(self, page_id, slot):
+        """
+        Get the path of the image in a link slot of a webpage.
+        """
+        return '/image/%d-%d.png' % (page_id, slot)
+
+    def is_image(self, page_id, slot):
+        """
+        Judge if a link slot of a webpage is an image.
+        """
+        return site_fraction(self.seed, 'image', page_id, slot) < self.image_ratio
+
+    def is_error(self, path):
+        """
+        Judge if the url of path answers 503, never for the root webpage.
+        """
+        return path != '/page/0.html' and site_fraction(self.seed, 'error', path) < self.error_rate
+
+    def iterate_children(self, page_id, level):
+        """
+        Iterate the (slot, child_page_id) of the link slots of a webpage at
+        level, child_page_id is None for an image.
+        """
+        for slot in xrange(self.fan_out):
+            if self.is_image(page_id, slot):
+                yield slot, None
+            elif level < self.depth:
+                yield slot, page_id * self.fan_out + slot + 1
+
+    def page_level(self, page_id):
+        """
+        Get the level of a webpage in the tree.
+        """
+        level = 0
+        while page_id:
+            page_id = (page_id - 1) // self.fan_out
+            level += 1
+        return level
+
+    def render_page(self, page_id):
+        """
+        Render a webpage padded to page_size bytes.
+        """
+        parts = ['<!DOCTYPE html>\n<html><head><title>page %d</title></head><body>\n' % page_id]
+        for slot, child_id in self.iterate_children(page_id, self.page_level(page_id)):
+            if child_id is None:
+                parts.append('<img src="%s" alt="image">\n' % self.image_path(page_id, slot))
+            else:
+                parts.append('<a href="%s">page %d</a>\n' % (self.page_url(child_id), child_id))
+        parts.append('<a href="%s">home</a>\n' % self.page_url(0))
+        if page_id:
+            parts.append('<a href="%s">up</a>\n' % self.page_url((page_id - 1) // self.fan_out))
+        size = sum(len(part) for part in parts)
+        word_index = page_id
+        parts.append('<p>')
+        while size < self.page_size - len('</p></body></html>\n'):
+            word = WORDS[word_index % len(WORDS)] + ' '
+            word_index += 1
+            parts.append(word)
+            size += len(word)
+        parts.append('</p></body></html>\n')
+        return ''.join(parts)
+
+    def count_urls(self):
+        """
+        Count the webpages and images a crawl of the whole site grabs.
+
+        Returns:
+            A (pages, images, errors) tuple, errors of them answer 503 and
+            the links of an error webpage are not counted.
+        """
+        pages = images = errors = 0
+        stack = [(0, 0)]
+        while stack:
+            page_id, level = stack.pop()
+            pages += 1
+            if self.is_error('/page/%d.html' % page_id):
+                errors += 1
+                continue
+            for slot, child_id in self.iterate_children(page_id, level):
+                if child_id is not None:
+                    stack.append((child_id, level + 1))
+                    continue
+                images += 1
+                if self.is_error(self.image_path(page_id, slot)):
+                    errors += 1
+        return pages, images, errors
+
+
+class SiteRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serve the webpages and images of server.site with keep-alive.
+
+    The response is buffered and sent at once, or the delayed ack of the
+    headers alone would add tens of milliseconds to every keep-alive fetch.
+    """
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def do_GET(self):
+        """
+        Handle GET request.
+        """
+        site = self.server.site
+        if site.latency:
+            time.sleep(site.latency)
+        path = self.path.split('?', 1)[0]
+        if site.is_error(path):
+            self._send(503, 'text/plain', 'injected error')
+            return
+        name, _, extension = path.rpartition('.')
+        try:
+            if path.startswith('/page/') and extension == 'html':
+                self._send(200, 'text/html', site.render_page(int(name[len('/page/'):])))
+            elif path.startswith('/image/') and extension == 'png':
+                self._send(200, 'image/png', '\x89PNG' + '\0' * (site.page_size // 4))
+            else:
+                self._send(404, 'text/plain', 'not found')
+        except ValueError:
+            self._send(404, 'text/plain', 'not found')
+
+    def _send(self, code, content_type, body):
+        """
+        Send a response with Content-Length, keeping the connection open.
+        """
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """
+        Keep the benchmark output quiet.
+        """
+        pass
+
+
+class SiteServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The server of one host of the synthetic site.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, site):
+        """ Init the server on a free port of 127.0.0.1.
+
+        Args:
+            site: The SyntheticSite to serve.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), SiteRequestHandler)
+        self.site = site
+
+
+def serve_site(site, port_queue, stop_event):
+    """
+    Serve every host of the site until stop_event is set, in a child process.
+
+    Args:
+        site: The SyntheticSite to serve.
+        port_queue: The multiprocessing.Queue receiving the list of ports.
+        stop_event: The multiprocessing.Event stopping the servers.
+    """
+    servers = [SiteServer(site) for i in xrange(site.hosts)]
+    site.ports = [server.server_address[1] for server in servers]
+    for server in servers:
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.setDaemon(True)
+        server_thread.start()
+    port_queue.put(site.ports)
+    stop_event.wait()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmark_engine(configuration, engine, result_queue):
+    """
+    Crawl the site with one engine and put its result to result_queue, in a
+    child process so its peak RSS and CPU time are its own.
+
+    Args:
+        configuration: The configuration of mini spider set for the site.
+        engine: The crawl engine name.
+        result_queue: The multiprocessing.Queue receiving the result dict.
+    """
+    configuration.set('spider', 'engine', engine)
+    start_time = time.time()
+    mini_spider.run_spider(configuration)
+    elapsed = time.time() - start_time
+
+    with open(configuration.get('spider', 'metrics_path')) as stats_file:
+        stats = json.load(stats_file)
+    counters = stats['counters']
+    pages = sum(counters.get('pages_total', {}).values())
+    errors = sum(counters.get('errors_total', {}).values())
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result_queue.put({
+        'engine': engine,
+        'pages': pages,
+        'errors': errors,
+        'bytes': sum(counters.get('bytes_total', {}).values()),
+        'seconds': elapsed,
+        'pages_per_second': pages / max(elapsed, 1e-6),
+        'fetch_p50': stats['histograms']['fetch']['p50'],
+        'fetch_p99': stats['histograms']['fetch']['p99'],
+        'peak_rss_kb': usage.ru_maxrss,
+        'cpu_seconds': (usage.ru_utime + usage.ru_stime +
+                        children_usage.ru_utime + children_usage.ru_stime),
+    })
+
+
+def wait_result(process, result_queue):
+    """
+    Wait for the result of a benchmark process.
+
+    Returns:
+        The result dict, None if the process exited without one.
+    """
+    while True:
+        try:
+            result = result_queue.get(timeout=1)
+        except Queue.Empty:
+            if not process.is_alive():
+                return None
+            continue
+        process.join()
+        return result
+
+
+def configure_run(configuration_file_name, site, run_directory, crawl_interval):
+    """
+    Write the configuration of a run, pointed at the served site and the run directory.
+
+    Args:
+        configuration_file_name: The configuration file of mini spider to start from.
+        site: The served SyntheticSite.
+        run_directory: The temp directory of the run.
+        crawl_interval: The crawl interval per host.
+
+    Returns:
+        The parsed configuration of the run.
+
+    Raises:
+        ConfigurationException: The configuration is invalid.
+    """
+    url_list_file = os.path.join(run_directory, 'urls')
+    with open(url_list_file, 'w') as url_lines:
+        url_lines.write(site.page_url(0) + '\n')
+
+    configuration = ConfigParser.RawConfigParser()
+    configuration.read(configuration_file_name)
+    if not configuration.has_section('spider'):
+        configuration.add_section('spider')
+    overrides = {
+        'url_list_file': url_list_file,
+        'output_directory': os.path.join(run_directory, 'output'),
+        'max_depth': str(site.depth + 1),
+        'crawl_interval': str(crawl_interval),
+        'host_crawl_intervals': '',
+        'target_url': TARGET_URL,
+        'seen_store_path': os.path.join(run_directory, 'seen.db'),
+        'cluster_nodes': '',
+        'metrics_path': os.path.join(run_directory, 'stats.json'),
+        'metrics_interval': '3600',
+        'metrics_port': '0',
+    }
+    for option, file_name in (('checkpoint_path', 'checkpoint.db'),
+                              ('page_metadata_path', 'page_metadata.db'),
+                              ('frontier_spill_directory', '')):
+        if configuration.has_option('spider', option) and configuration.get('spider', option):
+            overrides[option] = os.path.join(run_directory, file_name)
+    for option, value in overrides.iteritems():
+        configuration.set('spider', option, value)
+
+    run_configuration_file_name = os.path.join(run_directory, 'spider.conf')
+    with open(run_configuration_file_name, 'w') as configuration_file:
+        configuration.write(configuration_file)
+    return mini_spider.parse_configuration(run_configuration_file_name)
+
+
+def main():
+    """
+    Main function entrance.
+    """
+    argument_parser = argparse.ArgumentParser(
+        description='Benchmark mini spider engines against a synthetic site.')
+    argument_parser.add_argument('-c', '--conf',
+                                 default="spider.conf",
+                                 help='confiuration file path(default is "spider.conf")')
+    argument_parser.add_argument('-e', '--engine',
+                                 action='append',
+                                 choices=mini_spider.CRAWL_ENGINES,
+                                 help='engine to benchmark(default is all engines)')
+    argument_parser.add_argument('-o', '--output', default='crawl_benchmark.json',
+                                 help='json result file(default is crawl_benchmark.json)')
+    argument_parser.add_argument('-r', '--rounds', type=int, default=1,
+                                 help='crawls per engine(default is 1)')
+    argument_parser.add_argument('--fan-out', type=int, default=8,
+                                 help='link slots per webpage(default is 8)')
+    argument_parser.add_argument('--depth', type=int, default=3,
+                                 help='levels below the root webpage(default is 3)')
+    argument_parser.add_argument('--hosts', type=int, default=4,
+                                 help='hosts of the site(default is 4)')
+    argument_parser.add_argument('--page-size', type=int, default=16384,
+                                 help='bytes per webpage(default is 16384)')
+    argument_parser.add_argument('--image-ratio', type=float, default=0.25,
+                                 help='probability of a link to be an image(default is 0.25)')
+    argument_parser.add_argument('--latency', type=float, default=0.005,
+                                 help='seconds every response is delayed(default is 0.005)')
+    argument_parser.add_argument('--error-rate', type=float, default=0.01,
+                                 help='probability of a url to answer 503(default is 0.01)')
+    argument_parser.add_argument('--seed', type=int, default=0,
+                                 help='seed the site is generated from(default is 0)')
+    argument_parser.add_argument('--crawl-interval', type=float, default=0.001,
+                                 help='crawl interval per host(default is 0.001)')
+    arguments = argument_parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    if not os.path.exists(arguments.conf):
+        logging.error('Configuration file %s not found!', arguments.conf)
+        return -1
+
+    site = SyntheticSite(arguments.fan_out, arguments.depth, arguments.hosts,
+                         arguments.page_size, arguments.image_ratio, arguments.latency,
+                         arguments.error_rate, arguments.seed)
+    pages, images, errors = site.count_urls()
+    sys.stdout.write('site: %d webpages, %d images, %d errors on %d hosts\n'
+                     % (pages, images, errors, site.hosts))
+
+    port_queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    server_process = multiprocessing.Process(target=serve_site,
+                                             args=(site, port_queue, stop_event))
+    server_process.start()
+    site.ports = port_queue.get()
+
+    sys.stdout.write('%-8s %8s %8s %10s %10s %10s %10s %10s %10s\n'
+                     % ('engine', 'pages', 'errors', 'seconds', 'pages/s', 'p50 ms', 'p99 ms',
+                        'peak KB', 'cpu s'))
+    results = []
+    result_queue = multiprocessing.Queue()
+    try:
+        for engine in arguments.engine or mini_spider.CRAWL_ENGINES:
+            for round_index in xrange(arguments.rounds):
+                run_directory = tempfile.mkdtemp(prefix='crawl_benchmark_')
+                try:
+                    configuration = configure_run(arguments.conf, site, run_directory,
+                                                  arguments.crawl_interval)
+                    process = multiprocessing.Process(target=benchmark_engine,
+                                                      args=(configuration, engine, result_queue))
+                    process.start()
+                    result = wait_result(process, result_queue)
+                finally:
+                    shutil.rmtree(run_directory)
+                if result is None:
+                    logging.error('Engine %s exited with code %s', engine, process.exitcode)
+                    return -1
+                result['round'] = round_index
+                results.append(result)
+                sys.stdout.write('%-8s %8d %8d %10.2f %10.2f %10.1f %10.1f %10d %10.2f\n'
+                                 % (engine, result['pages'], result['errors'],
+                                    result['seconds'], result['pages_per_second'],
+                                    (result['fetch_p50'] or 0) * 1000,
+                                    (result['fetch_p99'] or 0) * 1000,
+                                    result['peak_rss_kb'], result['cpu_seconds']))
+    except mini_spider.ConfigurationException as ex:
+        logging.error(str(ex))
+        return -1
+    finally:
+        stop_event.set()
+        server_process.join()
+
+    with open(arguments.output, 'w') as output_file:
+        json.dump({
+            'time': time.time(),
+            'python': platform.python_version(),
+            'configuration': arguments.conf,
+            'crawl_interval': arguments.crawl_interval,
+            'site': dict(site.parameters(), pages=pages, images=images, errors=errors),
+            'results': results,
+        }, output_file, indent=2, sort_keys=True)
+    sys.stdout.write('results written to %s\n' % arguments.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
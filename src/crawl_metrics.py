@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the live metrics of a crawl, to tell which stage a slow
+crawl is bound by.
+
+The stages timed in latency histograms are:
+
+    dns: Resolving a host, by the event engine.
+    connect: Opening a new keep-alive connection, with its dns lookup.
+    fetch: Sending a request until the response headers, or the whole
+           response in the event engine.
+    transfer: Reading a response body.
+    parse: Extracting and joining the links of a webpage.
+    store: Writing a target webpage, not counting its transfer.
+
+The counters are the pages and body bytes grabed and the errors by class,
+and the gauges are the queue depth and the in-flight requests per host.
+
+A MetricsReporter writes a json stats file every interval seconds, with the
+pages and bytes per second since the last write and the p50 and p99 of every
+stage. A MetricsServer serves the metrics in the Prometheus text format on
+http://127.0.0.1:<port>/metrics.
+
+Author: weileizhe
+Date: 2015/03/30 00:00:06
+"""
+
+import bisect
+import BaseHTTPServer
+import collections
+import json
+import logging
+import os
+import SocketServer
+import threading
+import time
+
+
+STAGES = ('dns', 'connect', 'fetch', 'transfer', 'parse', 'store')
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                           1, 2.5, 5, 10, 30)
+
+METRIC_PREFIX = 'mini_spider_'
+
+
+class Histogram(object):
+    """
+    A histogram of latencies in fixed buckets.
+
+    Attributes:
+        buckets: The upper bounds of the buckets, the last one is +Inf.
+        counts: The observations per bucket, not cumulative.
+        count: The observations.
+        sum: The sum of the observations.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """ Init the histogram.
+
+        Args:
+            buckets: The sorted upper bounds of the buckets but +Inf.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Add an observation, the caller holds the lock of the metrics.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate the q quantile as the upper bound of its bucket.
+
+        Returns:
+            The upper bound, the last bound for the +Inf bucket, None if empty.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+class CrawlMetrics(object):
+    """
+    The counters, histograms and gauges of a crawl, shared by every thread.
+
+    Every update takes one lock for a few additions, so the metrics are cheap
+    enough to keep on in every crawl.
+
+    Attributes:
+        start_time: The time the metrics started.
+        counters: A Counter of (name, label) to value.
+        histograms: A dict from stage to its Histogram.
+        in_flight: A Counter of host to its in-flight requests.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """ Init the metrics.
+
+        Args:
+            buckets: The upper bounds of the latency buckets in seconds.
+        """
+        self.start_time = time.time()
+        self.counters = collections.Counter()
+        self.histograms = dict((stage, Histogram(buckets)) for stage in STAGES)
+        self.in_flight = collections.Counter()
+        self.gauges = {}
+        self.mutex = threading.Lock()
+
+    def increment(self, name, amount=1, label=''):
+        """
+        Add amount to the counter name of label.
+        """
+        with self.mutex:
+            self.counters[name, label] += amount
+
+    def observe(self, stage, seconds):
+        """
+        Add a latency of stage.
+        """
+        with self.mutex:
+            self.histograms[stage].observe(seconds)
+
+    def begin_request(self, host):
+        """
+        Count a request to host in flight.
+        """
+        with self.mutex:
+            self.in_flight[host] += 1
+
+    def end_request(self, host):
+        """
+        Count a request to host finished.
+        """
+        with self.mutex:
+            self.in_flight[host] -= 1
+            if self.in_flight[host] <= 0:
+                del self.in_flight[host]
+
+    def register_gauge(self, name, function):
+        """
+        Sample function() as the gauge name whenever the metrics are read.
+        """
+        with self.mutex:
+            self.gauges[name] = function
+
+    def snapshot(self):
+        """
+        Get the current metrics.
+
+        Returns:
+            A dict of elapsed seconds, counters by name and label, gauges,
+            in-flight requests by host and the histograms by stage.
+        """
+        with self.mutex:
+            counters = {}
+            for (name, label), value in self.counters.iteritems():
+                counters.setdefault(name, {})[label] = value
+            histograms = {}
+            for stage, histogram in self.histograms.iteritems():
+                histograms[stage] = {
+                    'buckets': list(histogram.buckets),
+                    'counts': list(histogram.counts),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'p50': histogram.quantile(0.5),
+                    'p99': histogram.quantile(0.99),
+                }
+            gauges = self.gauges.items()
+            in_flight = dict(self.in_flight)
+        return {
+            'elapsed': time.time() - self.start_time,
+            'counters': counters,
+            'gauges': dict((name, function()) for name, function in gauges),
+            'in_flight': in_flight,
+            'histograms': histograms,
+        }
+
+    def render_prometheus(self):
+        """
+        Get the metrics in the Prometheus text format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted(snapshot['counters']):
+            metric = METRIC_PREFIX + name
+            lines.append('# TYPE %s counter' % metric)
+            for label, value in sorted(snapshot['counters'][name].iteritems()):
+                labels = '{class="%s"}' % escape_label(label) if label else ''
+                lines.append('%s%s %s' % (metric, labels, value))
+        for name in sorted(snapshot['gauges']):
+            metric = METRIC_PREFIX + name
+            lines.append('# TYPE %s gauge' % metric)
+            lines.append('%s %s' % (metric, snapshot['gauges'][name]))
+        metric = METRIC_PREFIX + 'in_flight_requests'
+        lines.append('# TYPE %s gauge' % metric)
+        for host, value in sorted(snapshot['in_flight'].iteritems()):
+            lines.append('%s{host="%s"} %d' % (metric, escape_label(host), value))
+        metric = METRIC_PREFIX + 'stage_seconds'
+        lines.append('# TYPE %s histogram' % metric)
+        for stage in STAGES:
+            histogram = snapshot['histograms'][stage]
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'] + ['+Inf'], histogram['counts']):
+                cumulative += count
+                lines.append('%s_bucket{stage="%s",le="%s"} %d' % (metric, stage, bound,
+                                                                   cumulative))
+            lines.append('%s_sum{stage="%s"} %s' % (metric, stage, repr(histogram['sum'])))
+            lines.append('%s_count{stage="%s"} %d' % (metric, stage, histogram['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    """
+    Escape a Prometheus label value.
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsReporter(object):
+    """
+    Write the metrics to a json stats file every interval seconds and on stop().
+    """
+
+    def __init__(self, metrics, path, interval):
+        """ Init the reporter.
+
+        Args:
+            metrics: The CrawlMetrics to report.
+            path: The stats file path.
+            interval: The seconds between two writes.
+        """
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.last_time = metrics.start_time
+        self.last_pages = 0
+        self.last_bytes = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Start writing periodically.
+        """
+        self.thread = threading.Thread(target=self._write_periodically)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _write_periodically(self):
+        """
+        Write the stats file every interval seconds until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except (IOError, OSError) as error:
+                logging.warn('Write stats file %s failed due to %s', self.path, str(error))
+
+    def write(self):
+        """
+        Write the stats file, replacing the old one at once.
+        """
+        now = time.time()
+        snapshot = self.metrics.snapshot()
+        pages = sum(snapshot['counters'].get('pages_total', {}).values())
+        body_bytes = sum(snapshot['counters'].get('bytes_total', {}).values())
+        errors = sum(snapshot['counters'].get('errors_total', {}).values())
+        elapsed = max(now - self.last_time, 1e-6)
+        snapshot['pages_per_second'] = (pages - self.last_pages) / elapsed
+        snapshot['bytes_per_second'] = (body_bytes - self.last_bytes) / elapsed
+        snapshot['error_rate'] = float(errors) / (pages + errors) if pages + errors else 0.0
+        self.last_time, self.last_pages, self.last_bytes = now, pages, body_bytes
+
+        temp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(temp_path, 'w') as stats_file:
+            json.dump(snapshot, stats_file, indent=2, sort_keys=True)
+        os.rename(temp_path, self.path)
+
+    def stop(self):
+        """
+        Stop writing periodically and write the final stats.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
+
+
+class MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serve the metrics in the Prometheus text format on /metrics.
+    """
+
+    def do_GET(self):
+        """
+        Handle GET request.
+        """
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render_prometheus()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """
+        Keep the scrapes out of the crawl log.
+        """
+        pass
+
+
+class MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The local HTTP server of the metrics.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        """ Init the server.
+
+        Args:
+            metrics: The CrawlMetrics to serve.
+            port: The port to listen on, 0 for any free port.
+            host: The address to listen on.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), MetricsRequestHandler)
+        self.metrics = metrics
+        self.thread = None
+
+    def start(self):
+        """
+        Start serving in a daemon thread.
+        """
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
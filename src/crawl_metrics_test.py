@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for crawl metrics.
+
+Author: weileizhe
+Date: 2015/03/30 00:00:06
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib2
+
+
+import blob_store_test
+import crawl_metrics
+import event_spider_test
+import frontier
+import mini_spider
+import seen_store
+
+
+class TestHistogram(unittest.TestCase):
+    """ Test for Histogram.
+    """
+
+    def test_quantile(self):
+        """ Test the quantiles are the upper bounds of their buckets.
+        """
+        histogram = crawl_metrics.Histogram((0.1, 1, 10))
+        self.assertEqual(histogram.quantile(0.5), None)
+        for value in (0.05, 0.05, 0.5, 0.5, 0.5, 2, 2, 2, 5, 60):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 3, 4, 1])
+        self.assertEqual(histogram.quantile(0.5), 1)
+        self.assertEqual(histogram.quantile(0.9), 10)
+        self.assertEqual(histogram.quantile(0.99), 10)
+        self.assertAlmostEqual(histogram.sum, 72.6)
+
+
+class TestCrawlMetrics(unittest.TestCase):
+    """ Test for CrawlMetrics and its exporters.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.metrics = crawl_metrics.CrawlMetrics((0.1, 1))
+        self.metrics.increment('pages_total', 3)
+        self.metrics.increment('bytes_total', 300)
+        self.metrics.increment('errors_total', 1, 'http_404')
+        self.metrics.observe('fetch', 0.5)
+        self.metrics.begin_request('a.com')
+        self.metrics.begin_request('a.com')
+        self.metrics.begin_request('b.com')
+        self.metrics.end_request('b.com')
+        self.metrics.register_gauge('queue_depth', lambda: 7)
+        self.temp_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def test_snapshot(self):
+        """ Test the snapshot holds every metric.
+        """
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'pages_total': {'': 3}, 'bytes_total': {'': 300},
+                                                'errors_total': {'http_404': 1}})
+        self.assertEqual(snapshot['gauges'], {'queue_depth': 7})
+        self.assertEqual(snapshot['in_flight'], {'a.com': 2})
+        self.assertEqual(snapshot['histograms']['fetch']['p99'], 1)
+        self.assertEqual(snapshot['histograms']['dns']['count'], 0)
+
+    def test_render_prometheus(self):
+        """ Test the Prometheus text format.
+        """
+        lines = self.metrics.render_prometheus().splitlines()
+        for line in ('# TYPE mini_spider_pages_total counter',
+                     'mini_spider_pages_total 3',
+                     'mini_spider_errors_total{class="http_404"} 1',
+                     'mini_spider_queue_depth 7',
+                     'mini_spider_in_flight_requests{host="a.com"} 2',
+                     'mini_spider_stage_seconds_bucket{stage="fetch",le="0.1"} 0',
+                     'mini_spider_stage_seconds_bucket{stage="fetch",le="1"} 1',
+                     'mini_spider_stage_seconds_bucket{stage="fetch",le="+Inf"} 1',
+                     'mini_spider_stage_seconds_count{stage="fetch"} 1'):
+            self.assertIn(line, lines)
+
+    def test_reporter(self):
+        """ Test the stats file is written with the rates.
+        """
+        stats_path = os.path.join(self.temp_directory, 'stats.json')
+        reporter = crawl_metrics.MetricsReporter(self.metrics, stats_path, 60)
+        reporter.start()
+        reporter.stop()
+        with open(stats_path) as stats_file:
+            stats = json.load(stats_file)
+        self.assertGreater(stats['pages_per_second'], 0)
+        self.assertEqual(stats['error_rate'], 0.25)
+        self.assertEqual(os.listdir(self.temp_directory), ['stats.json'])
+
+    def test_server(self):
+        """ Test the metrics are served on /metrics only.
+        """
+        server = crawl_metrics.MetricsServer(self.metrics, 0)
+        server.start()
+        try:
+            base_url = 'http://127.0.0.1:%d' % server.server_address[1]
+            body = urllib2.urlopen(base_url + '/metrics', timeout=5).read()
+            self.assertIn('mini_spider_pages_total 3\n', body)
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen(base_url + '/', timeout=5)
+        finally:
+            server.stop()
+
+
+class TestMeasuredCrawl(unittest.TestCase):
+    """ Test a crawl fills the metrics.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = event_spider_test.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                            blob_store_test.MirrorHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.temp_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_directory)
+
+    def test_crawl(self):
+        """ Test the pages, bytes and stage latencies of a crawl are counted.
+        """
+        metrics = crawl_metrics.CrawlMetrics()
+        url_queue = frontier.HostFrontier(0)
+        crawled_urls = seen_store.SetSeenStore()
+        url_queue.put(mini_spider.Url(self.base_url + '/index.html', 0))
+        spider_thread = mini_spider.MiniSpiderThread(url_queue, crawled_urls, 1, 0, 5,
+                                                     '.*\.png', self.temp_directory,
+                                                     metrics=metrics)
+        spider_thread.setDaemon(True)
+        spider_thread.start()
+        url_queue.join()
+        url_queue.close()
+        spider_thread.join()
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['pages_total'], {'': 5})
+        self.assertEqual(snapshot['counters']['bytes_total'],
+                         {'': sum(len(body) for _, body in blob_store_test.WEBPAGES.values())})
+        self.assertEqual(snapshot['in_flight'], {})
+        histograms = snapshot['histograms']
+        self.assertEqual([histograms[stage]['count'] for stage in ('fetch', 'parse', 'store')],
+                         [5, 1, 4])
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
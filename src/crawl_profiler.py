@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the on-demand profiling of a running crawl, to find out
+why a crawl slowed down without killing it.
+
+A profiling window is started by a signal, SIGUSR2 by default, or by the
+configuration at the start of the crawl, and lasts duration seconds:
+
+    A sampler thread takes the stacks of every thread each interval seconds
+    and counts them in the collapsed stack format of flame graphs, one
+    "thread;frame;...;frame count" line per distinct stack.
+    The crawl jobs started in the window run under cProfile, one profile per
+    job merged into one pstats dump when the job is done.
+
+Both are written to output_directory as profile-<time>-<pid>.folded and
+profile-<time>-<pid>.pstats when the window ends. While no window is open a
+crawl job only checks the active attribute, so the profiler costs nothing.
+
+Usage: kill -USR2 <pid of mini_spider.py>
+
+Author: weileizhe
+Date: 2015/04/13 00:00:06
+"""
+
+import collections
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+
+
+DEFAULT_PROFILE_SIGNAL = 'SIGUSR2'
+
+
+def parse_signal(signal_name):
+    """
+    Parse a signal name, like SIGUSR2.
+
+    Returns:
+        The signal number, None if signal_name is empty.
+
+    Raises:
+        ValueError: Unknown signal.
+    """
+    if not signal_name:
+        return None
+    signal_name = signal_name.upper()
+    signal_number = getattr(signal, signal_name, None)
+    if not signal_name.startswith('SIG') or signal_name.startswith('SIG_') or \
+            not isinstance(signal_number, int):
+        raise ValueError('unknown signal %s' % signal_name)
+    return signal_number
+
+
+def frame_name(frame):
+    """
+    Get the collapsed stack name of a frame, as file:function:line.
+    """
+    code = frame.f_code
+    return '%s:%s:%d' % (os.path.basename(code.co_filename), code.co_name, code.co_firstlineno)
+
+
+def collapse_stack(thread_name, frame):
+    """
+    Get the collapsed stack of a thread, the outermost frame first.
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.append(thread_name.replace(';', '_').replace(' ', '_'))
+    names.reverse()
+    return ';'.join(names)
+
+
+class CrawlProfiler(object):
+    """
+    Sample the stacks of every thread and profile the crawl jobs for a window.
+
+    Attributes:
+        output_directory: The directory of the profile files.
+        duration: The seconds of a window.
+        interval: The seconds between two stack samples.
+        active: True while a window is open.
+        stacks: A Counter of the collapsed stacks sampled in the window.
+        stats: The pstats.Stats of the jobs done in the window, None if none.
+        windows: The windows finished.
+    """
+
+    def __init__(self, output_directory, duration=30, interval=0.01):
+        """ Init the profiler.
+
+        Args:
+            output_directory: The directory of the profile files.
+            duration: The seconds of a window.
+            interval: The seconds between two stack samples.
+        """
+        self.output_directory = output_directory
+        self.duration = duration
+        self.interval = interval
+        self.active = False
+        self.stacks = collections.Counter()
+        self.stats = None
+        self.windows = 0
+        self.window_id = 0
+        self.stopped = threading.Event()
+        self.sampler = None
+        self.mutex = threading.Lock()
+
+    def start(self):
+        """
+        Open a window unless one is open.
+
+        Returns:
+            True if a window is opened.
+        """
+        with self.mutex:
+            if self.active:
+                return False
+            self.active = True
+            self.window_id += 1
+            self.stacks = collections.Counter()
+            self.stats = None
+            self.stopped.clear()
+        self.sampler = threading.Thread(target=self._sample, name='profiler')
+        self.sampler.setDaemon(True)
+        self.sampler.start()
+        logging.info('Profile the crawl for %s seconds', self.duration)
+        return True
+
+    def runcall(self, function, *args):
+        """
+        Call function(*args), under cProfile if a window is open.
+
+        The callers check active first, so a call without a window never
+        reaches here in the crawl loops.
+        """
+        if not self.active:
+            return function(*args)
+        window_id = self.window_id
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            with self.mutex:
+                if self.active and window_id == self.window_id:
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+
+    def _sample(self):
+        """
+        Sample the stacks until the window ends, then write the profile files.
+        """
+        own_ident = threading.current_thread().ident
+        deadline = time.time() + self.duration
+        while not self.stopped.wait(self.interval) and time.time() < deadline:
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                self.stacks[collapse_stack(names.get(ident, str(ident)), frame)] += 1
+        try:
+            self._finish()
+        except (IOError, OSError) as error:
+            logging.warn('Write profile to %s failed due to %s', self.output_directory,
+                         str(error))
+
+    def _finish(self):
+        """
+        Close the window and write the collapsed stacks and the pstats dump.
+        """
+        with self.mutex:
+            self.active = False
+            self.windows += 1
+            stacks, stats = self.stacks, self.stats
+        if not os.path.isdir(self.output_directory):
+            os.makedirs(self.output_directory)
+        path_prefix = os.path.join(self.output_directory, 'profile-%s-%d'
+                                   % (time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        with open(path_prefix + '.folded', 'w') as folded_file:
+            for stack, count in sorted(stacks.iteritems()):
+                folded_file.write('%s %d\n' % (stack, count))
+        if stats is not None:
+            stats.dump_stats(path_prefix + '.pstats')
+        logging.info('Profile written to %s.folded: %d samples of %d stacks, %s',
+                     path_prefix, sum(stacks.values()), len(stacks),
+                     'cProfile of %d calls in %s.pstats' % (stats.total_calls, path_prefix)
+                     if stats is not None else 'no crawl job done in the window')
+
+    def stop(self):
+        """
+        End the open window early and wait for its profile files.
+        """
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+
+    def install_signal_handler(self, signal_number):
+        """
+        Open a window on signal_number, from the main thread.
+
+        Returns:
+            The previous handler to restore.
+        """
+        return signal.signal(signal_number, lambda signal_number, frame: self.start())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for crawl profiler.
+
+Author: weileizhe
+Date: 2015/04/13 00:00:06
+"""
+
+import os
+import pstats
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+
+import crawl_profiler
+
+
+def busy_job(seconds):
+    """ Keep a thread busy for seconds.
+    """
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        sum(xrange(100))
+
+
+class TestParseSignal(unittest.TestCase):
+    """ Test parse_signal(signal_name) function.
+    """
+
+    def test_parse_signal(self):
+        """ Test parsing signal names.
+        """
+        self.assertEqual(crawl_profiler.parse_signal('SIGUSR2'), signal.SIGUSR2)
+        self.assertEqual(crawl_profiler.parse_signal('sigusr1'), signal.SIGUSR1)
+        self.assertEqual(crawl_profiler.parse_signal(''), None)
+        for signal_name in ('SIGNOPE', 'SIG_IGN', 'signal'):
+            with self.assertRaises(ValueError):
+                crawl_profiler.parse_signal(signal_name)
+
+
+class TestCrawlProfiler(unittest.TestCase):
+    """ Test for CrawlProfiler.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.profiler = crawl_profiler.CrawlProfiler(self.temp_directory, 0.3, 0.005)
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.profiler.stop()
+        shutil.rmtree(self.temp_directory)
+
+    def profile_files(self):
+        """ Get the profile file names by extension.
+        """
+        return dict((os.path.splitext(name)[1], os.path.join(self.temp_directory, name))
+                    for name in os.listdir(self.temp_directory))
+
+    def test_off(self):
+        """ Test nothing is profiled without a window.
+        """
+        self.assertEqual(self.profiler.runcall(sum, [1, 2]), 3)
+        self.assertEqual(self.profiler.stats, None)
+        self.assertEqual(os.listdir(self.temp_directory), [])
+
+    def test_window(self):
+        """ Test a window writes the sampled stacks and the jobs profile.
+        """
+        self.assertTrue(self.profiler.start())
+        self.assertFalse(self.profiler.start())
+        job_thread = threading.Thread(target=self.profiler.runcall, args=(busy_job, 0.1),
+                                      name='crawl job')
+        job_thread.start()
+        job_thread.join()
+        self.profiler.sampler.join()
+        self.assertFalse(self.profiler.active)
+        self.assertEqual(self.profiler.windows, 1)
+
+        profile_files = self.profile_files()
+        self.assertEqual(sorted(profile_files), ['.folded', '.pstats'])
+        with open(profile_files['.folded']) as folded_file:
+            lines = folded_file.read().splitlines()
+        busy_lines = [line for line in lines if line.startswith('crawl_job;')
+                      and ':busy_job:' in line]
+        self.assertTrue(busy_lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        functions = [function for _, _, function in pstats.Stats(profile_files['.pstats']).stats]
+        self.assertIn('busy_job', functions)
+
+    def test_stop(self):
+        """ Test stop ends a window early and writes it.
+        """
+        self.profiler.duration = 60
+        self.profiler.start()
+        start_time = time.time()
+        self.profiler.stop()
+        self.assertLess(time.time() - start_time, 5)
+        self.assertFalse(self.profiler.active)
+        self.assertEqual(sorted(self.profile_files()), ['.folded'])
+
+    def test_signal(self):
+        """ Test the signal opens a window.
+        """
+        previous_handler = self.profiler.install_signal_handler(signal.SIGUSR2)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR2)
+            time.sleep(0.01)
+            self.assertTrue(self.profiler.active)
+        finally:
+            signal.signal(signal.SIGUSR2, previous_handler)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
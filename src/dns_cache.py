@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes a process-wide cache of host resolution, so the crawl
+threads share one blocking getaddrinfo per host instead of repeating it for
+every request.
+
+Once installed, DnsCache replaces socket.getaddrinfo, which urllib2, httplib
+and the keep-alive pool resolve hosts with:
+
+    A result is kept for ttl seconds, as getaddrinfo tells no record ttl.
+    A failed lookup is kept for negative_ttl seconds, so an unresolvable
+    host fails at once instead of waiting for the resolver again.
+    Threads missing the same host at the same time wait for one lookup.
+
+The hosts of the urls put to the url queue are prefetched by background
+threads, so the lookup is done by the time a url is grabed.
+
+Author: weileizhe
+Date: 2015/04/20 00:00:06
+"""
+
+import logging
+import Queue
+import socket
+import threading
+import time
+import urlparse
+
+
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 30
+DEFAULT_PREFETCH_WORKERS = 4
+PREFETCH_QUEUE_SIZE = 10000
+
+# The getaddrinfo of the socket module before any DnsCache is installed.
+system_getaddrinfo = socket.getaddrinfo
+
+
+class DnsCache(object):
+    """
+    A cache of getaddrinfo with ttl, negative caching and prefetching.
+
+    Attributes:
+        ttl: The seconds a resolved host is kept.
+        negative_ttl: The seconds a failed lookup is kept.
+        prefetch_workers: The threads resolving prefetched hosts.
+        metrics: The crawl_metrics.CrawlMetrics timing the lookups, None not to.
+        hits: The lookups answered from the cache.
+        negative_hits: The lookups failed from the cache.
+        misses: The lookups sent to the resolver.
+        prefetches: The hosts queued for prefetching.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 prefetch_workers=DEFAULT_PREFETCH_WORKERS, metrics=None):
+        """ Init the cache.
+
+        Args:
+            ttl: The seconds a resolved host is kept.
+            negative_ttl: The seconds a failed lookup is kept, 0 not to keep it.
+            prefetch_workers: The threads resolving prefetched hosts, 0 not to prefetch.
+            metrics: The crawl_metrics.CrawlMetrics timing the lookups, None not to.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefetch_workers = prefetch_workers
+        self.metrics = metrics
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.prefetches = 0
+        self.entries = {}
+        self.pending = {}
+        self.queued = set()
+        self.prefetch_queue = Queue.Queue(PREFETCH_QUEUE_SIZE)
+        self.prefetch_threads = []
+        self.replaced_getaddrinfo = None
+        self.mutex = threading.Lock()
+
+    def getaddrinfo(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        """
+        Resolve host as socket.getaddrinfo does, from the cache if possible.
+
+        Raises:
+            socket.gaierror: Fail to resolve host, maybe a cached failure.
+        """
+        key = (host, port, family, socktype, proto, flags)
+        while True:
+            with self.mutex:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > time.time():
+                    result, error = entry[1:]
+                    if error is None:
+                        outcome = 'hit'
+                        self.hits += 1
+                    else:
+                        outcome = 'negative_hit'
+                        self.negative_hits += 1
+                    break
+                lookup_done = self.pending.get(key)
+                if lookup_done is None:
+                    self.pending[key] = threading.Event()
+                    self.misses += 1
+            if lookup_done is not None:
+                lookup_done.wait()
+                continue
+            outcome = 'miss'
+            result, error = self._resolve(key)
+            break
+
+        if self.metrics is not None:
+            self.metrics.increment('dns_lookups_total', 1, outcome)
+        if error is not None:
+            raise error
+        return result
+
+    def _resolve(self, key):
+        """
+        Resolve key with the system resolver and wake up the waiting threads.
+
+        Returns:
+            A (result, error) tuple, error is the socket.gaierror if failed.
+        """
+        start_time = time.time()
+        result = error = None
+        try:
+            result = system_getaddrinfo(*key)
+        except socket.gaierror as ex:
+            error = ex
+        finally:
+            now = time.time()
+            with self.mutex:
+                if error is None and result is not None:
+                    self.entries[key] = (now + self.ttl, result, None)
+                elif error is not None and self.negative_ttl:
+                    self.entries[key] = (now + self.negative_ttl, None, error)
+                self.pending.pop(key).set()
+            if self.metrics is not None:
+                self.metrics.observe('dns', now - start_time)
+        return result, error
+
+    def prefetch(self, url):
+        """
+        Resolve the host of url in the background unless it is cached.
+
+        The key is the one httplib resolves a connection with, so the lookup
+        of the grab hits it.
+        """
+        if not self.prefetch_workers:
+            return
+        split_url = urlparse.urlsplit(url)
+        if split_url.scheme not in ('http', 'https') or not split_url.hostname:
+            return
+        try:
+            port = split_url.port or (443 if split_url.scheme == 'https' else 80)
+        except ValueError:
+            return
+        key = (split_url.hostname, port, 0, socket.SOCK_STREAM, 0, 0)
+        with self.mutex:
+            entry = self.entries.get(key)
+            if key in self.queued or key in self.pending or \
+                    (entry is not None and entry[0] > time.time()):
+                return
+            self.queued.add(key)
+            self.prefetches += 1
+            if not self.prefetch_threads:
+                self._start_prefetch_threads()
+        try:
+            self.prefetch_queue.put_nowait(key)
+        except Queue.Full:
+            with self.mutex:
+                self.queued.discard(key)
+
+    def _start_prefetch_threads(self):
+        """
+        Start the prefetch threads, the caller holds the mutex.
+        """
+        for i in xrange(self.prefetch_workers):
+            prefetch_thread = threading.Thread(target=self._prefetch_hosts,
+                                               name='dns-prefetch-%d' % i)
+            prefetch_thread.setDaemon(True)
+            prefetch_thread.start()
+            self.prefetch_threads.append(prefetch_thread)
+
+    def _prefetch_hosts(self):
+        """
+        Resolve the queued hosts until a None is queued.
+        """
+        while True:
+            key = self.prefetch_queue.get()
+            if key is None:
+                return
+            with self.mutex:
+                self.queued.discard(key)
+            try:
+                self.getaddrinfo(*key)
+            except (socket.error, UnicodeError) as error:
+                logging.debug('Prefetch %s failed due to %s', key[0], str(error))
+
+    def install(self):
+        """
+        Replace socket.getaddrinfo of the process with the cache.
+        """
+        self.replaced_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = self.getaddrinfo
+
+    def close(self):
+        """
+        Stop the prefetch threads and give socket.getaddrinfo back.
+        """
+        if self.replaced_getaddrinfo is not None and socket.getaddrinfo == self.getaddrinfo:
+            socket.getaddrinfo = self.replaced_getaddrinfo
+        self.replaced_getaddrinfo = None
+        for prefetch_thread in self.prefetch_threads:
+            self.prefetch_queue.put(None)
+        for prefetch_thread in self.prefetch_threads:
+            prefetch_thread.join()
+        self.prefetch_threads = []
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for dns cache.
+
+Author: weileizhe
+Date: 2015/04/20 00:00:06
+"""
+
+import Queue
+import socket
+import threading
+import time
+import unittest
+
+
+import crawl_metrics
+import dns_cache
+import mini_spider
+import seen_store
+
+
+class TestDnsCache(unittest.TestCase):
+    """ Test for DnsCache.
+    """
+
+    def setUp(self):
+        """ Set up test with a resolver counting its lookups.
+        """
+        self.lookups = []
+        self.lookup_delay = 0
+        self.system_getaddrinfo = dns_cache.system_getaddrinfo
+        dns_cache.system_getaddrinfo = self.fake_getaddrinfo
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        dns_cache.system_getaddrinfo = self.system_getaddrinfo
+
+    def fake_getaddrinfo(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        """ Resolve every host but bad.test to 10.0.0.1.
+        """
+        self.lookups.append(host)
+        time.sleep(self.lookup_delay)
+        if host == 'bad.test':
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', port))]
+
+    def test_ttl(self):
+        """ Test a host is resolved once per ttl.
+        """
+        metrics = crawl_metrics.CrawlMetrics()
+        cache = dns_cache.DnsCache(0.2, 0, 0, metrics)
+        for i in xrange(3):
+            self.assertEqual(cache.getaddrinfo('a.test', 80, 0, socket.SOCK_STREAM)[0][4],
+                             ('10.0.0.1', 80))
+        cache.getaddrinfo('a.test', 443, 0, socket.SOCK_STREAM)
+        time.sleep(0.3)
+        cache.getaddrinfo('a.test', 80, 0, socket.SOCK_STREAM)
+        self.assertEqual(self.lookups, ['a.test'] * 3)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        self.assertEqual(metrics.snapshot()['counters']['dns_lookups_total'],
+                         {'hit': 2, 'miss': 3})
+        self.assertEqual(metrics.histograms['dns'].count, 3)
+
+    def test_negative_ttl(self):
+        """ Test a failed lookup fails from the cache for negative_ttl.
+        """
+        cache = dns_cache.DnsCache(60, 60, 0)
+        for i in xrange(2):
+            with self.assertRaises(socket.gaierror):
+                cache.getaddrinfo('bad.test', 80)
+        self.assertEqual(self.lookups, ['bad.test'])
+        self.assertEqual(cache.negative_hits, 1)
+
+        cache = dns_cache.DnsCache(60, 0, 0)
+        for i in xrange(2):
+            with self.assertRaises(socket.gaierror):
+                cache.getaddrinfo('bad.test', 80)
+        self.assertEqual(self.lookups, ['bad.test'] * 3)
+
+    def test_concurrent_misses(self):
+        """ Test threads missing the same host wait for one lookup.
+        """
+        self.lookup_delay = 0.2
+        cache = dns_cache.DnsCache(60, 60, 0)
+        threads = [threading.Thread(target=cache.getaddrinfo, args=('a.test', 80))
+                   for i in xrange(5)]
+        for lookup_thread in threads:
+            lookup_thread.start()
+        for lookup_thread in threads:
+            lookup_thread.join()
+        self.assertEqual(self.lookups, ['a.test'])
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+    def test_prefetch(self):
+        """ Test the hosts of urls are resolved in the background once.
+        """
+        cache = dns_cache.DnsCache(60, 60, 2)
+        for url in ('http://a.test/1.html', 'http://a.test/2.html', 'https://b.test/',
+                    'mailto:c@c.test', 'http://bad.test/'):
+            cache.prefetch(url)
+        cache.close()
+        self.assertEqual(sorted(self.lookups), ['a.test', 'b.test', 'bad.test'])
+        self.assertEqual(cache.prefetches, 3)
+        cache.getaddrinfo('b.test', 443, 0, socket.SOCK_STREAM)
+        self.assertEqual(cache.hits, 1)
+
+    def test_install(self):
+        """ Test the cache replaces socket.getaddrinfo until closed.
+        """
+        cache = dns_cache.DnsCache(60, 60, 0)
+        cache.install()
+        try:
+            self.assertEqual(socket.getaddrinfo('a.test', 80)[0][4], ('10.0.0.1', 80))
+            self.assertEqual(cache.misses, 1)
+        finally:
+            cache.close()
+        self.assertIs(socket.getaddrinfo, self.system_getaddrinfo)
+
+
+class TestPrefetchNextUrls(unittest.TestCase):
+    """ Test the hosts of the next urls are prefetched.
+    """
+
+    def test_put_next_urls(self):
+        """ Test only the urls put are prefetched.
+        """
+        prefetched = []
+
+        class RecordingDnsCache(object):
+            def prefetch(self, url):
+                prefetched.append(url)
+
+        url_queue = Queue.Queue()
+        crawled_urls = seen_store.SetSeenStore()
+        crawled_urls.add_if_absent('http://b.test/')
+        spider = mini_spider.MiniSpider(url_queue, crawled_urls, 2, 0, 5, '.*\.png$', './output',
+                                        dns_cache=RecordingDnsCache())
+        spider.put_next_urls(mini_spider.Url('http://a.test/', 0),
+                             ['http://a.test/1.html', 'http://b.test/'], url_queue, crawled_urls)
+        self.assertEqual(prefetched, ['http://a.test/1.html'])
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
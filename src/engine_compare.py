@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module compares the crawl engines of mini spider on the same seed list.
+
+Each engine crawls the url_list_file of the configuration into its own
+sub directory of output_directory, with its own seen url store, page
+metadata and frontier spill directory in a temp directory, so no engine
+starts from the state of another. The pages grabed, counted by the crawl
+metrics, elapsed time and pages per second of every engine are printed.
+
+Usage: python engine_compare.py -c spider.conf [-e thread -e event]
+
+Author: weileizhe
+Date: 2014/12/30 00:00:06
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import mini_spider
+import seed_feeder
+
+
+def configure_engine(configuration, engine, state_directory):
+    """
+    Set the engine and point the crawl state of the configuration to state_directory.
+
+    Args:
+        configuration: The configuration of mini spider.
+        engine: The crawl engine name.
+        state_directory: The temp directory of the engine.
+    """
+    configuration.set('spider', 'engine', engine)
+    configuration.set('spider', 'seen_store_path', os.path.join(state_directory, 'seen.db'))
+    configuration.set('spider', 'metrics_path', os.path.join(state_directory, 'stats.json'))
+    for option, file_name in (('page_metadata_path', 'page_metadata.db'),
+                              ('frontier_spill_directory', 'frontier')):
+        if configuration.get('spider', option):
+            configuration.set('spider', option, os.path.join(state_directory, file_name))
+
+
+def compare_engine(configuration, engine):
+    """
+    Crawl the seed list with one engine.
+
+    Args:
+        configuration: The configuration of mini spider.
+        engine: The crawl engine name.
+
+    Returns:
+        A (pages, elapsed) tuple, pages is the webpages grabed.
+    """
+    state_directory = tempfile.mkdtemp(prefix='engine_compare_')
+    try:
+        configure_engine(configuration, engine, state_directory)
+        url_queue = mini_spider.create_url_queue(configuration)
+        crawled_urls = mini_spider.create_crawled_urls(configuration)
+        feeder = mini_spider.create_seed_feeder(configuration, url_queue, crawled_urls)
+
+        start_time = time.time()
+        feeder.start()
+        try:
+            mini_spider.run_engine(configuration, seed_feeder.SeededUrlQueue(url_queue, feeder),
+                                   crawled_urls)
+            elapsed = time.time() - start_time
+        finally:
+            feeder.stop()
+            if hasattr(crawled_urls, 'close'):
+                crawled_urls.close()
+
+        with open(configuration.get('spider', 'metrics_path')) as stats_file:
+            counters = json.load(stats_file)['counters']
+        return sum(counters.get('pages_total', {}).values()), elapsed
+    finally:
+        shutil.rmtree(state_directory, True)
+
+
+def main():
+    """
+    Main function entrance.
+    """
+    argument_parser = argparse.ArgumentParser(description='Compare mini spider engines.')
+    argument_parser.add_argument('-c', '--conf',
+                                 default="spider.conf",
+                                 help='confiuration file path(default is "spider.conf")')
+    argument_parser.add_argument('-e', '--engine',
+                                 action='append',
+                                 choices=mini_spider.CRAWL_ENGINES,
+                                 help='engine to compare(default is all engines)')
+    arguments = argument_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    try:
+        configuration = mini_spider.parse_configuration(arguments.conf)
+    except mini_spider.ConfigurationException as ex:
+        logging.error(str(ex))
+        return -1
+
+    output_directory = configuration.get('spider', 'output_directory')
+    sys.stdout.write('%-8s %10s %10s %10s\n' % ('engine', 'pages', 'seconds', 'pages/s'))
+    for engine in arguments.engine or mini_spider.CRAWL_ENGINES:
+        configuration.set('spider', 'output_directory', os.path.join(output_directory, engine))
+        pages, elapsed = compare_engine(configuration, engine)
+        sys.stdout.write('%-8s %10d %10.2f %10.2f\n' % (engine, pages, elapsed,
+                                                        pages / max(elapsed, 1e-6)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
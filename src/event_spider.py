@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes an event loop crawl engine which grabs many urls
+concurrently on one thread with non-blocking sockets, instead of blocking
+one thread per in-flight request.
+
+Author: weileizhe
+Date: 2014/12/30 00:00:06
+"""
+
+import asyncore
+import errno
+import httplib
+import logging
+import Queue
+import socket
+import ssl
+import StringIO
+import sys
+import time
+import urlparse
+
+import frontier
+
+USER_AGENT = 'mini-spider/1.0'
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+RECV_BUFFER_SIZE = 65536
+MAX_HEADER_SIZE = 65536
+LOOP_TIMEOUT = 0.05
+
+
+class FetchError(Exception):
+    """
+    Fetch exception if fail to grab the url.
+
+    Attributes:
+        transient: If a retry may succeed, as for a timeout or a broken connection.
+    """
+
+    def __init__(self, message, transient=True):
+        """ Init the fetch exception.
+
+        Args:
+            message: The error message.
+            transient: If a retry may succeed.
+        """
+        Exception.__init__(self, message)
+        self.transient = transient
+
+
+class EventResponse(object):
+    """
+    A grabed response which acts like the response of urllib2.urlopen.
+
+    Attributes:
+        url: The url of the response.
+        code: The http status code.
+        headers: The http headers as httplib.HTTPMessage.
+        body: The file object of the response body.
+    """
+
+    def __init__(self, url, code, headers, body):
+        """ Init the response.
+
+        Args:
+            url: The url of the response.
+            code: The http status code.
+            headers: The http headers as httplib.HTTPMessage.
+            body: The response body.
+        """
+        self.url = url
+        self.code = code
+        self.headers = headers
+        self.body = StringIO.StringIO(body)
+
+    def getcode(self):
+        """
+        Get the http status code.
+        """
+        return self.code
+
+    def geturl(self):
+        """
+        Get the url of the response.
+        """
+        return self.url
+
+    def info(self):
+        """
+        Get the http headers.
+        """
+        return self.headers
+
+    def read(self, size=-1):
+        """
+        Read the response body.
+        """
+        return self.body.read(size)
+
+
+def parse_response(url, raw_response):
+    """
+    Parse a raw http response into an EventResponse.
+
+    Args:
+        url: The url of the response.
+        raw_response: The raw bytes received from the server.
+
+    Returns:
+        An EventResponse object.
+
+    Raises:
+        FetchError: Fail to parse the response.
+    """
+    header_end = raw_response.find('\r\n\r\n')
+    if header_end < 0:
+        raise FetchError('Incomplete response header')
+    header_lines = raw_response[:header_end].split('\r\n', 1)
+    body = raw_response[header_end + 4:]
+
+    status_line = header_lines[0].split(None, 2)
+    if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+        raise FetchError('Bad status line %r' % header_lines[0])
+    try:
+        code = int(status_line[1])
+    except ValueError:
+        raise FetchError('Bad status line %r' % header_lines[0])
+
+    header_text = header_lines[1] + '\r\n\r\n' if len(header_lines) > 1 else '\r\n'
+    headers = httplib.HTTPMessage(StringIO.StringIO(header_text))
+    if headers.getheader('transfer-encoding', '').lower() == 'chunked':
+        body = decode_chunked_body(body)
+    return EventResponse(url, code, headers, body)
+
+
+def decode_chunked_body(body):
+    """
+    Decode a body sent with chunked transfer encoding.
+
+    Args:
+        body: The chunked body.
+
+    Returns:
+        The decoded body.
+    """
+    chunks = []
+    position = 0
+    while True:
+        line_end = body.find('\r\n', position)
+        if line_end < 0:
+            break
+        try:
+            chunk_size = int(body[position:line_end].split(';', 1)[0], 16)
+        except ValueError:
+            break
+        if chunk_size == 0:
+            break
+        chunk_start = line_end + 2
+        chunks.append(body[chunk_start:chunk_start + chunk_size])
+        position = chunk_start + chunk_size + 2
+    return ''.join(chunks)
+
+
+class HttpFetch(asyncore.dispatcher):
+    """
+    A non-blocking http(s) GET of one url.
+
+    The request is sent as HTTP/1.0 with "Connection: close", so the response
+    ends when the server closes the connection.
+
+    Attributes:
+        url: The url to grab.
+        host: The host of the url.
+        start_time: The time when the fetch started.
+        deadline: The time when the fetch times out.
+        callback: Called as callback(fetch, response, error) when done.
+    """
+
+    def __init__(self, url, address, timeout, callback, socket_map, max_body_size=0,
+                 headers=None):
+        """ Init the fetch and start connecting.
+
+        Args:
+            url: The url to grab.
+            address: The (family, sockaddr) resolved for the url host.
+            timeout: The fetch timeout in seconds.
+            callback: Called as callback(fetch, response, error) when done.
+            socket_map: The asyncore socket map of the event loop.
+            max_body_size: The max bytes of the response body, 0 for no limit.
+            headers: The extra request headers, like the conditional headers.
+        """
+        asyncore.dispatcher.__init__(self, map=socket_map)
+        self.url = url
+        self.start_time = time.time()
+        self.deadline = self.start_time + timeout
+        self.callback = callback
+        self.done = False
+
+        split_url = urlparse.urlsplit(url)
+        self.use_ssl = split_url.scheme == 'https'
+        self.host = split_url.hostname
+        self.handshaking = False
+        self.handshake_want_write = False
+        path = split_url.path or '/'
+        if split_url.query:
+            path += '?' + split_url.query
+        extra_headers = ''.join('%s: %s\r\n' % header for header in (headers or {}).iteritems())
+        self.out_buffer = ('GET %s HTTP/1.0\r\n'
+                           'Host: %s\r\n'
+                           'User-Agent: %s\r\n'
+                           'Accept: */*\r\n'
+                           '%s'
+                           'Connection: close\r\n\r\n') % (path, split_url.netloc, USER_AGENT,
+                                                            extra_headers)
+        self.in_buffer = []
+        self.received_size = 0
+        self.max_response_size = max_body_size + MAX_HEADER_SIZE if max_body_size else 0
+
+        family, sockaddr = address
+        self.create_socket(family, socket.SOCK_STREAM)
+        self.connect(sockaddr)
+
+    def readable(self):
+        """
+        Wait for reading unless the ssl handshake waits for writing.
+        """
+        return not self.connecting and not (self.handshaking and self.handshake_want_write)
+
+    def writable(self):
+        """
+        Wait for writing while connecting, handshaking or sending the request.
+        """
+        if self.connecting:
+            return True
+        if self.handshaking:
+            return self.handshake_want_write
+        return bool(self.out_buffer)
+
+    def handle_connect(self):
+        """
+        Wrap the connected socket with ssl for https urls.
+        """
+        if self.use_ssl:
+            context = ssl.create_default_context()
+            self.socket = context.wrap_socket(self.socket, server_hostname=self.host,
+                                              do_handshake_on_connect=False)
+            self.handshaking = True
+            self.handshake_want_write = True
+
+    def handle_write(self):
+        """
+        Continue the ssl handshake or send the request.
+        """
+        if self.handshaking:
+            self._do_handshake()
+            return
+        try:
+            sent = self.socket.send(self.out_buffer)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return
+        except socket.error as error:
+            if error.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                return
+            raise
+        self.out_buffer = self.out_buffer[sent:]
+
+    def handle_read(self):
+        """
+        Continue the ssl handshake or receive the response.
+        """
+        if self.handshaking:
+            self._do_handshake()
+            return
+        while True:
+            try:
+                data = self.socket.recv(RECV_BUFFER_SIZE)
+            except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                return
+            except socket.error as error:
+                if error.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    return
+                raise
+            if not data:
+                self.finish()
+                return
+            self.in_buffer.append(data)
+            self.received_size += len(data)
+            if self.max_response_size and self.received_size > self.max_response_size:
+                self.finish(FetchError('Response of %s exceeds %d bytes'
+                                       % (self.url, self.max_response_size), False))
+                return
+            if not self.use_ssl or not self.socket.pending():
+                return
+
+    def handle_close(self):
+        """
+        The server closed the connection, the response is complete.
+        """
+        self.finish()
+
+    def handle_error(self):
+        """
+        Fail the fetch on any socket or ssl error.
+        """
+        error = sys.exc_info()[1]
+        self.finish(FetchError(str(error) or error.__class__.__name__))
+
+    def _do_handshake(self):
+        """
+        Continue the non-blocking ssl handshake.
+        """
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLWantReadError:
+            self.handshake_want_write = False
+        except ssl.SSLWantWriteError:
+            self.handshake_want_write = True
+        else:
+            self.handshaking = False
+
+    def finish(self, error=None):
+        """
+        Close the connection and call back with the response or the error.
+
+        Args:
+            error: The error if the fetch failed.
+        """
+        if self.done:
+            return
+        self.done = True
+        self.close()
+        response = None
+        if error is None:
+            try:
+                response = parse_response(self.url, ''.join(self.in_buffer))
+            except FetchError as ex:
+                error = ex
+        self.in_buffer = []
+        self.callback(self, response, error)
+
+
+class EventSpider(object):
+    """
+    An event loop crawl engine.
+
+    Up to concurrency urls are grabed at the same time on one thread. Each
+    grabed webpage is handed to page_handler.handle_webpage, so the url depth,
+    target url saving and crawled urls dedup are the same as the thread engine.
+    The url queue is a frontier.HostFrontier, which keeps the crawl interval
+    per host.
+
+    Attributes:
+        url_queue: The url queue to crawl and parse.
+        crawled_urls: The crawled urls.
+        page_handler: The mini spider handling grabed webpages.
+        concurrency: The max in-flight fetches.
+        crawl_timeout: The crawl timeout.
+        max_body_size: The max bytes of a response body, 0 for no limit.
+        metrics: The crawl_metrics.CrawlMetrics of page_handler, None if the
+                 crawl is not measured.
+        dns_cache: The dns_cache.DnsCache of page_handler, None if not shared.
+        host_health: The host_health.HostHealth of page_handler, None if the
+                     hosts are not tracked.
+    """
+
+    def __init__(self, url_queue, crawled_urls, page_handler, concurrency, crawl_timeout,
+                 max_body_size=0):
+        """ Init the event spider.
+
+        Args:
+            url_queue: The url queue to crawl and parse.
+            crawled_urls: The crawled urls.
+            page_handler: The mini spider handling grabed webpages.
+            concurrency: The max in-flight fetches.
+            crawl_timeout: The crawl timeout.
+            max_body_size: The max bytes of a response body, 0 for no limit.
+        """
+        self.url_queue = url_queue
+        self.crawled_urls = crawled_urls
+        self.page_handler = page_handler
+        self.concurrency = concurrency
+        self.crawl_timeout = crawl_timeout
+        self.max_body_size = max_body_size
+        self.metrics = page_handler.metrics
+        self.dns_cache = page_handler.dns_cache
+        self.host_health = page_handler.host_health
+        self.socket_map = {}
+        self.fetches = {}
+        self.free_slots = concurrency
+        self.addresses = {}
+
+    def run(self):
+        """
+        Run the event loop until the url queue is drained.
+        """
+        while self.page_handler.run_profiled(self._run_once):
+            pass
+
+    def _run_once(self):
+        """
+        Run one iteration of the event loop.
+
+        Returns:
+            False if the url queue is drained, True otherwise.
+        """
+        self._start_fetches()
+        if not self.fetches and self.url_queue.empty():
+            return False
+        if self.socket_map:
+            asyncore.loop(timeout=LOOP_TIMEOUT, use_poll=True, map=self.socket_map, count=1)
+        else:
+            time.sleep(LOOP_TIMEOUT)
+        self._expire_fetches()
+        return True
+
+    def _start_fetches(self):
+        """
+        Start grabing queued urls on the free fetch slots.
+        """
+        while self.free_slots > 0:
+            try:
+                url_obj = self.url_queue.get_nowait()
+            except Queue.Empty:
+                return
+            self.free_slots -= 1
+            self._fetch(url_obj, url_obj.url, 0)
+
+    def _fetch(self, url_obj, url, redirects):
+        """
+        Start grabing the url for url_obj.
+
+        Args:
+            url_obj: The url object being crawled.
+            url: The url to grab, which differs from url_obj.url after redirects.
+            redirects: The redirects followed so far.
+        """
+        if self.host_health is not None and not self.host_health.allows(frontier.url_host(url)):
+            self._on_done(url_obj, None, FetchError('Skip %s of a given up host' % url, False))
+            return
+        try:
+            address = self._resolve(url)
+            fetch = HttpFetch(url, address, self.crawl_timeout, self._on_fetched, self.socket_map,
+                              self.max_body_size, self.page_handler.request_headers(url_obj))
+        except (FetchError, socket.error, ValueError) as error:
+            self.page_handler.record_grab(url, 0, None, error)
+            self._on_done(url_obj, None, error)
+            return
+        self.fetches[fetch] = (url_obj, redirects)
+        if self.metrics is not None:
+            self.metrics.begin_request(fetch.host)
+
+    def _resolve(self, url):
+        """
+        Resolve the host of url, cached per host and port.
+
+        The lookup itself blocks the loop, so each host is only resolved once,
+        or once per ttl by the shared dns_cache, which also times its lookups
+        and has prefetched most hosts by the time they are grabed.
+
+        Args:
+            url: The url to resolve.
+
+        Returns:
+            A (family, sockaddr) tuple.
+
+        Raises:
+            FetchError: Fail to resolve the host.
+        """
+        split_url = urlparse.urlsplit(url)
+        if split_url.scheme not in ('http', 'https') or not split_url.hostname:
+            raise FetchError('Unsupported url %s' % url, False)
+        port = split_url.port or (443 if split_url.scheme == 'https' else 80)
+        key = (split_url.hostname, port)
+        if key not in self.addresses or self.dns_cache is not None:
+            start_time = time.time()
+            try:
+                address_info = socket.getaddrinfo(split_url.hostname, port, 0, socket.SOCK_STREAM)
+            except socket.gaierror as error:
+                raise FetchError(str(error))
+            finally:
+                if self.metrics is not None and self.dns_cache is None:
+                    self.metrics.observe('dns', time.time() - start_time)
+            family, _, _, _, sockaddr = address_info[0]
+            self.addresses[key] = (family, sockaddr)
+        return self.addresses[key]
+
+    def _expire_fetches(self):
+        """
+        Fail the fetches which exceed crawl_timeout.
+        """
+        now = time.time()
+        for fetch in [fetch for fetch in self.fetches if fetch.deadline <= now]:
+            fetch.finish(FetchError('timed out'))
+
+    def _on_fetched(self, fetch, response, error):
+        """
+        Follow redirects or hand the finished fetch to _on_done.
+        """
+        url_obj, redirects = self.fetches.pop(fetch)
+        if self.metrics is not None:
+            self.metrics.end_request(fetch.host)
+            self.metrics.observe('fetch', time.time() - fetch.start_time)
+        self.page_handler.record_grab(fetch.url, time.time() - fetch.start_time, response, error)
+        if error is None and response.getcode() in REDIRECT_CODES:
+            location = response.info().getheader('location')
+            if location and redirects < MAX_REDIRECTS:
+                self._fetch(url_obj, urlparse.urljoin(fetch.url, location), redirects + 1)
+                return
+        self._on_done(url_obj, response, error)
+
+    def _on_done(self, url_obj, response, error):
+        """
+        Handle the grabed webpage and free the fetch slot.
+
+        Args:
+            url_obj: The url object crawled.
+            response: The EventResponse, None if failed.
+            error: The error if failed.
+        """
+        handler = self.page_handler
+        if error is not None:
+            logging.warn(str(error))
+            if self.metrics is not None:
+                self.metrics.increment('errors_total', 1, error.__class__.__name__)
+        handler.accept_url_response(url_obj.url, response, error)
+
+        try:
+            handler.handle_webpage(url_obj, self.url_queue, self.crawled_urls)
+        except Exception as ex:
+            logging.warn('Crawl %s failed due to %s', url_obj.url, str(ex))
+        self.url_queue.task_done(url_obj)
+        self.free_slots += 1
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for event spider.
+
+Author: weileizhe
+Date: 2014/12/30 00:00:06
+"""
+
+import BaseHTTPServer
+import os
+import shutil
+import socket
+import SocketServer
+import threading
+import unittest
+
+
+import event_spider
+import frontier
+import mini_spider
+import seen_store
+
+
+WEBPAGES = {
+    '/index.html': ('text/html', '<a href="/page.html">Page</a><img src="/image.png" />'
+                                 '<a href="/moved.html">Moved</a><a href="/missing.html">Missing</a>'),
+    '/page.html': ('text/html', '<img src="/image.png" /><img src="/other.png" />'),
+    '/image.png': ('image/png', 'image'),
+    '/other.png': ('image/png', 'other'),
+    '/target.html': ('text/html', 'Target'),
+}
+
+
+class WebpageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serve WEBPAGES and redirect /moved.html to /target.html.
+    """
+
+    def do_GET(self):
+        """ Handle GET request.
+        """
+        if self.path == '/moved.html':
+            self.send_response(302)
+            self.send_header('Location', '/target.html')
+            self.end_headers()
+            return
+        if self.path not in WEBPAGES:
+            self.send_error(404)
+            return
+        content_type, body = WEBPAGES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """ Keep test output quiet.
+        """
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ Threading http server for test.
+    """
+    daemon_threads = True
+
+
+class TestParseResponse(unittest.TestCase):
+    """ Test parse_response(url, raw_response) function.
+    """
+
+    def test_parse_response(self):
+        """ Test parsing a normal response.
+        """
+        response = event_spider.parse_response(
+            'http://example.com/',
+            'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n<html></html>')
+        self.assertEqual(response.getcode(), 200)
+        self.assertEqual(response.info().gettype(), 'text/html')
+        self.assertEqual(response.read(), '<html></html>')
+
+    def test_parse_chunked_response(self):
+        """ Test parsing a chunked response.
+        """
+        response = event_spider.parse_response(
+            'http://example.com/',
+            'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+            '5\r\nHello\r\n6\r\n world\r\n0\r\n\r\n')
+        self.assertEqual(response.read(), 'Hello world')
+
+    def test_parse_bad_response(self):
+        """ Test parsing a bad response.
+        """
+        with self.assertRaises(event_spider.FetchError):
+            event_spider.parse_response('http://example.com/', 'garbage')
+
+
+class TestEventSpider(unittest.TestCase):
+    """ Test for EventSpider.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), WebpageHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.url_queue = frontier.HostFrontier(0.01)
+        self.crawled_urls = seen_store.SetSeenStore()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists('output_test'):
+            shutil.rmtree('output_test')
+
+    def run_event_spider(self, seed_urls, max_depth):
+        """ Run event spider on seed urls.
+
+        Args:
+            seed_urls: The seed urls.
+            max_depth: The max crawl depth.
+        """
+        for url in seed_urls:
+            self.url_queue.put(mini_spider.Url(url, 0))
+        page_handler = mini_spider.MiniSpider(self.url_queue, self.crawled_urls, max_depth, 0, 5,
+                                              '.*\.(gif|png|jpg|bmp)$|.*/moved\.html$', './output_test')
+        spider = event_spider.EventSpider(self.url_queue, self.crawled_urls, page_handler, 10, 5)
+        spider.run()
+
+    def saved_path(self, path):
+        """ Get the saved file path of the url path.
+        """
+        return os.path.join('output_test', mini_spider.urllib2.quote(self.base_url + path, ''))
+
+    def test_crawl(self):
+        """ Test crawling webpages to max depth.
+        """
+        self.run_event_spider([self.base_url + '/index.html'], 1)
+        self.assertEqual(self.crawled_urls, set([self.base_url + '/page.html',
+                                                 self.base_url + '/image.png',
+                                                 self.base_url + '/moved.html',
+                                                 self.base_url + '/missing.html']))
+        self.assertTrue(self.url_queue.empty())
+        with open(self.saved_path('/image.png'), 'rb') as saved_file:
+            self.assertEqual(saved_file.read(), 'image')
+        with open(self.saved_path('/moved.html'), 'rb') as saved_file:
+            self.assertEqual(saved_file.read(), 'Target')
+        self.assertFalse(os.path.exists(self.saved_path('/missing.html')))
+        self.assertFalse(os.path.exists(self.saved_path('/other.png')))
+
+    def test_crawl_unreachable_url(self):
+        """ Test crawling urls which fail to connect.
+        """
+        unused_socket = socket.socket()
+        unused_socket.bind(('127.0.0.1', 0))
+        unused_url = 'http://127.0.0.1:%d/index.html' % unused_socket.getsockname()[1]
+        unused_socket.close()
+        self.run_event_spider([unused_url, 'ftp://example.com/'], 1)
+        self.assertEqual(len(self.crawled_urls), 0)
+        self.assertTrue(self.url_queue.empty())
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
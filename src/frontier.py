@@ -0,0 +1,547 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes a crawl frontier which schedules urls per host, so the
+crawl interval is kept between the requests to the same host instead of
+between the jobs of each thread.
+
+The urls of a host are handed out by a pluggable score, lower first:
+
+    fifo: In the order they are put.
+    depth: Shallower urls first.
+    target: Urls matching target_url first, then shallower urls.
+
+A host has one url in flight at a time, unless a concurrency controller,
+like adaptive_concurrency.ConcurrencyController, limits the urls in flight
+per host and in total. A host_health.HostHealth parks the urls of a
+failing host and probes it with one url at a time.
+
+Only max_memory_urls urls are kept in memory. The others spill to segment
+files of (score, depth, url) records, each sorted by score, and the segment
+with the best score is loaded back when the memory urls run low.
+
+Author: weileizhe
+Date: 2015/01/05 00:00:06
+"""
+
+import heapq
+import logging
+import os
+import Queue
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import urlparse
+
+
+FRONTIER_SCORES = ('fifo', 'depth', 'target')
+
+# The score subtracted from the urls matching target_url by the target score.
+TARGET_SCORE_BONUS = 65536
+
+SPILL_RECORD_HEADER = struct.Struct('<dII')
+
+# The seconds join() waits at a time, as a signal handler of the main thread
+# only runs between two waits.
+JOIN_WAIT_INTERVAL = 1
+
+
+class FrontierClosed(Exception):
+    """
+    Frontier exception if get from a closed frontier.
+    """
+    pass
+
+
+def url_host(url):
+    """
+    Get the host key of url for politeness scheduling.
+
+    Args:
+        url: The url.
+
+    Returns:
+        The lower case netloc of url.
+    """
+    return urlparse.urlsplit(url).netloc.lower()
+
+
+def parse_host_crawl_intervals(host_crawl_intervals):
+    """
+    Parse the per host crawl interval overrides.
+
+    Args:
+        host_crawl_intervals: A string like "example.com=0.5, slow.org=5".
+
+    Returns:
+        A dict from host to crawl interval in seconds.
+
+    Raises:
+        ValueError: Fail to parse the overrides.
+    """
+    intervals = {}
+    for item in host_crawl_intervals.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, separator, interval = item.partition('=')
+        if not separator or not host.strip():
+            raise ValueError('Bad host crawl interval %r' % item)
+        interval = float(interval)
+        if interval < 0:
+            raise ValueError('Negative host crawl interval %r' % item)
+        intervals[host.strip().lower()] = interval
+    return intervals
+
+
+def create_score_function(name, target_url):
+    """
+    Create the score function of the urls of a host.
+
+    Args:
+        name: The score name of FRONTIER_SCORES.
+        target_url: The target url regular expression of the target score.
+
+    Returns:
+        A function of a url object to its score, lower first, None for fifo.
+
+    Raises:
+        ValueError: Unknown score.
+    """
+    if name == 'fifo':
+        return None
+    if name == 'depth':
+        return lambda url_obj: url_obj.depth
+    if name == 'target':
+        target_regex = re.compile(target_url)
+        return lambda url_obj: url_obj.depth - (
+            TARGET_SCORE_BONUS if target_regex.match(url_obj.url) is not None else 0)
+    raise ValueError('unknown frontier score %s' % name)
+
+
+def put_urls(url_queue, url_objs):
+    """
+    Put the url objects to url_queue in one batch if it has put_many, one
+    by one otherwise, like a Queue.Queue.
+
+    Args:
+        url_queue: The url queue.
+        url_objs: The list of url objects to crawl.
+    """
+    if not url_objs:
+        return
+    put_many = getattr(url_queue, 'put_many', None)
+    if put_many is not None:
+        put_many(url_objs)
+        return
+    for url_obj in url_objs:
+        url_queue.put(url_obj)
+
+
+class HostFrontier(object):
+    """
+    A url queue which only hands out urls whose host is due.
+
+    Each host has a ready time. A host is handed out to one worker at a time,
+    and when task_done(url_obj) reports its url finished, the host becomes
+    ready again after its crawl interval. get() always hands out the url of
+    the earliest ready host, so workers never wait while another host is due.
+
+    With a concurrency controller, a host is handed out to host_limit(host)
+    workers at a time, each url at least the crawl interval after the last
+    one, and get() waits while global_limit() urls are in flight.
+
+    With a host health, a host is not handed out before its ready_time(host),
+    nor to more workers than its host_limit(host) if it has one.
+
+    The urls of a host are kept in a heap of (score, sequence, url object),
+    so the url of the lowest score, then the first put, is handed out.
+
+    If max_memory_urls is set, a url put while the memory is full spills to
+    a segment buffer, written as a segment file sorted by score when it has
+    max_memory_urls / 2 urls. When the memory urls fall to half, or no host
+    is due, the segment of the best score is loaded back.
+
+    It keeps the Queue.Queue interface used by the crawl engines: put, get,
+    get_nowait, task_done, join, empty and qsize, and adds put_many to put
+    the links of a webpage under one lock acquisition. close() wakes up the workers
+    blocked in get() when the crawl is over, and removes the segment files.
+
+    Attributes:
+        crawl_interval: The default crawl interval per host in seconds.
+        host_crawl_intervals: A dict from host to its own crawl interval.
+        score: The function of a url object to its score, None for fifo.
+        max_memory_urls: The max urls kept in memory, 0 for no limit.
+        spilled_urls: The urls spilled to disk so far.
+        spilled_segments: The segment files written so far.
+        concurrency: The controller of the urls in flight, None for one per host.
+        host_health: The host_health.HostHealth parking failing hosts, None not to.
+        in_flight: The urls handed out and not done.
+    """
+
+    def __init__(self, crawl_interval, host_crawl_intervals=None, score=None,
+                 max_memory_urls=0, spill_directory=None, url_factory=None,
+                 concurrency=None, host_health=None):
+        """ Init the frontier.
+
+        Args:
+            crawl_interval: The default crawl interval per host in seconds.
+            host_crawl_intervals: A dict from host to its own crawl interval.
+            score: The function of a url object to its score, None for fifo.
+            max_memory_urls: The max urls kept in memory, 0 for no limit.
+            spill_directory: The directory to make the segment directory in,
+                             None for the system temp directory.
+            url_factory: The function making a url object of (url, depth)
+                         loaded from a segment, required by max_memory_urls.
+            concurrency: The controller of the urls in flight with host_limit(host)
+                         and global_limit(), None for one url per host.
+            host_health: The host_health.HostHealth parking failing hosts, None not to.
+        """
+        self.crawl_interval = crawl_interval
+        self.host_crawl_intervals = host_crawl_intervals or {}
+        self.score = score
+        self.max_memory_urls = max_memory_urls
+        self.spill_directory = spill_directory
+        self.url_factory = url_factory
+        self.concurrency = concurrency
+        self.host_health = host_health
+        self.segment_size = max(1, max_memory_urls // 2)
+        self.segment_directory = None
+        self.segments = []
+        self.spill_buffer = []
+        self.memory_url_count = 0
+        self.spilled_urls = 0
+        self.spilled_segments = 0
+        self.url_sequence = 0
+        self.host_urls = {}
+        self.host_ready_times = {}
+        self.host_in_flight = {}
+        self.in_flight = 0
+        self.scheduled_hosts = set()
+        self.ready_hosts = []
+        self.ready_sequence = 0
+        self.url_count = 0
+        self.unfinished_tasks = 0
+        self.closed = False
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.all_tasks_done = threading.Condition(self.mutex)
+
+    def host_crawl_interval(self, host):
+        """
+        Get the crawl interval of host.
+
+        Args:
+            host: The host key.
+
+        Returns:
+            The crawl interval in seconds.
+        """
+        return self.host_crawl_intervals.get(host, self.crawl_interval)
+
+    def _host_limit(self, host):
+        """
+        Get the limit of the urls in flight of host, holding the mutex.
+        """
+        limit = 1 if self.concurrency is None else self.concurrency.host_limit(host)
+        if self.host_health is not None:
+            health_limit = self.host_health.host_limit(host)
+            if health_limit is not None:
+                limit = min(limit, health_limit)
+        return limit
+
+    def _host_ready_time(self, host, ready_time):
+        """
+        Get the time host is ready at, ready_time unless it is parked later,
+        holding the mutex.
+        """
+        if self.host_health is None:
+            return ready_time
+        return max(ready_time, self.host_health.ready_time(host))
+
+    def _saturated(self):
+        """
+        Judge if the urls in flight reach the global limit, holding the mutex.
+        """
+        return self.concurrency is not None and \
+            self.in_flight >= self.concurrency.global_limit()
+
+    def put(self, url_obj, block=True, timeout=None):
+        """
+        Put the url object to its host queue, or spill it if the memory is full.
+
+        Args:
+            url_obj: The url object to crawl.
+            block: Unused, the frontier is unbounded.
+            timeout: Unused, the frontier is unbounded.
+        """
+        score = 0 if self.score is None else self.score(url_obj)
+        with self.mutex:
+            if self.max_memory_urls and self.memory_url_count >= self.max_memory_urls:
+                self._spill(score, url_obj)
+            else:
+                self._push_url(score, url_obj)
+            self.url_count += 1
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_many(self, url_objs):
+        """
+        Put the url objects as put does, scored before the lock is taken.
+
+        Args:
+            url_objs: The list of url objects to crawl.
+        """
+        if self.score is None:
+            scored_urls = [(0, url_obj) for url_obj in url_objs]
+        else:
+            scored_urls = [(self.score(url_obj), url_obj) for url_obj in url_objs]
+        with self.mutex:
+            for score, url_obj in scored_urls:
+                if self.max_memory_urls and self.memory_url_count >= self.max_memory_urls:
+                    self._spill(score, url_obj)
+                else:
+                    self._push_url(score, url_obj)
+            self.url_count += len(scored_urls)
+            self.unfinished_tasks += len(scored_urls)
+            self.not_empty.notify(len(scored_urls))
+
+    def _push_url(self, score, url_obj):
+        """
+        Put the url object to its host heap, holding the mutex.
+        """
+        host = url_host(url_obj.url)
+        urls = self.host_urls.get(host)
+        if urls is None:
+            urls = self.host_urls[host] = []
+            if self.host_in_flight.get(host, 0) < self._host_limit(host):
+                ready_time = self._host_ready_time(host, self.host_ready_times.pop(host, 0))
+                self._push_ready_host(ready_time, host)
+        self.url_sequence += 1
+        heapq.heappush(urls, (score, self.url_sequence, url_obj))
+        self.memory_url_count += 1
+
+    def _spill(self, score, url_obj):
+        """
+        Add the url object to the segment buffer, writing the buffer as a
+        segment file when full, holding the mutex.
+        """
+        url = url_obj.url
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        self.spill_buffer.append((score, url_obj.depth, url))
+        self.spilled_urls += 1
+        if len(self.spill_buffer) < self.segment_size:
+            return
+
+        self.spill_buffer.sort()
+        if self.segment_directory is None:
+            self.segment_directory = tempfile.mkdtemp(prefix='frontier-', dir=self.spill_directory)
+        self.spilled_segments += 1
+        path = os.path.join(self.segment_directory, 'segment-%06d' % self.spilled_segments)
+        with open(path, 'wb') as segment_file:
+            for score, depth, url in self.spill_buffer:
+                segment_file.write(SPILL_RECORD_HEADER.pack(score, depth, len(url)))
+                segment_file.write(url)
+        heapq.heappush(self.segments, (self.spill_buffer[0][0], self.spilled_segments, path))
+        self.spill_buffer = []
+
+    def _load_spilled(self):
+        """
+        Load the spilled urls of the best score back to memory, holding the mutex.
+
+        The segment file of the best first score is loaded, or the segment
+        buffer if its first score is better, so equal scores keep their order.
+
+        Returns:
+            True if any url is loaded.
+        """
+        if self.spill_buffer and \
+                (not self.segments or min(self.spill_buffer)[0] < self.segments[0][0]):
+            records, self.spill_buffer = self.spill_buffer, []
+        elif self.segments:
+            _, _, path = heapq.heappop(self.segments)
+            with open(path, 'rb') as segment_file:
+                data = segment_file.read()
+            os.remove(path)
+            records = []
+            offset = 0
+            while offset < len(data):
+                score, depth, length = SPILL_RECORD_HEADER.unpack_from(data, offset)
+                offset += SPILL_RECORD_HEADER.size
+                records.append((score, depth, data[offset:offset + length]))
+                offset += length
+        else:
+            return False
+        for score, depth, url in records:
+            self._push_url(score, self.url_factory(url, depth))
+        return True
+
+    def get(self, block=True, timeout=None):
+        """
+        Get the url object of the earliest due host.
+
+        Args:
+            block: Wait until a host is due if True.
+            timeout: The max seconds to wait, None to wait forever.
+
+        Returns:
+            The url object to crawl.
+
+        Raises:
+            Queue.Empty: No host is due.
+            FrontierClosed: The frontier is closed.
+        """
+        with self.not_empty:
+            end_time = None if timeout is None else time.time() + timeout
+            while True:
+                if self.closed:
+                    raise FrontierClosed
+                now = time.time()
+                due = self.ready_hosts and self.ready_hosts[0][0] <= now
+                if self.memory_url_count < self.url_count and \
+                        (self.memory_url_count <= self.max_memory_urls // 2 or
+                         not due and self.memory_url_count < self.max_memory_urls):
+                    if self._load_spilled():
+                        continue
+                saturated = self._saturated()
+                if due and not saturated:
+                    host = self.ready_hosts[0][2]
+                    parked_time = self._host_ready_time(host, 0)
+                    if parked_time > now:
+                        heapq.heappop(self.ready_hosts)
+                        self._push_ready_host(parked_time, host)
+                        continue
+                    if self.host_in_flight.get(host, 0) < self._host_limit(host):
+                        return self._pop_ready_host()
+                    # The limit of host was lowered, task_done schedules it again.
+                    heapq.heappop(self.ready_hosts)
+                    self.scheduled_hosts.discard(host)
+                    continue
+                if not block:
+                    raise Queue.Empty
+                wait_time = None
+                if self.ready_hosts and not saturated:
+                    wait_time = self.ready_hosts[0][0] - now
+                if end_time is not None:
+                    if end_time <= now:
+                        raise Queue.Empty
+                    if wait_time is None or wait_time > end_time - now:
+                        wait_time = end_time - now
+                self.not_empty.wait(wait_time)
+
+    def get_nowait(self):
+        """
+        Get the url object of a due host without waiting.
+
+        Raises:
+            Queue.Empty: No host is due.
+        """
+        return self.get(False)
+
+    def _push_ready_host(self, ready_time, host):
+        """
+        Schedule host at ready_time, holding the mutex. Hosts ready at the same
+        time are handed out in the order they are scheduled.
+        """
+        self.ready_sequence += 1
+        heapq.heappush(self.ready_hosts, (ready_time, self.ready_sequence, host))
+        self.scheduled_hosts.add(host)
+
+    def _pop_ready_host(self):
+        """
+        Hand out the next url of the earliest ready host, holding the mutex.
+
+        A host below its limit stays ready after its crawl interval.
+        """
+        _, _, host = heapq.heappop(self.ready_hosts)
+        self.scheduled_hosts.discard(host)
+        urls = self.host_urls[host]
+        url_obj = heapq.heappop(urls)[2]
+        in_flight = self.host_in_flight[host] = self.host_in_flight.get(host, 0) + 1
+        self.in_flight += 1
+        if in_flight < self._host_limit(host):
+            ready_time = self._host_ready_time(host, time.time() + self.host_crawl_interval(host))
+            if urls:
+                self._push_ready_host(ready_time, host)
+            else:
+                self.host_ready_times[host] = ready_time
+        if not urls:
+            del self.host_urls[host]
+        self.url_count -= 1
+        self.memory_url_count -= 1
+        return url_obj
+
+    def task_done(self, url_obj):
+        """
+        Report the url object finished and make its host ready after its crawl interval.
+
+        Args:
+            url_obj: The url object got from the frontier.
+        """
+        host = url_host(url_obj.url)
+        with self.mutex:
+            in_flight = self.host_in_flight.pop(host, 0)
+            if in_flight:
+                self.in_flight -= 1
+                if in_flight > 1:
+                    self.host_in_flight[host] = in_flight - 1
+            ready_time = self._host_ready_time(host, time.time() + self.host_crawl_interval(host))
+            if host in self.host_urls:
+                if host not in self.scheduled_hosts:
+                    self._push_ready_host(ready_time, host)
+                self.not_empty.notify()
+            else:
+                self.host_ready_times[host] = ready_time
+                if self.concurrency is not None:
+                    self.not_empty.notify()
+
+            self.unfinished_tasks -= 1
+            if self.unfinished_tasks <= 0:
+                self.all_tasks_done.notify_all()
+
+    def join(self):
+        """
+        Wait until every url put to the frontier is done.
+        """
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait(JOIN_WAIT_INTERVAL)
+
+    def close(self):
+        """
+        Close the frontier, wake up the workers blocked in get() and remove
+        the segment files.
+        """
+        with self.mutex:
+            self.closed = True
+            self.not_empty.notify_all()
+            if self.segment_directory is not None:
+                shutil.rmtree(self.segment_directory, True)
+                self.segment_directory = None
+                self.segments = []
+            if self.spilled_urls:
+                logging.info('Frontier spilled %d urls to %d segment files',
+                             self.spilled_urls, self.spilled_segments)
+
+    def empty(self):
+        """
+        Judge if no url is waiting in the frontier, due or not.
+        """
+        with self.mutex:
+            return self.url_count == 0
+
+    def qsize(self):
+        """
+        Get the number of urls waiting in the frontier.
+        """
+        with self.mutex:
+            return self.url_count
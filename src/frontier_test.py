@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for frontier.
+
+Author: weileizhe
+Date: 2015/01/05 00:00:06
+"""
+
+import os
+import Queue
+import threading
+import time
+import unittest
+
+
+import frontier
+import mini_spider
+
+
+class TestParseHostCrawlIntervals(unittest.TestCase):
+    """ Test parse_host_crawl_intervals(host_crawl_intervals) function.
+    """
+
+    def test_parse_host_crawl_intervals(self):
+        """ Test parsing normal overrides.
+        """
+        self.assertEqual(frontier.parse_host_crawl_intervals('Example.com=0.5, slow.org = 5,'),
+                         {'example.com': 0.5, 'slow.org': 5.0})
+        self.assertEqual(frontier.parse_host_crawl_intervals(''), {})
+
+    def test_parse_invalid_host_crawl_intervals(self):
+        """ Test parsing invalid overrides.
+        """
+        for host_crawl_intervals in ('example.com', 'example.com=fast', 'example.com=-1', '=1'):
+            with self.assertRaises(ValueError):
+                frontier.parse_host_crawl_intervals(host_crawl_intervals)
+
+
+class TestHostFrontier(unittest.TestCase):
+    """ Test for HostFrontier.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.frontier = frontier.HostFrontier(10, {'fast.com': 0})
+
+    def test_host_is_busy_until_done(self):
+        """ Test a host is not handed out again before its url is done.
+        """
+        self.frontier.put(mini_spider.Url('http://fast.com/1'))
+        self.frontier.put(mini_spider.Url('http://fast.com/2'))
+        url_obj = self.frontier.get_nowait()
+        self.assertEqual(url_obj.url, 'http://fast.com/1')
+        with self.assertRaises(Queue.Empty):
+            self.frontier.get_nowait()
+        self.frontier.task_done(url_obj)
+        self.assertEqual(self.frontier.get_nowait().url, 'http://fast.com/2')
+
+    def test_other_host_while_waiting(self):
+        """ Test urls of other hosts are handed out while a host waits its interval.
+        """
+        self.frontier.put(mini_spider.Url('http://slow.com/1'))
+        self.frontier.put(mini_spider.Url('http://slow.com/2'))
+        self.frontier.put(mini_spider.Url('http://fast.com/1'))
+        url_obj = self.frontier.get_nowait()
+        self.assertEqual(url_obj.url, 'http://slow.com/1')
+        self.frontier.task_done(url_obj)
+        self.assertEqual(self.frontier.get_nowait().url, 'http://fast.com/1')
+        with self.assertRaises(Queue.Empty):
+            self.frontier.get(timeout=0.01)
+        self.assertEqual(self.frontier.qsize(), 1)
+        self.assertFalse(self.frontier.empty())
+
+    def test_host_crawl_interval(self):
+        """ Test the host is due again after its crawl interval.
+        """
+        url_frontier = frontier.HostFrontier(0.05)
+        url_frontier.put(mini_spider.Url('http://example.com/1'))
+        url_frontier.put(mini_spider.Url('http://example.com/2'))
+        url_obj = url_frontier.get_nowait()
+        done_time = time.time()
+        url_frontier.task_done(url_obj)
+        self.assertEqual(url_frontier.get(timeout=1).url, 'http://example.com/2')
+        self.assertTrue(time.time() - done_time >= 0.05)
+
+    def test_join(self):
+        """ Test join waits until every url is done.
+        """
+        url_frontier = frontier.HostFrontier(0)
+        for i in xrange(20):
+            url_frontier.put(mini_spider.Url('http://host%d.com/' % (i % 3)))
+        done_urls = []
+
+        def worker():
+            while True:
+                url_obj = url_frontier.get()
+                done_urls.append(url_obj.url)
+                url_frontier.task_done(url_obj)
+
+        for i in xrange(4):
+            worker_thread = threading.Thread(target=worker)
+            worker_thread.setDaemon(True)
+            worker_thread.start()
+        url_frontier.join()
+        self.assertEqual(len(done_urls), 20)
+        self.assertTrue(url_frontier.empty())
+
+    def test_close(self):
+        """ Test close wakes up the workers blocked in get.
+        """
+        errors = []
+
+        def worker():
+            try:
+                self.frontier.get()
+            except frontier.FrontierClosed as error:
+                errors.append(error)
+
+        worker_thread = threading.Thread(target=worker)
+        worker_thread.start()
+        self.frontier.close()
+        worker_thread.join(1)
+        self.assertEqual(len(errors), 1)
+
+
+class FixedConcurrency(object):
+    """ A concurrency controller of fixed limits.
+    """
+
+    def __init__(self, host_limits, global_limit):
+        self.host_limits = host_limits
+        self.total = global_limit
+
+    def host_limit(self, host):
+        return self.host_limits.get(host, 1)
+
+    def global_limit(self):
+        return self.total
+
+
+class TestLimitedFrontier(unittest.TestCase):
+    """ Test for HostFrontier with a concurrency controller.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.concurrency = FixedConcurrency({'wide.com': 2}, 3)
+        self.frontier = frontier.HostFrontier(0, concurrency=self.concurrency)
+
+    def test_host_limit(self):
+        """ Test a host is handed out up to its limit at a time.
+        """
+        for i in xrange(3):
+            self.frontier.put(mini_spider.Url('http://wide.com/%d' % i))
+        first = self.frontier.get_nowait()
+        self.assertEqual(self.frontier.get_nowait().url, 'http://wide.com/1')
+        with self.assertRaises(Queue.Empty):
+            self.frontier.get_nowait()
+        self.frontier.task_done(first)
+        self.assertEqual(self.frontier.get_nowait().url, 'http://wide.com/2')
+
+    def test_lowered_host_limit(self):
+        """ Test a host over its lowered limit waits for its urls in flight.
+        """
+        for i in xrange(3):
+            self.frontier.put(mini_spider.Url('http://wide.com/%d' % i))
+        first = self.frontier.get_nowait()
+        self.concurrency.host_limits['wide.com'] = 1
+        with self.assertRaises(Queue.Empty):
+            self.frontier.get_nowait()
+        self.frontier.task_done(first)
+        second = self.frontier.get_nowait()
+        with self.assertRaises(Queue.Empty):
+            self.frontier.get_nowait()
+        self.concurrency.host_limits['wide.com'] = 2
+        self.frontier.task_done(second)
+        self.frontier.get_nowait()
+
+    def test_global_limit(self):
+        """ Test get waits while the global limit of urls is in flight.
+        """
+        for i in xrange(4):
+            self.frontier.put(mini_spider.Url('http://host%d.com/' % i))
+        url_objs = [self.frontier.get_nowait() for i in xrange(3)]
+        with self.assertRaises(Queue.Empty):
+            self.frontier.get(timeout=0.01)
+        self.assertEqual(self.frontier.in_flight, 3)
+
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(self.frontier.get(timeout=1)))
+        waiter.start()
+        self.frontier.task_done(url_objs[0])
+        waiter.join()
+        self.assertEqual(got[0].url, 'http://host3.com/')
+
+
+class TestScoredFrontier(unittest.TestCase):
+    """ Test for HostFrontier with a score and spilled urls.
+    """
+
+    def drain(self, url_frontier):
+        """ Get every url, reporting each done at once.
+        """
+        urls = []
+        while not url_frontier.empty():
+            url_obj = url_frontier.get_nowait()
+            urls.append((url_obj.url, url_obj.depth))
+            url_frontier.task_done(url_obj)
+        return urls
+
+    def test_create_score_function(self):
+        """ Test the urls of a host are handed out by score.
+        """
+        self.assertEqual(frontier.create_score_function('fifo', '.*'), None)
+        with self.assertRaises(ValueError):
+            frontier.create_score_function('random', '.*')
+
+        url_frontier = frontier.HostFrontier(0, score=frontier.create_score_function(
+            'target', r'.*\.png$'))
+        for url, depth in (('http://a.com/1.html', 1), ('http://a.com/2.html', 0),
+                           ('http://a.com/3.png', 2), ('http://a.com/4.html', 1)):
+            url_frontier.put(mini_spider.Url(url, depth))
+        self.assertEqual(self.drain(url_frontier),
+                         [('http://a.com/3.png', 2), ('http://a.com/2.html', 0),
+                          ('http://a.com/1.html', 1), ('http://a.com/4.html', 1)])
+
+    def test_spill(self):
+        """ Test urls over max_memory_urls spill to disk and come back in score order.
+        """
+        url_frontier = frontier.HostFrontier(0, score=lambda url_obj: url_obj.depth,
+                                             max_memory_urls=4, url_factory=mini_spider.Url)
+        for depth in (5, 4, 3, 2, 1, 9, 8, 7, 0, 6):
+            url_frontier.put(mini_spider.Url('http://a.com/%d' % depth, depth))
+        self.assertEqual((url_frontier.memory_url_count, url_frontier.qsize()), (4, 10))
+        self.assertEqual((url_frontier.spilled_urls, url_frontier.spilled_segments), (6, 3))
+        segment_directory = url_frontier.segment_directory
+        self.assertEqual(len(os.listdir(segment_directory)), 3)
+
+        urls = self.drain(url_frontier)
+        self.assertEqual(sorted(urls), [('http://a.com/%d' % depth, depth)
+                                        for depth in xrange(10)])
+        self.assertEqual([depth for url, depth in urls], [2, 3, 0, 4, 1, 5, 6, 7, 8, 9])
+        self.assertEqual(url_frontier.memory_url_count, 0)
+        url_frontier.close()
+        self.assertFalse(os.path.exists(segment_directory))
+
+    def test_put_many(self):
+        """ Test a batch put is handed out as urls put one by one, spilled or not.
+        """
+        url_frontier = frontier.HostFrontier(0, score=lambda url_obj: url_obj.depth,
+                                             max_memory_urls=4, url_factory=mini_spider.Url)
+        frontier.put_urls(url_frontier, [mini_spider.Url('http://a.com/%d' % depth, depth)
+                                         for depth in (5, 4, 3, 2, 1, 9, 8, 7, 0, 6)])
+        self.assertEqual((url_frontier.memory_url_count, url_frontier.qsize()), (4, 10))
+        self.assertEqual([depth for url, depth in self.drain(url_frontier)],
+                         [2, 3, 0, 4, 1, 5, 6, 7, 8, 9])
+        url_frontier.close()
+
+        url_queue = Queue.Queue()
+        frontier.put_urls(url_queue, [mini_spider.Url('http://a.com/%d' % i) for i in xrange(3)])
+        self.assertEqual(url_queue.qsize(), 3)
+
+    def test_spill_fifo(self):
+        """ Test spilled urls of the fifo score keep the order they are put.
+        """
+        url_frontier = frontier.HostFrontier(0, max_memory_urls=2, url_factory=mini_spider.Url)
+        for i in xrange(7):
+            url_frontier.put(mini_spider.Url('http://a.com/%d' % i))
+        self.assertEqual([url for url, depth in self.drain(url_frontier)],
+                         ['http://a.com/%d' % i for i in xrange(7)])
+        url_frontier.close()
+
+    def test_load_spilled_host_while_waiting(self):
+        """ Test spilled urls of a due host are loaded while the memory hosts wait.
+        """
+        url_frontier = frontier.HostFrontier(10, max_memory_urls=2, url_factory=mini_spider.Url)
+        for url in ('http://slow.com/1', 'http://slow.com/2', 'http://other.com/1'):
+            url_frontier.put(mini_spider.Url(url))
+        url_obj = url_frontier.get_nowait()
+        url_frontier.task_done(url_obj)
+        self.assertEqual(url_frontier.get_nowait().url, 'http://other.com/1')
+        url_frontier.close()
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
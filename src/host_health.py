@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the health of the crawled hosts, so a few dead or
+overloaded hosts do not tie up the workers with grabs waiting out the
+crawl timeout.
+
+A grab failed by a timeout, a connection error or a 429 or 5xx response is
+transient. The url is retried up to max_retries times, and each transient
+failure in a row after the first delays its host by a jittered exponential
+backoff, so a one-off failure costs only its retry:
+
+    closed: The host is grabed as usual, after its backoff if it failed.
+    open: failure_threshold failures in a row open the circuit of the host.
+          Its queued urls are parked for open_seconds, doubled each time the
+          circuit opens again, up to max_open_seconds.
+    half-open: After that, one url of the host is grabed as a probe. A
+               success closes the circuit, a failure opens it again.
+
+A host whose circuit opens max_trips times in a row is given up, and its
+urls fail at once.
+
+Author: weileizhe
+Date: 2015/05/04 00:00:06
+"""
+
+import httplib
+import logging
+import random
+import socket
+import threading
+import time
+import urllib2
+
+
+TRANSIENT_CODES = (429, 500, 502, 503, 504)
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 1
+DEFAULT_MAX_RETRY_BACKOFF = 60
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_OPEN_SECONDS = 30
+DEFAULT_MAX_OPEN_SECONDS = 600
+DEFAULT_MAX_TRIPS = 5
+
+
+def is_transient(error):
+    """
+    Judge if a grab failed with error may succeed when retried.
+
+    Args:
+        error: The exception of the grab. An exception of the event engine
+               tells it by its transient attribute.
+
+    Returns:
+        True for a 429 or 5xx urllib2.HTTPError, a socket error or a broken
+        HTTP response, False otherwise.
+    """
+    if isinstance(error, urllib2.HTTPError):
+        return error.code in TRANSIENT_CODES
+    if isinstance(error, urllib2.URLError):
+        return isinstance(error.reason, socket.error)
+    if isinstance(error, (socket.error, httplib.HTTPException)):
+        return True
+    return getattr(error, 'transient', False)
+
+
+class HostState(object):
+    """
+    The failures of a host in a row.
+
+    Attributes:
+        failures: The transient failures in a row.
+        trips: The times the circuit opened in a row.
+        open_until: The time the circuit is half-open at.
+        backoff_until: The time the backoff of the last failure ends at.
+    """
+    __slots__ = ('failures', 'trips', 'open_until', 'backoff_until')
+
+    def __init__(self):
+        """ Init the state of a healthy host.
+        """
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0
+        self.backoff_until = 0
+
+
+class HostHealth(object):
+    """
+    The circuit breakers and the retry backoff of the crawled hosts.
+
+    The frontier asks ready_time(host) and host_limit(host) to park or probe
+    the urls of a host, and the spider reports each grab to record_success
+    or record_failure and asks allows(host) before grabing.
+
+    Attributes:
+        max_retries: The times a url failed transiently is retried.
+        retry_backoff: The backoff of the first failure in seconds.
+        max_retry_backoff: The max backoff in seconds.
+        failure_threshold: The failures in a row opening the circuit.
+        open_seconds: The seconds the circuit first stays open.
+        max_open_seconds: The max seconds the circuit stays open.
+        max_trips: The times the circuit opens in a row before the host is
+                   given up, 0 never to give up.
+        opened: The times a circuit opened so far.
+        recovered: The times a circuit closed again so far.
+        given_up: The hosts given up so far.
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+                 max_retry_backoff=DEFAULT_MAX_RETRY_BACKOFF,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, open_seconds=DEFAULT_OPEN_SECONDS,
+                 max_open_seconds=DEFAULT_MAX_OPEN_SECONDS, max_trips=DEFAULT_MAX_TRIPS):
+        """ Init the host health.
+
+        Args:
+            max_retries: The times a url failed transiently is retried.
+            retry_backoff: The backoff of the first failure in seconds.
+            max_retry_backoff: The max backoff in seconds.
+            failure_threshold: The failures in a row opening the circuit.
+            open_seconds: The seconds the circuit first stays open.
+            max_open_seconds: The max seconds the circuit stays open.
+            max_trips: The times the circuit opens in a row before the host
+                       is given up, 0 never to give up.
+        """
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.max_trips = max_trips
+        self.opened = 0
+        self.recovered = 0
+        self.given_up = 0
+        self.hosts = {}
+        self.mutex = threading.Lock()
+
+    def backoff(self, failures):
+        """
+        Get the jittered backoff of a host, a random time between half and all
+        of the exponential backoff, so the retries spread out.
+
+        Args:
+            failures: The failures in a row backed off, from 1.
+
+        Returns:
+            The seconds to wait.
+        """
+        ceiling = min(self.max_retry_backoff, self.retry_backoff * 2 ** (failures - 1))
+        return random.uniform(ceiling / 2.0, ceiling)
+
+    def record_success(self, host):
+        """
+        Record a grab of host answered, which closes its circuit.
+        """
+        with self.mutex:
+            state = self.hosts.pop(host, None)
+            if state is not None and state.trips:
+                self.recovered += 1
+                logging.info('Circuit of host %s closed, it recovered after %d failures',
+                             host, state.failures)
+
+    def record_failure(self, host):
+        """
+        Record a grab of host failed transiently, which backs it off from the
+        second failure in a row and opens its circuit after failure_threshold
+        failures in a row. A failed probe of a half-open circuit opens it again
+        for twice as long.
+        """
+        now = time.time()
+        with self.mutex:
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = HostState()
+            elif self._given_up(state):
+                return
+            state.failures += 1
+            if state.failures < self.failure_threshold or now < state.open_until:
+                if state.failures > 1:
+                    state.backoff_until = now + self.backoff(state.failures - 1)
+                return
+            state.trips += 1
+            self.opened += 1
+            if self.max_trips and state.trips >= self.max_trips:
+                self.given_up += 1
+                logging.warn('Give up host %s after %d failures', host, state.failures)
+                return
+            open_seconds = min(self.max_open_seconds,
+                               self.open_seconds * 2 ** (state.trips - 1))
+            state.open_until = now + open_seconds
+            logging.warn('Circuit of host %s open for %.1f seconds after %d failures',
+                         host, open_seconds, state.failures)
+
+    def _given_up(self, state):
+        """
+        Judge if the host of state is given up, holding the mutex.
+        """
+        return bool(self.max_trips) and state.trips >= self.max_trips
+
+    def allows(self, host):
+        """
+        Judge if host is still grabed, False once it is given up.
+        """
+        with self.mutex:
+            state = self.hosts.get(host)
+            return state is None or not self._given_up(state)
+
+    def ready_time(self, host):
+        """
+        Get the time the urls of host are parked until.
+
+        Returns:
+            The end of the open circuit or the backoff of host, 0 if it is healthy
+            or given up, as the urls of a given up host fail at once.
+        """
+        with self.mutex:
+            state = self.hosts.get(host)
+            if state is None or self._given_up(state):
+                return 0
+            return max(state.open_until, state.backoff_until)
+
+    def host_limit(self, host):
+        """
+        Get the limit of the urls of host in flight.
+
+        Returns:
+            1 while the circuit of host is open or half-open, so it is probed
+            with one url, None if it is not limited.
+        """
+        with self.mutex:
+            state = self.hosts.get(host)
+            if state is None or state.failures < self.failure_threshold or \
+                    self._given_up(state):
+                return None
+            return 1
+
+    def open_hosts(self):
+        """
+        Get the number of hosts whose circuit is open now.
+        """
+        now = time.time()
+        with self.mutex:
+            return sum(1 for state in self.hosts.itervalues()
+                       if state.open_until > now and not self._given_up(state))
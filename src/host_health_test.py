@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for host health.
+
+Author: weileizhe
+Date: 2015/05/04 00:00:06
+"""
+
+import httplib
+import Queue
+import socket
+import time
+import unittest
+import urllib2
+
+
+import httpretty
+
+import event_spider
+import frontier
+import host_health
+import mini_spider
+import seen_store
+
+
+class TestIsTransient(unittest.TestCase):
+    """ Test is_transient(error) function.
+    """
+
+    def test_is_transient(self):
+        """ Test timeouts, connection errors and 429 or 5xx responses are transient.
+        """
+        for error in (socket.timeout('timed out'), socket.error(111, 'refused'),
+                      urllib2.URLError(socket.timeout()), httplib.BadStatusLine(''),
+                      urllib2.HTTPError('http://a.com/', 503, 'busy', {}, None),
+                      event_spider.FetchError('timed out')):
+            self.assertTrue(host_health.is_transient(error))
+        for error in (urllib2.HTTPError('http://a.com/', 404, 'missing', {}, None),
+                      urllib2.URLError('unknown url type'), ValueError('bad url'),
+                      event_spider.FetchError('Unsupported url', False)):
+            self.assertFalse(host_health.is_transient(error))
+
+
+class TestHostHealth(unittest.TestCase):
+    """ Test for HostHealth.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.health = host_health.HostHealth(2, 0.1, 0.3, 3, 0.2, 0.3, 3)
+
+    def test_backoff(self):
+        """ Test the jittered backoff grows exponentially up to its max.
+        """
+        for failures, ceiling in ((1, 0.1), (2, 0.2), (3, 0.3), (10, 0.3)):
+            for i in xrange(20):
+                self.assertTrue(ceiling / 2 <= self.health.backoff(failures) <= ceiling)
+
+    def test_retry_backoff(self):
+        """ Test a host failing in a row waits its backoff and a success clears it.
+        """
+        self.assertEqual(self.health.ready_time('a.com'), 0)
+        self.health.record_failure('a.com')
+        self.assertEqual(self.health.ready_time('a.com'), 0)
+        self.health.record_failure('a.com')
+        self.assertGreater(self.health.ready_time('a.com'), time.time())
+        self.assertEqual(self.health.host_limit('a.com'), None)
+        self.health.record_success('a.com')
+        self.assertEqual(self.health.ready_time('a.com'), 0)
+
+    def test_circuit(self):
+        """ Test the circuit opens, probes one url when half-open and closes.
+        """
+        for i in xrange(3):
+            self.health.record_failure('a.com')
+        self.assertEqual(self.health.opened, 1)
+        self.assertEqual(self.health.open_hosts(), 1)
+        self.assertEqual(self.health.host_limit('a.com'), 1)
+        self.assertGreater(self.health.ready_time('a.com'), time.time() + 0.1)
+
+        time.sleep(0.2)
+        self.assertEqual(self.health.open_hosts(), 0)
+        self.health.record_failure('a.com')
+        self.assertEqual(self.health.opened, 2)
+        self.assertGreater(self.health.ready_time('a.com'), time.time() + 0.25)
+
+        self.health.record_success('a.com')
+        self.assertEqual(self.health.recovered, 1)
+        self.assertEqual(self.health.host_limit('a.com'), None)
+        self.assertEqual(self.health.ready_time('a.com'), 0)
+
+    def test_give_up(self):
+        """ Test a host is given up after its circuit opens max_trips times in a row.
+        """
+        self.health.open_seconds = self.health.max_open_seconds = 0.01
+        for i in xrange(3):
+            self.health.record_failure('a.com')
+            self.health.record_failure('a.com')
+            self.health.record_failure('a.com')
+            time.sleep(0.02)
+        self.assertFalse(self.health.allows('a.com'))
+        self.assertTrue(self.health.allows('b.com'))
+        self.assertEqual(self.health.given_up, 1)
+        self.assertEqual(self.health.ready_time('a.com'), 0)
+        self.assertEqual(self.health.host_limit('a.com'), None)
+        self.health.record_failure('a.com')
+        self.assertEqual(self.health.given_up, 1)
+
+
+class TestParkedFrontier(unittest.TestCase):
+    """ Test for HostFrontier with a host health.
+    """
+
+    def test_parked_host(self):
+        """ Test the urls of an open circuit are parked, then probed one at a time.
+        """
+        health = host_health.HostHealth(2, 0.1, 0.1, 1, 0.1, 0.1, 0)
+        url_frontier = frontier.HostFrontier(0, concurrency=None, host_health=health)
+        for url in ('http://bad.com/1', 'http://bad.com/2', 'http://good.com/1'):
+            url_frontier.put(mini_spider.Url(url))
+        url_obj = url_frontier.get_nowait()
+        self.assertEqual(url_obj.url, 'http://bad.com/1')
+        health.record_failure('bad.com')
+        url_frontier.task_done(url_obj)
+        self.assertEqual(url_frontier.get_nowait().url, 'http://good.com/1')
+        with self.assertRaises(Queue.Empty):
+            url_frontier.get_nowait()
+        start_time = time.time()
+        self.assertEqual(url_frontier.get(timeout=1).url, 'http://bad.com/2')
+        self.assertGreater(time.time() - start_time, 0.05)
+
+
+class TestRetryUrl(unittest.TestCase):
+    """ Test the urls failed transiently are retried.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        httpretty.enable()
+        httpretty.register_uri(httpretty.GET, 'http://busy.com/', body='busy', status=503)
+        httpretty.register_uri(httpretty.GET, 'http://gone.com/', body='gone', status=404)
+        self.url_queue = Queue.Queue()
+        self.health = host_health.HostHealth(1, 0.01, 0.01, 5, 1, 1, 1)
+        self.spider = mini_spider.MiniSpider(self.url_queue, seen_store.SetSeenStore(), 1, 0, 5,
+                                             '.*\.png$', './output', host_health=self.health)
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        httpretty.disable()
+        httpretty.reset()
+
+    def test_retry_url(self):
+        """ Test a 503 is retried up to max_retries times and a 404 is not.
+        """
+        self.spider.crawl_job(mini_spider.Url('http://busy.com/', 1), self.url_queue, set())
+        retry = self.url_queue.get_nowait()
+        self.assertEqual((retry.url, retry.depth, retry.retries), ('http://busy.com/', 1, 1))
+        self.spider.crawl_job(retry, self.url_queue, set())
+        self.assertTrue(self.url_queue.empty())
+        self.assertEqual(self.health.hosts['busy.com'].failures, 2)
+
+        self.spider.crawl_job(mini_spider.Url('http://gone.com/'), self.url_queue, set())
+        self.assertTrue(self.url_queue.empty())
+        self.assertNotIn('gone.com', self.health.hosts)
+
+    def test_given_up_host(self):
+        """ Test the urls of a given up host fail without a grab.
+        """
+        for i in xrange(5):
+            self.health.record_failure('busy.com')
+        requests = len(httpretty.latest_requests())
+        self.spider.crawl_job(mini_spider.Url('http://busy.com/'), self.url_queue, set())
+        self.assertEqual(len(httpretty.latest_requests()), requests)
+        self.assertTrue(self.url_queue.empty())
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
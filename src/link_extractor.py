@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the link extractors which find the urls in a webpage.
+
+Every extractor offers extract(webpage_content) which iterates the href of
+a and link elements and the src of script and img elements, in the raw form
+written in the webpage:
+
+    tokenizer: One pass of a regular expression over the webpage which only
+               tokenizes the start tags of these elements, comments and the
+               script and style bodies. No DOM is built.
+    beautifulsoup: The whole webpage parsed to a BeautifulSoup DOM, slower
+                   and larger but tolerant of any broken markup.
+
+Author: weileizhe
+Date: 2015/02/02 00:00:06
+"""
+
+import htmlentitydefs
+import logging
+import re
+
+import bs4
+
+
+LINK_EXTRACTORS = ('tokenizer', 'beautifulsoup')
+
+ELEMENT_ATTRIBUTION_MAP = {
+    'a': 'href',
+    'link': 'href',
+    'script': 'src',
+    'img': 'src',
+}
+
+# A comment, or the start tag of an element holding a url or a raw text body.
+# Quoted attribute values may hold '>'.
+TAG_PATTERN = re.compile(r'<!--(?:.*?-->|.*)'
+                         r'|<(?P<element>a|link|img|script|style)(?=[\s/>])'
+                         r'(?P<attributions>(?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+                         re.IGNORECASE | re.DOTALL)
+
+ATTRIBUTION_PATTERN = re.compile(r'(?<![^\s/"\'])(?P<name>[^\s/>"\'=]+)\s*=\s*'
+                                 r'(?:"(?P<double>[^"]*)"|\'(?P<single>[^\']*)\''
+                                 r'|(?P<bare>[^\s>"\']+))')
+
+RAW_TEXT_END_PATTERNS = {
+    'script': re.compile(r'</script[\s/>]', re.IGNORECASE),
+    'style': re.compile(r'</style[\s/>]', re.IGNORECASE),
+}
+
+ENTITY_PATTERN = re.compile(r'&(#[0-9]+|#[xX][0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);')
+
+
+def is_valid_url(url):
+    """
+    Judge if url is valid or not.
+    """
+    if url.startswith('javascript:'):
+        return False
+
+    return True
+
+
+def _replace_entity(match):
+    """
+    Get the character of a character reference match, utf-8 encoded for str.
+    """
+    name = match.group(1)
+    if name.startswith('#x') or name.startswith('#X'):
+        codepoint = int(name[2:], 16)
+    elif name.startswith('#'):
+        codepoint = int(name[1:])
+    else:
+        codepoint = htmlentitydefs.name2codepoint.get(name)
+    if codepoint is None or codepoint > 0x10ffff:
+        return match.group(0)
+
+    try:
+        character = unichr(codepoint)
+    except ValueError:
+        return match.group(0)
+    if isinstance(match.string, unicode):
+        return character
+    return character.encode('utf-8')
+
+
+def unescape_attribution(value):
+    """
+    Replace the character references in an attribution value.
+
+    Args:
+        value: The raw attribution value.
+
+    Returns:
+        The value of the same type with &amp;, &#47; etc. replaced.
+    """
+    if '&' not in value:
+        return value
+    return ENTITY_PATTERN.sub(_replace_entity, value)
+
+
+class TokenizerExtractor(object):
+    """
+    A single pass extractor which only tokenizes the tags holding urls.
+
+    The webpage is scanned once for comments and the start tags of a, link,
+    img, script and style elements. The urls are read from the attributions of
+    the start tags, comments are skipped and the bodies of script and style
+    elements are jumped over, so markup inside them is not taken as links.
+    """
+
+    def extract(self, webpage_content):
+        """
+        Iterate the urls in the webpage in document order.
+
+        Args:
+            webpage_content: The webpage, str or unicode.
+
+        Yields:
+            The raw urls, the same type as webpage_content.
+        """
+        position = 0
+        while True:
+            match = TAG_PATTERN.search(webpage_content, position)
+            if match is None:
+                return
+            position = match.end()
+            element = match.group('element')
+            if element is None:
+                continue
+
+            element = element.lower()
+            attribution_name = ELEMENT_ATTRIBUTION_MAP.get(element)
+            if attribution_name is not None:
+                url = self._find_attribution(match.group('attributions'), attribution_name)
+                if url is not None and is_valid_url(url):
+                    yield url
+
+            if element in RAW_TEXT_END_PATTERNS:
+                end = RAW_TEXT_END_PATTERNS[element].search(webpage_content, position)
+                position = end.start() if end else len(webpage_content)
+
+    def _find_attribution(self, attributions, attribution_name):
+        """
+        Find the first value of attribution_name in the start tag attributions.
+        """
+        if attribution_name not in attributions.lower():
+            return None
+        for match in ATTRIBUTION_PATTERN.finditer(attributions):
+            if match.group('name').lower() == attribution_name:
+                value = match.group('double')
+                if value is None:
+                    value = match.group('single')
+                if value is None:
+                    value = match.group('bare')
+                return unescape_attribution(value).strip()
+        return None
+
+
+class BeautifulSoupExtractor(object):
+    """
+    An extractor which parses the webpage to a BeautifulSoup DOM.
+    """
+
+    def extract(self, webpage_content):
+        """
+        Iterate the urls in the webpage, element by element.
+
+        Args:
+            webpage_content: The webpage, str or unicode.
+
+        Yields:
+            The raw urls as unicode.
+        """
+        soup = bs4.BeautifulSoup(webpage_content)
+        for element, attribution in ELEMENT_ATTRIBUTION_MAP.iteritems():
+            for url in self._find_urls_of_element(soup, element, attribution):
+                yield url
+
+    def _find_urls_of_element(self, soup, element_name, attribution_name):
+        """
+        Find urls of elements.
+        """
+        elements = soup.find_all(element_name)
+        for element in elements:
+            try:
+                url = element[attribution_name]
+                if is_valid_url(url):
+                    yield url
+            except KeyError:
+                logging.debug('Attribution %s of element %s not found',
+                              attribution_name, element_name)
+
+
+def create_link_extractor(name):
+    """
+    Create a link extractor.
+
+    Args:
+        name: One of LINK_EXTRACTORS.
+
+    Returns:
+        A link extractor, which keeps no state and may be shared by threads.
+
+    Raises:
+        ValueError: Unknown extractor.
+    """
+    if name == 'tokenizer':
+        return TokenizerExtractor()
+    if name == 'beautifulsoup':
+        return BeautifulSoupExtractor()
+    raise ValueError('Unknown link extractor %s' % name)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module benchmarks the link extractors of mini spider on an html corpus.
+
+The corpus is every *.html file under a directory, or pages generated like a
+news site: stylesheets and scripts in the head, a navigation bar, articles
+with inline links and images, comments, inline scripts and entities. Each
+extractor runs in its own child process, and the pages per second, the urls
+found and the peak memory growth of the child are printed. The peak memory
+growth stands for the allocations, the DOM of beautifulsoup being the bulk.
+
+Usage: python link_extractor_benchmark.py [-d corpus_directory] [-p 200] [-r 3]
+
+Author: weileizhe
+Date: 2015/02/02 00:00:06
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+import link_extractor
+
+
+WORDS = ('spider', 'crawl', 'page', 'link', 'news', 'market', 'weather', 'sport',
+         'science', 'travel', 'music', 'health', 'today', 'report', 'city', 'world')
+
+
+def generate_webpage(generator, page_index):
+    """
+    Generate a news site like webpage.
+
+    Args:
+        generator: The random.Random generating the content.
+        page_index: The page index.
+
+    Returns:
+        The webpage as str.
+    """
+    def words(count):
+        return ' '.join(generator.choice(WORDS) for i in xrange(count))
+
+    def path():
+        return '/%s/%d.html' % (generator.choice(WORDS), generator.randint(0, 100000))
+
+    parts = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8">\n'
+             '<title>%s</title>\n' % words(6)]
+    for i in xrange(4):
+        parts.append('<link rel="stylesheet" type="text/css" href="/static/%d.css">\n' % i)
+    for i in xrange(4):
+        parts.append('<script type="text/javascript" src="/static/%d.js"></script>\n' % i)
+    parts.append('<script>var ad = \'<a href="%s">%s</a>\'; if (a < b && c > d) {}</script>\n'
+                 '<style>.nav > li { float: left; }</style>\n</head><body>\n'
+                 % (path(), words(2)))
+
+    parts.append('<div class="nav"><ul>\n')
+    for i in xrange(60):
+        parts.append('<li><a class="nav-item" href="%s" title="%s">%s</a></li>\n'
+                     % (path(), words(3), words(2)))
+    parts.append('</ul></div>\n<!-- <a href="/old/navigation.html">old</a> -->\n')
+
+    for i in xrange(20):
+        parts.append('<div class="article"><h2><a href=%s>%s</a></h2>\n' % (path(), words(8)))
+        parts.append('<img src="/images/%d.jpg" alt="%s" width="320" height="240">\n'
+                     % (generator.randint(0, 100000), words(4)))
+        for j in xrange(3):
+            parts.append('<p>%s <a href="%s?from=%d&amp;page=%d">%s</a> %s</p>\n'
+                         % (words(30), path(), page_index, j, words(2), words(40)))
+        parts.append('<a href="javascript:share(%d)">share</a></div>\n' % i)
+
+    parts.append('<div class="footer">')
+    for i in xrange(30):
+        parts.append('<a href=\'%s\'>%s</a> | ' % (path(), words(1)))
+    parts.append('&copy; 2015</div>\n</body></html>\n')
+    return ''.join(parts)
+
+
+def load_corpus(corpus_directory, page_count):
+    """
+    Load the html files under a directory, or generate pages.
+
+    Args:
+        corpus_directory: The corpus directory, None to generate pages.
+        page_count: The page count to generate.
+
+    Returns:
+        A list of webpages.
+    """
+    if corpus_directory is None:
+        generator = random.Random(page_count)
+        return [generate_webpage(generator, i) for i in xrange(page_count)]
+
+    corpus = []
+    for directory, sub_directories, file_names in os.walk(corpus_directory):
+        for file_name in sorted(file_names):
+            if file_name.endswith('.html') or file_name.endswith('.htm'):
+                with open(os.path.join(directory, file_name), 'rb') as webpage_file:
+                    corpus.append(webpage_file.read())
+    return corpus
+
+
+def benchmark_extractor(name, corpus, rounds, result_queue):
+    """
+    Run one extractor over the corpus and put its result to result_queue.
+
+    Args:
+        name: The link extractor name.
+        corpus: The list of webpages.
+        rounds: The times to extract the whole corpus.
+        result_queue: The multiprocessing.Queue receiving (name, pages,
+                      urls, elapsed, peak memory growth in KB).
+    """
+    extractor = link_extractor.create_link_extractor(name)
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    url_count = 0
+    start_time = time.time()
+    for i in xrange(rounds):
+        for webpage_content in corpus:
+            url_count += len(list(extractor.extract(webpage_content)))
+    elapsed = time.time() - start_time
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_memory
+    result_queue.put((name, len(corpus) * rounds, url_count, elapsed, peak_memory))
+
+
+def main():
+    """
+    Main function entrance.
+    """
+    argument_parser = argparse.ArgumentParser(description='Benchmark mini spider link extractors.')
+    argument_parser.add_argument('-d', '--corpus',
+                                 help='directory of *.html files(default is generated pages)')
+    argument_parser.add_argument('-p', '--pages', type=int, default=200,
+                                 help='page count to generate(default is 200)')
+    argument_parser.add_argument('-r', '--rounds', type=int, default=3,
+                                 help='times to extract the corpus(default is 3)')
+    argument_parser.add_argument('-e', '--extractor',
+                                 action='append',
+                                 choices=link_extractor.LINK_EXTRACTORS,
+                                 help='extractor to benchmark(default is all extractors)')
+    arguments = argument_parser.parse_args()
+
+    corpus = load_corpus(arguments.corpus, arguments.pages)
+    if not corpus:
+        sys.stderr.write('No html file found in %s\n' % arguments.corpus)
+        return -1
+    sys.stdout.write('%d pages, %d KB on average\n'
+                     % (len(corpus), sum(len(page) for page in corpus) / len(corpus) / 1024))
+
+    sys.stdout.write('%-14s %10s %10s %10s %12s\n'
+                     % ('extractor', 'urls', 'seconds', 'pages/s', 'peak KB'))
+    result_queue = multiprocessing.Queue()
+    for name in arguments.extractor or link_extractor.LINK_EXTRACTORS:
+        process = multiprocessing.Process(target=benchmark_extractor,
+                                          args=(name, corpus, arguments.rounds, result_queue))
+        process.start()
+        name, pages, url_count, elapsed, peak_memory = result_queue.get()
+        process.join()
+        sys.stdout.write('%-14s %10d %10.2f %10.2f %12d\n'
+                         % (name, url_count, elapsed, pages / max(elapsed, 1e-6), peak_memory))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for link extractor.
+
+Author: weileizhe
+Date: 2015/02/02 00:00:06
+"""
+
+import unittest
+
+
+import link_extractor
+
+
+WEBPAGE = '''<!DOCTYPE html>
+<html><head>
+<LINK rel="stylesheet" HREF='/css/site.css'>
+<script type="text/javascript" src=/js/site.js></script>
+<script>document.write('<a href="/in_script.html">x</a>');</script>
+<style>a:after { content: '<img src="/in_style.png">'; }</style>
+</head><body>
+<!-- <a href="/in_comment.html">old</a> -->
+<a title="a > b" href="/page.html?a=1&amp;b=2">page</a>
+<a href="javascript:void(0)">js</a>
+<a name="anchor">no href</a>
+<abbr href="/not_a_link.html">abbr</abbr>
+<img data-src="/lazy.png" src=" /image&#46;png ">
+<a class="x"href="/no_space.html">no space</a>
+</body></html>
+'''
+
+EXPECTED_URLS = ['/css/site.css', '/js/site.js', '/page.html?a=1&b=2',
+                 '/image.png', '/no_space.html']
+
+
+class TestTokenizerExtractor(unittest.TestCase):
+    """ Test for TokenizerExtractor.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.extractor = link_extractor.TokenizerExtractor()
+
+    def test_extract(self):
+        """ Test the urls are extracted in document order.
+        """
+        self.assertEqual(list(self.extractor.extract(WEBPAGE)), EXPECTED_URLS)
+
+    def test_extract_unicode(self):
+        """ Test extracting a unicode webpage gives unicode urls.
+        """
+        urls = list(self.extractor.extract(u'<a href="/caf&eacute;.html">x</a>'))
+        self.assertEqual(urls, [u'/caf\xe9.html'])
+        self.assertEqual(list(self.extractor.extract('<a href="/caf&eacute;.html">x</a>')),
+                         ['/caf\xc3\xa9.html'])
+
+    def test_extract_broken_markup(self):
+        """ Test unclosed comments, script bodies and quotes.
+        """
+        self.assertEqual(list(self.extractor.extract('<a href="/1.html"><!-- <a href="/2.html">')),
+                         ['/1.html'])
+        self.assertEqual(list(self.extractor.extract('<script src="/1.js"><a href="/2.html">')),
+                         ['/1.js'])
+        self.assertEqual(list(self.extractor.extract('<a href="/1.html><a href="/2.html">')),
+                         ['/2.html'])
+
+
+class TestBeautifulSoupExtractor(unittest.TestCase):
+    """ Test for BeautifulSoupExtractor.
+    """
+
+    def test_extract(self):
+        """ Test the urls are the same as the tokenizer extractor.
+        """
+        extractor = link_extractor.BeautifulSoupExtractor()
+        self.assertEqual(sorted(url.strip() for url in extractor.extract(WEBPAGE)),
+                         sorted(EXPECTED_URLS))
+
+
+class TestCreateLinkExtractor(unittest.TestCase):
+    """ Test create_link_extractor(name) function.
+    """
+
+    def test_create_link_extractor(self):
+        """ Test creating every extractor.
+        """
+        for name in link_extractor.LINK_EXTRACTORS:
+            self.assertTrue(hasattr(link_extractor.create_link_extractor(name), 'extract'))
+        with self.assertRaises(ValueError):
+            link_extractor.create_link_extractor('unknown')
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
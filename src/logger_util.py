@@ -8,6 +8,11 @@
 """
 This module realizes different level logging output to different files.
 
+start_async_logging moves the handlers of the root logger behind a queue,
+so the crawl threads only enqueue their records and one background thread
+formats and writes them, flushing once per batch. SamplingFilter lets only
+a few records of a call site through per second, like the per url messages.
+
 Author: weileizhe
 Date: 2014/12/24 00:00:06
 """
@@ -15,6 +20,12 @@ Date: 2014/12/24 00:00:06
 import logging
 import logging.handlers
 import os
+import Queue
+import threading
+import time
+
+
+LOG_FULL_POLICIES = ('drop', 'block')
 
 
 def init_logger(log_path, log_level=logging.INFO, log_split_interval="D", backup_num=7,
@@ -69,3 +80,244 @@ def init_logger(log_path, log_level=logging.INFO, log_split_interval="D", backup
     handler.setLevel(logging.DEBUG)
     handler.setFormatter(log_formatter)
     logger.addHandler(handler)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    A filter letting at most rate records of each call site through per second.
+
+    The records above max_level are never sampled. The number of records
+    suppressed in a second is told by the next record of the call site let
+    through.
+
+    Attributes:
+        rate: The records of a call site let through per second.
+        max_level: The highest level sampled.
+        suppressed: The records suppressed so far.
+    """
+
+    def __init__(self, rate, max_level=logging.WARNING):
+        """ Init the filter.
+
+        Args:
+            rate: The records of a call site let through per second.
+            max_level: The highest level sampled.
+        """
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.max_level = max_level
+        self.suppressed = 0
+        self.call_sites = {}
+        self.mutex = threading.Lock()
+
+    def filter(self, record):
+        """
+        Judge if record is let through, telling the records suppressed before it.
+        """
+        if record.levelno > self.max_level:
+            return True
+        key = (record.pathname, record.lineno)
+        second = int(record.created)
+        with self.mutex:
+            window = self.call_sites.get(key)
+            if window is None or window[0] != second:
+                self.call_sites[key] = [second, 1, 0]
+                if window is not None and window[2]:
+                    record.msg = '%s (%d similar messages suppressed)' % (record.getMessage(),
+                                                                          window[2])
+                    record.args = None
+                return True
+            if window[1] < self.rate:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class QueueHandler(logging.Handler):
+    """
+    A handler putting the records to a queue for an AsyncLogWriter.
+
+    The message is formatted when the record is put, as its arguments may
+    change before it is written.
+
+    Attributes:
+        queue: The Queue.Queue of records.
+        block: Wait for room if the queue is full, drop the record otherwise.
+        dropped: The records dropped so far.
+    """
+
+    def __init__(self, queue, block=False):
+        """ Init the handler.
+
+        Args:
+            queue: The Queue.Queue of records.
+            block: Wait for room if the queue is full, drop the record otherwise.
+        """
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.block = block
+        self.dropped = 0
+
+    def emit(self, record):
+        """
+        Put record to the queue, or drop it if the queue is full and block is False.
+        """
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+        except Exception:
+            self.handleError(record)
+            return
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+
+
+class AsyncLogWriter(object):
+    """
+    A background thread writing the queued records to the handlers.
+
+    The records are written in batches of up to batch_size, and each handler
+    is flushed once per batch instead of once per record.
+
+    Attributes:
+        handlers: The handlers writing the records.
+        queue_handler: The QueueHandler putting the records.
+        batch_size: The max records written between two flushes.
+        flush_interval: The max seconds a record waits for its batch.
+        written: The records written so far.
+    """
+
+    def __init__(self, handlers, queue_size=10000, block=False, batch_size=256,
+                 flush_interval=1.0):
+        """ Init the writer.
+
+        Args:
+            handlers: The handlers writing the records.
+            queue_size: The max records waiting in the queue.
+            block: Wait for room if the queue is full, drop the record otherwise.
+            batch_size: The max records written between two flushes.
+            flush_interval: The max seconds a record waits for its batch.
+        """
+        self.handlers = handlers
+        self.queue_handler = QueueHandler(Queue.Queue(queue_size), block)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.reported_drops = 0
+        self.writer = None
+
+    def start(self):
+        """
+        Start the writer thread, deferring the flush of each handler to it.
+        """
+        for handler in self.handlers:
+            handler.flush = lambda: None
+        self.writer = threading.Thread(target=self._write_batches, name='log-writer')
+        self.writer.setDaemon(True)
+        self.writer.start()
+
+    def _write_batches(self):
+        """
+        Write the queued records in batches until a None is queued.
+        """
+        queue = self.queue_handler.queue
+        running = True
+        while running:
+            try:
+                batch = [queue.get(timeout=self.flush_interval)]
+            except Queue.Empty:
+                continue
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(queue.get(timeout=max(0, deadline - time.time())))
+                except Queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+            dropped = self.queue_handler.dropped
+            if dropped > self.reported_drops:
+                batch.append(logging.makeLogRecord({
+                    'name': 'logger_util', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': 'Dropped %d log records as the log queue was full'
+                           % (dropped - self.reported_drops)}))
+                self.reported_drops = dropped
+            self._write(batch)
+
+    def _write(self, records):
+        """
+        Write records to the handlers of their level and flush the handlers once.
+        """
+        for record in records:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        self.written += len(records)
+        for handler in self.handlers:
+            type(handler).flush(handler)
+
+    def stop(self):
+        """
+        Write the queued records and give the handlers their own flush back.
+        """
+        if self.writer is not None:
+            self.queue_handler.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        for handler in self.handlers:
+            handler.__dict__.pop('flush', None)
+
+
+def start_async_logging(queue_size=10000, full_policy='drop', batch_size=256,
+                        flush_interval=1.0):
+    """
+    Move the handlers of the root logger behind a queue written by a background thread.
+
+    Args:
+        queue_size: The max records waiting in the queue.
+        full_policy: What a record does when the queue is full, 'drop' to be
+                     dropped or 'block' to wait, see LOG_FULL_POLICIES.
+        batch_size: The max records written between two flushes.
+        flush_interval: The max seconds a record waits for its batch.
+
+    Returns:
+        The started AsyncLogWriter, stop_async_logging stops it.
+
+    Raises:
+        ValueError: Unknown full policy.
+    """
+    if full_policy not in LOG_FULL_POLICIES:
+        raise ValueError('unknown log queue full policy %s' % full_policy)
+    logger = logging.getLogger()
+    writer = AsyncLogWriter(logger.handlers[:], queue_size, full_policy == 'block',
+                            batch_size, flush_interval)
+    for handler in writer.handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(writer.queue_handler)
+    writer.start()
+    return writer
+
+
+def stop_async_logging(writer):
+    """
+    Write the queued records and put the handlers back to the root logger.
+
+    Args:
+        writer: The AsyncLogWriter started by start_async_logging.
+    """
+    logger = logging.getLogger()
+    logger.removeHandler(writer.queue_handler)
+    writer.stop()
+    for handler in writer.handlers:
+        logger.addHandler(handler)
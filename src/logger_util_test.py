@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for logger util.
+
+Author: weileizhe
+Date: 2015/05/11 00:00:06
+"""
+
+import logging
+import StringIO
+import threading
+import time
+import unittest
+
+
+import logger_util
+
+
+class CountingStream(StringIO.StringIO):
+    """ A stream counting its flushes.
+    """
+
+    def __init__(self):
+        StringIO.StringIO.__init__(self)
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestSamplingFilter(unittest.TestCase):
+    """ Test for SamplingFilter.
+    """
+
+    def make_record(self, lineno, created, level=logging.INFO):
+        """ Make a record of a call site at time created.
+        """
+        record = logging.LogRecord('root', level, 'spider.py', lineno, 'Grab %s', ('url',), None)
+        record.created = created
+        return record
+
+    def test_filter(self):
+        """ Test rate records of a call site pass per second and the rest are told.
+        """
+        sampling_filter = logger_util.SamplingFilter(2)
+        passed = [sampling_filter.filter(self.make_record(10, 100.5)) for i in xrange(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(sampling_filter.filter(self.make_record(11, 100.5)))
+        self.assertTrue(sampling_filter.filter(self.make_record(10, 100.9, logging.ERROR)))
+        self.assertEqual(sampling_filter.suppressed, 3)
+
+        record = self.make_record(10, 101.1)
+        self.assertTrue(sampling_filter.filter(record))
+        self.assertEqual(record.getMessage(), 'Grab url (3 similar messages suppressed)')
+
+
+class TestAsyncLogging(unittest.TestCase):
+    """ Test for start_async_logging and AsyncLogWriter.
+    """
+
+    def setUp(self):
+        """ Set up test with a root logger writing to a stream.
+        """
+        self.logger = logging.getLogger()
+        self.saved_handlers = self.logger.handlers[:]
+        self.saved_level = self.logger.level
+        for handler in self.saved_handlers:
+            self.logger.removeHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.stream = CountingStream()
+        self.handler = logging.StreamHandler(self.stream)
+        self.handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        for handler in self.logger.handlers[:]:
+            self.logger.removeHandler(handler)
+        for handler in self.saved_handlers:
+            self.logger.addHandler(handler)
+        self.logger.setLevel(self.saved_level)
+
+    def test_batched_writes(self):
+        """ Test the records are written by the writer thread with a flush per batch.
+        """
+        writer = logger_util.start_async_logging(100, 'block', 50, 0.05)
+        self.assertEqual(self.logger.handlers, [writer.queue_handler])
+        threads = [threading.Thread(target=lambda: [logging.info('record %d', i)
+                                                    for i in xrange(50)]) for j in xrange(4)]
+        for log_thread in threads:
+            log_thread.start()
+        for log_thread in threads:
+            log_thread.join()
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            logging.exception('failed')
+        logger_util.stop_async_logging(writer)
+
+        self.assertEqual(self.logger.handlers, [self.handler])
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(sum(1 for line in lines if line.startswith('INFO record')), 200)
+        self.assertIn('ERROR failed', lines)
+        self.assertIn('ValueError: broken', lines)
+        self.assertEqual(writer.written, 201)
+        self.assertLess(self.stream.flushes, 201)
+        self.assertNotIn('flush', self.handler.__dict__)
+
+    def test_drop(self):
+        """ Test the records are dropped and told when the queue is full.
+        """
+        writer = logger_util.AsyncLogWriter([self.handler], 2, False, 10, 0.05)
+        self.logger.removeHandler(self.handler)
+        self.logger.addHandler(writer.queue_handler)
+        for i in xrange(5):
+            logging.warn('record %d', i)
+        writer.start()
+        self.logger.removeHandler(writer.queue_handler)
+        writer.stop()
+        self.assertEqual(writer.queue_handler.dropped, 3)
+        self.assertEqual(self.stream.getvalue().splitlines(), [
+            'WARNING record 0', 'WARNING record 1',
+            'WARNING Dropped 3 log records as the log queue was full'])
+
+    def test_unknown_policy(self):
+        """ Test an unknown full policy is refused.
+        """
+        with self.assertRaises(ValueError):
+            logger_util.start_async_logging(full_policy='wait')
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -16,23 +16,58 @@ Date: 2014/11/11 00:00:06
 
 import argparse
 import ConfigParser
+import hashlib
+import httplib
 import logging
 import os
-import Queue
 import re
+import signal
+import socket
 import sys
-import time
+import tempfile
 import threading
+import time
 import urllib2
-import urlparse
-
-import bs4
+import zlib
 
+import adaptive_concurrency
+import archive
+import blob_store
+import canonical_url
+import checkpoint
+import cluster
+import connection_pool
+import content_coding
+import crawl_metrics
+import crawl_profiler
+import dns_cache
+import event_spider
+import frontier
+import host_health
+import link_extractor
 import logger_util
+import page_metadata
+import pipeline
+import seed_feeder
+import seen_store
+import url_pruner
 
 
 VERSION = '1.0'
 
+DEFAULT_DOWNLOAD_BUFFER_SIZE = 65536
+
+CRAWL_ENGINES = ('thread', 'event', 'pipeline')
+
+# The option of the fetching workers of each engine, the default global concurrency ceiling.
+ENGINE_WORKER_OPTIONS = {
+    'thread': 'thread_count',
+    'event': 'event_concurrency',
+    'pipeline': 'pipeline_fetch_workers',
+}
+
+STORAGE_LAYOUTS = ('url', 'content', 'archive')
+
 
 class Error(Exception):
     """
@@ -48,56 +83,144 @@ class ConfigurationException(Error):
     pass
 
 
+class DownloadException(Error):
+    """
+    Download exception if the webpage body exceeds max_body_size or fails to decode.
+    """
+    pass
+
+
 class Url(object):
     """
     Url object to crawl and parse.
+
+    It has slots instead of a dict, as millions of them may wait in the frontier.
     
     Attributes:
         url: Url to crawl and parse.
         depth: The crawl depth of url. 
+        retries: The times url has been retried after a transient failure.
     """
+    __slots__ = ('url', 'depth', 'retries')
 
-    def __init__(self, url, depth=0):
+    def __init__(self, url, depth=0, retries=0):
         """ Init the url.
         
         Args:
             url: Url to crawl and parse.
             depth: The crawl depth of url.
+            retries: The times url has been retried after a transient failure.
         """
         self.url = url
         self.depth = depth        
+        self.retries = retries
 
 
-class MiniSpiderThread(threading.Thread):
+class MiniSpider(object):
     """
-    A mini spider thread.
-    
+    A mini spider which crawls one url at a time.
+
+    It holds the crawl logic shared by all crawl engines: grabing the url, saving
+    the target webpage and putting the uncrawled urls to the url queue.
+
     Attributes:
         url_queue: The url queue to crawl and parse.
-        crawled_urls: The crawled urls.
+        crawled_urls: The seen_store of crawled urls.
         max_depth: The max crawl depth.
-        crawl_interval: The crawl time interval.
+        crawl_interval: The default crawl time interval per host.
         crawl_timeout: The crawl timeout.
         target_regex: The target url regular expression matching special regularation to save.
         output_directory: The output directory for saving target webpages.  
         grab_url_success: If grab url success or not.
         url_response: The response from grabing url.
+        connection_pool: The pool of keep-alive connections, None to grab
+                         with urllib2.urlopen.
+        max_body_size: The max bytes of a webpage body, 0 for no limit.
+        download_buffer_size: The bytes read from the socket at a time when saving.
+        extractor: The link_extractor finding the urls in a webpage.
+        page_metadata: The page_metadata store to revalidate webpages, None
+                       to always grab the whole webpages.
+        reuse_links: Reuse the links kept for unchanged webpages instead of
+                     grabing and parsing them again.
+        webpage_store: The store keeping target webpages, a blob_store.BlobStore
+                       or an archive.ArchiveWriter, None to write them to
+                       output_directory/urllib2.quote(url).
+        canonicalizer: The canonical_url canonicalizer joining the links.
+        pruner: The url_pruner dropping the useless next urls, None to put them all.
+        metrics: The crawl_metrics.CrawlMetrics of the crawl, None not to measure it.
+        profiler: The crawl_profiler.CrawlProfiler profiling the crawl jobs on
+                  demand, None never to profile them.
+        dns_cache: The installed dns_cache.DnsCache prefetching the hosts of
+                   the next urls, None not to prefetch them.
+        concurrency: The adaptive_concurrency.ConcurrencyController told the
+                     latency and outcome of each grab, None not to tell it.
+        host_health: The host_health.HostHealth told each grab, which retries
+                     the urls failed transiently, None never to retry them.
+        accept_compression: Ask for gzip or deflate webpages, decoded as they are read.
+        compress_stored_text: Store the text target webpages gzip compressed
+                              when they are kept a file per url.
+        compression_level: The zlib level of the webpages stored compressed.
+        compression_stats: The content_coding.CompressionStats counting the
+                           bytes saved on the wire and on the disk, None not to.
+        content_type: The content type of the grabed webpage, None if failed.
+        retryable: If the grab of url_response failed transiently or not.
+        rewritten_urls: The set of next urls of the grabed webpage which were
+                        rewritten by the canonicalizer.
+        webpage_unchanged: If the grabed webpage is not modified or not.
+        webpage_hash: The md5 of the webpage body read so far, None if not read.
     """
 
     def __init__(self, url_queue, crawled_urls, max_depth, crawl_interval,
-                 crawl_timeout, target_url, output_directory):
-        """ Init the mini spider thread.
+                 crawl_timeout, target_url, output_directory, connection_pool=None,
+                 max_body_size=0, download_buffer_size=DEFAULT_DOWNLOAD_BUFFER_SIZE,
+                 extractor=None, page_metadata=None, reuse_links=True,
+                 webpage_store=None, canonicalizer=None, pruner=None, metrics=None,
+                 profiler=None, dns_cache=None, concurrency=None, host_health=None,
+                 accept_compression=True, compress_stored_text=False,
+                 compression_level=content_coding.DEFAULT_COMPRESSION_LEVEL,
+                 compression_stats=None):
+        """ Init the mini spider.
 
         Args:
             url_queue: The url queue to crawl and parse.
             crawled_urls: The crawled urls.
             max_depth: The max crawl depth.
-            crawl_interval: The crawl time interval.
+            crawl_interval: The default crawl time interval per host.
             crawl_timeout: The crawl timeout.
             target_url: The target url matching special regularation to save.
             output_directory: The output directory for saving target webpages.            
+            connection_pool: The pool of keep-alive connections, None to grab
+                             with urllib2.urlopen.
+            max_body_size: The max bytes of a webpage body, 0 for no limit.
+            download_buffer_size: The bytes read from the socket at a time when saving.
+            extractor: The link_extractor finding the urls in a webpage,
+                       None for a tokenizer extractor.
+            page_metadata: The page_metadata store to revalidate webpages, None
+                           to always grab the whole webpages.
+            reuse_links: Reuse the links kept for unchanged webpages instead of
+                         grabing and parsing them again.
+            webpage_store: The store keeping target webpages, a blob_store.BlobStore
+                           or an archive.ArchiveWriter, None to write them to
+                           output_directory/urllib2.quote(url).
+            canonicalizer: The canonical_url canonicalizer joining the links,
+                           None for one of every rule.
+            pruner: The url_pruner dropping the useless next urls, None to put them all.
+            metrics: The crawl_metrics.CrawlMetrics of the crawl, None not to measure it.
+            profiler: The crawl_profiler.CrawlProfiler profiling the crawl jobs on
+                      demand, None never to profile them.
+            dns_cache: The installed dns_cache.DnsCache prefetching the hosts of
+                       the next urls, None not to prefetch them.
+            concurrency: The adaptive_concurrency.ConcurrencyController told the
+                         latency and outcome of each grab, None not to tell it.
+            host_health: The host_health.HostHealth told each grab, which retries
+                         the urls failed transiently, None never to retry them.
+            accept_compression: Ask for gzip or deflate webpages, decoded as they are read.
+            compress_stored_text: Store the text target webpages gzip compressed
+                                  when they are kept a file per url.
+            compression_level: The zlib level of the webpages stored compressed.
+            compression_stats: The content_coding.CompressionStats counting the
+                               bytes saved on the wire and on the disk, None not to.
         """
-        threading.Thread.__init__(self)
         self.url_queue = url_queue
         self.crawled_urls = crawled_urls
         self.max_depth = max_depth
@@ -107,21 +230,36 @@ class MiniSpiderThread(threading.Thread):
         self.output_directory = output_directory
         self.grab_url_success = False
         self.url_response = None
+        self.connection_pool = connection_pool
+        self.max_body_size = max_body_size
+        self.download_buffer_size = download_buffer_size
+        if extractor is None:
+            extractor = link_extractor.TokenizerExtractor()
+        self.extractor = extractor
+        self.page_metadata = page_metadata
+        self.reuse_links = reuse_links
+        self.webpage_store = webpage_store
+        if canonicalizer is None:
+            canonicalizer = canonical_url.Canonicalizer()
+        self.canonicalizer = canonicalizer
+        self.pruner = pruner
+        self.metrics = metrics
+        self.profiler = profiler
+        self.dns_cache = dns_cache
+        self.concurrency = concurrency
+        self.host_health = host_health
+        self.accept_compression = accept_compression
+        self.compress_stored_text = compress_stored_text
+        self.compression_level = compression_level
+        self.compression_stats = compression_stats
+        self.content_type = None
+        self.retryable = False
+        self.request_host = None
+        self.transfer_seconds = 0
+        self.rewritten_urls = set()
+        self.webpage_unchanged = False
+        self.webpage_hash = None
 
-    def run(self):
-        """
-        Run crawl job.
-        """
-        while True:
-            url_obj = self.url_queue.get(self.crawl_timeout)
-            try:
-                self.crawl_job(url_obj, self.url_queue, self.crawled_urls)
-                time.sleep(self.crawl_interval) 
-            except Error as error:
-                logging.warn('Crawl %s failed due to %s', url_obj.url, str(error))
-                
-            self.url_queue.task_done()
-           
     def crawl_job(self, url_obj, url_queue, crawled_urls):
         """
         A crawl job for crawling the url.
@@ -131,66 +269,587 @@ class MiniSpiderThread(threading.Thread):
         Args:
             url_obj: The current url object for crawling and parsing.
             url_queue: The url queue to crawl and parse.
-            crawled_urls: A set for urls already crawled.
+            crawled_urls: A seen_store for urls already crawled.
+        """
+        self.grab_url(url_obj.url, self.request_headers(url_obj))
+        try:
+            self.handle_webpage(url_obj, url_queue, crawled_urls)
+        finally:
+            self.release_url_response()
+
+    def run_profiled(self, function, *args):
+        """
+        Call function(*args), under cProfile while a profiling window is open.
+        """
+        if self.profiler is None or not self.profiler.active:
+            return function(*args)
+        return self.profiler.runcall(function, *args)
+
+    def handle_webpage(self, url_obj, url_queue, crawled_urls):
+        """
+        Handle the grabed webpage in url_response.
+
+        Save the target url and put the uncrawled urls to the url_queue. An
+        unchanged webpage is not saved again and its kept links are put.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+            url_queue: The url queue to crawl and parse.
+            crawled_urls: A seen_store for urls already crawled.
         """
-        self.grab_url(url_obj.url)
+        if self.webpage_unchanged:
+            self.put_next_urls(url_obj, self._unchanged_links(url_obj), url_queue, crawled_urls)
+            return
+
         if not self.grab_url_success:
             logging.info('Grab url %s failed', url_obj.url)
+            self.retry_url(url_obj, url_queue)
             return
 
         if self.target_regex.match(url_obj.url) is not None:
             self.save_specific_webpage(url_obj.url, self.output_directory)
 
-        for next_url in self.iterate_next_urls(url_obj):
-            if mutex.acquire(1) and next_url not in crawled_urls:
-                crawled_urls.add(next_url)
-                next_url_obj = Url(next_url, url_obj.depth + 1)
-                url_queue.put(next_url_obj)
-            mutex.release()
+        next_urls = list(self.iterate_next_urls(url_obj))
+        self.put_next_urls(url_obj, next_urls, url_queue, crawled_urls, self.rewritten_urls)
+        self.record_page_metadata(url_obj, next_urls if self._is_parsable(url_obj) else None)
+
+    def retry_url(self, url_obj, url_queue):
+        """
+        Put url_obj back to the url_queue if its grab failed transiently and
+        it has retries left. The host health backs its host off meanwhile.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+            url_queue: The url queue to crawl and parse.
+        """
+        if not self.retryable or url_obj.retries >= self.host_health.max_retries:
+            return
+        url_queue.put(Url(url_obj.url, url_obj.depth, url_obj.retries + 1))
+        self._count('retries_total')
+        logging.info('Retry url %s, retry %d', url_obj.url, url_obj.retries + 1)
+
+    def put_next_urls(self, url_obj, next_urls, url_queue, crawled_urls, rewritten_urls=()):
+        """
+        Put the uncrawled urls found in the webpage of url_obj to the url_queue,
+        except the ones the pruner proves useless, and prefetch their hosts.
+
+        The links are admitted to crawled_urls and put to the url_queue in one
+        batch per webpage, so the crawl threads take each lock once per webpage.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+            next_urls: The canonical urls found in the webpage.
+            url_queue: The url queue to crawl and parse.
+            crawled_urls: A seen_store for urls already crawled.
+            rewritten_urls: The next urls rewritten by the canonicalizer, a
+                            duplicate of them is a fetch avoided.
+        """
+        next_depth = url_obj.depth + 1
+        if self.pruner is not None:
+            next_urls = [next_url for next_url in next_urls
+                         if self.pruner.allows(next_url, next_depth)]
+        if not next_urls:
+            return
+        added_urls = crawled_urls.add_many(next_urls)
+        frontier.put_urls(url_queue, [Url(next_url, next_depth) for next_url in added_urls])
+        if self.dns_cache is not None:
+            for next_url in added_urls:
+                self.dns_cache.prefetch(next_url)
+        if rewritten_urls:
+            first_urls = set(added_urls)
+            avoided_duplicates = 0
+            for next_url in next_urls:
+                if next_url in first_urls:
+                    first_urls.discard(next_url)
+                elif next_url in rewritten_urls:
+                    avoided_duplicates += 1
+            if avoided_duplicates:
+                self.canonicalizer.count_avoided_duplicates(avoided_duplicates)
+
+    def fetch_webpage(self, url_obj):
+        """
+        Grab the url and read the webpage for the store or the parse stage.
+
+        As handle_webpage does, a target webpage is saved and not parsed, and
+        only text/html webpages above max_depth are parsed.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+
+        A target webpage is spooled to a temp file once it exceeds
+        download_buffer_size bytes, so the webpages waiting for the store
+        stage hold no more than a buffer each in memory.
+
+        Returns:
+            A (target, webpage_content) tuple, target is True if the webpage is
+            to save and False if it is to parse, webpage_content is None if
+            there is nothing to do. The webpage_content of a target webpage
+            is a file object for store_webpage.
+
+        Raises:
+            DownloadException: The body exceeds max_body_size or fails to decode.
+        """
+        self.grab_url(url_obj.url, self.request_headers(url_obj))
+        try:
+            if self.webpage_unchanged:
+                self.put_next_urls(url_obj, self._unchanged_links(url_obj),
+                                   self.url_queue, self.crawled_urls)
+                return False, None
+            if not self.grab_url_success:
+                logging.info('Grab url %s failed', url_obj.url)
+                self.retry_url(url_obj, self.url_queue)
+                return False, None
+            if self.target_regex.match(url_obj.url) is not None:
+                self._check_content_length(url_obj.url)
+                webpage_file = tempfile.SpooledTemporaryFile(self.download_buffer_size)
+                try:
+                    for chunk in self._iterate_body_chunks(url_obj.url):
+                        webpage_file.write(chunk)
+                except:
+                    webpage_file.close()
+                    raise
+                webpage_file.seek(0)
+                self.record_page_metadata(url_obj, None)
+                return True, webpage_file
+            if self._is_parsable(url_obj):
+                webpage_content = self._read_webpage(url_obj.url)
+                links = self._same_content_links(url_obj)
+                self.record_page_metadata(url_obj, links)
+                if links is None:
+                    return False, webpage_content
+                self.put_next_urls(url_obj, links, self.url_queue, self.crawled_urls)
+                return False, None
+            self.record_page_metadata(url_obj, None)
+            return False, None
+        finally:
+            self.release_url_response()
+
+    def store_webpage(self, url, webpage_file, content_type=None):
+        """
+        Save a target webpage already read to output_directory.
+
+        Args:
+            url: The target url.
+            webpage_file: The file object of the webpage body fetch_webpage
+                          returns, copied download_buffer_size bytes at a
+                          time and closed.
+            content_type: The content type of the webpage, None if unknown.
+        """
+        start_time = time.time()
+        try:
+            chunks = iter(lambda: webpage_file.read(self.download_buffer_size), '')
+            self._write_webpage(url, self.output_directory, chunks, content_type)
+        finally:
+            webpage_file.close()
+        self._observe('store', start_time)
+
+    def request_headers(self, url_obj):
+        """
+        Get the request headers to grab url_obj, the conditional headers and
+        the Accept-Encoding of the compressions decoded.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+
+        Returns:
+            A dict of request headers.
+        """
+        headers = self.conditional_headers(url_obj)
+        if self.accept_compression:
+            headers['Accept-Encoding'] = content_coding.ACCEPT_ENCODING
+        return headers
+
+    def conditional_headers(self, url_obj):
+        """
+        Get the If-None-Match and If-Modified-Since headers to revalidate url_obj.
+
+        No header is sent if the webpage is not in page_metadata, or if a 304
+        would leave something undone: the target file is missing, or the
+        links of an html webpage to parse are not kept or not to reuse.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+
+        Returns:
+            A dict of request headers.
+        """
+        if self.page_metadata is None:
+            return {}
+        metadata = self.page_metadata.get(url_obj.url)
+        if metadata is None:
+            return {}
+        if self.target_regex.match(url_obj.url) is not None:
+            if not self._webpage_saved(url_obj.url):
+                return {}
+        elif metadata.content_type == 'text/html' and url_obj.depth < self.max_depth and \
+                (metadata.links is None or not self.reuse_links):
+            return {}
+
+        headers = {}
+        if metadata.etag:
+            headers['If-None-Match'] = metadata.etag
+        if metadata.last_modified:
+            headers['If-Modified-Since'] = metadata.last_modified
+        return headers
+
+    def _webpage_saved(self, url):
+        """
+        Judge if the target webpage of url is saved.
+        """
+        if self.webpage_store is not None:
+            return self.webpage_store.lookup(url) is not None
+        return any(os.path.exists(path)
+                   for path in content_coding.webpage_paths(self.output_directory, url))
+
+    def _unchanged_links(self, url_obj):
+        """
+        Get the kept links of the unchanged webpage of url_obj to put.
+        """
+        metadata = self.page_metadata.get(url_obj.url)
+        if metadata is None or metadata.links is None or not self.reuse_links or \
+                url_obj.depth >= self.max_depth:
+            return []
+        return metadata.links
+
+    def _same_content_links(self, url_obj):
+        """
+        Get the kept links if the webpage body read has the kept md5, else None.
+        """
+        if self.page_metadata is None or not self.reuse_links or self.webpage_hash is None:
+            return None
+        metadata = self.page_metadata.get(url_obj.url)
+        if metadata is None or metadata.links is None or \
+                metadata.content_hash != self.webpage_hash.hexdigest():
+            return None
+        logging.debug('Webpage "%s" has the same content, reuse its links', url_obj.url)
+        return metadata.links
+
+    def record_page_metadata(self, url_obj, links):
+        """
+        Keep the validators, content type and body md5 of the grabed webpage.
+
+        Args:
+            url_obj: The current url object for crawling and parsing.
+            links: The list of links found in the webpage, None if not parsed.
+        """
+        if self.page_metadata is None or self.url_response is None:
+            return
+        info = self.url_response.info()
+        content_hash = None
+        if self.webpage_hash is not None:
+            content_hash = self.webpage_hash.hexdigest()
+        self.page_metadata.put(url_obj.url, page_metadata.PageMetadata(
+            info.getheader('etag'), info.getheader('last-modified'), info.gettype(),
+            content_hash, links))
+
+    def record_links(self, url_obj, links):
+        """
+        Keep the links found in the webpage of url_obj, parsed after it is recorded.
+        """
+        if self.page_metadata is not None:
+            self.page_metadata.put_links(url_obj.url, links)
     
-    def grab_url(self, url):
+    def grab_url(self, url, headers=None):
         """
         Grab the url
 
         Args:
             url: The current url for crawling and parsing. 
+            headers: The extra request headers, like the conditional headers.
         """
+        self.release_url_response()
+        if self.host_health is not None and not self.host_health.allows(frontier.url_host(url)):
+            self.accept_url_response(url, None)
+            self._count('errors_total', 'host_given_up')
+            logging.warn('Skip "%s" of a given up host', url)
+            return
+        if self.metrics is not None:
+            self.request_host = frontier.url_host(url)
+            self.metrics.begin_request(self.request_host)
+        start_time = time.time()
         try:
-            self.url_response = urllib2.urlopen(url, timeout=self.crawl_timeout)
-            if self.url_response.getcode() == 200:
-                self.grab_url_success = True
+            if self.connection_pool is None:
+                request = urllib2.Request(url, headers=headers or {})
+                response = urllib2.urlopen(request, timeout=self.crawl_timeout)
             else:
-                logging.info('Fail to grab "%s" with status code %s',
-                    url, self.url_response.getcode())
-                self.grab_url_success = False
+                response = self.connection_pool.urlopen(url, self.crawl_timeout, headers)
+            self._observe('fetch', start_time)
+            self.record_grab(url, time.time() - start_time, response)
+            self.accept_url_response(url, response)
         except urllib2.HTTPError as ex:
-            self.grab_url_success = False
+            self.record_grab(url, time.time() - start_time, error=ex)
+            self.accept_url_response(url, None, ex)
+            if ex.code == 304:
+                self.webpage_unchanged = True
+                self._count('unchanged_total')
+                logging.info('Webpage "%s" not modified', url)
+                return
+            self._count('errors_total', 'http_%d' % ex.code)
             logging.warn(str(ex.code))
             return
         except urllib2.URLError as ex:
-            self.grab_url_success = False
+            self.record_grab(url, time.time() - start_time, error=ex)
+            self.accept_url_response(url, None, ex)
+            self._count('errors_total', ex.reason.__class__.__name__
+                        if isinstance(ex.reason, Exception) else ex.__class__.__name__)
             logging.warn(str(ex.reason))
             return
+        except (connection_pool.PoolError, httplib.HTTPException, socket.error) as ex:
+            self.record_grab(url, time.time() - start_time, error=ex)
+            self.accept_url_response(url, None, ex)
+            self._count('errors_total', ex.__class__.__name__)
+            logging.warn(str(ex) or ex.__class__.__name__)
+            return
         else:
             pass
 
+    def accept_url_response(self, url, response, error=None):
+        """
+        Take the response from grabing url as the current url_response.
+
+        A gzip or deflate response is taken decoded.
+
+        Args:
+            url: The url grabed.
+            response: The response, None if the grab failed.
+            error: The error if the grab failed, which tells if it is retryable.
+        """
+        if response is not None:
+            response = content_coding.decode_response(response, self.compression_stats,
+                                                      self.download_buffer_size)
+        self.url_response = response
+        self.content_type = None
+        self.grab_url_success = False
+        self.webpage_unchanged = False
+        self.webpage_hash = None
+        self.rewritten_urls = set()
+        self.retryable = self.host_health is not None and \
+            (response is not None or error is not None) and \
+            self._failed_transiently(response, error)
+        if response is None:
+            return
+        if response.getcode() == 200:
+            self.grab_url_success = True
+            self.content_type = response.info().gettype()
+            self._count('pages_total')
+        elif response.getcode() == 304:
+            self.webpage_unchanged = True
+            self._count('unchanged_total')
+            logging.info('Webpage "%s" not modified', url)
+        else:
+            self._count('errors_total', 'http_%d' % response.getcode())
+            logging.info('Fail to grab "%s" with status code %s',
+                url, response.getcode())
+
+    def release_url_response(self):
+        """
+        Close the response from grabing url, which gives a pooled connection back.
+        """
+        if self.url_response is not None:
+            self.url_response.close()
+            self.url_response = None
+        if self.request_host is not None:
+            self.metrics.end_request(self.request_host)
+            self.request_host = None
+
+    def _count(self, name, label=''):
+        """
+        Add one to the counter name of label if the crawl is measured.
+        """
+        if self.metrics is not None:
+            self.metrics.increment(name, 1, label)
+
+    def _observe(self, stage, start_time):
+        """
+        Add the seconds since start_time to stage if the crawl is measured.
+        """
+        if self.metrics is not None:
+            self.metrics.observe(stage, time.time() - start_time)
+
+    def record_grab(self, url, seconds, response=None, error=None):
+        """
+        Tell the concurrency controller and the host health how grabing url went.
+
+        A failure which tells nothing about the host, like an unsupported url,
+        neither closes nor opens its circuit.
+
+        Args:
+            url: The url grabed.
+            seconds: The seconds until the response header or the failure.
+            response: The response, None if the grab failed.
+            error: The error if the grab failed.
+        """
+        host = frontier.url_host(url)
+        if self.concurrency is not None:
+            if error is None:
+                outcome = adaptive_concurrency.response_outcome(response.getcode())
+            else:
+                outcome = adaptive_concurrency.error_outcome(error)
+            self.concurrency.record(host, seconds, outcome)
+        if self.host_health is not None:
+            if self._failed_transiently(response, error):
+                self.host_health.record_failure(host)
+            elif error is None or isinstance(error, urllib2.HTTPError):
+                self.host_health.record_success(host)
+
+    def _failed_transiently(self, response, error):
+        """
+        Judge if a grab answered with response or failed with error may succeed
+        when retried.
+        """
+        if error is None:
+            return response.getcode() in host_health.TRANSIENT_CODES
+        return host_health.is_transient(error)
+
     def save_specific_webpage(self, url, output_directory):
         """
         Save webpage matching the specific pattern to output_directory.
+
+        The body is streamed download_buffer_size bytes at a time to a temp file
+        which is renamed to the target file when complete, so a partial webpage
+        is never left under the target name.
         
         Args:
             url: The current url for crawling and parsing.
             output_directory: Output directory for saving target webpages.  
+
+        Raises:
+            DownloadException: The body exceeds max_body_size.
         """
         if not self.grab_url_success:
             return
-        file_name = urllib2.quote(url, '')
-        target_path = os.path.join(output_directory, file_name)
+        self._check_content_length(url)
+        start_time = time.time()
+        self.transfer_seconds = 0
+        self._write_webpage(url, output_directory, self._iterate_body_chunks(url),
+                            self.content_type)
+        if self.metrics is not None:
+            self.metrics.observe('store', time.time() - start_time - self.transfer_seconds)
+
+    def _iterate_body_chunks(self, url):
+        """
+        Iterate the body of url_response download_buffer_size bytes at a time.
+
+        Raises:
+            DownloadException: The body exceeds max_body_size or fails to decode.
+        """
+        body_size = 0
+        while True:
+            start_time = time.time()
+            chunk = self._read_body(url, self.download_buffer_size)
+            self._observe_transfer(start_time, len(chunk))
+            if not chunk:
+                return
+            body_size += len(chunk)
+            if self.max_body_size and body_size > self.max_body_size:
+                raise DownloadException('Body of %s exceeds %d bytes'
+                                        % (url, self.max_body_size))
+            self._hash_webpage(chunk)
+            yield chunk
+
+    def _read_body(self, url, size=-1):
+        """
+        Read at most size bytes of the body of url_response, all if size is negative.
+
+        Raises:
+            DownloadException: The gzip or deflate body fails to decode.
+        """
+        try:
+            return self.url_response.read(size)
+        except zlib.error as error:
+            raise DownloadException('Decode body of %s failed due to %s' % (url, str(error)))
+
+    def _observe_transfer(self, start_time, size):
+        """
+        Add a body read of size bytes since start_time if the crawl is measured.
+        """
+        if self.metrics is None:
+            return
+        seconds = time.time() - start_time
+        self.transfer_seconds += seconds
+        self.metrics.observe('transfer', seconds)
+        if size:
+            self.metrics.increment('bytes_total', size)
+
+    def _hash_webpage(self, webpage_content):
+        """
+        Add the webpage body read to webpage_hash if page_metadata is kept.
+        """
+        if self.page_metadata is None:
+            return
+        if self.webpage_hash is None:
+            self.webpage_hash = hashlib.md5()
+        self.webpage_hash.update(webpage_content)
+
+    def _write_webpage(self, url, output_directory, chunks, content_type=None):
+        """
+        Write the webpage chunks to a temp file and rename it to the target file,
+        or to webpage_store if the webpages are not kept a file per url.
+
+        A text webpage is written gzip compressed to the target file + '.gz'
+        if compress_stored_text, see content_coding.read_webpage.
+        """
+        if self.webpage_store is not None:
+            self.webpage_store.write(url, chunks)
+            return
+
+        target_path, compressed_path = content_coding.webpage_paths(output_directory, url)
+        stale_path = compressed_path
+        if self.compress_stored_text and content_type is not None and \
+                content_coding.is_text_content(content_type):
+            chunks = content_coding.compress_chunks(chunks, self.compression_stats,
+                                                    self.compression_level)
+            target_path, stale_path = compressed_path, target_path
         target_directory = os.path.dirname(target_path)
         if not os.path.exists(target_directory):
             os.makedirs(target_directory)
-        with open(target_path, 'wb') as target_file:
-            target_file.write(self.url_response.read())
+
+        temp_file = tempfile.NamedTemporaryFile(dir=target_directory, prefix='.',
+                                                suffix='.part', delete=False)
+        try:
+            with temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+            os.rename(temp_file.name, target_path)
+        except:
+            os.remove(temp_file.name)
+            raise
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    def _check_content_length(self, url):
+        """
+        Abort early if the Content-Length of the webpage exceeds max_body_size.
+
+        Raises:
+            DownloadException: The Content-Length exceeds max_body_size.
+        """
+        if not self.max_body_size:
+            return
+        content_length = self.url_response.info().getheader('content-length')
+        if content_length and content_length.isdigit() and \
+                int(content_length) > self.max_body_size:
+            raise DownloadException('Content-Length %s of %s exceeds %d bytes'
+                                    % (content_length, url, self.max_body_size))
+
+    def _read_webpage(self, url):
+        """
+        Read the webpage body to parse, no more than max_body_size bytes.
+
+        Raises:
+            DownloadException: The body exceeds max_body_size or fails to decode.
+        """
+        self._check_content_length(url)
+        start_time = time.time()
+        if not self.max_body_size:
+            webpage_content = self._read_body(url)
+        else:
+            webpage_content = self._read_body(url, self.max_body_size + 1)
+        self._observe_transfer(start_time, len(webpage_content))
+        if self.max_body_size and len(webpage_content) > self.max_body_size:
+            raise DownloadException('Body of %s exceeds %d bytes' % (url, self.max_body_size))
+        self._hash_webpage(webpage_content)
+        return webpage_content
 
     def iterate_next_urls(self, url_obj):
         """
@@ -200,64 +859,74 @@ class MiniSpiderThread(threading.Thread):
             logging.warn('Grab url %s failed or not started.', url_obj.url)
             return
  
-        content_type = self.url_response.info().gettype() 
-        if content_type == 'text/html'  and \
-            url_obj.depth < self.max_depth:
-            webpage_urls = self._iterate_webpage_urls(self.url_response.read())
-            url_join_function = lambda u: self.url_join(url_obj.url, u)
-            webpage_urls = map(url_join_function, webpage_urls)
+        if self._is_parsable(url_obj):
+            webpage_content = self._read_webpage(url_obj.url)
+            links = self._same_content_links(url_obj)
+            if links is not None:
+                for url in links:
+                    yield url
+                return
+            start_time = time.time()
+            webpage_urls = self._iterate_webpage_urls(webpage_content)
+            webpage_urls, self.rewritten_urls = self.canonicalizer.join_all(url_obj.url,
+                                                                            webpage_urls)
+            self._observe('parse', start_time)
             for url in webpage_urls:
                 yield url
 
+    def _is_parsable(self, url_obj):
+        """
+        Judge if the grabed webpage is html to parse within max_depth.
+        """
+        content_type = self.url_response.info().gettype()
+        return content_type == 'text/html' and url_obj.depth < self.max_depth
+
     def url_join(self, base, url):
         """
-        Join urls.
+        Join urls and canonicalize the joined url.
         """
-        joined_url = urlparse.urljoin(base, url)
-        splited_url = urlparse.urlsplit(joined_url)
-        path = os.path.normpath(splited_url.path)
-        return urlparse.urlunsplit((splited_url.scheme, splited_url.netloc,
-                                    path, splited_url.query,
-                                    splited_url.fragment))
+        return self.canonicalizer.join(base, url)
 
     def _iterate_webpage_urls(self, webpage_content):
         """
         Iterate webpage urls
         """
-        soup = bs4.BeautifulSoup(webpage_content)
-        element_attribution_map = {
-            'a': 'href',
-            'link': 'href',
-            'script': 'src',
-            'img': 'src',
-        }
+        return self.extractor.extract(webpage_content)
 
-        for element, attribution in element_attribution_map.iteritems():
-            for url in self._find_urls_of_element(soup, element, attribution):
-                yield url
 
-    def _find_urls_of_element(self, soup, element_name, attribution_name):
-        """
-        Find urls of elements.
+class MiniSpiderThread(MiniSpider, threading.Thread):
+    """
+    A mini spider thread.
+
+    Each thread blocks on grabing one url at a time, so the in-flight requests
+    never exceed the thread count. The url queue is a frontier.HostFrontier
+    which keeps the crawl interval per host, so the thread never sleeps itself.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """ Init the mini spider thread.
+
+        Args:
+            The same arguments as MiniSpider.
         """
-        elements = soup.find_all(element_name)
-        for element in elements:
-            try:
-                url = element[attribution_name]
-                if self._is_valid_url(url):
-                    yield url
-            except KeyError:
-                logging.debug('Attribution %s of element %s not found',
-                            attribution_name, element_name)
+        threading.Thread.__init__(self)
+        MiniSpider.__init__(self, *args, **kwargs)
 
-    def _is_valid_url(self, url):
+    def run(self):
         """
-        Judge if url is valid or not.
+        Run crawl job.
         """
-        if url.startswith('javascript:'):
-            return False
-
-        return True
+        while True:
+            try:
+                url_obj = self.url_queue.get(self.crawl_timeout)
+            except frontier.FrontierClosed:
+                return
+            try:
+                self.run_profiled(self.crawl_job, url_obj, self.url_queue, self.crawled_urls)
+            except Error as error:
+                logging.warn('Crawl %s failed due to %s', url_obj.url, str(error))
+            finally:
+                self.url_queue.task_done(url_obj)
 
 
 def parse_configuration(configuration_file_name):
@@ -278,9 +947,85 @@ def parse_configuration(configuration_file_name):
         'output_directory': './output',
         'max_depth': '1',
         'crawl_interval': '1',
+        'host_crawl_intervals': '',
         'crawl_timeout': '1',
         'target_url': '.*\.(gif|png|jpg|bmp)$',
-        'thread_count': '8'
+        'thread_count': '8',
+        'engine': 'thread',
+        'event_concurrency': '1000',
+        'keep_alive': 'true',
+        'max_connections_per_host': '2',
+        'max_idle_connections': '256',
+        'connection_idle_timeout': '30',
+        'seen_store': 'fingerprint',
+        'seen_store_capacity': '100000',
+        'seen_store_error_rate': '0.001',
+        'seen_store_path': './seen.db',
+        'checkpoint_path': '',
+        'checkpoint_interval': '60',
+        'max_body_size': '0',
+        'download_buffer_size': str(DEFAULT_DOWNLOAD_BUFFER_SIZE),
+        'link_extractor': 'tokenizer',
+        'pipeline_fetch_workers': '8',
+        'pipeline_parse_workers': '2',
+        'pipeline_store_workers': '2',
+        'pipeline_queue_size': '64',
+        'cluster_nodes': '',
+        'cluster_node_index': '0',
+        'cluster_batch_size': '100',
+        'cluster_flush_interval': '0.5',
+        'page_metadata_path': '',
+        'reuse_unchanged_links': 'true',
+        'storage_layout': 'url',
+        'archive_segment_size': str(archive.DEFAULT_SEGMENT_SIZE),
+        'canonical_rules': ', '.join(canonical_url.CANONICAL_RULES),
+        'tracking_query_params': ', '.join(canonical_url.DEFAULT_TRACKING_PARAMS),
+        'url_join_cache_size': str(canonical_url.DEFAULT_JOIN_CACHE_SIZE),
+        'prune_rules': ', '.join(url_pruner.PRUNE_RULES),
+        'allowed_domains': '',
+        'denied_domains': '',
+        'frontier_score': 'target',
+        'frontier_max_memory_urls': '100000',
+        'frontier_spill_directory': '',
+        'metrics_path': '',
+        'metrics_interval': '10',
+        'metrics_port': '0',
+        'profile_signal': crawl_profiler.DEFAULT_PROFILE_SIGNAL,
+        'profile_on_start': 'false',
+        'profile_duration': '30',
+        'profile_interval': '0.01',
+        'profile_directory': '',
+        'dns_cache': 'true',
+        'dns_ttl': '300',
+        'dns_negative_ttl': '30',
+        'dns_prefetch_workers': '4',
+        'adaptive_concurrency': 'false',
+        'host_concurrency_floor': '1',
+        'host_concurrency_ceiling': '4',
+        'global_concurrency_floor': '1',
+        'global_concurrency_ceiling': '0',
+        'concurrency_latency_tolerance': '2',
+        'concurrency_log_interval': '10',
+        'host_health': 'true',
+        'host_retries': str(host_health.DEFAULT_MAX_RETRIES),
+        'retry_backoff': str(host_health.DEFAULT_RETRY_BACKOFF),
+        'max_retry_backoff': str(host_health.DEFAULT_MAX_RETRY_BACKOFF),
+        'circuit_failure_threshold': str(host_health.DEFAULT_FAILURE_THRESHOLD),
+        'circuit_open_seconds': str(host_health.DEFAULT_OPEN_SECONDS),
+        'circuit_max_open_seconds': str(host_health.DEFAULT_MAX_OPEN_SECONDS),
+        'circuit_max_trips': str(host_health.DEFAULT_MAX_TRIPS),
+        'async_logging': 'false',
+        'log_queue_size': '10000',
+        'log_queue_full': 'drop',
+        'log_batch_size': '256',
+        'log_flush_interval': '1',
+        'log_sample_rate': '0',
+        'accept_compression': 'true',
+        'compress_stored_text': 'false',
+        'store_compression_level': '6',
+        'seen_store_stripes': '1',
+        'seed_queue_size': '10000',
+        'seed_batch_size': '1000'
     }
 
     configuration = ConfigParser.ConfigParser(default_configuration)
@@ -298,80 +1043,954 @@ def parse_configuration(configuration_file_name):
         raise ConfigurationException('The max crawling depth configuration max_depth' 
                                      'must be no less than zero.')
 
-    if configuration.getint('spider', 'crawl_interval') <= 0:
+    if configuration.getfloat('spider', 'crawl_interval') <= 0:
         raise ConfigurationException('The crawling time interval configuration crawl_interval'
                                      'must be greater than zero.')
 
+    try:
+        frontier.parse_host_crawl_intervals(configuration.get('spider', 'host_crawl_intervals'))
+    except ValueError as ex:
+        raise ConfigurationException('The per host crawling time interval configuration '
+                                     'host_crawl_intervals is invalid: %s.' % str(ex))
+
     if configuration.getint('spider', 'crawl_timeout') <= 0:
         raise ConfigurationException('The crawling timeout configuration crawl_timeout'
                                      'must be greater than zero.')
 
-    if configuration.getint('spider', 'thread_count') < 1:
-        raise ConfigurationException('The crawling thread count configuration thread_count'
+    if configuration.get('spider', 'frontier_score') not in frontier.FRONTIER_SCORES:
+        raise ConfigurationException('The frontier configuration frontier_score '
+                                     'must be one of %s.' % ', '.join(frontier.FRONTIER_SCORES))
+
+    if configuration.getint('spider', 'frontier_max_memory_urls') < 0:
+        raise ConfigurationException('The frontier configuration frontier_max_memory_urls '
+                                     'must be no less than zero.')
+
+    if configuration.getfloat('spider', 'metrics_interval') <= 0:
+        raise ConfigurationException('The metrics configuration metrics_interval '
                                      'must be greater than zero.')
 
-    return configuration
+    if not 0 <= configuration.getint('spider', 'metrics_port') <= 65535:
+        raise ConfigurationException('The metrics configuration metrics_port '
+                                     'must be between 0 and 65535.')
 
-    
-def argument_parser():
-    """
-    Parse the arguments from cmd line.
+    try:
+        crawl_profiler.parse_signal(configuration.get('spider', 'profile_signal'))
+    except ValueError as ex:
+        raise ConfigurationException('The profiling configuration profile_signal '
+                                     'must be a signal name like SIGUSR2: %s.' % str(ex))
 
-    Returns:
-        arguments: Arguments from cmd line.
-    """
-    argument_parser = argparse.ArgumentParser(description='A mini spider.')
-    argument_parser.add_argument('-c', '--conf',
-                                 default="spider.conf",
-                                 help='confiuration file path(default is "spider.conf")')
-    argument_parser.add_argument('-v', '--version',
-                                 action='version',
-                                 version='%(prog)s: ' + VERSION)
-    arguments = argument_parser.parse_args()
+    if configuration.getfloat('spider', 'profile_duration') <= 0 or \
+            configuration.getfloat('spider', 'profile_interval') <= 0:
+        raise ConfigurationException('The profiling configuration profile_duration and '
+                                     'profile_interval must be greater than zero.')
 
-    return arguments 
+    if configuration.getfloat('spider', 'dns_ttl') <= 0:
+        raise ConfigurationException('The dns configuration dns_ttl '
+                                     'must be greater than zero.')
 
+    if configuration.getfloat('spider', 'dns_negative_ttl') < 0 or \
+            configuration.getint('spider', 'dns_prefetch_workers') < 0:
+        raise ConfigurationException('The dns configuration dns_negative_ttl and '
+                                     'dns_prefetch_workers must be no less than zero.')
 
-def run_spider(configuration):
-    """
-    Run spider and start crawling urls.
-    
-    Args:
-        configuration: The configuration of mini spider.
-    """
-    url_queue = Queue.Queue()
-    crawled_urls = set()
-    
-    thread_count = configuration.getint('spider', 'thread_count')
-    max_depth = configuration.getint('spider', 'max_depth') 
-    crawl_interval = configuration.getint('spider', 'crawl_interval') 
-    crawl_timeout = configuration.getint('spider', 'crawl_timeout') 
-    target_url = configuration.get('spider', 'target_url')
-    output_directory = configuration.get('spider', 'output_directory')
+    try:
+        configuration.getboolean('spider', 'adaptive_concurrency')
+    except ValueError:
+        raise ConfigurationException('The concurrency configuration adaptive_concurrency '
+                                     'must be a boolean.')
 
-    
-    with open(configuration.get('spider', 'url_list_file'), 'r') as url_lines:
-        for line in url_lines:
-            url = line.rstrip()
-            url_obj = Url(url, 0)
-            url_queue.put(url_obj)
+    for scope in ('host', 'global'):
+        floor = configuration.getint('spider', '%s_concurrency_floor' % scope)
+        ceiling = configuration.getint('spider', '%s_concurrency_ceiling' % scope)
+        if floor < 1 or ceiling < floor and (scope == 'host' or ceiling != 0):
+            raise ConfigurationException('The concurrency configuration %s_concurrency_floor '
+                                         'must be greater than zero and no greater than '
+                                         '%s_concurrency_ceiling.' % (scope, scope))
 
-    for i in xrange(configuration.getint('spider', 'thread_count')):
-        spider_thread = MiniSpiderThread(url_queue, crawled_urls, max_depth, crawl_interval, 
-                                         crawl_timeout, target_url, output_directory)
-        spider_thread.setDaemon(True)
-        spider_thread.start()
+    if configuration.getfloat('spider', 'concurrency_latency_tolerance') <= 1:
+        raise ConfigurationException('The concurrency configuration concurrency_latency_tolerance '
+                                     'must be greater than one.')
 
-    url_queue.join()
+    if configuration.getfloat('spider', 'concurrency_log_interval') <= 0:
+        raise ConfigurationException('The concurrency configuration concurrency_log_interval '
+                                     'must be greater than zero.')
 
+    try:
+        configuration.getboolean('spider', 'host_health')
+    except ValueError:
+        raise ConfigurationException('The host health configuration host_health '
+                                     'must be a boolean.')
 
-def init_log():
-    """
-    Init logging for mini spider.
-    """
-    logger_util.init_logger(os.path.join(os.path.abspath(os.curdir), 'log'))
+    if configuration.getint('spider', 'host_retries') < 0 or \
+            configuration.getint('spider', 'circuit_max_trips') < 0:
+        raise ConfigurationException('The host health configuration host_retries and '
+                                     'circuit_max_trips must be no less than zero.')
+
+    if configuration.getint('spider', 'circuit_failure_threshold') < 1:
+        raise ConfigurationException('The host health configuration circuit_failure_threshold '
+                                     'must be greater than zero.')
+
+    for option, max_option in (('retry_backoff', 'max_retry_backoff'),
+                               ('circuit_open_seconds', 'circuit_max_open_seconds')):
+        if not 0 < configuration.getfloat('spider', option) <= \
+                configuration.getfloat('spider', max_option):
+            raise ConfigurationException('The host health configuration %s must be greater '
+                                         'than zero and no greater than %s.'
+                                         % (option, max_option))
+
+    try:
+        configuration.getboolean('spider', 'async_logging')
+    except ValueError:
+        raise ConfigurationException('The logging configuration async_logging '
+                                     'must be a boolean.')
+
+    if configuration.get('spider', 'log_queue_full') not in logger_util.LOG_FULL_POLICIES:
+        raise ConfigurationException('The logging configuration log_queue_full '
+                                     'must be one of %s.' % ', '.join(logger_util.LOG_FULL_POLICIES))
+
+    if configuration.getint('spider', 'log_queue_size') < 1 or \
+            configuration.getint('spider', 'log_batch_size') < 1 or \
+            configuration.getfloat('spider', 'log_flush_interval') <= 0:
+        raise ConfigurationException('The logging configuration log_queue_size, log_batch_size '
+                                     'and log_flush_interval must be greater than zero.')
+
+    if configuration.getint('spider', 'log_sample_rate') < 0:
+        raise ConfigurationException('The logging configuration log_sample_rate '
+                                     'must be no less than zero.')
+
+    for option in ('accept_compression', 'compress_stored_text'):
+        try:
+            configuration.getboolean('spider', option)
+        except ValueError:
+            raise ConfigurationException('The compression configuration %s '
+                                         'must be a boolean.' % option)
+
+    if configuration.getboolean('spider', 'compress_stored_text') and \
+            configuration.get('spider', 'storage_layout') != 'url':
+        raise ConfigurationException('The compression configuration compress_stored_text '
+                                     'must be false unless storage_layout is url.')
+
+    if not 1 <= configuration.getint('spider', 'store_compression_level') <= 9:
+        raise ConfigurationException('The compression configuration store_compression_level '
+                                     'must be between 1 and 9.')
+
+    if configuration.getint('spider', 'thread_count') < 1:
+        raise ConfigurationException('The crawling thread count configuration thread_count'
+                                     'must be greater than zero.')
+
+    if configuration.get('spider', 'engine') not in CRAWL_ENGINES:
+        raise ConfigurationException('The crawl engine configuration engine '
+                                     'must be one of %s.' % ', '.join(CRAWL_ENGINES))
+
+    if configuration.getint('spider', 'event_concurrency') < 1:
+        raise ConfigurationException('The event engine concurrency configuration event_concurrency '
+                                     'must be greater than zero.')
+
+    try:
+        configuration.getboolean('spider', 'keep_alive')
+    except ValueError:
+        raise ConfigurationException('The keep-alive configuration keep_alive '
+                                     'must be a boolean.')
+
+    if configuration.getint('spider', 'max_connections_per_host') < 1:
+        raise ConfigurationException('The keep-alive connection configuration '
+                                     'max_connections_per_host must be greater than zero.')
+
+    if configuration.getint('spider', 'max_idle_connections') < 0:
+        raise ConfigurationException('The keep-alive connection configuration '
+                                     'max_idle_connections must be no less than zero.')
+
+    if configuration.getfloat('spider', 'connection_idle_timeout') <= 0:
+        raise ConfigurationException('The keep-alive connection configuration '
+                                     'connection_idle_timeout must be greater than zero.')
+
+    if configuration.get('spider', 'seen_store') not in seen_store.SEEN_STORE_BACKENDS:
+        raise ConfigurationException('The seen url store configuration seen_store '
+                                     'must be one of %s.' % ', '.join(seen_store.SEEN_STORE_BACKENDS))
+
+    if configuration.getint('spider', 'seen_store_capacity') < 1:
+        raise ConfigurationException('The seen url store configuration seen_store_capacity '
+                                     'must be greater than zero.')
+
+    if not 0 < configuration.getfloat('spider', 'seen_store_error_rate') < 1:
+        raise ConfigurationException('The seen url store configuration seen_store_error_rate '
+                                     'must be between zero and one.')
+
+    if configuration.getint('spider', 'seen_store_stripes') < 1:
+        raise ConfigurationException('The seen url store configuration seen_store_stripes '
+                                     'must be greater than zero.')
+
+    for option in ('seed_queue_size', 'seed_batch_size'):
+        if configuration.getint('spider', option) < 1:
+            raise ConfigurationException('The seed configuration %s '
+                                         'must be greater than zero.' % option)
+
+    if configuration.getfloat('spider', 'checkpoint_interval') <= 0:
+        raise ConfigurationException('The checkpoint configuration checkpoint_interval '
+                                     'must be greater than zero.')
+
+    if configuration.getint('spider', 'max_body_size') < 0:
+        raise ConfigurationException('The download configuration max_body_size '
+                                     'must be no less than zero.')
+
+    if configuration.getint('spider', 'download_buffer_size') < 1:
+        raise ConfigurationException('The download configuration download_buffer_size '
+                                     'must be greater than zero.')
+
+    if configuration.get('spider', 'link_extractor') not in link_extractor.LINK_EXTRACTORS:
+        raise ConfigurationException('The link extractor configuration link_extractor '
+                                     'must be one of %s.' % ', '.join(link_extractor.LINK_EXTRACTORS))
+
+    for option in ('pipeline_fetch_workers', 'pipeline_parse_workers',
+                   'pipeline_store_workers', 'pipeline_queue_size'):
+        if configuration.getint('spider', option) < 1:
+            raise ConfigurationException('The pipeline engine configuration %s '
+                                         'must be greater than zero.' % option)
+
+    check_cluster_configuration(configuration)
+
+    try:
+        configuration.getboolean('spider', 'reuse_unchanged_links')
+    except ValueError:
+        raise ConfigurationException('The revalidation configuration reuse_unchanged_links '
+                                     'must be a boolean.')
+
+    if configuration.get('spider', 'storage_layout') not in STORAGE_LAYOUTS:
+        raise ConfigurationException('The storage configuration storage_layout '
+                                     'must be one of %s.' % ', '.join(STORAGE_LAYOUTS))
+
+    if configuration.getint('spider', 'archive_segment_size') < 1:
+        raise ConfigurationException('The storage configuration archive_segment_size '
+                                     'must be greater than zero.')
+
+    try:
+        canonical_url.parse_canonical_rules(configuration.get('spider', 'canonical_rules'))
+    except ValueError as ex:
+        raise ConfigurationException('The canonicalization configuration canonical_rules '
+                                     'must be some of %s: %s.'
+                                     % (', '.join(canonical_url.CANONICAL_RULES), str(ex)))
+
+    if configuration.getint('spider', 'url_join_cache_size') < 0:
+        raise ConfigurationException('The canonicalization configuration url_join_cache_size '
+                                     'must be no less than zero.')
+
+    try:
+        url_pruner.parse_prune_rules(configuration.get('spider', 'prune_rules'))
+    except ValueError as ex:
+        raise ConfigurationException('The pruning configuration prune_rules '
+                                     'must be some of %s: %s.'
+                                     % (', '.join(url_pruner.PRUNE_RULES), str(ex)))
+
+    if configuration.getint('spider', 'cluster_batch_size') < 1:
+        raise ConfigurationException('The cluster configuration cluster_batch_size '
+                                     'must be greater than zero.')
+
+    if configuration.getfloat('spider', 'cluster_flush_interval') <= 0:
+        raise ConfigurationException('The cluster configuration cluster_flush_interval '
+                                     'must be greater than zero.')
+
+    return configuration
+
+
+def check_cluster_configuration(configuration):
+    """
+    Check the cluster nodes and the index of this node in them.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Raises:
+        ConfigurationException: Invalid cluster_nodes or cluster_node_index.
+    """
+    try:
+        nodes = cluster.parse_cluster_nodes(configuration.get('spider', 'cluster_nodes'))
+    except ValueError as ex:
+        raise ConfigurationException('The cluster configuration cluster_nodes '
+                                     'is invalid: %s.' % str(ex))
+
+    if nodes and not 0 <= configuration.getint('spider', 'cluster_node_index') < len(nodes):
+        raise ConfigurationException('The cluster configuration cluster_node_index '
+                                     'must be an index of cluster_nodes.')
+
+    
+def argument_parser():
+    """
+    Parse the arguments from cmd line.
+
+    Returns:
+        arguments: Arguments from cmd line.
+    """
+    argument_parser = argparse.ArgumentParser(description='A mini spider.')
+    argument_parser.add_argument('-c', '--conf',
+                                 default="spider.conf",
+                                 help='confiuration file path(default is "spider.conf")')
+    argument_parser.add_argument('-v', '--version',
+                                 action='version',
+                                 version='%(prog)s: ' + VERSION)
+    argument_parser.add_argument('-r', '--resume',
+                                 action='store_true',
+                                 help='resume the crawl from the checkpoint_path checkpoint')
+    argument_parser.add_argument('-n', '--node-index',
+                                 type=int,
+                                 help='index of this node in cluster_nodes(default is '
+                                      'cluster_node_index)')
+    arguments = argument_parser.parse_args()
+
+    return arguments 
+
+
+def create_connection_pool(configuration, metrics=None):
+    """
+    Create the pool of keep-alive connections.
+
+    Args:
+        configuration: The configuration of mini spider.
+        metrics: The crawl_metrics.CrawlMetrics timing the connects, None not to.
+
+    Returns:
+        A connection_pool.ConnectionPool object, None if keep_alive is off.
+    """
+    if not configuration.getboolean('spider', 'keep_alive'):
+        return None
+    return connection_pool.ConnectionPool(
+        configuration.getint('spider', 'max_connections_per_host'),
+        configuration.getint('spider', 'max_idle_connections'),
+        configuration.getfloat('spider', 'connection_idle_timeout'), metrics)
+
+
+def mini_spider_options(configuration, metrics=None, profiler=None, url_queue=None):
+    """
+    Get the optional MiniSpider arguments from the configuration.
+
+    Args:
+        configuration: The configuration of mini spider.
+        metrics: The crawl_metrics.CrawlMetrics of the crawl, None not to measure it.
+        profiler: The crawl_profiler.CrawlProfiler of the crawl, None never to profile it.
+        url_queue: The url queue whose concurrency controller and host health
+                   the grabs are told, None not to tell them.
+
+    Returns:
+        A dict of keyword arguments of MiniSpider.
+    """
+    return {
+        'max_body_size': configuration.getint('spider', 'max_body_size'),
+        'download_buffer_size': configuration.getint('spider', 'download_buffer_size'),
+        'extractor': link_extractor.create_link_extractor(
+            configuration.get('spider', 'link_extractor')),
+        'page_metadata': create_page_metadata(configuration),
+        'reuse_links': configuration.getboolean('spider', 'reuse_unchanged_links'),
+        'webpage_store': create_webpage_store(configuration),
+        'canonicalizer': create_canonicalizer(configuration),
+        'pruner': create_url_pruner(configuration),
+        'metrics': metrics,
+        'profiler': profiler,
+        'dns_cache': create_dns_cache(configuration, metrics),
+        'concurrency': url_queue.concurrency if url_queue is not None else None,
+        'host_health': url_queue.host_health if url_queue is not None else None,
+        'accept_compression': configuration.getboolean('spider', 'accept_compression'),
+        'compress_stored_text': configuration.getboolean('spider', 'compress_stored_text'),
+        'compression_level': configuration.getint('spider', 'store_compression_level'),
+        'compression_stats': content_coding.CompressionStats(metrics),
+    }
+
+
+def create_canonicalizer(configuration):
+    """
+    Create the canonicalizer of the links and the seed urls.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A canonical_url.Canonicalizer object.
+    """
+    return canonical_url.Canonicalizer(
+        canonical_url.parse_canonical_rules(configuration.get('spider', 'canonical_rules')),
+        canonical_url.parse_names(configuration.get('spider', 'tracking_query_params')),
+        configuration.getint('spider', 'url_join_cache_size'))
+
+
+def create_dns_cache(configuration, metrics=None):
+    """
+    Create the process-wide dns cache and install it.
+
+    Args:
+        configuration: The configuration of mini spider.
+        metrics: The crawl_metrics.CrawlMetrics timing the lookups, None not to.
+
+    Returns:
+        An installed dns_cache.DnsCache object, None if dns_cache is off.
+    """
+    if not configuration.getboolean('spider', 'dns_cache'):
+        return None
+    cache = dns_cache.DnsCache(configuration.getfloat('spider', 'dns_ttl'),
+                               configuration.getfloat('spider', 'dns_negative_ttl'),
+                               configuration.getint('spider', 'dns_prefetch_workers'),
+                               metrics)
+    cache.install()
+    return cache
+
+
+def create_url_pruner(configuration):
+    """
+    Create the pruner dropping the useless urls before they are put.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A url_pruner.UrlPruner object, None if prune_rules is empty.
+    """
+    rules = url_pruner.parse_prune_rules(configuration.get('spider', 'prune_rules'))
+    if not rules:
+        return None
+    return url_pruner.UrlPruner(
+        rules, configuration.getint('spider', 'max_depth'),
+        configuration.get('spider', 'target_url'),
+        url_pruner.parse_domains(configuration.get('spider', 'allowed_domains')),
+        url_pruner.parse_domains(configuration.get('spider', 'denied_domains')))
+
+
+def create_page_metadata(configuration):
+    """
+    Create the store of webpage metadata to revalidate webpages.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A page_metadata.PageMetadataStore object, None if page_metadata_path is empty.
+    """
+    page_metadata_path = configuration.get('spider', 'page_metadata_path')
+    if not page_metadata_path:
+        return None
+    return page_metadata.PageMetadataStore(page_metadata_path)
+
+
+def create_webpage_store(configuration):
+    """
+    Create the store of target webpages of the storage_layout.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A blob_store.BlobStore object or an archive.ArchiveWriter object in
+        output_directory, None if storage_layout is url.
+    """
+    storage_layout = configuration.get('spider', 'storage_layout')
+    output_directory = configuration.get('spider', 'output_directory')
+    if storage_layout == 'content':
+        return blob_store.BlobStore(output_directory)
+    if storage_layout == 'archive':
+        return archive.ArchiveWriter(output_directory,
+                                     configuration.getint('spider', 'archive_segment_size'))
+    return None
+
+
+def close_mini_spider_options(options):
+    """
+    Close the stores opened by mini_spider_options.
+
+    Args:
+        options: The dict of keyword arguments of MiniSpider.
+    """
+    canonicalizer = options['canonicalizer']
+    logging.info('Canonical urls: %d links joined, %d joins cached, %d rewritten, '
+                 '%d duplicate fetches avoided', canonicalizer.joins, canonicalizer.join_hits,
+                 canonicalizer.rewritten, canonicalizer.avoided_duplicates)
+    if options['pruner'] is not None:
+        dropped = options['pruner'].dropped
+        logging.info('Pruned urls: %d dropped before fetching (%s)', sum(dropped.values()),
+                     ', '.join('%s %d' % (rule, dropped[rule]) for rule in url_pruner.PRUNE_RULES))
+    if options['dns_cache'] is not None:
+        cache = options['dns_cache']
+        logging.info('Dns cache: %d hits, %d negative hits, %d misses, %d hosts prefetched',
+                     cache.hits, cache.negative_hits, cache.misses, cache.prefetches)
+        cache.close()
+    if options['concurrency'] is not None:
+        options['concurrency'].log_limits()
+    if options['host_health'] is not None:
+        health = options['host_health']
+        logging.info('Host health: %d circuits opened, %d recovered, %d hosts given up',
+                     health.opened, health.recovered, health.given_up)
+    stats = options['compression_stats']
+    logging.info('Compression: %d bytes saved on the wire of %d decoded, '
+                 '%d bytes saved on the disk by %d webpages stored compressed',
+                 stats.wire_saved(), stats.decoded_bytes, stats.disk_saved(),
+                 stats.stored_files)
+    if options['page_metadata'] is not None:
+        logging.info('Page metadata %s: %d webpages', options['page_metadata'].path,
+                     len(options['page_metadata']))
+        options['page_metadata'].close()
+    store = options['webpage_store']
+    if isinstance(store, blob_store.BlobStore):
+        logging.info('Blob store %s: %d blobs of %d bytes written, %d bytes deduplicated',
+                     store.directory, store.blob_count, store.stored_bytes,
+                     store.deduplicated_bytes)
+    elif isinstance(store, archive.ArchiveWriter):
+        logging.info('Archive %s: %d records of %d bytes appended, last segment %d',
+                     store.directory, store.record_count, store.record_bytes, store.segment)
+    if store is not None:
+        store.close()
+
+
+def run_thread_engine(configuration, url_queue, crawled_urls, metrics=None, profiler=None):
+    """
+    Crawl the urls with thread_count blocking MiniSpiderThreads.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The url queue to crawl and parse.
+        crawled_urls: The crawled urls.
+        metrics: The crawl_metrics.CrawlMetrics of the crawl, None not to measure it.
+        profiler: The crawl_profiler.CrawlProfiler of the crawl, None never to profile it.
+    """
+    max_depth = configuration.getint('spider', 'max_depth') 
+    crawl_interval = configuration.getfloat('spider', 'crawl_interval') 
+    crawl_timeout = configuration.getint('spider', 'crawl_timeout') 
+    target_url = configuration.get('spider', 'target_url')
+    output_directory = configuration.get('spider', 'output_directory')
+    pool = create_connection_pool(configuration, metrics)
+    options = mini_spider_options(configuration, metrics, profiler, url_queue)
+
+    spider_threads = []
+    for i in xrange(configuration.getint('spider', 'thread_count')):
+        spider_thread = MiniSpiderThread(url_queue, crawled_urls, max_depth, crawl_interval, 
+                                         crawl_timeout, target_url, output_directory, pool,
+                                         **options)
+        spider_thread.setDaemon(True)
+        spider_thread.start()
+        spider_threads.append(spider_thread)
+
+    url_queue.join()
+    url_queue.close()
+    for spider_thread in spider_threads:
+        spider_thread.join()
+    close_mini_spider_options(options)
+
+    if pool is not None:
+        stats = pool.stats()
+        logging.info('Keep-alive connections: %d requests on %d connections, '
+                     '%d reused (handshakes saved), %d evicted',
+                     stats['requests'], stats['connections_created'],
+                     stats['connections_reused'], stats['connections_evicted'])
+        pool.close()
+
+
+def run_event_engine(configuration, url_queue, crawled_urls, metrics=None, profiler=None):
+    """
+    Crawl the urls with event_concurrency fetches on one event loop.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The url queue to crawl and parse.
+        crawled_urls: The crawled urls.
+        metrics: The crawl_metrics.CrawlMetrics of the crawl, None not to measure it.
+        profiler: The crawl_profiler.CrawlProfiler of the crawl, None never to profile it.
+    """
+    max_depth = configuration.getint('spider', 'max_depth') 
+    crawl_interval = configuration.getfloat('spider', 'crawl_interval') 
+    crawl_timeout = configuration.getint('spider', 'crawl_timeout') 
+    target_url = configuration.get('spider', 'target_url')
+    output_directory = configuration.get('spider', 'output_directory')
+    concurrency = configuration.getint('spider', 'event_concurrency')
+
+    options = mini_spider_options(configuration, metrics, profiler, url_queue)
+
+    page_handler = MiniSpider(url_queue, crawled_urls, max_depth, crawl_interval,
+                              crawl_timeout, target_url, output_directory, **options)
+    spider = event_spider.EventSpider(url_queue, crawled_urls, page_handler, concurrency,
+                                      crawl_timeout, options['max_body_size'])
+    spider.run()
+    close_mini_spider_options(options)
+
+
+def run_pipeline_engine(configuration, url_queue, crawled_urls, metrics=None, profiler=None):
+    """
+    Crawl the urls with fetch, parse and store stages connected by bounded queues.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The url queue to crawl and parse.
+        crawled_urls: The crawled urls.
+        metrics: The crawl_metrics.CrawlMetrics of the crawl, None not to measure it.
+        profiler: The crawl_profiler.CrawlProfiler of the crawl, None never to profile it.
+    """
+    max_depth = configuration.getint('spider', 'max_depth') 
+    crawl_interval = configuration.getfloat('spider', 'crawl_interval') 
+    crawl_timeout = configuration.getint('spider', 'crawl_timeout') 
+    target_url = configuration.get('spider', 'target_url')
+    output_directory = configuration.get('spider', 'output_directory')
+    pool = create_connection_pool(configuration, metrics)
+    options = mini_spider_options(configuration, metrics, profiler, url_queue)
+
+    page_handlers = []
+    for i in xrange(configuration.getint('spider', 'pipeline_fetch_workers')):
+        page_handlers.append(MiniSpider(url_queue, crawled_urls, max_depth, crawl_interval,
+                                        crawl_timeout, target_url, output_directory, pool,
+                                        **options))
+    spider = pipeline.PipelineSpider(url_queue, crawled_urls, page_handlers,
+                                     configuration.getint('spider', 'pipeline_parse_workers'),
+                                     configuration.getint('spider', 'pipeline_store_workers'),
+                                     configuration.getint('spider', 'pipeline_queue_size'))
+    spider.run()
+    close_mini_spider_options(options)
+
+    if pool is not None:
+        pool.close()
+
+
+def run_engine(configuration, url_queue, crawled_urls):
+    """
+    Crawl the urls with the configured crawl engine.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The url queue to crawl and parse.
+        crawled_urls: The crawled urls.
+    """
+    metrics, exporters = create_crawl_metrics(configuration, url_queue)
+    profiler = create_crawl_profiler(configuration)
+    profile_signal = crawl_profiler.parse_signal(configuration.get('spider', 'profile_signal'))
+    previous_handler = None
+    if profile_signal is not None:
+        try:
+            previous_handler = profiler.install_signal_handler(profile_signal)
+        except ValueError:
+            logging.warn('Profiling on %s is off out of the main thread.',
+                         configuration.get('spider', 'profile_signal'))
+    if configuration.getboolean('spider', 'profile_on_start'):
+        profiler.start()
+
+    engine = configuration.get('spider', 'engine')
+    try:
+        if engine == 'event':
+            run_event_engine(configuration, url_queue, crawled_urls, metrics, profiler)
+        elif engine == 'pipeline':
+            run_pipeline_engine(configuration, url_queue, crawled_urls, metrics, profiler)
+        else:
+            run_thread_engine(configuration, url_queue, crawled_urls, metrics, profiler)
+    finally:
+        if previous_handler is not None:
+            signal.signal(profile_signal, previous_handler)
+        profiler.stop()
+        for exporter in exporters:
+            exporter.stop()
+
+
+def create_crawl_profiler(configuration):
+    """
+    Create the on-demand profiler of the crawl.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A crawl_profiler.CrawlProfiler object writing to profile_directory,
+        the working directory of the log files if it is empty.
+    """
+    return crawl_profiler.CrawlProfiler(
+        configuration.get('spider', 'profile_directory') or os.path.abspath(os.curdir),
+        configuration.getfloat('spider', 'profile_duration'),
+        configuration.getfloat('spider', 'profile_interval'))
+
+
+def create_crawl_metrics(configuration, url_queue):
+    """
+    Create the live metrics of the crawl and start exporting them.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The url queue whose depth, concurrency limit and open
+                   circuits are gauges.
+
+    Returns:
+        A (metrics, exporters) tuple, metrics is a crawl_metrics.CrawlMetrics
+        object, None if neither metrics_path nor metrics_port is set, and
+        exporters are the started MetricsReporter and MetricsServer to stop.
+    """
+    metrics_path = configuration.get('spider', 'metrics_path')
+    metrics_port = configuration.getint('spider', 'metrics_port')
+    if not metrics_path and not metrics_port:
+        return None, []
+    metrics = crawl_metrics.CrawlMetrics()
+    metrics.register_gauge('queue_depth', url_queue.qsize)
+    if url_queue.concurrency is not None:
+        url_queue.concurrency.metrics = metrics
+        metrics.register_gauge('concurrency_limit', url_queue.concurrency.global_limit)
+    if url_queue.host_health is not None:
+        metrics.register_gauge('open_circuits', url_queue.host_health.open_hosts)
+    exporters = []
+    if metrics_path:
+        exporters.append(crawl_metrics.MetricsReporter(
+            metrics, metrics_path, configuration.getfloat('spider', 'metrics_interval')))
+    if metrics_port:
+        exporters.append(crawl_metrics.MetricsServer(metrics, metrics_port))
+        logging.info('Serve metrics on http://127.0.0.1:%d/metrics', metrics_port)
+    for exporter in exporters:
+        exporter.start()
+    return metrics, exporters
+
+
+def create_url_queue(configuration):
+    """
+    Create the url queue scheduling urls per host.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A frontier.HostFrontier object, limiting the urls in flight by an
+        adaptive_concurrency.ConcurrencyController if adaptive_concurrency is on,
+        and parking the failing hosts by a host_health.HostHealth if host_health is on.
+    """
+    host_crawl_intervals = frontier.parse_host_crawl_intervals(
+        configuration.get('spider', 'host_crawl_intervals'))
+    score = frontier.create_score_function(configuration.get('spider', 'frontier_score'),
+                                           configuration.get('spider', 'target_url'))
+    return frontier.HostFrontier(configuration.getfloat('spider', 'crawl_interval'),
+                                 host_crawl_intervals, score,
+                                 configuration.getint('spider', 'frontier_max_memory_urls'),
+                                 configuration.get('spider', 'frontier_spill_directory') or None,
+                                 Url, create_concurrency_controller(configuration),
+                                 create_host_health(configuration))
+
+
+def create_host_health(configuration):
+    """
+    Create the circuit breakers and the retry backoff of the crawled hosts.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A host_health.HostHealth object, None if host_health is off.
+    """
+    if not configuration.getboolean('spider', 'host_health'):
+        return None
+    return host_health.HostHealth(configuration.getint('spider', 'host_retries'),
+                                  configuration.getfloat('spider', 'retry_backoff'),
+                                  configuration.getfloat('spider', 'max_retry_backoff'),
+                                  configuration.getint('spider', 'circuit_failure_threshold'),
+                                  configuration.getfloat('spider', 'circuit_open_seconds'),
+                                  configuration.getfloat('spider', 'circuit_max_open_seconds'),
+                                  configuration.getint('spider', 'circuit_max_trips'))
+
+
+def create_concurrency_controller(configuration):
+    """
+    Create the AIMD controller of the urls in flight per host and in total.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        An adaptive_concurrency.ConcurrencyController object, None if
+        adaptive_concurrency is off. The global ceiling is the workers of
+        the engine if global_concurrency_ceiling is 0.
+    """
+    if not configuration.getboolean('spider', 'adaptive_concurrency'):
+        return None
+    global_floor = configuration.getint('spider', 'global_concurrency_floor')
+    global_ceiling = configuration.getint('spider', 'global_concurrency_ceiling')
+    if not global_ceiling:
+        global_ceiling = max(global_floor, configuration.getint(
+            'spider', ENGINE_WORKER_OPTIONS[configuration.get('spider', 'engine')]))
+    return adaptive_concurrency.ConcurrencyController(
+        configuration.getint('spider', 'host_concurrency_floor'),
+        configuration.getint('spider', 'host_concurrency_ceiling'),
+        global_floor, global_ceiling,
+        configuration.getfloat('spider', 'concurrency_latency_tolerance'),
+        configuration.getfloat('spider', 'concurrency_log_interval'))
+
+
+def create_crawled_urls(configuration):
+    """
+    Create the store of crawled urls.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        A seen url store of seen_store.
+    """
+    return seen_store.create_seen_store(configuration.get('spider', 'seen_store'),
+                                        configuration.getint('spider', 'seen_store_capacity'),
+                                        configuration.getfloat('spider', 'seen_store_error_rate'),
+                                        configuration.get('spider', 'seen_store_path'),
+                                        configuration.getint('spider', 'seen_store_stripes'))
+
+
+def create_cluster_node(configuration, url_queue, crawled_urls):
+    """
+    Create the node of this process in the cluster.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The local url queue of the node.
+        crawled_urls: The local crawled urls of the node.
+
+    Returns:
+        A cluster.ClusterNode object, None if cluster_nodes is empty.
+    """
+    nodes = cluster.parse_cluster_nodes(configuration.get('spider', 'cluster_nodes'))
+    if not nodes:
+        return None
+    return cluster.ClusterNode(nodes, configuration.getint('spider', 'cluster_node_index'),
+                               url_queue, crawled_urls, Url,
+                               configuration.getint('spider', 'cluster_batch_size'),
+                               configuration.getfloat('spider', 'cluster_flush_interval'),
+                               configuration.getint('spider', 'crawl_timeout'))
+
+
+def create_seed_feeder(configuration, url_queue, crawled_urls, url_filter=None, offset=0,
+                       checkpointed=False):
+    """
+    Create the feeder putting the seed urls of url_list_file lazily.
+
+    Args:
+        configuration: The configuration of mini spider.
+        url_queue: The url queue to put the seed urls.
+        crawled_urls: The crawled urls the seed urls are added to.
+        url_filter: The function judging if a seed url is put, None to put all.
+        offset: The offset in url_list_file to read from.
+        checkpointed: True if url_queue records the offset to the crawl checkpoint.
+
+    Returns:
+        A seed_feeder.SeedFeeder object, not started.
+    """
+    return seed_feeder.SeedFeeder(configuration.get('spider', 'url_list_file'), url_queue,
+                                  crawled_urls, Url, create_canonicalizer(configuration),
+                                  url_filter, configuration.getint('spider', 'seed_queue_size'),
+                                  configuration.getint('spider', 'seed_batch_size'),
+                                  offset, checkpointed)
+
+
+def restore_checkpoint(crawl_checkpoint, url_queue, crawled_urls):
+    """
+    Restore the pending urls and the crawled urls from the checkpoint.
+
+    Args:
+        crawl_checkpoint: The checkpoint.CrawlCheckpoint to restore.
+        url_queue: The url queue to put the pending urls.
+        crawled_urls: The store to add the seen urls.
+
+    Returns:
+        True if anything is restored, False if the checkpoint is empty.
+    """
+    pending, seen = crawl_checkpoint.load()
+    seen_count = 0
+    for url in seen:
+        crawled_urls.add_if_absent(url)
+        seen_count += 1
+    pending_count = 0
+    for url, depth in pending:
+        url_queue.put(Url(url, depth))
+        pending_count += 1
+    logging.info('Resume from checkpoint %s: %d pending urls, %d seen urls',
+                 crawl_checkpoint.path, pending_count, seen_count)
+    return bool(pending_count or seen_count)
+
+
+def run_spider(configuration, resume=False):
+    """
+    Run spider and start crawling urls.
+    
+    Args:
+        configuration: The configuration of mini spider.
+        resume: Resume from the checkpoint instead of the seed urls.
+    """
+    url_queue = create_url_queue(configuration)
+    crawled_urls = create_crawled_urls(configuration)
+    resumed = False
+
+    crawl_checkpoint = None
+    checkpoint_path = configuration.get('spider', 'checkpoint_path')
+    if checkpoint_path:
+        crawl_checkpoint = checkpoint.CrawlCheckpoint(
+            checkpoint_path, configuration.getfloat('spider', 'checkpoint_interval'))
+        if resume:
+            resumed = restore_checkpoint(crawl_checkpoint, url_queue, crawled_urls)
+        else:
+            crawl_checkpoint.reset()
+        url_queue = checkpoint.CheckpointedUrlQueue(url_queue, crawl_checkpoint)
+        crawl_checkpoint.start()
+    elif resume:
+        logging.warn('No checkpoint_path configured, start from the seed urls.')
+
+    cluster_node = create_cluster_node(configuration, url_queue, crawled_urls)
+    url_filter = None
+    if cluster_node is not None:
+        url_queue = cluster.ShardedUrlQueue(url_queue, cluster_node)
+        url_filter = cluster_node.owns
+
+    # A resumed crawl reads the seed urls on from the offset checkpointed, or
+    # not at all if the checkpoint predates the offset, when every seed was put.
+    seed_offset = 0
+    if resumed:
+        seed_offset = crawl_checkpoint.load_seed_offset()
+    feeder = None
+    if seed_offset is not None:
+        feeder = create_seed_feeder(configuration, url_queue, crawled_urls, url_filter,
+                                    seed_offset, crawl_checkpoint is not None)
+        feeder.start()
+        url_queue = seed_feeder.SeededUrlQueue(url_queue, feeder)
+        if cluster_node is not None:
+            cluster_node.seed_feeder = feeder
+
+    try:
+        if cluster_node is not None:
+            cluster_node.start()
+        run_engine(configuration, url_queue, crawled_urls)
+    finally:
+        if feeder is not None:
+            feeder.stop()
+            logging.info('Seed urls: %d read, %d put, %d duplicates, read up to offset %d',
+                         feeder.read_urls, feeder.seeded_urls, feeder.duplicate_urls,
+                         feeder.offset)
+        if cluster_node is not None:
+            cluster_node.close()
+            logging.info('Cluster node %d: %d urls forwarded, %d urls received',
+                         cluster_node.node_index, cluster_node.sent, cluster_node.received)
+        if crawl_checkpoint is not None:
+            crawl_checkpoint.close()
+
+    logging.info('Seen url store %s: %d urls in %d bytes',
+                 configuration.get('spider', 'seen_store'), len(crawled_urls),
+                 crawled_urls.memory_footprint())
+    if hasattr(crawled_urls, 'close'):
+        crawled_urls.close()
+
+
+def init_log():
+    """
+    Init logging for mini spider.
+    """
+    logger_util.init_logger(os.path.join(os.path.abspath(os.curdir), 'log'))
+
+
+def configure_logging(configuration):
+    """
+    Sample the repetitive log records and move the writes off the crawl
+    threads as configured.
+
+    Args:
+        configuration: The configuration of mini spider.
+
+    Returns:
+        The started logger_util.AsyncLogWriter, None if async_logging is off.
+    """
+    sample_rate = configuration.getint('spider', 'log_sample_rate')
+    if sample_rate:
+        logging.getLogger().addFilter(logger_util.SamplingFilter(sample_rate))
+    if not configuration.getboolean('spider', 'async_logging'):
+        return None
+    return logger_util.start_async_logging(configuration.getint('spider', 'log_queue_size'),
+                                           configuration.get('spider', 'log_queue_full'),
+                                           configuration.getint('spider', 'log_batch_size'),
+                                           configuration.getfloat('spider', 'log_flush_interval'))
 
-mutex = threading.Lock()
 def main():
     """
     Main function entrace.
@@ -383,7 +2002,21 @@ def main():
     except ConfigurationException as ex:
         logging.error(str(ex))
         return -1
-    run_spider(configuration)
+    if arguments.node_index is not None:
+        configuration.set('spider', 'cluster_node_index', str(arguments.node_index))
+        try:
+            check_cluster_configuration(configuration)
+        except ConfigurationException as ex:
+            logging.error(str(ex))
+            return -1
+    log_writer = configure_logging(configuration)
+    try:
+        run_spider(configuration, arguments.resume)
+    finally:
+        if log_writer is not None:
+            logging.info('Async logging: %d records dropped as the log queue was full',
+                         log_writer.queue_handler.dropped)
+            logger_util.stop_async_logging(log_writer)
 
 if __name__ == '__main__':
     main()    
@@ -120,6 +120,31 @@ class TestParseConfiguration(unittest.TestCase):
         with self.assertRaises(mini_spider.ConfigurationException):
             mini_spider.parse_configuration(self.configuration_file_path)
     
+    def test_float_crawl_interval_configuration(self):
+        """ Test for float crawl_interval and host_crawl_intervals configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'crawl_interval: 0.5\n'
+            'host_crawl_intervals: example.com=2, fast.com=0\n'
+        )
+        configuration = mini_spider.parse_configuration(self.configuration_file_path)
+        self.assertEqual(configuration.getfloat('spider', 'crawl_interval'), 0.5)
+        url_queue = mini_spider.create_url_queue(configuration)
+        self.assertEqual(url_queue.host_crawl_interval('example.com'), 2.0)
+        self.assertEqual(url_queue.host_crawl_interval('fast.com'), 0.0)
+        self.assertEqual(url_queue.host_crawl_interval('other.com'), 0.5)
+
+    def test_invalid_host_crawl_intervals_configuration(self):
+        """ Test for invalid host_crawl_intervals configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'host_crawl_intervals: example.com\n'
+        ) 
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+    
     def test_invalid_crawl_timeout_configuration(self):
         """ Test for invalid crawl_timeout configuration parse.
         """
@@ -140,6 +165,148 @@ class TestParseConfiguration(unittest.TestCase):
         with self.assertRaises(mini_spider.ConfigurationException):
             mini_spider.parse_configuration(self.configuration_file_path)
 
+    def test_invalid_link_extractor_configuration(self):
+        """ Test for invalid link_extractor configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'link_extractor: lxml\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_storage_layout_configuration(self):
+        """ Test for invalid storage_layout configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'storage_layout: blobs\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_canonical_rules_configuration(self):
+        """ Test for invalid canonical_rules configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'canonical_rules: drop_fragment, lowercase_path\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_prune_rules_configuration(self):
+        """ Test for invalid prune_rules configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'prune_rules: scheme, size\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_frontier_score_configuration(self):
+        """ Test for invalid frontier_score configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'frontier_score: random\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_metrics_interval_configuration(self):
+        """ Test for invalid metrics_interval configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'metrics_interval: 0\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_profile_signal_configuration(self):
+        """ Test for invalid profile_signal configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'profile_signal: SIGNOPE\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_dns_ttl_configuration(self):
+        """ Test for invalid dns_ttl configuration parse.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'dns_ttl: 0\n'
+        )
+        with self.assertRaises(mini_spider.ConfigurationException):
+            mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_adaptive_concurrency_configuration(self):
+        """ Test the global concurrency ceiling defaults to the workers of the engine.
+        """
+        self.write_configuration_file(
+            '[spider]\n'
+            'adaptive_concurrency: true\n'
+            'engine: pipeline\n'
+            'pipeline_fetch_workers: 6\n'
+            'host_concurrency_floor: 2\n'
+        )
+        configuration = mini_spider.parse_configuration(self.configuration_file_path)
+        controller = mini_spider.create_url_queue(configuration).concurrency
+        self.assertEqual(controller.global_limit(), 6)
+        self.assertEqual(controller.host_limit('example.com'), 2)
+
+    def test_invalid_concurrency_configuration(self):
+        """ Test for invalid concurrency floor and ceiling configuration parse.
+        """
+        for option in ('host_concurrency_floor: 0', 'host_concurrency_ceiling: 0',
+                       'global_concurrency_floor: 2\nglobal_concurrency_ceiling: 1',
+                       'concurrency_latency_tolerance: 1'):
+            self.write_configuration_file('[spider]\n%s\n' % option)
+            with self.assertRaises(mini_spider.ConfigurationException):
+                mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_host_health_configuration(self):
+        """ Test for invalid retry and circuit breaker configuration parse.
+        """
+        for option in ('host_retries: -1', 'circuit_failure_threshold: 0',
+                       'retry_backoff: 0', 'retry_backoff: 100\nmax_retry_backoff: 10',
+                       'circuit_open_seconds: 900', 'host_health: maybe'):
+            self.write_configuration_file('[spider]\n%s\n' % option)
+            with self.assertRaises(mini_spider.ConfigurationException):
+                mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_logging_configuration(self):
+        """ Test for invalid async logging and sampling configuration parse.
+        """
+        for option in ('log_queue_full: wait', 'log_queue_size: 0', 'log_flush_interval: 0',
+                       'log_sample_rate: -1', 'async_logging: maybe'):
+            self.write_configuration_file('[spider]\n%s\n' % option)
+            with self.assertRaises(mini_spider.ConfigurationException):
+                mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_compression_configuration(self):
+        """ Test for invalid content coding and stored compression configuration parse.
+        """
+        for option in ('accept_compression: maybe', 'compress_stored_text: maybe',
+                       'store_compression_level: 0', 'store_compression_level: 10',
+                       'compress_stored_text: true\nstorage_layout: content'):
+            self.write_configuration_file('[spider]\n%s\n' % option)
+            with self.assertRaises(mini_spider.ConfigurationException):
+                mini_spider.parse_configuration(self.configuration_file_path)
+
+    def test_invalid_seed_configuration(self):
+        """ Test for invalid lazy seed ingestion configuration parse.
+        """
+        for option in ('seed_queue_size: 0', 'seed_batch_size: 0'):
+            self.write_configuration_file('[spider]\n%s\n' % option)
+            with self.assertRaises(mini_spider.ConfigurationException):
+                mini_spider.parse_configuration(self.configuration_file_path)
+
 
 class TestMiniSpiderThread(unittest.TestCase):
     """ Test for MiniSpiderThread.
@@ -148,7 +315,7 @@ class TestMiniSpiderThread(unittest.TestCase):
         """ Set up test.
         """
         self.url_queue = Queue.Queue()
-        self.crawled_urls = set()
+        self.crawled_urls = mini_spider.seen_store.SetSeenStore()
         self.mini_spider_thread = mini_spider.MiniSpiderThread(self.url_queue, self.crawled_urls,
                                                           6, 2, 5, '.*\.(gif|png|jpg|bmp)$', 
                                                           './output_test')
@@ -187,6 +354,18 @@ class TestMiniSpiderThread(unittest.TestCase):
         self.assertTrue(self.mini_spider_thread.grab_url_success)
         self.assertEqual(self.mini_spider_thread.url_response.read(), 'Grab url success.')
 
+    def test_grab_url_with_connection_pool(self):
+        """ Test grabing url on a pooled keep-alive connection.
+        """
+        self.mini_spider_thread.connection_pool = mini_spider.connection_pool.ConnectionPool()
+        self.mini_spider_thread.grab_url('http://example.com/graburl/success')
+        self.assertTrue(self.mini_spider_thread.grab_url_success)
+        self.assertEqual(self.mini_spider_thread.url_response.read(), 'Grab url success.')
+        self.mini_spider_thread.grab_url('http://example.com/graburl/fail')
+        self.assertFalse(self.mini_spider_thread.grab_url_success)
+        self.mini_spider_thread.release_url_response()
+        self.assertEqual(self.mini_spider_thread.connection_pool.stats()['requests'], 2)
+
     def test_grab_url_fail(self):
         """ Test grabing url fail.
         """
@@ -206,6 +385,37 @@ class TestMiniSpiderThread(unittest.TestCase):
         with open(saved_path, 'r') as saved_file:
             self.assertEqual(saved_file.read(), 'Saved webpage content.')
 
+    def test_save_specific_webpage_in_chunks(self):
+        """ Test saving specific webpage with a small download buffer.
+        """
+        self.mini_spider_thread.download_buffer_size = 4
+        self.mini_spider_thread.grab_url('http://example.com/savewebpage/saved.txt')
+        self.mini_spider_thread.save_specific_webpage('http://example.com/savewebpage/saved.txt',
+                                                      self.mini_spider_thread.output_directory)
+        saved_path = os.path.join(self.mini_spider_thread.output_directory,
+                                  'http%3A%2F%2Fexample.com%2Fsavewebpage%2Fsaved.txt')
+        with open(saved_path, 'r') as saved_file:
+            self.assertEqual(saved_file.read(), 'Saved webpage content.')
+        self.assertEqual(os.listdir(self.mini_spider_thread.output_directory),
+                         ['http%3A%2F%2Fexample.com%2Fsavewebpage%2Fsaved.txt'])
+
+    def test_save_specific_webpage_too_large(self):
+        """ Test saving specific webpage larger than max_body_size.
+        """
+        httpretty.register_uri(httpretty.GET,
+                               'http://example.com/savewebpage/unknown_length.txt',
+                               body = 'Saved webpage content.',
+                               forcing_headers = {'content-type': 'text/plain'})
+        self.mini_spider_thread.max_body_size = 10
+        self.mini_spider_thread.download_buffer_size = 4
+        for url in ('http://example.com/savewebpage/saved.txt',
+                    'http://example.com/savewebpage/unknown_length.txt'):
+            self.mini_spider_thread.grab_url(url)
+            with self.assertRaises(mini_spider.DownloadException):
+                self.mini_spider_thread.save_specific_webpage(
+                    url, self.mini_spider_thread.output_directory)
+        self.assertEqual(os.listdir(self.mini_spider_thread.output_directory), [])
+
     def test_iterate_next_urls_html(self):
         """ Test interate next urls for html type webpage.
         """
@@ -214,6 +424,16 @@ class TestMiniSpiderThread(unittest.TestCase):
         self.assertEqual(list(self.mini_spider_thread.iterate_next_urls(self.url_obj))[0],
                          'http://example.com/test/test1.html')
 
+    def test_iterate_next_urls_html_with_beautifulsoup(self):
+        """ Test interate next urls for html type webpage with the beautifulsoup extractor.
+        """
+        self.mini_spider_thread.extractor = mini_spider.link_extractor.BeautifulSoupExtractor()
+        self.mini_spider_thread.grab_url('http://example.com/iterate_next_urls/html_webpage')
+        self.assertEqual(sorted(self.mini_spider_thread.iterate_next_urls(self.url_obj)),
+                         ['http://example.com/test/test1.html',
+                          'http://example.com/test/test3.png',
+                          'http://example.com/test/test4.js'])
+
     def test_iterate_next_urls_not_html(self):
         """ Test iterate next urls for not html type webpage.
         """
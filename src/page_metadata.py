@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the store of webpage metadata kept between crawls, so a
+recrawl revalidates the webpages with conditional GETs instead of grabing
+their bodies again.
+
+For every url the store keeps the ETag and Last-Modified validators, the
+content type, the md5 of the body and the links extracted from it. A webpage
+answering 304 Not Modified, or whose body has the same md5, is unchanged and
+its links are reused instead of parsed.
+
+Author: weileizhe
+Date: 2015/02/23 00:00:06
+"""
+
+import collections
+import sqlite3
+import threading
+
+
+COMMIT_INTERVAL = 100
+
+
+PageMetadata = collections.namedtuple(
+    'PageMetadata', ['etag', 'last_modified', 'content_type', 'content_hash', 'links'])
+
+
+def join_links(links):
+    """
+    Join the links to one str, a link per line.
+
+    Line breaks are dropped from the links as browsers do, and unicode links
+    are utf-8 encoded.
+    """
+    lines = []
+    for link in links:
+        if isinstance(link, unicode):
+            link = link.encode('utf-8')
+        lines.append(link.replace('\r', '').replace('\n', ''))
+    return '\n'.join(lines)
+
+
+class PageMetadataStore(object):
+    """
+    Webpage metadata kept in a sqlite file.
+
+    Changes are committed every COMMIT_INTERVAL webpages and on close().
+
+    Attributes:
+        path: The sqlite file path.
+    """
+
+    def __init__(self, path):
+        """ Init the store, creating the sqlite file if not exists.
+
+        Args:
+            path: The sqlite file path.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.text_factory = str
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS page_metadata '
+                                '(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+                                'content_type TEXT, content_hash TEXT, links TEXT)')
+        self.uncommitted = 0
+        self.mutex = threading.Lock()
+
+    def get(self, url):
+        """
+        Get the metadata of url.
+
+        Args:
+            url: The url.
+
+        Returns:
+            A PageMetadata, links is None if the webpage was not parsed. None if
+            url is not in the store.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with self.mutex:
+            row = self.connection.execute(
+                'SELECT etag, last_modified, content_type, content_hash, links '
+                'FROM page_metadata WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_type, content_hash, links = row
+        if links is not None:
+            links = links.split('\n') if links else []
+        return PageMetadata(etag, last_modified, content_type, content_hash, links)
+
+    def put(self, url, page_metadata):
+        """
+        Put the metadata of url, replacing the old one.
+
+        Args:
+            url: The url.
+            page_metadata: The PageMetadata.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        links = page_metadata.links
+        if links is not None:
+            links = join_links(links)
+        with self.mutex:
+            self.connection.execute('INSERT OR REPLACE INTO page_metadata VALUES (?, ?, ?, ?, ?, ?)',
+                                    (url, page_metadata.etag, page_metadata.last_modified,
+                                     page_metadata.content_type, page_metadata.content_hash,
+                                     links))
+            self._commit_periodically()
+
+    def put_links(self, url, links):
+        """
+        Put the links extracted from the webpage of url.
+
+        Args:
+            url: The url already put.
+            links: The list of joined links.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        with self.mutex:
+            self.connection.execute('UPDATE page_metadata SET links = ? WHERE url = ?',
+                                    (join_links(links), url))
+            self._commit_periodically()
+
+    def _commit_periodically(self):
+        """
+        Commit every COMMIT_INTERVAL changes, holding the mutex.
+        """
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_INTERVAL:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def __len__(self):
+        """
+        Get the url count.
+        """
+        with self.mutex:
+            return self.connection.execute('SELECT COUNT(*) FROM page_metadata').fetchone()[0]
+
+    def close(self):
+        """
+        Commit and close the sqlite file.
+        """
+        with self.mutex:
+            self.connection.commit()
+            self.connection.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for page metadata.
+
+Author: weileizhe
+Date: 2015/02/23 00:00:06
+"""
+
+import BaseHTTPServer
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+import event_spider
+import event_spider_test
+import frontier
+import mini_spider
+import page_metadata
+import pipeline
+import seen_store
+
+
+WEBPAGES = {
+    '/index.html': ('text/html', '<a href="/page.html">Page</a><img src="/image.png" />'),
+    '/page.html': ('text/html', '<img src="/other.png" />'),
+    '/image.png': ('image/png', 'image'),
+    '/other.png': ('image/png', 'other'),
+}
+
+
+class RevalidatingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serve WEBPAGES with an ETag, answering 304 if If-None-Match matches.
+    """
+
+    def do_GET(self):
+        """ Handle GET request.
+        """
+        content_type, body = WEBPAGES[self.path]
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.getheader('if-none-match') == etag:
+            self.server.responses[self.path, 304] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.server.responses[self.path, 200] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """ Keep test output quiet.
+        """
+        pass
+
+
+class TestPageMetadataStore(unittest.TestCase):
+    """ Test for PageMetadataStore.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_directory, 'metadata.db')
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def test_put_and_get(self):
+        """ Test the metadata and links are kept after close.
+        """
+        store = page_metadata.PageMetadataStore(self.path)
+        self.assertEqual(store.get('http://example.com/'), None)
+        store.put(u'http://example.com/', page_metadata.PageMetadata(
+            '"etag"', None, 'text/html', 'hash', None))
+        store.put_links('http://example.com/', [u'http://example.com/\xe9', 'http://a.com/\nb'])
+        store.put('http://example.com/empty', page_metadata.PageMetadata(
+            None, 'Mon, 23 Feb 2015 00:00:00 GMT', 'text/html', None, []))
+        store.close()
+
+        store = page_metadata.PageMetadataStore(self.path)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get('http://example.com/'), page_metadata.PageMetadata(
+            '"etag"', None, 'text/html', 'hash',
+            ['http://example.com/\xc3\xa9', 'http://a.com/b']))
+        self.assertEqual(store.get('http://example.com/empty').links, [])
+        store.close()
+
+
+class TestRevalidation(unittest.TestCase):
+    """ Test recrawling with conditional GETs in every crawl engine.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = event_spider_test.ThreadingHTTPServer(('127.0.0.1', 0), RevalidatingHandler)
+        self.server.responses = collections.Counter()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.temp_directory = tempfile.mkdtemp()
+        self.output_directory = os.path.join(self.temp_directory, 'output')
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_directory)
+
+    def crawl(self, engine, reuse_links=True):
+        """ Crawl from /index.html to depth 2 with the page metadata kept in the temp directory.
+
+        Returns:
+            The crawled urls.
+        """
+        url_queue = frontier.HostFrontier(0)
+        crawled_urls = seen_store.SetSeenStore()
+        url_queue.put(mini_spider.Url(self.base_url + '/index.html', 0))
+        store = page_metadata.PageMetadataStore(os.path.join(self.temp_directory, 'metadata.db'))
+        page_handler = mini_spider.MiniSpiderThread(url_queue, crawled_urls, 2, 0, 5,
+                                                    '.*\.png$', self.output_directory,
+                                                    page_metadata=store,
+                                                    reuse_links=reuse_links)
+        if engine == 'event':
+            event_spider.EventSpider(url_queue, crawled_urls, page_handler, 10, 5).run()
+        elif engine == 'pipeline':
+            pipeline.PipelineSpider(url_queue, crawled_urls, [page_handler], 1, 1, 4).run()
+        else:
+            page_handler.setDaemon(True)
+            page_handler.start()
+            url_queue.join()
+            url_queue.close()
+            page_handler.join()
+        store.close()
+        return crawled_urls
+
+    def test_recrawl(self):
+        """ Test a recrawl revalidates every webpage and reuses the kept links.
+        """
+        expected_urls = set([self.base_url + path for path in WEBPAGES if path != '/index.html'])
+        for engine in mini_spider.CRAWL_ENGINES:
+            self.server.responses.clear()
+            self.assertEqual(self.crawl(engine), expected_urls, engine)
+            self.assertEqual(set(self.server.responses.values()), set([1]))
+            self.server.responses.clear()
+            self.assertEqual(self.crawl(engine), expected_urls, engine)
+            self.assertEqual(self.server.responses,
+                             collections.Counter((path, 304) for path in WEBPAGES), engine)
+            with open(os.path.join(self.output_directory, mini_spider.urllib2.quote(
+                    self.base_url + '/other.png', ''))) as saved_file:
+                self.assertEqual(saved_file.read(), 'other')
+            shutil.rmtree(self.temp_directory)
+            os.makedirs(self.temp_directory)
+
+    def test_recrawl_without_reusing_links(self):
+        """ Test html webpages to parse are grabed again if their links are not reused.
+        """
+        self.crawl('thread')
+        self.server.responses.clear()
+        self.crawl('thread', False)
+        self.assertEqual(self.server.responses, collections.Counter(
+            [('/index.html', 200), ('/page.html', 200), ('/image.png', 304),
+             ('/other.png', 304)]))
+
+    def test_recrawl_missing_target(self):
+        """ Test a target webpage whose file is missing is grabed again.
+        """
+        self.crawl('thread')
+        shutil.rmtree(self.output_directory)
+        self.server.responses.clear()
+        self.crawl('thread')
+        self.assertEqual(self.server.responses[('/image.png', 200)], 1)
+        self.assertEqual(self.server.responses[('/index.html', 304)], 1)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the pipeline crawl engine of mini spider.
+
+The crawl of a url is split into three stages connected by bounded queues:
+
+    fetch: Threads grabing the urls and reading the webpages to parse into
+           memory, and the target webpages to temp files spooled to the disk
+           past download_buffer_size bytes.
+    parse: Threads handing the webpages to a multiprocessing pool which
+           extracts and joins the links out of the GIL, then putting the
+           uncrawled links to the url queue.
+    store: Threads saving the target webpages to output_directory.
+
+A fetch thread blocks when the queue of the next stage is full, so a slow
+parse or store stage slows the fetching down instead of filling the memory.
+At most (queue_size + workers) webpages wait in each stage.
+
+Author: weileizhe
+Date: 2015/02/09 00:00:06
+"""
+
+import logging
+import multiprocessing
+import Queue
+import threading
+import time
+
+import frontier
+
+
+# The link extractor and canonicalizer of a parse process, set by init_parse_process.
+process_extractor = None
+process_canonicalizer = None
+
+
+def init_parse_process(extractor, canonicalizer):
+    """
+    Init a parse process with the link extractor and the canonical_url canonicalizer.
+    """
+    global process_extractor
+    global process_canonicalizer
+    process_extractor = extractor
+    process_canonicalizer = canonicalizer
+
+
+def parse_webpage(url, webpage_content):
+    """
+    Extract the links of a webpage in a parse process.
+
+    Args:
+        url: The webpage url to join the links to.
+        webpage_content: The webpage body.
+
+    Returns:
+        A (next_urls, rewritten_urls) tuple of the canonical urls, as
+        canonical_url.Canonicalizer.join_all returns.
+    """
+    return process_canonicalizer.join_all(url, process_extractor.extract(webpage_content))
+
+
+class PipelineSpider(object):
+    """
+    A crawl engine of fetch, parse and store stages.
+
+    The page handlers are MiniSpider objects, one per fetch thread, as a
+    handler keeps the response it grabs. The first handler also saves the
+    webpages and puts the links, which keep no state.
+
+    Attributes:
+        url_queue: The url queue to crawl and parse.
+        crawled_urls: The seen_store of crawled urls.
+        page_handlers: The MiniSpider objects of the fetch threads.
+        parse_workers: The parse process and thread count.
+        store_workers: The store thread count.
+    """
+
+    def __init__(self, url_queue, crawled_urls, page_handlers, parse_workers=2,
+                 store_workers=2, queue_size=64):
+        """ Init the pipeline spider.
+
+        Args:
+            url_queue: The url queue to crawl and parse.
+            crawled_urls: The seen_store of crawled urls.
+            page_handlers: The MiniSpider objects of the fetch threads.
+            parse_workers: The parse process and thread count.
+            store_workers: The store thread count.
+            queue_size: The max webpages waiting for each of the parse and
+                        store stages.
+        """
+        self.url_queue = url_queue
+        self.crawled_urls = crawled_urls
+        self.page_handlers = page_handlers
+        self.parse_workers = parse_workers
+        self.store_workers = store_workers
+        self.parse_queue = Queue.Queue(queue_size)
+        self.store_queue = Queue.Queue(queue_size)
+        self.parse_pool = None
+
+    def run(self):
+        """
+        Crawl until every url in url_queue is done.
+        """
+        # Fork the parse processes before any thread of this engine starts.
+        self.parse_pool = multiprocessing.Pool(self.parse_workers, init_parse_process,
+                                               (self.page_handlers[0].extractor,
+                                                self.page_handlers[0].canonicalizer))
+        stage_threads = []
+        for page_handler in self.page_handlers:
+            stage_threads.append(self._start_thread(self._fetch, page_handler))
+        for i in xrange(self.parse_workers):
+            stage_threads.append(self._start_thread(self._parse))
+        for i in xrange(self.store_workers):
+            stage_threads.append(self._start_thread(self._store))
+
+        try:
+            self.url_queue.join()
+        finally:
+            self.url_queue.close()
+            for i in xrange(self.parse_workers):
+                self.parse_queue.put(None)
+            for i in xrange(self.store_workers):
+                self.store_queue.put(None)
+            for stage_thread in stage_threads:
+                stage_thread.join()
+            self.parse_pool.close()
+            self.parse_pool.join()
+
+    def _start_thread(self, target, *args):
+        """
+        Start a daemon thread of a stage.
+        """
+        stage_thread = threading.Thread(target=target, args=args)
+        stage_thread.setDaemon(True)
+        stage_thread.start()
+        return stage_thread
+
+    def _fetch(self, page_handler):
+        """
+        Grab urls and hand the webpages to the parse or the store stage.
+        """
+        while True:
+            try:
+                url_obj = self.url_queue.get(page_handler.crawl_timeout)
+            except frontier.FrontierClosed:
+                return
+            try:
+                target, webpage_content = page_handler.run_profiled(page_handler.fetch_webpage,
+                                                                    url_obj)
+            except Exception as error:
+                logging.warn('Fetch %s failed due to %s', url_obj.url, str(error))
+                webpage_content = None
+
+            if webpage_content is None:
+                self.url_queue.task_done(url_obj)
+            elif target:
+                self.store_queue.put((url_obj, webpage_content, page_handler.content_type))
+            else:
+                self.parse_queue.put((url_obj, webpage_content))
+
+    def _parse(self):
+        """
+        Extract the links of webpages in the pool and put the uncrawled ones.
+        """
+        page_handler = self.page_handlers[0]
+        while True:
+            item = self.parse_queue.get()
+            if item is None:
+                return
+            url_obj, webpage_content = item
+            try:
+                start_time = time.time()
+                next_urls, rewritten_urls = self.parse_pool.apply(
+                    parse_webpage, (url_obj.url, webpage_content))
+                if page_handler.metrics is not None:
+                    page_handler.metrics.observe('parse', time.time() - start_time)
+                page_handler.put_next_urls(url_obj, next_urls, self.url_queue, self.crawled_urls,
+                                           rewritten_urls)
+                page_handler.record_links(url_obj, next_urls)
+            except Exception as error:
+                logging.warn('Parse %s failed due to %s', url_obj.url, str(error))
+            finally:
+                self.url_queue.task_done(url_obj)
+
+    def _store(self):
+        """
+        Save the target webpages.
+        """
+        page_handler = self.page_handlers[0]
+        while True:
+            item = self.store_queue.get()
+            if item is None:
+                return
+            url_obj, webpage_file, content_type = item
+            try:
+                page_handler.run_profiled(page_handler.store_webpage, url_obj.url,
+                                          webpage_file, content_type)
+            except Exception as error:
+                logging.warn('Store %s failed due to %s', url_obj.url, str(error))
+            finally:
+                self.url_queue.task_done(url_obj)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for pipeline.
+
+Author: weileizhe
+Date: 2015/02/09 00:00:06
+"""
+
+import os
+import shutil
+import socket
+import threading
+import unittest
+
+
+import canonical_url
+import connection_pool
+import event_spider_test
+import frontier
+import link_extractor
+import mini_spider
+import pipeline
+import seen_store
+
+
+class TestParseWebpage(unittest.TestCase):
+    """ Test parse_webpage(url, webpage_content) function.
+    """
+
+    def test_parse_webpage(self):
+        """ Test the links are extracted and joined.
+        """
+        pipeline.init_parse_process(link_extractor.TokenizerExtractor(),
+                                    canonical_url.Canonicalizer())
+        self.assertEqual(pipeline.parse_webpage('http://example.com/a/b.html',
+                                                '<a href="../c.html">c</a><img src="d.png">'
+                                                '<a href="HTTP://Example.com:80/c.html#top">c</a>'),
+                         (['http://example.com/c.html', 'http://example.com/a/d.png',
+                           'http://example.com/c.html'], set(['http://example.com/c.html'])))
+
+
+class TestPipelineSpider(unittest.TestCase):
+    """ Test for PipelineSpider.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.server = event_spider_test.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                            event_spider_test.WebpageHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.url_queue = frontier.HostFrontier(0.01)
+        self.crawled_urls = seen_store.SetSeenStore()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists('output_test'):
+            shutil.rmtree('output_test')
+
+    def run_pipeline_spider(self, seed_urls, max_depth, pool=None):
+        """ Run pipeline spider on seed urls with 3 fetch threads and a queue of 1.
+
+        Args:
+            seed_urls: The seed urls.
+            max_depth: The max crawl depth.
+            pool: The connection pool of the fetch threads.
+        """
+        for url in seed_urls:
+            self.url_queue.put(mini_spider.Url(url, 0))
+        page_handlers = [mini_spider.MiniSpider(self.url_queue, self.crawled_urls, max_depth,
+                                                0, 5, '.*\.(gif|png|jpg|bmp)$|.*/moved\.html$',
+                                                './output_test', pool)
+                         for i in xrange(3)]
+        spider = pipeline.PipelineSpider(self.url_queue, self.crawled_urls, page_handlers,
+                                         2, 1, 1)
+        spider.run()
+
+    def saved_path(self, path):
+        """ Get the saved file path of the url path.
+        """
+        return os.path.join('output_test', mini_spider.urllib2.quote(self.base_url + path, ''))
+
+    def test_crawl(self):
+        """ Test crawling webpages to max depth through the stages.
+        """
+        for pool in (None, connection_pool.ConnectionPool()):
+            self.url_queue = frontier.HostFrontier(0.01)
+            self.crawled_urls = seen_store.SetSeenStore()
+            self.run_pipeline_spider([self.base_url + '/index.html'], 2, pool)
+            self.assertEqual(self.crawled_urls, set([self.base_url + '/page.html',
+                                                     self.base_url + '/image.png',
+                                                     self.base_url + '/other.png',
+                                                     self.base_url + '/moved.html',
+                                                     self.base_url + '/missing.html']))
+            self.assertTrue(self.url_queue.empty())
+            for path, body in (('/image.png', 'image'), ('/other.png', 'other'),
+                               ('/moved.html', 'Target')):
+                with open(self.saved_path(path), 'rb') as saved_file:
+                    self.assertEqual(saved_file.read(), body)
+            self.assertFalse(os.path.exists(self.saved_path('/missing.html')))
+
+    def test_target_spooled(self):
+        """ Test a target webpage past download_buffer_size is spooled to the disk and stored.
+        """
+        page_handler = mini_spider.MiniSpider(self.url_queue, self.crawled_urls, 1, 0, 5,
+                                              '.*\.png$', './output_test', download_buffer_size=2)
+        target, webpage_file = page_handler.fetch_webpage(
+            mini_spider.Url(self.base_url + '/image.png'))
+        self.assertTrue(target)
+        self.assertTrue(webpage_file._rolled)
+        page_handler.store_webpage(self.base_url + '/image.png', webpage_file, 'image/png')
+        self.assertTrue(webpage_file.closed)
+        with open(self.saved_path('/image.png'), 'rb') as saved_file:
+            self.assertEqual(saved_file.read(), 'image')
+
+    def test_crawl_unreachable_url(self):
+        """ Test crawling urls which fail to connect.
+        """
+        unused_socket = socket.socket()
+        unused_socket.bind(('127.0.0.1', 0))
+        unused_url = 'http://127.0.0.1:%d/index.html' % unused_socket.getsockname()[1]
+        unused_socket.close()
+        self.run_pipeline_spider([unused_url, 'ftp://example.com/'], 1)
+        self.assertEqual(len(self.crawled_urls), 0)
+        self.assertTrue(self.url_queue.empty())
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the lazy ingestion of the seed urls, so a url list of
+tens of millions of urls neither delays the first fetch nor fills the memory
+with url objects.
+
+A SeedFeeder thread reads the url_list_file, plain or gzip, batch_size urls
+at a time while the crawl runs:
+
+    Each seed is canonicalized like the links, and added to the crawled urls
+    before it is put, so a repeated seed, or a link back to a seed, is not
+    crawled again.
+    The feeder waits while max_pending urls wait in the url queue, so the
+    seeds come in as fast as the crawl takes them.
+    The offset in the url list after each batch is recorded to the crawl
+    checkpoint together with the urls put, each seen and pending, so a
+    resumed crawl reads on from there and never finds a seed seen that was
+    not put.
+
+The SeededUrlQueue wrapping the url queue keeps the crawl going until every
+seed is read.
+
+Author: weileizhe
+Date: 2015/06/01 00:00:06
+"""
+
+import gzip
+import logging
+import threading
+
+import frontier
+
+
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_BATCH_SIZE = 1000
+GZIP_MAGIC = '\x1f\x8b'
+# The seconds the feeder waits at a time for the url queue to drain.
+SEED_WAIT_INTERVAL = 0.1
+
+
+def open_url_list(url_list_file):
+    """
+    Open a url list file, gzip compressed or not.
+
+    Args:
+        url_list_file: The url list file, one url per line.
+
+    Returns:
+        A file object of the url list, a gzip.GzipFile if it starts with the gzip magic.
+
+    Raises:
+        IOError: Fail to open the file.
+    """
+    with open(url_list_file, 'rb') as url_lines:
+        magic = url_lines.read(len(GZIP_MAGIC))
+    if magic == GZIP_MAGIC:
+        return gzip.open(url_list_file, 'rb')
+    return open(url_list_file, 'rb')
+
+
+class SeedFeeder(object):
+    """
+    A thread putting the seed urls of a url list file to the url queue lazily.
+
+    Attributes:
+        url_list_file: The url list file, one url per line.
+        max_pending: The urls waiting in the url queue the feeder waits at.
+        batch_size: The seed urls read and put at a time.
+        offset: The offset in the url list after the last batch put.
+        read_urls: The seed urls read so far.
+        seeded_urls: The seed urls put so far.
+        duplicate_urls: The seed urls already crawled or seen before.
+        finished: The event set once the url list is read or the feeder stopped.
+    """
+
+    def __init__(self, url_list_file, url_queue, crawled_urls, url_factory, canonicalizer=None,
+                 url_filter=None, max_pending=DEFAULT_MAX_PENDING, batch_size=DEFAULT_BATCH_SIZE,
+                 offset=0, checkpointed=False):
+        """ Init the feeder.
+
+        Args:
+            url_list_file: The url list file, one url per line.
+            url_queue: The url queue to put the seed urls.
+            crawled_urls: The seen_store the seed urls are added to.
+            url_factory: The function making a url object of (url, depth).
+            canonicalizer: The canonical_url.Canonicalizer of the seed urls,
+                           None to put them as they are.
+            url_filter: The function judging if a seed url is put, None to put all.
+            max_pending: The urls waiting in the url queue the feeder waits at.
+            batch_size: The seed urls read and put at a time.
+            offset: The offset in the url list to read from.
+            checkpointed: True if url_queue is, or wraps, a checkpoint.CheckpointedUrlQueue,
+                          which records the offset with the seed urls put.
+        """
+        self.url_list_file = url_list_file
+        self.url_queue = url_queue
+        self.crawled_urls = crawled_urls
+        self.url_factory = url_factory
+        self.canonicalizer = canonicalizer
+        self.url_filter = url_filter
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.offset = offset
+        self.checkpointed = checkpointed
+        self.read_urls = 0
+        self.seeded_urls = 0
+        self.duplicate_urls = 0
+        self.url_lines = None
+        self.feed_thread = None
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+
+    def start(self):
+        """
+        Open the url list at offset and start the feed thread.
+
+        Raises:
+            IOError: Fail to open the url list.
+        """
+        self.url_lines = open_url_list(self.url_list_file)
+        if self.offset:
+            self.url_lines.seek(self.offset)
+        self.feed_thread = threading.Thread(target=self._feed, name='seed-feeder')
+        self.feed_thread.setDaemon(True)
+        self.feed_thread.start()
+
+    def _feed(self):
+        """
+        Put the seed urls a batch at a time until the url list is read or stopped.
+        """
+        try:
+            with self.url_lines:
+                while self._wait_for_room():
+                    urls = []
+                    while len(urls) < self.batch_size:
+                        line = self.url_lines.readline()
+                        if not line:
+                            break
+                        url = line.strip()
+                        if url:
+                            urls.append(url)
+                    if not urls:
+                        return
+                    self.read_urls += len(urls)
+                    self.feed(urls, self.url_lines.tell())
+        except (IOError, EOFError) as error:
+            logging.warn('Read seed urls from %s failed due to %s',
+                         self.url_list_file, str(error))
+        finally:
+            self.finished.set()
+
+    def _wait_for_room(self):
+        """
+        Wait while max_pending urls wait in the url queue.
+
+        Returns:
+            False if the feeder is stopped, True otherwise.
+        """
+        while self.url_queue.qsize() >= self.max_pending:
+            if self.stopped.wait(SEED_WAIT_INTERVAL):
+                return False
+        return not self.stopped.is_set()
+
+    def feed(self, urls, offset):
+        """
+        Put the seed urls not seen yet and record the offset they were read up to.
+
+        Args:
+            urls: The list of seed urls.
+            offset: The offset in the url list after urls.
+        """
+        if self.canonicalizer is not None:
+            canonical_urls = []
+            for url in urls:
+                try:
+                    canonical_urls.append(self.canonicalizer.canonicalize(url))
+                except ValueError as error:
+                    logging.warn('Skip seed url %s due to %s', url, str(error))
+            urls = canonical_urls
+        if self.url_filter is not None:
+            urls = [url for url in urls if self.url_filter(url)]
+        added_urls = self.crawled_urls.add_many(urls)
+        url_objs = [self.url_factory(url, 0) for url in added_urls]
+        if self.checkpointed:
+            self.url_queue.put_many(url_objs, offset)
+        else:
+            frontier.put_urls(self.url_queue, url_objs)
+        self.seeded_urls += len(added_urls)
+        self.duplicate_urls += len(urls) - len(added_urls)
+        self.offset = offset
+
+    def wait(self, timeout=None):
+        """
+        Wait until the url list is read or the feeder stopped.
+
+        Returns:
+            True if finished, False if timed out.
+        """
+        return self.finished.wait(timeout)
+
+    def stop(self):
+        """
+        Stop the feed thread.
+        """
+        self.stopped.set()
+        if self.feed_thread is not None:
+            self.feed_thread.join()
+
+
+class SeededUrlQueue(object):
+    """
+    A url queue fed by a SeedFeeder. The crawl is not over until every seed
+    is read, so join() waits for the feeder and empty() is False until then.
+
+    Everything else is delegated to the wrapped url queue.
+    """
+
+    def __init__(self, url_queue, seed_feeder):
+        """ Init the url queue.
+
+        Args:
+            url_queue: The wrapped url queue the feeder puts to.
+            seed_feeder: The SeedFeeder of the url queue.
+        """
+        self.url_queue = url_queue
+        self.seed_feeder = seed_feeder
+
+    def join(self):
+        """
+        Wait until every seed is read and every url put is done.
+        """
+        while not self.seed_feeder.wait(frontier.JOIN_WAIT_INTERVAL):
+            pass
+        self.url_queue.join()
+
+    def empty(self):
+        """
+        Judge if every seed is read and no url is waiting.
+        """
+        return self.seed_feeder.finished.is_set() and self.url_queue.empty()
+
+    def __getattr__(self, name):
+        """
+        Delegate to the wrapped url queue.
+        """
+        return getattr(self.url_queue, name)
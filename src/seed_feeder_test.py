@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for seed feeder.
+
+Author: weileizhe
+Date: 2015/06/01 00:00:06
+"""
+
+import gzip
+import os
+import Queue
+import shutil
+import tempfile
+import unittest
+
+
+import canonical_url
+import checkpoint
+import frontier
+import mini_spider
+import seed_feeder
+import seen_store
+
+
+class FlushingSeenStore(seen_store.SetSeenStore):
+    """ A seen store flushing the checkpoint once the urls are added, as the
+    flush thread may do before they are put.
+    """
+
+    def add_many(self, urls):
+        """ Add the urls not seen and flush the checkpoint.
+        """
+        added_urls = seen_store.SetSeenStore.add_many(self, urls)
+        self.crawl_checkpoint.flush()
+        self.flushed = map(list, self.crawl_checkpoint.load()) + \
+            [self.crawl_checkpoint.load_seed_offset()]
+        return added_urls
+
+
+class TestSeedFeeder(unittest.TestCase):
+    """ Test for SeedFeeder and SeededUrlQueue.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.url_queue = frontier.HostFrontier(0)
+        self.crawled_urls = seen_store.SetSeenStore()
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def write_url_list(self, urls, compressed=False):
+        """ Write a url list file, gzip compressed or not.
+        """
+        path = os.path.join(self.temp_directory, 'urls.gz' if compressed else 'urls')
+        url_lines = gzip.open(path, 'wb') if compressed else open(path, 'wb')
+        with url_lines:
+            url_lines.write(''.join('%s\n' % url for url in urls))
+        return path
+
+    def create_feeder(self, path, **kwargs):
+        """ Create a feeder of the url list to the url queue.
+        """
+        return seed_feeder.SeedFeeder(path, self.url_queue, self.crawled_urls,
+                                      mini_spider.Url, canonical_url.Canonicalizer(), **kwargs)
+
+    def drain(self, url_queue):
+        """ Get every url, reporting each done at once.
+        """
+        urls = []
+        while not url_queue.empty():
+            try:
+                url_obj = url_queue.get(timeout=0.1)
+            except Queue.Empty:
+                continue
+            urls.append(url_obj.url)
+            url_queue.task_done(url_obj)
+        return urls
+
+    def test_feed(self):
+        """ Test plain and gzip url lists are fed canonical and deduplicated.
+        """
+        urls = ['HTTP://A.com', '', 'http://a.com/', 'http://b.com/x/../y', 'http://c.com/']
+        for compressed in (False, True):
+            self.crawled_urls = seen_store.SetSeenStore(['http://c.com/'])
+            feeder = self.create_feeder(self.write_url_list(urls, compressed))
+            url_queue = seed_feeder.SeededUrlQueue(self.url_queue, feeder)
+            feeder.start()
+            self.assertEqual(sorted(self.drain(url_queue)), ['http://a.com/', 'http://b.com/y'])
+            url_queue.join()
+            self.assertEqual((feeder.read_urls, feeder.seeded_urls, feeder.duplicate_urls),
+                             (4, 2, 2))
+            self.assertTrue('http://a.com/' in self.crawled_urls)
+
+    def test_backpressure(self):
+        """ Test the feeder waits while max_pending urls wait in the url queue.
+        """
+        urls = ['http://a.com/%d' % i for i in xrange(100)]
+        feeder = self.create_feeder(self.write_url_list(urls), max_pending=10, batch_size=5)
+        feeder.start()
+        self.assertFalse(feeder.wait(0.3))
+        self.assertEqual(self.url_queue.qsize(), 10)
+        self.assertEqual(feeder.read_urls, 10)
+        url_queue = seed_feeder.SeededUrlQueue(self.url_queue, feeder)
+        self.assertFalse(url_queue.empty())
+        self.assertEqual(len(self.drain(url_queue)), 100)
+        self.assertTrue(feeder.finished.is_set())
+        feeder.stop()
+
+    def test_resume_offset(self):
+        """ Test the offset is checkpointed and a new feeder reads on from it.
+        """
+        urls = ['http://a.com/%d' % i for i in xrange(10)]
+        path = self.write_url_list(urls)
+        crawl_checkpoint = checkpoint.CrawlCheckpoint(os.path.join(self.temp_directory,
+                                                                   'checkpoint.db'), 60)
+        crawl_checkpoint.reset()
+        self.url_queue = checkpoint.CheckpointedUrlQueue(self.url_queue, crawl_checkpoint)
+        feeder = self.create_feeder(path, max_pending=4, batch_size=4, checkpointed=True)
+        feeder.start()
+        feeder.wait(0.3)
+        feeder.stop()
+        crawl_checkpoint.close()
+
+        crawl_checkpoint = checkpoint.CrawlCheckpoint(crawl_checkpoint.path, 60)
+        offset = crawl_checkpoint.load_seed_offset()
+        self.assertEqual(offset, len(''.join('%s\n' % url for url in urls[:4])))
+        self.url_queue = frontier.HostFrontier(0)
+        feeder = self.create_feeder(path, offset=offset)
+        feeder.start()
+        self.assertTrue(feeder.wait(1))
+        self.assertEqual(self.drain(self.url_queue), urls[4:])
+        self.assertEqual(list(crawl_checkpoint.load()[0]), [(url, 0) for url in urls[:4]])
+        crawl_checkpoint.close()
+
+    def test_flush_between_admission_and_put(self):
+        """ Test seed urls flushed after they are added and before they are put
+        are neither seen nor read on resume.
+        """
+        crawl_checkpoint = checkpoint.CrawlCheckpoint(os.path.join(self.temp_directory,
+                                                                   'checkpoint.db'), 60)
+        crawl_checkpoint.reset()
+        self.url_queue = checkpoint.CheckpointedUrlQueue(self.url_queue, crawl_checkpoint)
+        self.crawled_urls = FlushingSeenStore()
+        self.crawled_urls.crawl_checkpoint = crawl_checkpoint
+        feeder = self.create_feeder(self.write_url_list([]), checkpointed=True)
+        feeder.feed(['http://a.com/', 'http://b.com/'], 28)
+        self.assertEqual(self.crawled_urls.flushed, [[], [], 0])
+        crawl_checkpoint.flush()
+        self.assertEqual(map(list, crawl_checkpoint.load()),
+                         [[('http://a.com/', 0), ('http://b.com/', 0)],
+                          ['http://a.com/', 'http://b.com/']])
+        self.assertEqual(crawl_checkpoint.load_seed_offset(), 28)
+        crawl_checkpoint.close()
+
+    def test_missing_url_list(self):
+        """ Test starting the feeder of a missing url list raises IOError.
+        """
+        feeder = self.create_feeder(os.path.join(self.temp_directory, 'missing'))
+        self.assertRaises(IOError, feeder.start)
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,619 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the stores of seen urls used to dedup the crawled urls.
+
+Every store is thread-safe and offers add_if_absent(url), add_many(urls),
+__contains__, __len__ and memory_footprint(). add_many admits the links of a
+webpage under one lock acquisition instead of one per link:
+
+    set: The url strings in a python set, exact but the largest.
+    fingerprint: 64-bit url fingerprints in an open addressing table, exact
+                 up to fingerprint collisions (about n^2 / 2^65).
+    bloom: A scalable bloom filter with a configured false positive rate.
+    disk: 64-bit url fingerprints in a sqlite file, for crawls larger than RAM.
+
+A StripedSeenStore splits the urls over several stores of a backend by url
+hash, so the crawl threads admitting links mostly take different locks.
+
+Author: weileizhe
+Date: 2015/01/19 00:00:06
+"""
+
+import array
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+import sys
+import threading
+
+
+SEEN_STORE_BACKENDS = ('set', 'fingerprint', 'bloom', 'disk')
+FINGERPRINT_TYPE = 'L'
+MAX_LOAD_FACTOR = 0.7
+DISK_COMMIT_INTERVAL = 1000
+
+
+def url_fingerprint(url):
+    """
+    Get the 64-bit fingerprint of url.
+
+    Args:
+        url: The url.
+
+    Returns:
+        A non-zero integer below 2^64.
+    """
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    fingerprint, = struct.unpack('<Q', hashlib.md5(url).digest()[:8])
+    return fingerprint or 1
+
+
+class SetSeenStore(set):
+    """
+    Seen urls kept as strings in a python set.
+    """
+
+    def __init__(self, urls=()):
+        """ Init the store.
+
+        Args:
+            urls: The urls already seen.
+        """
+        set.__init__(self, urls)
+        self.mutex = threading.Lock()
+
+    def add_if_absent(self, url):
+        """
+        Add url if it is not seen.
+
+        Args:
+            url: The url.
+
+        Returns:
+            True if url is added, False if it is already seen.
+        """
+        with self.mutex:
+            if url in self:
+                return False
+            self.add(url)
+            return True
+
+    def add_many(self, urls):
+        """
+        Add the urls not seen under one lock acquisition.
+
+        Args:
+            urls: The iterable of urls.
+
+        Returns:
+            A list of the urls added in order, a repeated url is added once.
+        """
+        added_urls = []
+        with self.mutex:
+            for url in urls:
+                if url not in self:
+                    self.add(url)
+                    added_urls.append(url)
+        return added_urls
+
+    def memory_footprint(self):
+        """
+        Get the bytes used by the set and its url strings.
+        """
+        with self.mutex:
+            return sys.getsizeof(self) + sum(sys.getsizeof(url) for url in self)
+
+
+class FingerprintSeenStore(object):
+    """
+    Seen urls kept as 64-bit fingerprints in an open addressing hash table.
+
+    The table is a flat array of fingerprints with linear probing, zero marks
+    an empty slot. It doubles when the load factor exceeds MAX_LOAD_FACTOR,
+    so each url costs about 8 / MAX_LOAD_FACTOR to 16 / MAX_LOAD_FACTOR bytes.
+    """
+
+    def __init__(self, capacity=65536):
+        """ Init the store.
+
+        Args:
+            capacity: The expected url count to size the initial table.
+        """
+        size = 16
+        while size * MAX_LOAD_FACTOR < capacity:
+            size *= 2
+        self.slots = array.array(FINGERPRINT_TYPE, [0]) * size
+        self.mask = size - 1
+        self.fingerprint_mask = (1 << (8 * self.slots.itemsize)) - 1
+        self.count = 0
+        self.mutex = threading.Lock()
+
+    def _fingerprint(self, url):
+        """
+        Get the fingerprint of url which fits in a table slot.
+        """
+        return (url_fingerprint(url) & self.fingerprint_mask) or 1
+
+    def _find_slot(self, slots, mask, fingerprint):
+        """
+        Find the slot holding fingerprint, or the empty slot to put it.
+        """
+        index = fingerprint & mask
+        while slots[index] and slots[index] != fingerprint:
+            index = (index + 1) & mask
+        return index
+
+    def add_if_absent(self, url):
+        """
+        Add url if it is not seen.
+
+        Args:
+            url: The url.
+
+        Returns:
+            True if url is added, False if it is already seen.
+        """
+        fingerprint = self._fingerprint(url)
+        with self.mutex:
+            return self._add(fingerprint)
+
+    def add_many(self, urls):
+        """
+        Add the urls not seen under one lock acquisition, fingerprinted before it.
+
+        Args:
+            urls: The iterable of urls.
+
+        Returns:
+            A list of the urls added in order, a repeated url is added once.
+        """
+        fingerprints = [(self._fingerprint(url), url) for url in urls]
+        with self.mutex:
+            return [url for fingerprint, url in fingerprints if self._add(fingerprint)]
+
+    def _add(self, fingerprint):
+        """
+        Add fingerprint if it is not in the table, holding the mutex.
+
+        Returns:
+            True if fingerprint is added, False if it is already in the table.
+        """
+        index = self._find_slot(self.slots, self.mask, fingerprint)
+        if self.slots[index]:
+            return False
+        self.slots[index] = fingerprint
+        self.count += 1
+        if self.count > len(self.slots) * MAX_LOAD_FACTOR:
+            self._grow()
+        return True
+
+    def _grow(self):
+        """
+        Double the table, holding the mutex.
+        """
+        slots = array.array(FINGERPRINT_TYPE, [0]) * (len(self.slots) * 2)
+        mask = len(slots) - 1
+        for fingerprint in self.slots:
+            if fingerprint:
+                slots[self._find_slot(slots, mask, fingerprint)] = fingerprint
+        self.slots = slots
+        self.mask = mask
+
+    def __contains__(self, url):
+        """
+        Judge if url is seen.
+        """
+        fingerprint = self._fingerprint(url)
+        with self.mutex:
+            return bool(self.slots[self._find_slot(self.slots, self.mask, fingerprint)])
+
+    def __len__(self):
+        """
+        Get the seen url count.
+        """
+        return self.count
+
+    def memory_footprint(self):
+        """
+        Get the bytes used by the table.
+        """
+        return self.slots.itemsize * len(self.slots)
+
+
+class BloomFilter(object):
+    """
+    A fixed size bloom filter.
+
+    Attributes:
+        capacity: The url count the filter is sized for.
+        bit_count: The bit count of the filter.
+        hash_count: The hash function count.
+    """
+
+    def __init__(self, capacity, error_rate):
+        """ Init the filter.
+
+        Args:
+            capacity: The url count the filter is sized for.
+            error_rate: The false positive rate at capacity.
+        """
+        self.capacity = capacity
+        self.bit_count = max(8, int(math.ceil(-capacity * math.log(error_rate) /
+                                              (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.bit_count / float(capacity) * math.log(2))))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _bit_indexes(self, digest):
+        """
+        Get the bit indexes of a url digest by double hashing.
+        """
+        first_hash, second_hash = struct.unpack('<QQ', digest)
+        second_hash |= 1
+        for i in xrange(self.hash_count):
+            yield (first_hash + i * second_hash) % self.bit_count
+
+    def __contains__(self, digest):
+        """
+        Judge if a url digest may be added.
+        """
+        bits = self.bits
+        for index in self._bit_indexes(digest):
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def add(self, digest):
+        """
+        Add a url digest.
+        """
+        bits = self.bits
+        for index in self._bit_indexes(digest):
+            bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+
+class BloomSeenStore(object):
+    """
+    Seen urls kept in a scalable bloom filter.
+
+    When a filter reaches its capacity, a new filter with double capacity and
+    half the error rate is added, so the total false positive rate stays below
+    error_rate however many urls are seen. A false positive drops a url which
+    is not crawled yet.
+
+    Attributes:
+        error_rate: The max false positive rate.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        """ Init the store.
+
+        Args:
+            capacity: The url count the first filter is sized for.
+            error_rate: The max false positive rate.
+        """
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(capacity, error_rate / 2)]
+        self.count = 0
+        self.mutex = threading.Lock()
+
+    def add_if_absent(self, url):
+        """
+        Add url if it is not seen.
+
+        Args:
+            url: The url.
+
+        Returns:
+            True if url is added, False if it is seen or a false positive.
+        """
+        digest = self._digest(url)
+        with self.mutex:
+            return self._add(digest)
+
+    def add_many(self, urls):
+        """
+        Add the urls not seen under one lock acquisition, hashed before it.
+
+        Args:
+            urls: The iterable of urls.
+
+        Returns:
+            A list of the urls added in order, a repeated url is added once.
+        """
+        digests = [(self._digest(url), url) for url in urls]
+        with self.mutex:
+            return [url for digest, url in digests if self._add(digest)]
+
+    def _digest(self, url):
+        """
+        Get the md5 digest of url.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        return hashlib.md5(url).digest()
+
+    def _add(self, digest):
+        """
+        Add digest if it is not in any filter, holding the mutex.
+
+        Returns:
+            True if digest is added, False if it may be in a filter.
+        """
+        for bloom_filter in self.filters:
+            if digest in bloom_filter:
+                return False
+        last_filter = self.filters[-1]
+        if last_filter.count >= last_filter.capacity:
+            error_rate = self.error_rate / (2 ** (len(self.filters) + 1))
+            last_filter = BloomFilter(last_filter.capacity * 2, error_rate)
+            self.filters.append(last_filter)
+        last_filter.add(digest)
+        self.count += 1
+        return True
+
+    def __contains__(self, url):
+        """
+        Judge if url may be seen.
+        """
+        digest = self._digest(url)
+        with self.mutex:
+            return any(digest in bloom_filter for bloom_filter in self.filters)
+
+    def __len__(self):
+        """
+        Get the added url count.
+        """
+        return self.count
+
+    def memory_footprint(self):
+        """
+        Get the bytes used by the filters.
+        """
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters)
+
+
+class DiskSeenStore(object):
+    """
+    Seen urls kept as 64-bit fingerprints in a sqlite file.
+
+    Only the sqlite page cache lives in memory. Inserts are committed every
+    DISK_COMMIT_INTERVAL urls and on close().
+
+    Attributes:
+        path: The sqlite file path.
+    """
+
+    def __init__(self, path, cache_size=2000):
+        """ Init the store.
+
+        Args:
+            path: The sqlite file path, created if not exists.
+            cache_size: The sqlite page cache size in pages.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('PRAGMA cache_size = %d' % cache_size)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS seen '
+                                '(fingerprint INTEGER PRIMARY KEY)')
+        self.count, = self.connection.execute('SELECT COUNT(*) FROM seen').fetchone()
+        self.uncommitted = 0
+        self.mutex = threading.Lock()
+
+    def _fingerprint(self, url):
+        """
+        Get the fingerprint of url as a signed 64-bit sqlite integer.
+        """
+        return url_fingerprint(url) - (1 << 63)
+
+    def add_if_absent(self, url):
+        """
+        Add url if it is not seen.
+
+        Args:
+            url: The url.
+
+        Returns:
+            True if url is added, False if it is already seen.
+        """
+        fingerprint = self._fingerprint(url)
+        with self.mutex:
+            added = self._add(fingerprint)
+            self._commit_due()
+            return added
+
+    def add_many(self, urls):
+        """
+        Add the urls not seen under one lock acquisition.
+
+        Args:
+            urls: The iterable of urls.
+
+        Returns:
+            A list of the urls added in order, a repeated url is added once.
+        """
+        fingerprints = [(self._fingerprint(url), url) for url in urls]
+        with self.mutex:
+            added_urls = [url for fingerprint, url in fingerprints if self._add(fingerprint)]
+            self._commit_due()
+            return added_urls
+
+    def _add(self, fingerprint):
+        """
+        Insert fingerprint if it is not in the file, holding the mutex.
+
+        Returns:
+            True if fingerprint is inserted, False if it is already in the file.
+        """
+        cursor = self.connection.execute('INSERT OR IGNORE INTO seen VALUES (?)',
+                                         (fingerprint,))
+        if cursor.rowcount != 1:
+            return False
+        self.count += 1
+        self.uncommitted += 1
+        return True
+
+    def _commit_due(self):
+        """
+        Commit the inserts once DISK_COMMIT_INTERVAL are uncommitted, holding the mutex.
+        """
+        if self.uncommitted >= DISK_COMMIT_INTERVAL:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def __contains__(self, url):
+        """
+        Judge if url is seen.
+        """
+        fingerprint = self._fingerprint(url)
+        with self.mutex:
+            return self.connection.execute('SELECT 1 FROM seen WHERE fingerprint = ?',
+                                           (fingerprint,)).fetchone() is not None
+
+    def __len__(self):
+        """
+        Get the seen url count.
+        """
+        return self.count
+
+    def memory_footprint(self):
+        """
+        Get the bytes the sqlite page cache may use.
+        """
+        with self.mutex:
+            page_size, = self.connection.execute('PRAGMA page_size').fetchone()
+            cache_size, = self.connection.execute('PRAGMA cache_size').fetchone()
+        if cache_size < 0:
+            return -cache_size * 1024
+        return page_size * cache_size
+
+    def close(self):
+        """
+        Commit and close the sqlite file.
+        """
+        with self.mutex:
+            self.connection.commit()
+            self.connection.close()
+
+
+class StripedSeenStore(object):
+    """
+    Seen urls split over several stores by url hash, each behind its own lock.
+
+    Attributes:
+        stripes: The list of stores.
+    """
+
+    def __init__(self, stripes):
+        """ Init the store.
+
+        Args:
+            stripes: The list of stores of one backend, empty.
+        """
+        self.stripes = stripes
+
+    def _stripe(self, url):
+        """
+        Get the store of url.
+        """
+        return self.stripes[hash(url) % len(self.stripes)]
+
+    def add_if_absent(self, url):
+        """
+        Add url to its store if it is not seen.
+
+        Args:
+            url: The url.
+
+        Returns:
+            True if url is added, False if it is already seen.
+        """
+        return self._stripe(url).add_if_absent(url)
+
+    def add_many(self, urls):
+        """
+        Add the urls not seen, one lock acquisition per store they fall in.
+
+        Args:
+            urls: The iterable of urls.
+
+        Returns:
+            A list of the urls added in order, a repeated url is added once.
+        """
+        urls = list(urls)
+        stripe_urls = {}
+        for url in urls:
+            stripe_urls.setdefault(hash(url) % len(self.stripes), []).append(url)
+        added_urls = set()
+        for index, batch in stripe_urls.iteritems():
+            added_urls.update(self.stripes[index].add_many(batch))
+        ordered_urls = []
+        for url in urls:
+            if url in added_urls:
+                added_urls.discard(url)
+                ordered_urls.append(url)
+        return ordered_urls
+
+    def __contains__(self, url):
+        """
+        Judge if url is seen.
+        """
+        return url in self._stripe(url)
+
+    def __len__(self):
+        """
+        Get the seen url count.
+        """
+        return sum(len(stripe) for stripe in self.stripes)
+
+    def memory_footprint(self):
+        """
+        Get the bytes used by the stores.
+        """
+        return sum(stripe.memory_footprint() for stripe in self.stripes)
+
+
+def create_seen_store(backend, capacity=1000000, error_rate=0.001, path='./seen.db', stripes=1):
+    """
+    Create a store of seen urls.
+
+    Args:
+        backend: One of SEEN_STORE_BACKENDS.
+        capacity: The expected url count.
+        error_rate: The false positive rate of the bloom backend.
+        path: The sqlite file path of the disk backend, which is emptied.
+        stripes: The stores to split the urls over, each sized for its share
+                 of capacity. The disk backend is one sqlite file, never split.
+
+    Returns:
+        A seen url store.
+
+    Raises:
+        ValueError: Unknown backend.
+    """
+    if stripes > 1 and backend in ('set', 'fingerprint', 'bloom'):
+        stripe_capacity = max(1, capacity // stripes)
+        return StripedSeenStore([create_seen_store(backend, stripe_capacity, error_rate)
+                                 for i in xrange(stripes)])
+    if backend == 'set':
+        return SetSeenStore()
+    if backend == 'fingerprint':
+        return FingerprintSeenStore(capacity)
+    if backend == 'bloom':
+        return BloomSeenStore(capacity, error_rate)
+    if backend == 'disk':
+        if os.path.exists(path):
+            os.remove(path)
+        return DiskSeenStore(path)
+    raise ValueError('Unknown seen store backend %s' % backend)
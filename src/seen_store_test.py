@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for seen store.
+
+Author: weileizhe
+Date: 2015/01/19 00:00:06
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+import seen_store
+
+
+class TestSeenStores(unittest.TestCase):
+    """ Test add_if_absent of every seen store backend.
+    """
+
+    def setUp(self):
+        """ Set up test.
+        """
+        self.temp_directory = tempfile.mkdtemp()
+        self.urls = ['http://example.com/page/%d.html' % i for i in xrange(2000)]
+
+    def tearDown(self):
+        """ Tear down test.
+        """
+        shutil.rmtree(self.temp_directory)
+
+    def create_stores(self):
+        """ Create a small store of every backend.
+        """
+        path = os.path.join(self.temp_directory, 'seen.db')
+        return [seen_store.create_seen_store(backend, 16, 0.001, path)
+                for backend in seen_store.SEEN_STORE_BACKENDS]
+
+    def test_add_if_absent(self):
+        """ Test urls are added once.
+        """
+        for store in self.create_stores():
+            added_count = sum(1 for url in self.urls if store.add_if_absent(url))
+            if isinstance(store, seen_store.BloomSeenStore):
+                self.assertTrue(added_count > len(self.urls) * 0.99)
+            else:
+                self.assertEqual(added_count, len(self.urls))
+            for url in self.urls:
+                self.assertFalse(store.add_if_absent(url), store)
+                self.assertTrue(url in store)
+            self.assertEqual(len(store), added_count)
+            self.assertTrue(store.memory_footprint() > 0)
+
+    def test_add_many(self):
+        """ Test a batch of urls is added once each, in order, striped or not.
+        """
+        stores = self.create_stores() + [
+            seen_store.create_seen_store(backend, 16, 0.001, stripes=4)
+            for backend in ('set', 'fingerprint', 'bloom')]
+        for store in stores:
+            store.add_if_absent(self.urls[3])
+            added_urls = store.add_many(self.urls[:10] + self.urls[:5])
+            self.assertEqual(added_urls, self.urls[:3] + self.urls[4:10])
+            self.assertEqual(store.add_many(self.urls[:10]), [])
+            self.assertEqual(len(store), 10)
+            self.assertTrue(all(url in store for url in self.urls[:10]))
+            if hasattr(store, 'close'):
+                store.close()
+
+    def test_striped_store(self):
+        """ Test a striped store splits the urls over its stripes.
+        """
+        store = seen_store.create_seen_store('fingerprint', 1000, stripes=4)
+        self.assertIsInstance(store, seen_store.StripedSeenStore)
+        self.assertEqual(len(store.add_many(self.urls)), len(self.urls))
+        self.assertTrue(all(len(stripe) > len(self.urls) / 8 for stripe in store.stripes))
+        self.assertFalse(store.add_if_absent(self.urls[0]))
+        self.assertTrue(store.memory_footprint() > 0)
+        self.assertIsInstance(seen_store.create_seen_store(
+            'disk', path=os.path.join(self.temp_directory, 'seen.db'), stripes=4),
+            seen_store.DiskSeenStore)
+
+    def test_fingerprint_store_is_smaller(self):
+        """ Test fingerprints take less memory than url strings.
+        """
+        set_store = seen_store.SetSeenStore()
+        fingerprint_store = seen_store.FingerprintSeenStore(len(self.urls))
+        for url in self.urls:
+            set_store.add_if_absent(url)
+            fingerprint_store.add_if_absent(url)
+        self.assertTrue(fingerprint_store.memory_footprint() * 4 < set_store.memory_footprint())
+
+    def test_bloom_store_error_rate(self):
+        """ Test the false positive rate of bloom store stays below error_rate.
+        """
+        store = seen_store.BloomSeenStore(500, 0.01)
+        for url in self.urls:
+            store.add_if_absent(url)
+        self.assertTrue(len(store.filters) > 1)
+        false_positives = sum(1 for i in xrange(10000)
+                              if 'http://example.com/other/%d' % i in store)
+        self.assertTrue(false_positives < 100)
+
+    def test_disk_store_persists(self):
+        """ Test disk store keeps seen urls after close.
+        """
+        path = os.path.join(self.temp_directory, 'persist.db')
+        store = seen_store.DiskSeenStore(path)
+        store.add_if_absent(self.urls[0])
+        store.close()
+        store = seen_store.DiskSeenStore(path)
+        self.assertEqual(len(store), 1)
+        self.assertFalse(store.add_if_absent(self.urls[0]))
+        store.close()
+
+    def test_unknown_backend(self):
+        """ Test creating an unknown backend.
+        """
+        with self.assertRaises(ValueError):
+            seen_store.create_seen_store('unknown')
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
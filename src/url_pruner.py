@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014 All Rights Reserved
+#
+################################################################################
+"""
+This module realizes the pruning of the urls found in webpages before they
+are put to the url queue, so a url proved useless is never grabed.
+
+A url is useful only if it matches target_url or its webpage may hold links
+to crawl. The rules, checked in this order, drop the urls proved otherwise:
+
+    scheme: Not an http or https url, which can not be grabed.
+    domain: The host is in denied_domains, or not in allowed_domains when
+            it is not empty. A domain matches its subdomains too.
+    depth: Deeper than max_depth.
+    leaf: Not a target at max_depth, where webpages are not parsed.
+    mime_hint: Not a target, and the extension hints a type which holds no
+               links, like an image, a script or an archive.
+
+Every rule counts the urls it dropped.
+
+Author: weileizhe
+Date: 2015/03/23 00:00:06
+"""
+
+import collections
+import mimetypes
+import re
+import threading
+import urlparse
+
+
+PRUNE_RULES = ('scheme', 'domain', 'depth', 'leaf', 'mime_hint')
+
+CRAWLABLE_SCHEMES = ('http', 'https')
+
+# The types guessed from an extension which never hold links to crawl.
+LINKLESS_MAJOR_TYPES = ('image', 'audio', 'video', 'font')
+LINKLESS_TYPES = frozenset([
+    'text/css',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'application/x-javascript',
+    'application/json',
+    'application/pdf',
+    'application/zip',
+    'application/gzip',
+    'application/x-gzip',
+    'application/x-tar',
+    'application/x-bzip2',
+    'application/x-rar-compressed',
+    'application/x-7z-compressed',
+    'application/octet-stream',
+    'application/x-shockwave-flash',
+    'application/msword',
+    'application/vnd.ms-excel',
+    'application/vnd.ms-powerpoint',
+    'application/x-msdownload',
+    'application/x-msdos-program',
+])
+
+
+def parse_domains(domains):
+    """
+    Parse a comma separated domain list to a tuple of lowercase domains.
+    """
+    return tuple(domain.strip().lower().lstrip('.') for domain in domains.split(',')
+                 if domain.strip())
+
+
+def parse_prune_rules(prune_rules):
+    """
+    Parse the prune rules configuration.
+
+    Args:
+        prune_rules: Comma separated rule names of PRUNE_RULES.
+
+    Returns:
+        A tuple of the rule names.
+
+    Raises:
+        ValueError: Unknown rule.
+    """
+    rules = tuple(rule.strip() for rule in prune_rules.split(',') if rule.strip())
+    for rule in rules:
+        if rule not in PRUNE_RULES:
+            raise ValueError('unknown prune rule %s' % rule)
+    return rules
+
+
+def match_domain(host, domains):
+    """
+    Judge if host is one of domains or a subdomain of them.
+    """
+    for domain in domains:
+        if host == domain or host.endswith('.' + domain):
+            return True
+    return False
+
+
+def is_linkless_type(path):
+    """
+    Judge if the extension of path hints a type which holds no links.
+    """
+    content_type = mimetypes.guess_type(path, strict=False)[0]
+    if content_type is None:
+        return False
+    return content_type in LINKLESS_TYPES or \
+        content_type.split('/', 1)[0] in LINKLESS_MAJOR_TYPES
+
+
+class UrlPruner(object):
+    """
+    Drop the urls proved useless before they are put to the url queue.
+
+    Attributes:
+        rules: The names of the rules checked.
+        max_depth: The max crawl depth.
+        target_regex: The target url regular expression.
+        allowed_domains: The domains to crawl only, empty for every domain.
+        denied_domains: The domains never to crawl.
+        dropped: A Counter of the urls dropped by every rule.
+    """
+
+    def __init__(self, rules, max_depth, target_url, allowed_domains=(), denied_domains=()):
+        """ Init the pruner.
+
+        Args:
+            rules: The names of the rules to check.
+            max_depth: The max crawl depth.
+            target_url: The target url matching special regularation to save.
+            allowed_domains: The domains to crawl only, empty for every domain.
+            denied_domains: The domains never to crawl.
+        """
+        self.rules = tuple(rules)
+        self.max_depth = max_depth
+        self.target_regex = re.compile(target_url)
+        self.allowed_domains = tuple(allowed_domains)
+        self.denied_domains = tuple(denied_domains)
+        self.check_scheme = 'scheme' in rules
+        self.check_domain = 'domain' in rules and bool(allowed_domains or denied_domains)
+        self.check_depth = 'depth' in rules
+        self.check_leaf = 'leaf' in rules
+        self.check_mime_hint = 'mime_hint' in rules
+        self.dropped = collections.Counter()
+        self.mutex = threading.Lock()
+
+    def prune(self, url, depth):
+        """
+        Get the rule proving url useless.
+
+        Args:
+            url: The joined url.
+            depth: The crawl depth url would be put at.
+
+        Returns:
+            The name of the first rule dropping url, None if url is kept.
+        """
+        splited_url = urlparse.urlsplit(url)
+        if self.check_scheme and splited_url.scheme not in CRAWLABLE_SCHEMES:
+            return 'scheme'
+        if self.check_domain:
+            host = (splited_url.hostname or '').rstrip('.')
+            if match_domain(host, self.denied_domains):
+                return 'domain'
+            if self.allowed_domains and not match_domain(host, self.allowed_domains):
+                return 'domain'
+        if self.check_depth and depth > self.max_depth:
+            return 'depth'
+        if self.target_regex.match(url) is not None:
+            return None
+        if self.check_leaf and depth >= self.max_depth:
+            return 'leaf'
+        if self.check_mime_hint and is_linkless_type(splited_url.path):
+            return 'mime_hint'
+        return None
+
+    def allows(self, url, depth):
+        """
+        Judge if url is kept, counting it to its rule if dropped.
+
+        Args:
+            url: The joined url.
+            depth: The crawl depth url would be put at.
+        """
+        rule = self.prune(url, depth)
+        if rule is None:
+            return True
+        with self.mutex:
+            self.dropped[rule] += 1
+        return False
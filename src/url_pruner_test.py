@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+################################################################################
+#
+# Copyright (c) 2014  All Rights Reserved
+#
+################################################################################
+"""
+This module realizes unit test for url pruner.
+
+Author: weileizhe
+Date: 2015/03/23 00:00:06
+"""
+
+import Queue
+import unittest
+
+
+import mini_spider
+import seen_store
+import url_pruner
+
+
+class TestParsePruneRules(unittest.TestCase):
+    """ Test parse_prune_rules(prune_rules) and parse_domains(domains) functions.
+    """
+
+    def test_parse_prune_rules(self):
+        """ Test parsing normal and unknown rules.
+        """
+        self.assertEqual(url_pruner.parse_prune_rules('scheme, leaf,'), ('scheme', 'leaf'))
+        self.assertEqual(url_pruner.parse_prune_rules(''), ())
+        with self.assertRaises(ValueError):
+            url_pruner.parse_prune_rules('scheme, size')
+
+    def test_parse_domains(self):
+        """ Test parsing a domain list.
+        """
+        self.assertEqual(url_pruner.parse_domains(' Example.com, .cdn.net,'),
+                         ('example.com', 'cdn.net'))
+
+
+class TestUrlPruner(unittest.TestCase):
+    """ Test for UrlPruner.
+    """
+
+    def test_prune(self):
+        """ Test every rule drops the urls proved useless and counts them.
+        """
+        pruner = url_pruner.UrlPruner(url_pruner.PRUNE_RULES, 2, '.*\.(png|jpg)$',
+                                      ('example.com',), ('ads.example.com',))
+        for url, depth, rule in (('http://example.com/a.html', 1, None),
+                                 ('https://www.Example.com/a', 1, None),
+                                 ('http://example.com/a.png', 2, None),
+                                 ('http://example.com/a.php?id=1', 1, None),
+                                 ('mailto:a@example.com', 1, 'scheme'),
+                                 ('ftp://example.com/a.png', 1, 'scheme'),
+                                 ('http://other.com/a.html', 1, 'domain'),
+                                 ('http://notexample.com/a.html', 1, 'domain'),
+                                 ('http://ads.example.com/a.png', 1, 'domain'),
+                                 ('http://example.com/a.png', 3, 'depth'),
+                                 ('http://example.com/a.html', 2, 'leaf'),
+                                 ('http://example.com/a.gif', 1, 'mime_hint'),
+                                 ('http://example.com/a.js', 1, 'mime_hint'),
+                                 ('http://example.com/a.css?v=1', 1, 'mime_hint'),
+                                 ('http://example.com/a.pdf', 1, 'mime_hint')):
+            self.assertEqual(pruner.prune(url, depth), rule, url)
+            self.assertEqual(pruner.allows(url, depth), rule is None, url)
+        self.assertEqual(pruner.dropped, {'scheme': 2, 'domain': 3, 'depth': 1, 'leaf': 1,
+                                          'mime_hint': 4})
+
+    def test_prune_without_rules(self):
+        """ Test only the rules given are checked.
+        """
+        pruner = url_pruner.UrlPruner(('leaf',), 1, '.*\.png$', ('example.com',))
+        self.assertEqual(pruner.prune('http://other.com/a.js', 0), None)
+        self.assertEqual(pruner.prune('mailto:a@example.com', 1), 'leaf')
+
+
+class TestPutNextUrls(unittest.TestCase):
+    """ Test pruned urls are not put or marked crawled.
+    """
+
+    def test_put_next_urls(self):
+        """ Test only the kept urls are put.
+        """
+        url_queue = Queue.Queue()
+        crawled_urls = seen_store.SetSeenStore()
+        pruner = url_pruner.UrlPruner(url_pruner.PRUNE_RULES, 1, '.*\.png$')
+        spider = mini_spider.MiniSpider(url_queue, crawled_urls, 1, 0, 5, '.*\.png$', './output',
+                                        pruner=pruner)
+        spider.put_next_urls(mini_spider.Url('http://a.com/', 0),
+                             ['http://a.com/a.png', 'http://a.com/b.html', 'http://a.com/c.css'],
+                             url_queue, crawled_urls)
+        self.assertEqual(url_queue.get().url, 'http://a.com/a.png')
+        self.assertTrue(url_queue.empty())
+        self.assertEqual(set(crawled_urls), set(['http://a.com/a.png']))
+
+
+def main():
+    """ Main function entrance.
+    """
+    unittest.main()
+
+if __name__ == '__main__':
+    main()